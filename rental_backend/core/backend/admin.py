@@ -21,8 +21,10 @@ from backend.models import User, Otp, Token, PasswordResetToken, Category, Slide
     PageItem, Order, OrderedProduct, Notification, ContactInfo, InformMe, AppVersion, ServiceOption, \
     ServiceCategory, ServiceSubCategory, Service, ServiceImage, ServiceBooking, ServicePageItem, Vendor, VendorToken, CartItem, \
     ProductBooking, UserAddress, ServiceCategoryAvailability, PageItemAvailability, ServiceableLocation, \
-    CategoryAvailability, HomePageItem, UserDevice, AdminNotificationLog, ArtistAvailability, Coupon, CouponUsage, \
-    ReferralSettings, Referral, WalletTransaction, ServiceVendor, ServiceVendorToken, TrialSettings, TrialBooking, TrialItem, ScreenViewEvent, CustomerLocationPing
+    CategoryAvailability, HomePageItem, UserDevice, AdminNotificationLog, ArtistAvailability, Coupon, CouponUsage, CouponCounterShard, \
+    ReferralSettings, Referral, WalletTransaction, ServiceVendor, ServiceVendorToken, TrialSettings, TrialBooking, TrialItem, ScreenViewEvent, CustomerLocationPing, \
+    ScreenDailyRollup, PlatformDailyRollup, OrderDailyRollup, LocationCellDailyCount, FunnelStepDaily, \
+    ScreenTransitionDaily, CatalogImportJob, MediaBlob, PincodeCentroid
 
 admin.site.unregister(Group)
 admin.site.unregister(AUser)
@@ -64,6 +66,11 @@ class ScreenViewEventAdmin(admin.ModelAdmin):
                 self.admin_site.admin_view(self.analytics_dashboard_view),
                 name='backend_analytics_dashboard',
             ),
+            path(
+                'funnels/',
+                self.admin_site.admin_view(self.funnels_view),
+                name='backend_session_funnels',
+            ),
         ]
         return custom_urls + urls
 
@@ -113,47 +120,137 @@ class ScreenViewEventAdmin(admin.ModelAdmin):
         }
         return render(request, 'admin/user_screen_timeline.html', context=context)
 
+    @staticmethod
+    def _days_param(request, default):
+        try:
+            days = int(request.GET.get('days') or default)
+        except (TypeError, ValueError):
+            days = default
+        return max(1, min(days, 366))
+
     def screen_analytics_view(self, request):
         """
-        Simple per-screen aggregates for admin analysis.
+        Simple per-screen aggregates for admin analysis (from ScreenDailyRollup).
+        unique_users is summed per day (user-days).
         """
-        qs = ScreenViewEvent.objects.all()
-        rows = (
-            qs.values('screen')
+        from backend.analytics_rollups import rollups_updated_at
+
+        days = self._days_param(request, 30)
+        start_day = timezone.localdate() - timedelta(days=days - 1)
+        rows = list(
+            ScreenDailyRollup.objects.filter(day__gte=start_day)
+            .values('screen')
             .annotate(
-                opens=Count('id'),
-                unique_users=Count('user', distinct=True),
-                total_seconds=Sum('duration_seconds'),
-                avg_seconds=Avg('duration_seconds'),
+                opens=Sum('opens'),
+                unique_users=Sum('unique_users'),
+                total_seconds=Sum('total_seconds'),
             )
             .order_by('-opens')
         )
+        for r in rows:
+            r['avg_seconds'] = (r['total_seconds'] or 0) / r['opens'] if r['opens'] else 0
         return render(
             request,
             'admin/screen_analytics.html',
-            context={'rows': rows},
+            context={'rows': rows, 'days': days, 'updated_at': rollups_updated_at()},
         )
 
     def app_opens_view(self, request):
         """
-        Daily app opens summary (based on ScreenViewEvent where screen='app_open').
+        Daily app opens summary (ScreenDailyRollup rows where screen='app_open').
         """
-        qs = ScreenViewEvent.objects.filter(screen='app_open')
+        from backend.analytics_rollups import rollups_updated_at
+
+        days = self._days_param(request, 90)
+        start_day = timezone.localdate() - timedelta(days=days - 1)
         rows = (
-            qs.extra(select={'day': "date(started_at)"})
-            .values('day')
-            .annotate(
-                opens=Count('id'),
-                unique_users=Count('user', distinct=True),
-                total_seconds=Sum('duration_seconds'),
-            )
+            ScreenDailyRollup.objects.filter(screen='app_open', day__gte=start_day)
             .order_by('-day')
+            .values('day', 'opens', 'unique_users', 'total_seconds')
         )
         return render(
             request,
             'admin/app_opens_analytics.html',
-            context={'rows': rows},
+            context={'rows': rows, 'days': days, 'updated_at': rollups_updated_at()},
+        )
+
+    def funnels_view(self, request):
+        """
+        Session funnel conversion and screen transition matrix
+        (from FunnelStepDaily / ScreenTransitionDaily, see build_session_funnels).
+        """
+        from backend.analytics_funnels import funnels_updated_at, get_funnels
+
+        days = self._days_param(request, 30)
+        start_day = timezone.localdate() - timedelta(days=days - 1)
+        funnels = get_funnels()
+        funnel = request.GET.get('funnel') or next(iter(funnels), '')
+
+        reached = dict(
+            FunnelStepDaily.objects.filter(funnel=funnel, day__gte=start_day)
+            .values('step')
+            .annotate(sessions=Sum('sessions'))
+            .values_list('step', 'sessions')
         )
+        steps = []
+        first = prev = None
+        for i, screen in enumerate(funnels.get(funnel) or [], start=1):
+            sessions = int(reached.get(i) or 0)
+            if first is None:
+                first = sessions
+            steps.append({
+                'step': i,
+                'screen': screen,
+                'sessions': sessions,
+                'from_prev': (sessions * 100.0 / prev) if prev else None,
+                'from_start': (sessions * 100.0 / first) if first else None,
+            })
+            prev = sessions
+
+        # Transition matrix over the busiest screens
+        transitions = (
+            ScreenTransitionDaily.objects.filter(day__gte=start_day)
+            .values('from_screen', 'to_screen')
+            .annotate(count=Sum('count'))
+        )
+        totals = {}
+        cells = {}
+        for t in transitions:
+            if not t['count']:
+                continue
+            cells[(t['from_screen'], t['to_screen'])] = int(t['count'])
+            totals[t['from_screen']] = totals.get(t['from_screen'], 0) + int(t['count'])
+        screens = sorted(totals, key=lambda k: -totals[k])[:12]
+        matrix = [
+            {
+                'screen': a,
+                'total': totals[a],
+                'cells': [
+                    {
+                        'count': cells.get((a, b), 0),
+                        'pct': cells.get((a, b), 0) * 100.0 / totals[a] if totals[a] else 0,
+                    }
+                    for b in screens
+                ],
+            }
+            for a in screens
+        ]
+        top_transitions = sorted(cells.items(), key=lambda kv: -kv[1])[:20]
+
+        context = {
+            'title': 'Session funnels',
+            'days': days,
+            'funnels': list(funnels),
+            'funnel': funnel,
+            'steps': steps,
+            'screens': screens,
+            'matrix': matrix,
+            'top_transitions': [
+                {'from_screen': a, 'to_screen': b, 'count': c} for (a, b), c in top_transitions
+            ],
+            'updated_at': funnels_updated_at(),
+        }
+        return render(request, 'admin/funnel_analytics.html', context=context)
 
     def analytics_dashboard_view(self, request):
         """
@@ -162,7 +259,12 @@ class ScreenViewEventAdmin(admin.ModelAdmin):
           - Screen opens + time spent
           - Orders over time + status breakdown
           - Users by city (based on pincode -> ServiceableLocation)
+        Screen and order charts read the daily rollup tables
+        (python manage.py build_analytics_rollups), not the raw events.
         """
+        from backend import reports
+        from backend.analytics_rollups import rollups_updated_at
+
         # Date range (default last 14 days)
         try:
             days = int(request.GET.get('days') or 14)
@@ -172,84 +274,48 @@ class ScreenViewEventAdmin(admin.ModelAdmin):
 
         end_dt = timezone.now()
         start_dt = end_dt - timedelta(days=days)
+        start_day = timezone.localdate() - timedelta(days=days - 1)
 
         # ---- Screen analytics ----
-        base_qs = ScreenViewEvent.objects.filter(started_at__gte=start_dt, started_at__lte=end_dt)
-        app_open_qs = base_qs.filter(screen='app_open')
-        screen_qs = base_qs.exclude(screen='app_open')
+        screen_rollups = ScreenDailyRollup.objects.filter(day__gte=start_day)
 
         app_opens_series = (
-            app_open_qs.annotate(day=TruncDate('started_at'))
-            .values('day')
-            .annotate(opens=Count('id'))
+            screen_rollups.filter(screen='app_open')
             .order_by('day')
+            .values('day', 'opens')
         )
 
-        top_screens = (
-            screen_qs.values('screen')
-            .annotate(opens=Count('id'), total_seconds=Sum('duration_seconds'), avg_seconds=Avg('duration_seconds'))
+        top_screens = list(
+            screen_rollups.exclude(screen='app_open')
+            .values('screen')
+            .annotate(opens=Sum('opens'), total_seconds=Sum('total_seconds'))
             .order_by('-opens')[:12]
         )
+        for r in top_screens:
+            r['avg_seconds'] = (r['total_seconds'] or 0) / r['opens'] if r['opens'] else 0
 
         # ---- Orders analytics ----
-        orders_qs = Order.objects.filter(created_at__gte=start_dt, created_at__lte=end_dt)
+        order_rollups = OrderDailyRollup.objects.filter(day__gte=start_day)
         orders_series = (
-            orders_qs.annotate(day=TruncDate('created_at'))
-            .values('day')
-            .annotate(orders=Count('id'))
+            order_rollups.values('day')
+            .annotate(orders=Sum('orders'))
             .order_by('day')
         )
         orders_status = (
-            orders_qs.values('tx_status')
-            .annotate(count=Count('id'))
+            order_rollups.values('tx_status')
+            .annotate(count=Sum('orders'))
             .order_by('-count')[:10]
         )
 
-        # ---- City analytics (by pincode) ----
-        # Map pincode -> city name from ServiceableLocation
-        loc_map = {str(l.pincode): (l.city or l.area_name or str(l.pincode)) for l in ServiceableLocation.objects.all()}
-
-        users_by_city_counts = {}
-        # NOTE: User.pincode is an IntegerField in current schema, but some legacy DBs may contain ''.
-        # Avoid pincode='' filters (they crash with "expected a number but got ''").
-        for u in User.objects.exclude(pincode__isnull=True).only('pincode'):
-            pc_raw = getattr(u, 'pincode', None)
-            if pc_raw is None:
-                continue
-            try:
-                pc = str(int(pc_raw))
-            except (TypeError, ValueError):
-                continue
-            city = loc_map.get(pc, pc)
-            users_by_city_counts[city] = users_by_city_counts.get(city, 0) + 1
-        users_by_city = sorted(
-            [{'city': k, 'count': v} for k, v in users_by_city_counts.items()],
-            key=lambda x: x['count'],
-            reverse=True,
-        )[:12]
-
-        # Orders by city (from order.user.pincode)
-        orders_by_city_counts = {}
-        for o in orders_qs.select_related('user').only('user__pincode'):
-            pc_raw = getattr(o.user, 'pincode', None) if getattr(o, 'user', None) else None
-            if pc_raw is None:
-                continue
-            try:
-                pc = str(int(pc_raw))
-            except (TypeError, ValueError):
-                continue
-            city = loc_map.get(pc, pc)
-            orders_by_city_counts[city] = orders_by_city_counts.get(city, 0) + 1
-        orders_by_city = sorted(
-            [{'city': k, 'count': v} for k, v in orders_by_city_counts.items()],
-            key=lambda x: x['count'],
-            reverse=True,
-        )[:12]
+        # ---- City analytics (by pincode -> ServiceableLocation city, grouped in SQL) ----
+        users_by_city = reports.users_by_city(limit=12)
+        orders_by_city = reports.orders_by_city(start_dt=start_dt, end_dt=end_dt, limit=12)
 
         context = {
             'days': days,
             'start_dt': start_dt,
             'end_dt': end_dt,
+            'updated_at': rollups_updated_at(),
             # JSON payloads for Chart.js
             'app_opens_series_json': json.dumps([
                 {'day': str(r['day']), 'opens': int(r['opens'] or 0)} for r in app_opens_series
@@ -277,12 +343,57 @@ class ScreenViewEventAdmin(admin.ModelAdmin):
 
 @admin.register(CustomerLocationPing)
 class CustomerLocationPingAdmin(admin.ModelAdmin):
-    list_display = ['created_at', 'user', 'device_id', 'latitude', 'longitude', 'accuracy_m', 'map_link']
+    change_list_template = 'admin/backend/customerlocationping/change_list.html'
+    list_display = ['created_at', 'user', 'device_id', 'latitude', 'longitude', 'accuracy_m', 'grid_cell', 'map_link']
     list_filter = ['platform']
     search_fields = ['device_id', 'user__email', 'user__phone']
     date_hierarchy = 'created_at'
     ordering = ['-created_at']
 
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                'heatmap/',
+                self.admin_site.admin_view(self.heatmap_view),
+                name='backend_location_heatmap',
+            ),
+        ]
+        return custom_urls + urls
+
+    def heatmap_view(self, request):
+        """
+        Customer demand heatmap from LocationCellDailyCount
+        (python manage.py rollup_location_pings), not the raw pings.
+        """
+        from backend.analytics_rollups import location_rollups_updated_at
+        from backend.geo_utils import GRID_SIZE_DEG, grid_cell_center
+
+        days = ScreenViewEventAdmin._days_param(request, 30)
+        start_day = timezone.localdate() - timedelta(days=days - 1)
+        cells = list(
+            LocationCellDailyCount.objects.filter(day__gte=start_day)
+            .values('grid_cell')
+            .annotate(pings=Sum('pings'), device_days=Sum('unique_devices'))
+            .order_by('-pings')[:5000]
+        )
+        points = []
+        for c in cells:
+            lat, lng = grid_cell_center(c['grid_cell'])
+            c['lat'], c['lng'] = lat, lng
+            points.append([lat, lng, int(c['pings'] or 0)])
+
+        context = {
+            'title': 'Customer location heatmap',
+            'days': days,
+            'grid_size_deg': GRID_SIZE_DEG,
+            'top_cells': cells[:25],
+            'cell_count': len(cells),
+            'points_json': json.dumps(points),
+            'updated_at': location_rollups_updated_at(),
+        }
+        return render(request, 'admin/location_heatmap.html', context=context)
+
     def map_link(self, obj):
         try:
             url = f"https://maps.google.com/?q={obj.latitude},{obj.longitude}"
@@ -292,6 +403,130 @@ class CustomerLocationPingAdmin(admin.ModelAdmin):
     map_link.short_description = "Map"
 
 
+@admin.register(CatalogImportJob)
+class CatalogImportJobAdmin(admin.ModelAdmin):
+    """
+    Admins upload a manifest (+ images zip) for a vendor; the import starts on save.
+    """
+    list_display = ['id', 'vendor', 'status', 'progress', 'products_created', 'options_created',
+                    'images_created', 'error_count', 'created_at', 'finished_at']
+    list_filter = ['status']
+    search_fields = ['vendor__name', 'vendor__vendor_id']
+    ordering = ['-created_at']
+    actions = ['resume_imports']
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return []
+        return [f.name for f in CatalogImportJob._meta.fields]
+
+    def get_fields(self, request, obj=None):
+        if obj is None:
+            return ['vendor', 'manifest', 'images_zip']
+        return super().get_fields(request, obj)
+
+    def progress(self, obj):
+        return f"{obj.rows_processed}/{obj.rows_total if obj.rows_total is not None else '?'}"
+    progress.short_description = 'Rows'
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            from backend.catalog_import import start_job
+            start_job(obj.pk)
+            messages.info(request, 'Import started. Refresh this page to follow progress.')
+
+    def resume_imports(self, request, queryset):
+        from backend.catalog_import import start_job
+        count = 0
+        for job in queryset.exclude(status=CatalogImportJob.STATUS_COMPLETED):
+            start_job(job.pk)
+            count += 1
+        self.message_user(request, f'{count} import(s) resumed.')
+    resume_imports.short_description = 'Resume selected imports'
+
+
+@admin.register(LocationCellDailyCount)
+class LocationCellDailyCountAdmin(admin.ModelAdmin):
+    list_display = ['day', 'grid_cell', 'pings', 'unique_devices']
+    search_fields = ['grid_cell']
+    date_hierarchy = 'day'
+    ordering = ['-day', '-pings']
+
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'size', 'ref_count', 'created_at', 'last_uploaded_at']
+    list_filter = ['ref_count']
+    search_fields = ['name', 'sha256']
+    ordering = ['-created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class StreamingExportMixin:
+    """
+    Adds "Export CSV / XLSX" buttons to a changelist. The export streams every
+    row matching the current filters and search (not just the visible page),
+    optionally narrowed by ?date_from / ?date_to (YYYY-MM-DD) and ?vendor (pk).
+    """
+    change_list_template = 'admin/backend/export_change_list.html'
+    export_dataset = None
+    export_params = ('file_format', 'date_from', 'date_to', 'vendor')
+
+    def get_urls(self):
+        urls = super().get_urls()
+        info = self.model._meta.app_label, self.model._meta.model_name
+        extra = [
+            path('export/', self.admin_site.admin_view(self.export_view), name='%s_%s_export' % info),
+        ]
+        return extra + urls
+
+    def export_view(self, request):
+        from django.core.exceptions import PermissionDenied
+        from backend import exports
+
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        changelist_url = reverse('admin:%s_%s_changelist' % (self.model._meta.app_label, self.model._meta.model_name))
+
+        params = request.GET.copy()
+        file_format = params.get('file_format', exports.FORMAT_CSV)
+        try:
+            date_from = exports.parse_date(params.get('date_from'))
+            date_to = exports.parse_date(params.get('date_to'))
+        except ValueError:
+            messages.error(request, 'Invalid date format. Use YYYY-MM-DD')
+            return redirect(changelist_url)
+        vendor_id = params.get('vendor') or None
+
+        # The remaining params are the changelist's own filters / search
+        for key in self.export_params:
+            params.pop(key, None)
+        request.GET = params
+        queryset = self.get_changelist_instance(request).get_queryset(request)
+
+        queryset = exports.filtered_queryset(
+            self.export_dataset, queryset, date_from=date_from, date_to=date_to, vendor_id=vendor_id,
+        )
+        return exports.export_response(self.export_dataset, queryset, file_format)
+
+
+class WalletAdjustmentForm(forms.Form):
+    type = forms.ChoiceField(choices=WalletTransaction.TYPE_CHOICES, label='Type')
+    amount = forms.DecimalField(max_digits=10, decimal_places=2, min_value=0.01, label='Amount (₹)')
+    reason = forms.CharField(max_length=150, label='Reason', help_text='Kept in the wallet ledger entry.')
+    # One per rendered form: resubmitting it posts nothing
+    token = forms.CharField(widget=forms.HiddenInput)
+
+
 @register(User)
 class UserAdmin(admin.ModelAdmin):
     list_display = ['id', 'email', 'phone', 'fullname', 'referral_code', 'referral_wallet_balance', 'referred_by', 'is_banned', 'created_at']
@@ -307,6 +542,7 @@ class UserAdmin(admin.ModelAdmin):
                 'referral_code',
                 'referred_by',
                 'referral_wallet_balance',
+                'wallet_adjustment',
                 'device_id',
                 'signup_ip',
                 'is_banned',
@@ -327,12 +563,78 @@ class UserAdmin(admin.ModelAdmin):
         'contact_no',
         'referral_code',
         'referred_by',
+        'referral_wallet_balance',
+        'wallet_adjustment',
         'device_id',
         'signup_ip',
     ]
     search_fields = ['id','email','phone','fullname','address','pincode']
     search_help_text =  "Search by id,email,phone,fullname,address,pincode"
 
+    def get_urls(self):
+        urls = super().get_urls()
+        extra = [
+            path(
+                '<path:object_id>/wallet-adjustment/',
+                self.admin_site.admin_view(self.wallet_adjustment_view),
+                name='backend_user_wallet_adjustment',
+            ),
+        ]
+        return extra + urls
+
+    def wallet_adjustment(self, obj):
+        if not obj or not obj.pk:
+            return '-'
+        url = reverse('admin:backend_user_wallet_adjustment', args=[obj.pk])
+        return format_html('<a class="button" href="{}">Adjust wallet</a>', url)
+    wallet_adjustment.short_description = 'Wallet adjustment'
+
+    def wallet_adjustment_view(self, request, object_id):
+        """Credit or debit the wallet through the ledger (backend/wallet.py); the balance is never edited directly."""
+        import uuid
+
+        from backend import wallet
+
+        user = self.get_object(request, object_id)
+        if user is None or not self.has_change_permission(request, user):
+            return redirect('admin:backend_user_changelist')
+
+        if request.method == 'POST':
+            form = WalletAdjustmentForm(request.POST)
+            if form.is_valid():
+                data = form.cleaned_data
+                try:
+                    _, created = wallet.post(
+                        user,
+                        data['type'],
+                        data['amount'],
+                        f"Adjustment by {request.user.get_username()}: {data['reason']}",
+                        wallet.adjustment_key(data['token']),
+                    )
+                except wallet.InsufficientBalance:
+                    form.add_error('amount', f'The wallet balance is only ₹{user.referral_wallet_balance}.')
+                else:
+                    if created:
+                        self.message_user(
+                            request,
+                            f"Wallet {data['type']} of ₹{data['amount']} posted; balance is now ₹{user.referral_wallet_balance}.",
+                            messages.SUCCESS,
+                        )
+                    else:
+                        self.message_user(request, 'This adjustment was already posted.', messages.INFO)
+                    return redirect('admin:backend_user_change', user.pk)
+        else:
+            form = WalletAdjustmentForm(initial={'token': uuid.uuid4().hex})
+
+        context = {
+            **self.admin_site.each_context(request),
+            'form': form,
+            'title': f'Adjust wallet: {user}',
+            'opts': self.model._meta,
+            'original': user,
+        }
+        return render(request, 'admin/backend/wallet_adjustment_form.html', context)
+
 
 
 @register(Otp)
@@ -639,58 +941,17 @@ class ReferralAdmin(admin.ModelAdmin):
 
     def approve_and_credit(self, request, queryset):
         """
-        Admin fraud dashboard action:
-        - Only credits wallet for non-suspicious, non-rewarded referrals.
+        Admin fraud dashboard action: runs the scheduled reward step
+        (backend/referral_rewards.py) for the selection now.
+        - Only credits wallet for non-suspicious, completed referrals past their hold.
         """
-        credited = 0
-        skipped_hold = 0
-        for referral in queryset.select_related('referrer', 'referred_user'):
-            # Skip suspicious, already rewarded, or not yet completed
-            if referral.is_suspicious or referral.status == Referral.STATUS_REWARDED:
-                continue
-            if referral.status != Referral.STATUS_COMPLETED:
-                continue
-
-            referrer = referral.referrer
-            if not referrer or referrer.is_banned:
-                continue
-
-            # Enforce hold period: do not credit before hold_until
-            if referral.hold_until and referral.hold_until > timezone.now():
-                skipped_hold += 1
-                continue
-
-            amount = referral.reward_amount
-            if not amount or amount <= 0:
-                continue
+        from backend import referral_rewards
 
-            # Credit wallet
-            referrer.referral_wallet_balance = (referrer.referral_wallet_balance or 0) + amount
-            referrer.save(update_fields=['referral_wallet_balance'])
-
-            WalletTransaction.objects.create(
-                user=referrer,
-                amount=amount,
-                type=WalletTransaction.TYPE_CREDIT,
-                description=f"Referral reward for {referral.referred_user.email}",
-            )
-
-            referral.status = Referral.STATUS_REWARDED
-            referral.rewarded_at = timezone.now()
-            referral.save(update_fields=['status', 'rewarded_at'])
-            credited += 1
-            # Push notification to referrer: wallet credited
-            try:
-                from backend.fcm_utils import send_fcm_to_user
-                amount_int = int(amount)
-                send_fcm_to_user(
-                    referrer,
-                    'Wallet credited 💰',
-                    f'₹{amount_int} has been credited to your referral wallet.',
-                    data={'screen': 'referral', 'type': 'referral_wallet_credited'},
-                )
-            except Exception as e:
-                self.message_user(request, f'Push notification failed: {e}', level=messages.WARNING)
+        now = timezone.now()
+        skipped_hold = queryset.filter(
+            status=Referral.STATUS_COMPLETED, is_suspicious=False, hold_until__gt=now,
+        ).count()
+        credited = len(referral_rewards.reward_due(now, referral_ids=queryset.values_list('pk', flat=True)))
 
         if credited:
             self.message_user(request, f"Credited wallet for {credited} referrals.", level=messages.SUCCESS)
@@ -709,55 +970,24 @@ class ReferralAdmin(admin.ModelAdmin):
         """
         Repair: For referrals already marked REWARDED but where the referrer's wallet
         was never credited (e.g. status was set manually). Credits wallet and creates
-        WalletTransaction so balance and history match the status.
+        WalletTransaction so balance and history match the status; referrals whose
+        reward key is already in the ledger are left alone.
         """
-        repaired = 0
-        for referral in queryset.select_related('referrer', 'referred_user'):
-            if referral.status != Referral.STATUS_REWARDED:
-                continue
-            referrer = referral.referrer
-            if not referrer or referrer.is_banned:
-                continue
-            amount = referral.reward_amount
-            if not amount or amount <= 0:
-                continue
-            # Check if we already have a matching credit (same user, amount, description pattern)
-            desc_substr = referral.referred_user.email or str(referral.referred_user_id)
-            already = WalletTransaction.objects.filter(
-                user=referrer,
-                type=WalletTransaction.TYPE_CREDIT,
-                amount=amount,
-                description__icontains=desc_substr,
-            ).exists()
-            if already:
-                continue
+        from django.db import transaction
 
-            referrer.referral_wallet_balance = (referrer.referral_wallet_balance or 0) + amount
-            referrer.save(update_fields=['referral_wallet_balance'])
-            WalletTransaction.objects.create(
-                user=referrer,
-                amount=amount,
-                type=WalletTransaction.TYPE_CREDIT,
-                description=f"Referral reward for {referral.referred_user.email}",
-            )
-            repaired += 1
-            # Push notification to referrer: wallet credited (repair)
-            try:
-                from backend.fcm_utils import send_fcm_to_user
-                amount_int = int(amount)
-                send_fcm_to_user(
-                    referrer,
-                    'Wallet credited 💰',
-                    f'₹{amount_int} has been credited to your referral wallet.',
-                    data={'screen': 'referral', 'type': 'referral_wallet_credited'},
-                )
-            except Exception as e:
-                self.message_user(request, f'Push notification failed: {e}', level=messages.WARNING)
+        from backend import referral_rewards, wallet
+
+        referrals = queryset.filter(
+            status=Referral.STATUS_REWARDED, referrer__is_banned=False, reward_amount__gt=0,
+        ).select_related('referred_user')
+        with transaction.atomic():
+            repaired = wallet.credit_referrals(list(referrals.select_for_update(of=('self',))))
+        referral_rewards.notify_credited(repaired)
 
         if repaired:
             self.message_user(
                 request,
-                f"Repaired: credited wallet for {repaired} referral(s) that were marked Rewarded but had no wallet credit.",
+                f"Repaired: credited wallet for {len(repaired)} referral(s) that were marked Rewarded but had no wallet credit.",
                 level=messages.SUCCESS,
             )
         else:
@@ -780,10 +1010,19 @@ class ReferralAdmin(admin.ModelAdmin):
 
 @register(WalletTransaction)
 class WalletTransactionAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user', 'type', 'amount', 'description', 'created_at']
+    """Read-only: the ledger is append-only and posted through backend/wallet.py."""
+    list_display = ['id', 'user', 'type', 'amount', 'description', 'idempotency_key', 'created_at']
     list_filter = ['type', 'created_at']
-    search_fields = ['user__email', 'description']
-    autocomplete_fields = ['user', 'order', 'service_booking']
+    search_fields = ['user__email', 'description', 'idempotency_key']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 # admin.py - Updated ProductAdmin (replace the existing ProductAdmin class)
@@ -793,7 +1032,8 @@ class ProductAdmin(admin.ModelAdmin):
     inlines = [ProductOptionInline]
     list_display = ['id', 'vendor', 'category', 'title', 'position',
                     'options_pricing_preview', 'delivery_charge', 'security_amount', 'cod', 'created_at', 'updated_at']
-    readonly_fields = ['star_1', 'star_2', 'star_3', 'star_4', 'star_5', 'options_pricing_overview']
+    readonly_fields = ['star_1', 'star_2', 'star_3', 'star_4', 'star_5', 'rating_count', 'rating_average',
+                       'options_pricing_overview']
     list_filter = ['cod', 'category', 'vendor', 'requires_date_selection']
     search_fields = ['id', 'title', 'vendor__name', 'vendor__vendor_id']
     search_help_text = "Search by Id, title, vendor name, vendor ID"
@@ -832,7 +1072,7 @@ class ProductAdmin(admin.ModelAdmin):
             'classes': ('collapse',),
         }),
         ('Ã¢Â­Â Ratings', {
-            'fields': ('star_5', 'star_4', 'star_3', 'star_2', 'star_1'),
+            'fields': ('rating_count', 'rating_average', 'star_5', 'star_4', 'star_3', 'star_2', 'star_1'),
             'classes': ('collapse',),
         }),
     )
@@ -1562,7 +1802,8 @@ class PageItemAdmin(admin.ModelAdmin):
 
 
 @admin.register(OrderedProduct)
-class OrderedProductAdmin(admin.ModelAdmin):
+class OrderedProductAdmin(StreamingExportMixin, admin.ModelAdmin):
+    export_dataset = 'ordered-products'
     list_display = [
         'id',
         'order_link',
@@ -1863,12 +2104,24 @@ class ProductBookingInline(admin.TabularInline):
         return False
 
 
+class CouponCounterShardInline(admin.TabularInline):
+    """Read-only: shards are set up with `python manage.py coupon_counter_shards`."""
+    model = CouponCounterShard
+    fields = ['shard', 'capacity', 'used']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj):
+        return False
+
+
 @register(Coupon)
 class CouponAdmin(admin.ModelAdmin):
     list_display = [
         'code', 'discount_type', 'discount_value', 'minimum_order_amount',
         'maximum_discount_amount', 'is_active', 'valid_from', 'valid_until',
-        'usage_limit', 'used_count', 'first_order_only', 'created_at'
+        'usage_limit', 'used_count', 'per_user_limit', 'first_order_only', 'created_at'
     ]
     list_filter = ['is_active', 'discount_type', 'first_order_only']
     search_fields = ['code', 'description']
@@ -1876,6 +2129,7 @@ class CouponAdmin(admin.ModelAdmin):
     autocomplete_fields = ['applicable_services']
     readonly_fields = ['used_count', 'created_at', 'updated_at']
     date_hierarchy = 'valid_until'
+    inlines = [CouponCounterShardInline]
     fieldsets = (
         (None, {
             'fields': ('code', 'description', 'is_active')
@@ -1887,7 +2141,7 @@ class CouponAdmin(admin.ModelAdmin):
             'fields': ('valid_from', 'valid_until', 'usage_limit', 'used_count')
         }),
         ('Restrictions', {
-            'fields': ('first_order_only', 'applicable_products', 'applicable_categories', 'applicable_services')
+            'fields': ('first_order_only', 'per_user_limit', 'applicable_products', 'applicable_categories', 'applicable_services')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at')
@@ -1908,7 +2162,8 @@ class CouponUsageAdmin(admin.ModelAdmin):
 
 
 @register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(StreamingExportMixin, admin.ModelAdmin):
+    export_dataset = 'orders'
     inlines = [OrderedProductInline,ProductBookingInline]
     list_display = ['id','seen', 'user', 'tx_amount', 'discount_amount', 'coupon', 'payment_mode', 'address', 'tx_id', 'tx_status', 'tx_time', 'tx_msg',
                     'from_cart', 'created_at', 'updated_at']
@@ -2174,7 +2429,8 @@ class ServiceAdmin(admin.ModelAdmin):
     list_filter = ['category', 'subcategory', 'availability', 'experience_years', 'created_at']
     search_fields = ['title', 'provider_name', 'provider_phone', 'location', 'languages']
     search_help_text = "Search by title, provider name, phone, location, or languages"
-    readonly_fields = ['rating', 'total_reviews', 'portfolio_preview', 'manage_availability_link', 'created_at', 'updated_at']
+    readonly_fields = ['rating', 'total_reviews', 'star_5', 'star_4', 'star_3', 'star_2', 'star_1',
+                       'portfolio_preview', 'manage_availability_link', 'created_at', 'updated_at']
 
     fieldsets = (
         ('Calendar & Availability', {
@@ -2194,7 +2450,7 @@ class ServiceAdmin(admin.ModelAdmin):
             )
         }),
         ('Ã¢Â­Â Ratings & Reviews', {
-            'fields': ('rating', 'total_reviews'),
+            'fields': ('rating', 'total_reviews', 'star_5', 'star_4', 'star_3', 'star_2', 'star_1'),
             'classes': ('collapse',)
         }),
         ('Ã°Å¸â€“Â¼Ã¯Â¸Â Portfolio Preview', {
@@ -2598,7 +2854,8 @@ class ServicePageItemAdmin(admin.ModelAdmin):
 
 
 @register(ServiceBooking)
-class ServiceBookingAdmin(admin.ModelAdmin):
+class ServiceBookingAdmin(StreamingExportMixin, admin.ModelAdmin):
+    export_dataset = 'service-bookings'
     list_display = [
         'id', 'user', 'service_option', 'booking_date', 'booking_time',
         'status', 'payment_status', 'total_amount', 'created_at'
@@ -2628,6 +2885,42 @@ class ServiceBookingAdmin(admin.ModelAdmin):
     )
 
     ordering = ['-created_at']
+    actions = ['confirm_bookings', 'cancel_bookings', 'mark_completed']
+
+    def _set_status(self, queryset, status):
+        """
+        Save each booking instead of queryset.update(): the post_save signals
+        free or take its artist calendar slots (backend/artist_calendar.py).
+        """
+        from django.db import transaction
+
+        with transaction.atomic():
+            bookings = list(queryset.select_for_update())
+            for booking in bookings:
+                booking.status = status
+                booking.save(update_fields=['status', 'updated_at'])
+        return len(bookings)
+
+    def confirm_bookings(self, request, queryset):
+        """Confirm selected bookings"""
+        confirmed_count = self._set_status(queryset.filter(status='PENDING'), 'CONFIRMED')
+        self.message_user(request, f'{confirmed_count} booking(s) confirmed.')
+
+    confirm_bookings.short_description = "Confirm selected bookings"
+
+    def cancel_bookings(self, request, queryset):
+        """Cancel selected bookings"""
+        cancelled_count = self._set_status(queryset.filter(status__in=['PENDING', 'CONFIRMED']), 'CANCELLED')
+        self.message_user(request, f'{cancelled_count} booking(s) cancelled.')
+
+    cancel_bookings.short_description = "Cancel selected bookings"
+
+    def mark_completed(self, request, queryset):
+        """Mark bookings as completed"""
+        completed_count = self._set_status(queryset.filter(status__in=['CONFIRMED', 'IN_PROGRESS']), 'COMPLETED')
+        self.message_user(request, f'{completed_count} booking(s) marked as completed.')
+
+    mark_completed.short_description = "Mark as completed"
 
 
 # ============== VENDOR ADMIN ==============
@@ -2736,7 +3029,8 @@ class VendorTokenAdmin(admin.ModelAdmin):
 
 
 @admin.register(ProductBooking)
-class ProductBookingAdmin(admin.ModelAdmin):
+class ProductBookingAdmin(StreamingExportMixin, admin.ModelAdmin):
+    export_dataset = 'product-bookings'
     list_display = [
         'id',
         'product_title',
@@ -3277,6 +3571,15 @@ class ServiceableLocationAdmin(admin.ModelAdmin):
         js = ('admin/js/serviceable_location_auto_fetch.js',)
 
 
+@register(PincodeCentroid)
+class PincodeCentroidAdmin(admin.ModelAdmin):
+    """Offline geocoding dataset; load with `python manage.py load_pincode_geodata <csv>`."""
+    list_display = ['pincode', 'district', 'state', 'latitude', 'longitude', 'office_count', 'updated_at']
+    list_filter = ['state']
+    search_fields = ['pincode', 'district', 'area_names']
+    readonly_fields = ['updated_at']
+
+
 @register(CategoryAvailability)
 class CategoryAvailabilityAdmin(admin.ModelAdmin):
     list_display = ['category', 'location', 'is_available', 'priority', 'created_at']
@@ -0,0 +1,596 @@
+"""
+Write-behind buffer for customer analytics (ScreenViewEvent, CustomerLocationPing).
+
+Analytics endpoints only validate the payload and append records here; a background
+flusher thread writes them to the database in large bulk inserts when either
+ANALYTICS_BUFFER_FLUSH_SIZE records are pending or ANALYTICS_BUFFER_FLUSH_SECONDS
+have passed.
+
+Durability (ANALYTICS_BUFFER_DURABILITY):
+  - 'memory': records are only kept in process memory (lost on crash).
+  - 'flush':  every append is also written to an append-only segment file and
+              flushed to the OS (survives a worker crash).
+  - 'fsync':  like 'flush' but fsync'd on every append (survives power loss).
+
+Segment files live in ANALYTICS_BUFFER_DIR and are named <pid>-<seq>.<state>:
+  .open      segment currently being appended to
+  .flushing  sealed segment whose records are being written to the database
+  .replay    orphaned segment claimed by another process for replay
+Segments left behind by dead processes are replayed on start-up and by
+`python manage.py flush_analytics_buffer`.
+
+Location pings are downsampled per device before insert (see _downsample_pings).
+"""
+import atexit
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from backend.geo_utils import grid_cell, haversine_m
+
+logger = logging.getLogger(__name__)
+
+# Record kinds accepted by parse_event / apply_events
+KIND_SCREEN_START = 'screen_start'
+KIND_SCREEN_END = 'screen_end'
+KIND_LOCATION_PING = 'location_ping'
+
+# An end whose start is not in the DB yet (e.g. still buffered in another worker)
+# is retried on this many later flushes before being dropped.
+MAX_END_ATTEMPTS = 3
+
+SEGMENT_OPEN = '.open'
+SEGMENT_FLUSHING = '.flushing'
+SEGMENT_REPLAY = '.replay'
+
+META_FIELDS = ('device_id', 'session_id', 'platform', 'app_version')
+
+
+# =============================================================================
+# PARSING
+# =============================================================================
+
+def parse_event(ev, defaults=None, user_id=None):
+    """
+    Validate one raw analytics event and turn it into a JSON-serialisable record.
+    Returns (record, None) or (None, error_message).
+
+    ev['type'] must be screen_start, screen_end or location_ping; device_id /
+    session_id / platform / app_version fall back to `defaults`.
+    """
+    if not isinstance(ev, dict):
+        return None, 'event must be an object'
+    defaults = defaults or {}
+    kind = str(ev.get('type') or '').strip()
+    meta = {key: (str(ev.get(key) or '').strip() or defaults.get(key, '')) for key in META_FIELDS}
+    now = timezone.now().isoformat()
+
+    if kind == KIND_SCREEN_START:
+        screen = str(ev.get('screen') or '').strip()
+        if not screen:
+            return None, 'screen is required'
+        try:
+            event_id = uuid.UUID(str(ev['event_id'])) if ev.get('event_id') else uuid.uuid4()
+        except ValueError:
+            return None, 'invalid event_id'
+        return {
+            'kind': kind,
+            'event_id': str(event_id),
+            'user_id': user_id,
+            'device_id': meta['device_id'][:255],
+            'session_id': meta['session_id'][:64],
+            'screen': screen[:150],
+            'platform': meta['platform'][:20],
+            'app_version': meta['app_version'][:40],
+            'ts': now,
+        }, None
+
+    if kind == KIND_SCREEN_END:
+        try:
+            event_id = uuid.UUID(str(ev.get('event_id') or ''))
+        except ValueError:
+            return None, 'event_id is required'
+        duration = ev.get('duration_seconds')
+        try:
+            duration = max(0, int(duration)) if duration is not None else None
+        except (TypeError, ValueError):
+            duration = None
+        return {
+            'kind': kind,
+            'event_id': str(event_id),
+            'duration_seconds': duration,
+            'ts': now,
+        }, None
+
+    if kind == KIND_LOCATION_PING:
+        if not meta['device_id']:
+            return None, 'device_id is required'
+        try:
+            lat = float(ev.get('latitude'))
+            lng = float(ev.get('longitude'))
+        except (TypeError, ValueError):
+            return None, 'latitude/longitude must be numbers'
+        try:
+            acc = float(ev.get('accuracy_m') or 0)
+        except (TypeError, ValueError):
+            acc = 0.0
+        return {
+            'kind': kind,
+            'user_id': user_id,
+            'device_id': meta['device_id'][:255],
+            'latitude': round(lat, 6),
+            'longitude': round(lng, 6),
+            'accuracy_m': acc,
+            'platform': meta['platform'][:20],
+            'app_version': meta['app_version'][:40],
+            'ts': now,
+        }, None
+
+    return None, f'unknown event type: {kind}'
+
+
+# =============================================================================
+# DATABASE WRITES
+# =============================================================================
+
+def _ts(record):
+    return parse_datetime(record.get('ts') or '') or timezone.now()
+
+
+def _end_duration(record, started_at):
+    if record.get('duration_seconds') is not None:
+        return int(record['duration_seconds'])
+    return max(0, int((_ts(record) - started_at).total_seconds()))
+
+
+def _downsample_pings(pings):
+    """
+    Drop pings that add no information: a ping is kept only if the device moved at
+    least LOCATION_PING_MIN_DISTANCE_M or LOCATION_PING_MIN_INTERVAL_MINUTES have
+    passed since its previous kept ping (in this batch or already stored).
+    Also fills grid_cell on every kept ping.
+    """
+    from backend.models import CustomerLocationPing
+
+    min_distance = float(getattr(settings, 'LOCATION_PING_MIN_DISTANCE_M', 0) or 0)
+    interval = datetime.timedelta(minutes=float(getattr(settings, 'LOCATION_PING_MIN_INTERVAL_MINUTES', 0) or 0))
+
+    pings = sorted(pings, key=lambda p: (p.device_id, p.created_at))
+    for p in pings:
+        p.grid_cell = grid_cell(p.latitude, p.longitude)
+    if min_distance <= 0 or not interval:
+        return pings
+
+    # Latest stored ping per device shortly before this batch (device_id, created_at index)
+    first_ts = {}
+    for p in pings:
+        first_ts.setdefault(p.device_id, p.created_at)
+    last_kept = {}
+    stored = (
+        CustomerLocationPing.objects
+        .filter(device_id__in=list(first_ts), created_at__gte=min(first_ts.values()) - interval)
+        .order_by('device_id', '-created_at')
+        .values_list('device_id', 'created_at', 'latitude', 'longitude')
+    )
+    for device_id, created_at, lat, lng in stored:
+        if device_id not in last_kept and created_at <= first_ts[device_id]:
+            last_kept[device_id] = (created_at, lat, lng)
+
+    kept = []
+    for p in pings:
+        prev = last_kept.get(p.device_id)
+        if prev is not None:
+            prev_ts, prev_lat, prev_lng = prev
+            if (
+                p.created_at - prev_ts < interval
+                and haversine_m(prev_lat, prev_lng, p.latitude, p.longitude) < min_distance
+            ):
+                continue
+        last_kept[p.device_id] = (p.created_at, p.latitude, p.longitude)
+        kept.append(p)
+    return kept
+
+
+def apply_events(records):
+    """
+    Write analytics records to the database in one transaction using bulk
+    inserts/updates. Returns the screen_end records whose start row was not found.
+    """
+    from backend.models import User, ScreenViewEvent, CustomerLocationPing
+
+    if not records:
+        return []
+
+    user_ids = {r['user_id'] for r in records if r.get('user_id')}
+    if user_ids:
+        user_ids = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+
+    starts = {}
+    ends = []
+    pings = []
+    for r in records:
+        kind = r.get('kind')
+        if kind == KIND_SCREEN_START:
+            starts[uuid.UUID(r['event_id'])] = ScreenViewEvent(
+                id=uuid.UUID(r['event_id']),
+                user_id=r.get('user_id') if r.get('user_id') in user_ids else None,
+                device_id=r.get('device_id', ''),
+                session_id=r.get('session_id', ''),
+                screen=r['screen'],
+                platform=r.get('platform', ''),
+                app_version=r.get('app_version', ''),
+                started_at=_ts(r),
+            )
+        elif kind == KIND_SCREEN_END:
+            ends.append(r)
+        elif kind == KIND_LOCATION_PING:
+            pings.append(CustomerLocationPing(
+                user_id=r.get('user_id') if r.get('user_id') in user_ids else None,
+                device_id=r['device_id'],
+                latitude=r['latitude'],
+                longitude=r['longitude'],
+                accuracy_m=r.get('accuracy_m') or 0,
+                platform=r.get('platform', ''),
+                app_version=r.get('app_version', ''),
+                created_at=_ts(r),
+            ))
+
+    unmatched = []
+    with transaction.atomic():
+        stored_ids = {uuid.UUID(r['event_id']) for r in ends} - set(starts)
+        existing = {}
+        if stored_ids:
+            existing = {
+                e.id: e for e in ScreenViewEvent.objects.filter(id__in=stored_ids)
+                .only('id', 'started_at', 'ended_at', 'duration_seconds')
+            }
+
+        to_update = {}
+        for r in ends:
+            event_id = uuid.UUID(r['event_id'])
+            ev = starts.get(event_id) or existing.get(event_id)
+            if ev is None:
+                unmatched.append(r)
+                continue
+            if ev.ended_at:
+                continue
+            ev.ended_at = _ts(r)
+            ev.duration_seconds = _end_duration(r, ev.started_at)
+            if event_id in existing:
+                to_update[event_id] = ev
+
+        if starts:
+            ScreenViewEvent.objects.bulk_create(starts.values(), batch_size=1000, ignore_conflicts=True)
+        if to_update:
+            ScreenViewEvent.objects.bulk_update(to_update.values(), ['ended_at', 'duration_seconds'], batch_size=1000)
+        if pings:
+            pings = _downsample_pings(pings)
+            CustomerLocationPing.objects.bulk_create(pings, batch_size=1000)
+
+    return unmatched
+
+
+# =============================================================================
+# BUFFER
+# =============================================================================
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        # os.kill() terminates processes on Windows; never replay other pids here.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def _read_segment(path):
+    records = []
+    with open(path, 'r', encoding='utf-8') as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Torn write at the tail of a crashed segment
+                logger.warning('Analytics buffer: skipping corrupt line in %s', path)
+    return records
+
+
+class AnalyticsBuffer:
+    """In-process write-behind buffer backed by an append-only segment log."""
+
+    def __init__(self, directory, durability='flush', flush_size=500, flush_seconds=5.0):
+        self.directory = str(directory)
+        self.durability = durability if durability in ('memory', 'flush', 'fsync') else 'flush'
+        self.flush_size = max(1, int(flush_size))
+        self.flush_seconds = max(0.1, float(flush_seconds))
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = []
+        self._segment_path = None
+        self._segment_fh = None
+        self._own_segments = set()
+        self._retry_segments = False
+        self._thread = None
+        self._pid = None
+
+        if self.durability != 'memory':
+            os.makedirs(self.directory, exist_ok=True)
+
+    # ----- segment files -----
+
+    def _segment_name(self, suffix):
+        return os.path.join(self.directory, f'{os.getpid()}-{time.time_ns()}{suffix}')
+
+    def _open_segment(self):
+        self._segment_path = self._segment_name(SEGMENT_OPEN)
+        self._segment_fh = open(self._segment_path, 'a', encoding='utf-8')
+        self._own_segments.add(os.path.basename(self._segment_path))
+
+    def _seal_segment(self):
+        """Close the active segment and rename it to .flushing. Caller holds self._lock."""
+        if not self._segment_fh:
+            return None
+        self._segment_fh.close()
+        sealed = self._segment_path[:-len(SEGMENT_OPEN)] + SEGMENT_FLUSHING
+        os.replace(self._segment_path, sealed)
+        self._own_segments.discard(os.path.basename(self._segment_path))
+        self._own_segments.add(os.path.basename(sealed))
+        self._segment_fh = None
+        self._segment_path = None
+        return sealed
+
+    # ----- public API -----
+
+    def append(self, records):
+        if not records:
+            return
+        self._ensure_started()
+        with self._lock:
+            if self.durability != 'memory':
+                if not self._segment_fh:
+                    self._open_segment()
+                self._segment_fh.write(''.join(json.dumps(r, separators=(',', ':')) + '\n' for r in records))
+                self._segment_fh.flush()
+                if self.durability == 'fsync':
+                    os.fsync(self._segment_fh.fileno())
+            self._pending.extend(records)
+            full = len(self._pending) >= self.flush_size
+        if full:
+            self._wakeup.set()
+
+    def pending_start(self, event_id):
+        """started_at of a screen_start for event_id that is still waiting to be flushed, else None."""
+        with self._lock:
+            for r in reversed(self._pending):
+                if r.get('kind') == KIND_SCREEN_START and r.get('event_id') == event_id:
+                    return _ts(r)
+        return None
+
+    def flush(self):
+        """Write all pending records to the database. Returns the number of records written."""
+        with self._flush_lock:
+            retried = 0
+            if self._retry_segments:
+                # Segments of earlier failed flushes / replays of this process
+                self._retry_segments = False
+                retried = self.replay_orphans()
+
+            with self._lock:
+                if not self._pending:
+                    return retried
+                records, self._pending = self._pending, []
+                sealed = self._seal_segment()
+
+            try:
+                unmatched = apply_events(records)
+            except Exception:
+                logger.exception('Analytics buffer: flush of %d records failed', len(records))
+                if sealed is None:
+                    # memory durability: keep the records for the next attempt
+                    with self._lock:
+                        self._pending[:0] = records
+                else:
+                    # The sealed segment stays on disk; release it so the next flush replays it
+                    self._release_failed(sealed)
+                return retried
+
+            if sealed:
+                self._discard(sealed)
+            self._requeue(unmatched)
+            return retried + len(records) - len(unmatched)
+
+    def replay_orphans(self, force=False):
+        """
+        Replay segments left by dead processes, earlier runs of this pid or failed flushes.
+        With force=True every segment not owned by this buffer is replayed; only
+        use that when no other worker is running.
+        Returns the number of records written.
+        """
+        if self.durability == 'memory' or not os.path.isdir(self.directory):
+            return 0
+        written = 0
+        for name in sorted(os.listdir(self.directory)):
+            base, ext = os.path.splitext(name)
+            if ext not in (SEGMENT_OPEN, SEGMENT_FLUSHING, SEGMENT_REPLAY) or name in self._own_segments:
+                continue
+            try:
+                pid = int(base.split('-', 1)[0])
+            except ValueError:
+                continue
+            if not force and pid != os.getpid() and _pid_alive(pid):
+                continue
+
+            # Claim the segment atomically so concurrent replayers don't double-insert
+            claimed = os.path.join(self.directory, f'{os.getpid()}-{time.time_ns()}{SEGMENT_REPLAY}')
+            try:
+                os.replace(os.path.join(self.directory, name), claimed)
+            except OSError:
+                continue
+            self._own_segments.add(os.path.basename(claimed))
+
+            records = _read_segment(claimed)
+            try:
+                unmatched = apply_events(records)
+            except Exception:
+                logger.exception('Analytics buffer: replay of %s failed', name)
+                self._release_failed(claimed)
+                continue
+            self._discard(claimed)
+            self._requeue(unmatched)
+            written += len(records) - len(unmatched)
+            logger.info('Analytics buffer: replayed %d records from %s', len(records), name)
+        return written
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'durability': self.durability,
+                'segment': self._segment_path,
+            }
+
+    # ----- internals -----
+
+    def _discard(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        self._own_segments.discard(os.path.basename(path))
+
+    def _release_failed(self, path):
+        """A segment whose records could not be written: no longer ours, replayed on the next flush."""
+        self._own_segments.discard(os.path.basename(path))
+        self._retry_segments = True
+
+    def _requeue(self, unmatched):
+        retry = []
+        for r in unmatched:
+            attempts = int(r.get('attempts') or 0) + 1
+            if attempts < MAX_END_ATTEMPTS:
+                retry.append({**r, 'attempts': attempts})
+        if retry:
+            self.append(retry)
+
+    def _ensure_started(self):
+        # Re-create the flusher after fork (gunicorn preload) as threads don't survive it.
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._pending = []
+                self._segment_fh = None
+                self._segment_path = None
+                self._own_segments = set()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='analytics-buffer-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        try:
+            self.replay_orphans()
+        except Exception:
+            logger.exception('Analytics buffer: start-up replay failed')
+        finally:
+            close_old_connections()
+        while True:
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Analytics buffer: flusher error')
+            finally:
+                close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """Return the process-wide AnalyticsBuffer, or None when buffering is disabled/unavailable."""
+    global _buffer
+    if not getattr(settings, 'ANALYTICS_BUFFER_ENABLED', False):
+        return None
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                try:
+                    _buffer = AnalyticsBuffer(
+                        directory=settings.ANALYTICS_BUFFER_DIR,
+                        durability=settings.ANALYTICS_BUFFER_DURABILITY,
+                        flush_size=settings.ANALYTICS_BUFFER_FLUSH_SIZE,
+                        flush_seconds=settings.ANALYTICS_BUFFER_FLUSH_SECONDS,
+                    )
+                except OSError as e:
+                    # e.g. read-only filesystem on serverless hosts: write synchronously instead
+                    logger.warning('Analytics buffer unavailable (%s); writing analytics directly', e)
+                    settings.ANALYTICS_BUFFER_ENABLED = False
+                    return None
+                atexit.register(_flush_at_exit)
+    return _buffer
+
+
+def _flush_at_exit():
+    if _buffer is not None and _buffer._pid == os.getpid():
+        try:
+            _buffer.flush()
+        except Exception:
+            logger.exception('Analytics buffer: flush at exit failed')
+
+
+def record_events(records):
+    """
+    Entry point for analytics views. Buffers the records when write-behind is
+    enabled (returns []), otherwise writes them immediately and returns the
+    unmatched screen_end records.
+    """
+    buf = get_buffer()
+    if buf is not None:
+        try:
+            buf.append(records)
+            return []
+        except OSError as e:
+            logger.warning('Analytics buffer append failed (%s); writing directly', e)
+    return apply_events(records)
+
+
+def screen_started_at(event_id):
+    """
+    When the screen view `event_id` started: from this process's buffer if the
+    start is not flushed yet, else from the database. None if neither has it
+    (e.g. the start is buffered by another worker).
+    """
+    from backend.models import ScreenViewEvent
+
+    buf = get_buffer()
+    if buf is not None:
+        started_at = buf.pending_start(event_id)
+        if started_at is not None:
+            return started_at
+    return ScreenViewEvent.objects.filter(id=event_id).values_list('started_at', flat=True).first()
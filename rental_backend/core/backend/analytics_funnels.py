@@ -0,0 +1,223 @@
+"""
+Incremental session funnels and screen transition counts.
+
+A run only looks at sessions that received events since the last run
+(ScreenViewEvent.received_at past the watermark). Each touched session is
+re-walked from its own events, ordered by (session_id, started_at), and the
+difference against what it contributed last time (SessionFunnelState) is
+applied to the daily counters. Work therefore scales with the new events and
+their sessions, not with total history, and late or out-of-order events simply
+change the session's contribution on the next run. Re-running over the same
+events is a no-op.
+
+Sessions are counted on the local day of their first event. Sessions whose
+first event is older than ANALYTICS_FUNNEL_STATE_DAYS are frozen: their state
+is pruned and later events for them are ignored.
+"""
+import datetime
+import logging
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_FUNNELS = 'funnels:sessions'
+
+# Covers events whose insert committed after a run had started
+DEFAULT_OVERLAP = datetime.timedelta(minutes=15)
+
+SESSION_BATCH_SIZE = 500
+
+# JSON keys of SessionFunnelState.transitions are "<from>\t<to>"
+TRANSITION_SEP = '\t'
+
+
+def get_funnels():
+    """{funnel name: [screen, ...]} from settings.ANALYTICS_FUNNELS (empty funnels dropped)."""
+    funnels = getattr(settings, 'ANALYTICS_FUNNELS', None) or {}
+    return {str(name): [str(s) for s in steps] for name, steps in funnels.items() if steps}
+
+
+def steps_reached(screens, steps):
+    """Number of leading funnel steps visited in order (other screens may sit in between)."""
+    reached = 0
+    for screen in screens:
+        if reached < len(steps) and screen == steps[reached]:
+            reached += 1
+    return reached
+
+
+def session_contribution(screens, funnels):
+    """(steps, transitions) one session adds to the counters, in SessionFunnelState's JSON shape."""
+    steps = {}
+    for name, funnel_steps in funnels.items():
+        reached = steps_reached(screens, funnel_steps)
+        if reached:
+            steps[name] = reached
+    transitions = Counter(
+        f'{a}{TRANSITION_SEP}{b}' for a, b in zip(screens, screens[1:]) if a != b
+    )
+    return steps, dict(transitions)
+
+
+def _add(step_delta, transition_delta, day, steps, transitions, sign):
+    for funnel, reached in steps.items():
+        for step in range(1, int(reached) + 1):
+            step_delta[(day, funnel, step)] += sign
+    for key, count in transitions.items():
+        from_screen, _, to_screen = key.partition(TRANSITION_SEP)
+        transition_delta[(day, from_screen, to_screen)] += sign * int(count)
+
+
+def _apply_deltas(step_delta, transition_delta, funnels):
+    from backend.models import FunnelStepDaily, ScreenTransitionDaily
+
+    step_delta = {k: v for k, v in step_delta.items() if v}
+    if step_delta:
+        days = {k[0] for k in step_delta}
+        existing = {
+            (r.day, r.funnel, r.step): r
+            for r in FunnelStepDaily.objects.filter(day__in=days, funnel__in={k[1] for k in step_delta})
+        }
+        to_update, to_create = [], []
+        for (day, funnel, step), delta in step_delta.items():
+            funnel_steps = funnels.get(funnel) or []
+            screen = funnel_steps[step - 1] if step <= len(funnel_steps) else ''
+            row = existing.get((day, funnel, step))
+            if row is None:
+                to_create.append(FunnelStepDaily(day=day, funnel=funnel, step=step, screen=screen, sessions=delta))
+            else:
+                row.sessions += delta
+                row.screen = screen or row.screen
+                to_update.append(row)
+        FunnelStepDaily.objects.bulk_update(to_update, ['sessions', 'screen'], batch_size=500)
+        FunnelStepDaily.objects.bulk_create(to_create, batch_size=500)
+
+    transition_delta = {k: v for k, v in transition_delta.items() if v}
+    if transition_delta:
+        days = {k[0] for k in transition_delta}
+        from_screens = {k[1] for k in transition_delta}
+        existing = {
+            (r.day, r.from_screen, r.to_screen): r
+            for r in ScreenTransitionDaily.objects.filter(day__in=days, from_screen__in=from_screens)
+        }
+        to_update, to_create = [], []
+        for (day, from_screen, to_screen), delta in transition_delta.items():
+            row = existing.get((day, from_screen, to_screen))
+            if row is None:
+                to_create.append(ScreenTransitionDaily(
+                    day=day, from_screen=from_screen, to_screen=to_screen, count=delta,
+                ))
+            else:
+                row.count += delta
+                to_update.append(row)
+        ScreenTransitionDaily.objects.bulk_update(to_update, ['count'], batch_size=500)
+        ScreenTransitionDaily.objects.bulk_create(to_create, batch_size=500)
+
+
+def process_sessions(session_ids, funnels, horizon_day):
+    """Recompute the given sessions and apply their changes to the counters. Returns events walked."""
+    from backend.models import ScreenViewEvent, SessionFunnelState
+
+    screens_by_session = defaultdict(list)
+    first_seen = {}
+    walked = 0
+    events = (
+        ScreenViewEvent.objects
+        .filter(session_id__in=session_ids)
+        .order_by('session_id', 'started_at')
+        .values_list('session_id', 'screen', 'started_at')
+    )
+    for session_id, screen, started_at in events.iterator(chunk_size=2000):
+        screens_by_session[session_id].append(screen)
+        first_seen.setdefault(session_id, started_at)
+        walked += 1
+
+    step_delta = defaultdict(int)
+    transition_delta = defaultdict(int)
+    with transaction.atomic():
+        states = {
+            s.session_id: s
+            for s in SessionFunnelState.objects.select_for_update().filter(session_id__in=session_ids)
+        }
+        to_update, to_create = [], []
+        for session_id, screens in screens_by_session.items():
+            day = timezone.localdate(first_seen[session_id])
+            if day < horizon_day:
+                continue
+            steps, transitions = session_contribution(screens, funnels)
+            state = states.get(session_id)
+            if state is not None:
+                if (state.day, state.steps, state.transitions) == (day, steps, transitions):
+                    continue
+                _add(step_delta, transition_delta, state.day, state.steps, state.transitions, -1)
+                state.day, state.events, state.steps, state.transitions = day, len(screens), steps, transitions
+                to_update.append(state)
+            else:
+                to_create.append(SessionFunnelState(
+                    session_id=session_id, day=day, events=len(screens), steps=steps, transitions=transitions,
+                ))
+            _add(step_delta, transition_delta, day, steps, transitions, 1)
+
+        _apply_deltas(step_delta, transition_delta, funnels)
+        SessionFunnelState.objects.bulk_update(
+            to_update, ['day', 'events', 'steps', 'transitions', 'updated_at'], batch_size=500,
+        )
+        SessionFunnelState.objects.bulk_create(to_create, batch_size=500)
+    return walked
+
+
+def build_session_funnels(full=False, overlap=DEFAULT_OVERLAP, state_days=None):
+    """
+    Update FunnelStepDaily / ScreenTransitionDaily for sessions with events received
+    since the last run. With full=True the counters for the tracked window are wiped
+    and rebuilt (needed after editing ANALYTICS_FUNNELS).
+    Returns (sessions, events walked).
+    """
+    from backend.models import (
+        AnalyticsWatermark, FunnelStepDaily, ScreenTransitionDaily, ScreenViewEvent, SessionFunnelState,
+    )
+
+    if state_days is None:
+        state_days = getattr(settings, 'ANALYTICS_FUNNEL_STATE_DAYS', 7)
+    funnels = get_funnels()
+    run_started = timezone.now()
+    horizon_day = timezone.localdate() - datetime.timedelta(days=max(1, state_days))
+    horizon = timezone.make_aware(
+        datetime.datetime.combine(horizon_day, datetime.time.min), timezone.get_current_timezone(),
+    )
+    mark, _ = AnalyticsWatermark.objects.get_or_create(name=WATERMARK_FUNNELS)
+
+    events = ScreenViewEvent.objects.exclude(session_id='')
+    if full or mark.processed_until is None:
+        with transaction.atomic():
+            SessionFunnelState.objects.all().delete()
+            FunnelStepDaily.objects.filter(day__gte=horizon_day).delete()
+            ScreenTransitionDaily.objects.filter(day__gte=horizon_day).delete()
+        events = events.filter(started_at__gte=horizon)
+    else:
+        events = events.filter(received_at__gte=mark.processed_until - overlap)
+
+    session_ids = list(events.order_by().values_list('session_id', flat=True).distinct())
+    walked = 0
+    for i in range(0, len(session_ids), SESSION_BATCH_SIZE):
+        walked += process_sessions(session_ids[i:i + SESSION_BATCH_SIZE], funnels, horizon_day)
+
+    SessionFunnelState.objects.filter(day__lt=horizon_day).delete()
+
+    mark.processed_until = run_started
+    mark.save(update_fields=['processed_until', 'updated_at'])
+    return len(session_ids), walked
+
+
+def funnels_updated_at():
+    """Watermark of the funnel counters (None if never built)."""
+    from backend.models import AnalyticsWatermark
+    return (
+        AnalyticsWatermark.objects.filter(name=WATERMARK_FUNNELS)
+        .values_list('processed_until', flat=True)
+        .first()
+    )
@@ -0,0 +1,279 @@
+"""
+Incremental rollups behind the admin analytics dashboards.
+
+Each run looks only at rows created or changed after the stored watermark
+(minus a small overlap for late-arriving, buffered events), collects the days
+they belong to, and recomputes those days' rollup rows from the raw tables.
+Recomputing whole days keeps distinct counts exact and makes re-runs idempotent.
+"""
+import datetime
+import logging
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_SCREEN_EVENTS = 'rollup:screen_events'
+WATERMARK_ORDERS = 'rollup:orders'
+WATERMARK_LOCATION_PINGS = 'rollup:location_pings'
+
+# Re-scan this far behind the watermark on every run; covers rows inserted by the
+# analytics buffer after the previous run with an older started_at.
+DEFAULT_OVERLAP = datetime.timedelta(minutes=15)
+
+
+def _day_bounds(day):
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min), tz)
+    return start, start + datetime.timedelta(days=1)
+
+
+def _touched_days(qs, since, time_fields, day_field):
+    cond = Q()
+    for field in time_fields:
+        cond |= Q(**{f'{field}__gte': since})
+    return set(
+        qs.filter(cond)
+        .annotate(_day=TruncDate(day_field))
+        .values_list('_day', flat=True)
+        .distinct()
+    )
+
+
+def rebuild_screen_day(day):
+    """Recompute screen, hourly and platform rollups for one (local) day."""
+    from backend.models import ScreenViewEvent, ScreenDailyRollup, ScreenHourlyRollup, PlatformDailyRollup
+
+    start, end = _day_bounds(day)
+    events = ScreenViewEvent.objects.filter(started_at__gte=start, started_at__lt=end)
+
+    daily = [
+        ScreenDailyRollup(
+            day=day,
+            screen=r['screen'],
+            opens=r['opens'],
+            unique_users=r['unique_users'],
+            unique_devices=r['unique_devices'],
+            total_seconds=r['total_seconds'] or 0,
+        )
+        for r in events.values('screen').annotate(
+            opens=Count('id'),
+            unique_users=Count('user', distinct=True),
+            unique_devices=Count('device_id', distinct=True, filter=~Q(device_id='')),
+            total_seconds=Sum('duration_seconds'),
+        )
+    ]
+    hourly = [
+        ScreenHourlyRollup(
+            hour=r['hour'],
+            screen=r['screen'],
+            opens=r['opens'],
+            total_seconds=r['total_seconds'] or 0,
+        )
+        for r in events.annotate(hour=TruncHour('started_at')).values('hour', 'screen').annotate(
+            opens=Count('id'),
+            total_seconds=Sum('duration_seconds'),
+        )
+    ]
+    platforms = [
+        PlatformDailyRollup(
+            day=day,
+            platform=r['platform'] or '',
+            events=r['events'],
+            app_opens=r['app_opens'],
+            unique_users=r['unique_users'],
+            unique_devices=r['unique_devices'],
+        )
+        for r in events.values('platform').annotate(
+            events=Count('id'),
+            app_opens=Count('id', filter=Q(screen='app_open')),
+            unique_users=Count('user', distinct=True),
+            unique_devices=Count('device_id', distinct=True, filter=~Q(device_id='')),
+        )
+    ]
+
+    with transaction.atomic():
+        ScreenDailyRollup.objects.filter(day=day).delete()
+        ScreenHourlyRollup.objects.filter(hour__gte=start, hour__lt=end).delete()
+        PlatformDailyRollup.objects.filter(day=day).delete()
+        ScreenDailyRollup.objects.bulk_create(daily, batch_size=500)
+        ScreenHourlyRollup.objects.bulk_create(hourly, batch_size=500)
+        PlatformDailyRollup.objects.bulk_create(platforms, batch_size=500)
+
+
+def rebuild_order_day(day):
+    """Recompute OrderDailyRollup for one (local) day of Order.created_at."""
+    from backend.models import Order, OrderDailyRollup
+
+    start, end = _day_bounds(day)
+    rows = [
+        OrderDailyRollup(
+            day=day,
+            tx_status=r['tx_status'] or '',
+            orders=r['orders'],
+            tx_amount=r['tx_amount'] or 0,
+        )
+        for r in Order.objects.filter(created_at__gte=start, created_at__lt=end)
+        .values('tx_status')
+        .annotate(orders=Count('id'), tx_amount=Sum('tx_amount'))
+    ]
+    with transaction.atomic():
+        OrderDailyRollup.objects.filter(day=day).delete()
+        OrderDailyRollup.objects.bulk_create(rows)
+
+
+def rebuild_location_day(day):
+    """Recompute LocationCellDailyCount for one (local) day of CustomerLocationPing.created_at."""
+    from backend.models import CustomerLocationPing, LocationCellDailyCount
+
+    start, end = _day_bounds(day)
+    rows = [
+        LocationCellDailyCount(
+            day=day,
+            grid_cell=r['grid_cell'],
+            pings=r['pings'],
+            unique_devices=r['unique_devices'],
+        )
+        for r in CustomerLocationPing.objects.filter(
+            created_at__gte=start, created_at__lt=end, grid_cell__isnull=False,
+        )
+        .values('grid_cell')
+        .annotate(pings=Count('id'), unique_devices=Count('device_id', distinct=True))
+    ]
+    with transaction.atomic():
+        LocationCellDailyCount.objects.filter(day=day).delete()
+        LocationCellDailyCount.objects.bulk_create(rows, batch_size=1000)
+
+
+def _run(name, qs, time_fields, day_field, rebuild_day, full=False, overlap=DEFAULT_OVERLAP):
+    from backend.models import AnalyticsWatermark
+
+    run_started = timezone.now()
+    mark, _ = AnalyticsWatermark.objects.get_or_create(name=name)
+
+    if full or mark.processed_until is None:
+        days = set(qs.annotate(_day=TruncDate(day_field)).values_list('_day', flat=True).distinct())
+    else:
+        days = _touched_days(qs, mark.processed_until - overlap, time_fields, day_field)
+
+    for day in sorted(d for d in days if d):
+        rebuild_day(day)
+
+    mark.processed_until = run_started
+    mark.save(update_fields=['processed_until', 'updated_at'])
+    return len(days)
+
+
+def build_screen_rollups(full=False, overlap=DEFAULT_OVERLAP):
+    """Update screen/platform rollups for days with new or closed events. Returns days rebuilt."""
+    from backend.models import ScreenViewEvent
+    return _run(
+        WATERMARK_SCREEN_EVENTS, ScreenViewEvent.objects.all(),
+        ['started_at', 'ended_at'], 'started_at', rebuild_screen_day, full, overlap,
+    )
+
+
+def build_order_rollups(full=False, overlap=DEFAULT_OVERLAP):
+    """Update order rollups for days with new or updated orders. Returns days rebuilt."""
+    from backend.models import Order
+    return _run(
+        WATERMARK_ORDERS, Order.objects.all(),
+        ['created_at', 'updated_at'], 'created_at', rebuild_order_day, full, overlap,
+    )
+
+
+def build_location_rollups(full=False, overlap=DEFAULT_OVERLAP):
+    """
+    Update per-cell daily ping counts for days with new pings, however old
+    (pings are purged on day boundaries, so a day with raw pings is complete).
+    Returns days rebuilt.
+    """
+    from backend.models import CustomerLocationPing
+    return _run(
+        WATERMARK_LOCATION_PINGS, CustomerLocationPing.objects.all(),
+        ['created_at'], 'created_at', rebuild_location_day, full, overlap,
+    )
+
+
+def backfill_ping_grid_cells(batch_size=2000):
+    """Fill grid_cell on pings stored before it existed. Returns rows updated."""
+    from backend.geo_utils import grid_cell
+    from backend.models import CustomerLocationPing
+
+    updated = 0
+    last_id = 0
+    while True:
+        batch = list(
+            CustomerLocationPing.objects.filter(grid_cell__isnull=True, id__gt=last_id)
+            .order_by('id')
+            .only('id', 'latitude', 'longitude')[:batch_size]
+        )
+        if not batch:
+            return updated
+        for p in batch:
+            p.grid_cell = grid_cell(p.latitude, p.longitude)
+        CustomerLocationPing.objects.bulk_update(batch, ['grid_cell'], batch_size=batch_size)
+        updated += len(batch)
+        last_id = batch[-1].id
+
+
+def ping_retention_cutoff(retain_days=None):
+    """
+    Start of the local day `retain_days` (default LOCATION_PING_RETENTION_DAYS)
+    before today; cut on a day boundary so every day that can still be rebuilt
+    is complete.
+    """
+    from django.conf import settings
+
+    if retain_days is None:
+        retain_days = getattr(settings, 'LOCATION_PING_RETENTION_DAYS', 30)
+    return _day_bounds(timezone.localdate() - datetime.timedelta(days=max(1, retain_days)))[0]
+
+
+def purge_location_pings(before, batch_size=5000):
+    """
+    Delete raw pings created before `before` in id-ordered chunks, but never
+    past the start of the location watermark's day: later pings may not be
+    counted yet. Returns rows deleted.
+    """
+    from backend.models import CustomerLocationPing
+
+    counted_until = location_rollups_updated_at()
+    if counted_until is None:
+        return 0
+    before = min(before, _day_bounds(timezone.localdate(counted_until))[0])
+    deleted = 0
+    while True:
+        ids = list(
+            CustomerLocationPing.objects.filter(created_at__lt=before)
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += CustomerLocationPing.objects.filter(id__in=ids).delete()[0]
+
+
+def rollups_updated_at():
+    """Oldest watermark of the dashboard rollups (None if never built)."""
+    from backend.models import AnalyticsWatermark
+    marks = list(
+        AnalyticsWatermark.objects.filter(name__in=[WATERMARK_SCREEN_EVENTS, WATERMARK_ORDERS])
+        .values_list('processed_until', flat=True)
+    )
+    if len(marks) < 2 or None in marks:
+        return None
+    return min(marks)
+
+
+def location_rollups_updated_at():
+    """Watermark of LocationCellDailyCount (None if never built)."""
+    from backend.models import AnalyticsWatermark
+    return (
+        AnalyticsWatermark.objects.filter(name=WATERMARK_LOCATION_PINGS)
+        .values_list('processed_until', flat=True)
+        .first()
+    )
@@ -6,6 +6,8 @@ class BackendConfig(AppConfig):
     name = 'backend'
 
     def ready(self):
+        from backend import signals  # noqa: F401  (connect receivers)
+
         try:
             from django.conf import settings
             creds = getattr(settings, 'FIREBASE_ADMIN_CREDENTIALS', None)
@@ -0,0 +1,290 @@
+"""
+Per-artist availability as bitmaps, behind the service calendar and time slot
+endpoints.
+
+ArtistCalendarMonth holds three day bitmaps per artist (Service) and month (bit
+d-1 = day d): days with active customer bookings, days marked booked by the
+admin and blocked days. ArtistDaySlots holds one bitmap of the 96 15-minute
+slots of a day covered by active bookings, each booking spanning its own
+duration (ServiceBooking.duration, copied from ServiceOption.duration).
+A month or slot query is one row read plus bit operations.
+
+Rows are built on first read and kept current by backend/signals.py. A change
+to a booking or availability entry refreshes that artist's day after the
+surrounding transaction commits: one query for that day's bookings, then one
+bit flip in the month row. Writes that bypass signals are repaired by
+`python manage.py rebuild_artist_calendar`.
+"""
+import calendar
+import datetime
+import logging
+import re
+import threading
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+SLOT_BYTES = SLOTS_PER_DAY // 8
+
+# Start times offered to customers (hourly, 09:00 to 18:00)
+OFFERED_START_HOURS = range(9, 19)
+DEFAULT_DURATION_MINUTES = 60
+
+ACTIVE_BOOKING_STATUSES = ['PENDING', 'CONFIRMED', 'IN_PROGRESS']
+
+_DURATION_RE = re.compile(
+    r'(\d+(?:\.\d+)?)(?:\s*-\s*(\d+(?:\.\d+)?))?\s*(m|min|mins|minute|minutes|h|hr|hrs|hour|hours|d|day|days)\b',
+    re.IGNORECASE,
+)
+
+_local = threading.local()
+
+
+# =============================================================================
+# BITS
+# =============================================================================
+
+def parse_duration_minutes(text):
+    """
+    Minutes for a free-text duration ('2 hours', '90 mins', '1.5 hr', '2-3 hours',
+    '1 day'). Ranges use the upper bound; unknown text is DEFAULT_DURATION_MINUTES.
+    """
+    total = 0
+    for low, high, unit in _DURATION_RE.findall(text or ''):
+        value = float(high or low)
+        unit = unit.lower()
+        if unit.startswith('d'):
+            return SLOTS_PER_DAY * SLOT_MINUTES
+        total += value * 60 if unit.startswith('h') else value
+    if not total:
+        return DEFAULT_DURATION_MINUTES
+    return min(int(total), SLOTS_PER_DAY * SLOT_MINUTES)
+
+
+def span_mask(start_time, minutes):
+    """Slot bitmap covering [start_time, start_time + minutes), clipped at midnight."""
+    first = (start_time.hour * 60 + start_time.minute) // SLOT_MINUTES
+    end_minute = start_time.hour * 60 + start_time.minute + max(minutes, 1)
+    last = min(SLOTS_PER_DAY, -(-end_minute // SLOT_MINUTES))
+    return ((1 << (last - first)) - 1) << first
+
+
+def day_bits(days):
+    bits = 0
+    for day in days:
+        bits |= 1 << (day - 1)
+    return bits
+
+
+def bit_days(bits, total_days=31):
+    return [day for day in range(1, total_days + 1) if bits >> (day - 1) & 1]
+
+
+def _to_bytes(bits):
+    return bits.to_bytes(SLOT_BYTES, 'little')
+
+
+def _from_bytes(data):
+    return int.from_bytes(bytes(data or b''), 'little')
+
+
+def _month_start(day):
+    return day.replace(day=1)
+
+
+# =============================================================================
+# BUILD / REFRESH
+# =============================================================================
+
+def _busy_from_bookings(bookings):
+    busy = 0
+    for booking_time, duration in bookings:
+        busy |= span_mask(booking_time, parse_duration_minutes(duration))
+    return busy
+
+
+def _active_bookings(artist_id, **filters):
+    from backend.models import ServiceBooking
+
+    return ServiceBooking.objects.filter(
+        service_option__service_id=artist_id, status__in=ACTIVE_BOOKING_STATUSES, **filters,
+    )
+
+
+def build_month(artist_id, month):
+    """Recompute one artist's month row from bookings and availability entries."""
+    from backend.models import ArtistAvailability, ArtistCalendarMonth
+
+    month = _month_start(month)
+    booked = _active_bookings(
+        artist_id, booking_date__year=month.year, booking_date__month=month.month,
+    ).values_list('booking_date__day', flat=True).distinct()
+    entries = ArtistAvailability.objects.filter(
+        artist_id=artist_id, date__year=month.year, date__month=month.month,
+    ).values_list('date__day', 'status')
+
+    values = {'booked_days': day_bits(booked), 'artist_booked_days': 0, 'blocked_days': 0}
+    for day, status in entries:
+        if status == ArtistAvailability.STATUS_BOOKED:
+            values['artist_booked_days'] |= 1 << (day - 1)
+        elif status == ArtistAvailability.STATUS_BLOCKED:
+            values['blocked_days'] |= 1 << (day - 1)
+    row, _ = ArtistCalendarMonth.objects.update_or_create(artist_id=artist_id, month=month, defaults=values)
+    return row
+
+
+def build_day(artist_id, date):
+    """Recompute one artist's slot bitmap for a day from its active bookings."""
+    from backend.models import ArtistDaySlots
+
+    busy = _busy_from_bookings(_active_bookings(artist_id, booking_date=date).values_list('booking_time', 'duration'))
+    row, _ = ArtistDaySlots.objects.update_or_create(
+        artist_id=artist_id, date=date, defaults={'busy': _to_bytes(busy)},
+    )
+    return row
+
+
+def refresh_day(artist_id, date):
+    """Rebuild the day's slots and update its bits in the month row (if that month is built)."""
+    from backend.models import ArtistAvailability, ArtistCalendarMonth
+
+    day_row = build_day(artist_id, date)
+    bit = 1 << (date.day - 1)
+    # Every active booking covers at least one slot
+    has_bookings = _from_bytes(day_row.busy) != 0
+    status = ArtistAvailability.objects.filter(artist_id=artist_id, date=date).values_list('status', flat=True).first()
+
+    with transaction.atomic():
+        month_row = ArtistCalendarMonth.objects.select_for_update().filter(
+            artist_id=artist_id, month=_month_start(date),
+        ).first()
+        if month_row is None:
+            return
+        for field, is_set in (
+            ('booked_days', has_bookings),
+            ('artist_booked_days', status == ArtistAvailability.STATUS_BOOKED),
+            ('blocked_days', status == ArtistAvailability.STATUS_BLOCKED),
+        ):
+            value = getattr(month_row, field)
+            setattr(month_row, field, value | bit if is_set else value & ~bit)
+        month_row.save(update_fields=['booked_days', 'artist_booked_days', 'blocked_days', 'refreshed_at'])
+
+
+def rebuild(artist_ids=None):
+    """Recompute every stored month and day row (of these artists). Returns rows rebuilt."""
+    from backend.models import ArtistCalendarMonth, ArtistDaySlots
+
+    months = ArtistCalendarMonth.objects.all()
+    days = ArtistDaySlots.objects.all()
+    if artist_ids is not None:
+        months = months.filter(artist_id__in=artist_ids)
+        days = days.filter(artist_id__in=artist_ids)
+
+    rebuilt = 0
+    for artist_id, month in months.values_list('artist_id', 'month').iterator():
+        build_month(artist_id, month)
+        rebuilt += 1
+    for artist_id, date in days.values_list('artist_id', 'date').iterator():
+        build_day(artist_id, date)
+        rebuilt += 1
+    return rebuilt
+
+
+# =============================================================================
+# SCHEDULING (coalesced until commit)
+# =============================================================================
+
+def _flush_pending():
+    pending = getattr(_local, 'pending', None)
+    if not pending:
+        return
+    _local.pending = set()
+    for artist_id, date in pending:
+        try:
+            refresh_day(artist_id, date)
+        except Exception:
+            logger.exception('Artist calendar refresh failed (%s, %s)', artist_id, date)
+
+
+def schedule_refresh(*artist_dates):
+    """Refresh (artist_id, date) pairs after the current transaction commits."""
+    artist_dates = {(a, d) for a, d in artist_dates if a and d}
+    if not artist_dates:
+        return
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        pending = _local.pending = set()
+    pending.update(artist_dates)
+    transaction.on_commit(_flush_pending)
+
+
+# =============================================================================
+# READ
+# =============================================================================
+
+def get_month(artist_id, year, month):
+    from backend.models import ArtistCalendarMonth
+
+    first = datetime.date(year, month, 1)
+    row = ArtistCalendarMonth.objects.filter(artist_id=artist_id, month=first).first()
+    return row or build_month(artist_id, first)
+
+
+def month_availability(artist_id, year, month, today):
+    """
+    {'booked_dates', 'blocked_dates', 'available_dates', 'total_days'} for a month.
+    Booked covers customer and admin bookings; available excludes past days.
+    """
+    row = get_month(artist_id, year, month)
+    total_days = calendar.monthrange(year, month)[1]
+    all_days = (1 << total_days) - 1
+    booked = row.booked_days | row.artist_booked_days
+    unavailable = booked | row.blocked_days
+
+    if (year, month) < (today.year, today.month):
+        future = 0
+    elif (year, month) > (today.year, today.month):
+        future = all_days
+    else:
+        future = all_days & ~((1 << (today.day - 1)) - 1)
+
+    return {
+        'booked_dates': bit_days(booked, total_days),
+        'blocked_dates': bit_days(row.blocked_days, total_days),
+        'available_dates': bit_days(future & ~unavailable, total_days),
+        'total_days': total_days,
+    }
+
+
+def day_unavailable(artist_id, date):
+    """True if the admin blocked or booked this artist's day."""
+    row = get_month(artist_id, date.year, date.month)
+    return bool((row.artist_booked_days | row.blocked_days) >> (date.day - 1) & 1)
+
+
+def day_busy(artist_id, date, exclude_booking_id=None):
+    """Busy slot bitmap for a day. exclude_booking_id leaves one booking out (rescheduling)."""
+    from backend.models import ArtistDaySlots
+
+    if exclude_booking_id is not None:
+        bookings = _active_bookings(artist_id, booking_date=date)
+        if bookings.filter(pk=exclude_booking_id).exists():
+            return _busy_from_bookings(bookings.exclude(pk=exclude_booking_id).values_list('booking_time', 'duration'))
+    row = ArtistDaySlots.objects.filter(artist_id=artist_id, date=date).first()
+    return _from_bytes((row or build_day(artist_id, date)).busy)
+
+
+def is_free(busy, start_time, minutes):
+    return not busy & span_mask(start_time, minutes)
+
+
+def offered_slots(busy, minutes=DEFAULT_DURATION_MINUTES):
+    """(available, booked) 'HH:MM:SS' start times for a day's busy bitmap and a booking length."""
+    available, booked = [], []
+    for hour in OFFERED_START_HOURS:
+        start = datetime.time(hour, 0)
+        (available if is_free(busy, start, minutes) else booked).append(start.strftime('%H:%M:%S'))
+    return available, booked
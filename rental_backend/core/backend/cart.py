@@ -0,0 +1,237 @@
+"""
+Cart storage and pricing shared by every cart endpoint.
+
+CartItem is the only cart store; User.cart (the old M2M) is no longer read or
+written, `python manage.py migrate_legacy_cart` moves rows still left in it.
+get_cart() prices a user's cart in three queries (lines with option and
+product, the options' images, the user's wishlist ids) and returns the lines
+plus one summary: totals, savings, delivery and security deposit.
+
+The priced cart is cached per user under User.cart_version. backend/signals.py
+bumps the version (an F() update) when a CartItem is saved or deleted, the
+wishlist changes, or a product / option / image in someone's cart is saved, so
+the next read misses and reprices. Entries also expire after CART_CACHE_SECONDS.
+"""
+import copy
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Prefetch
+
+DURATION_DAYS = {
+    '1_day': 1, '2_days': 2, '3_days': 3,
+    '7_days': 7, '14_days': 14, '30_days': 30,
+}
+
+
+def _cache_key(user_id, version):
+    return f'cart:{user_id}:{version}'
+
+
+# =============================================================================
+# PRICING
+# =============================================================================
+
+def line_price(item, option, product):
+    """
+    Unit price of a cart line: the stored rental_price, else the option's price
+    for the rental duration (rent) or its buy offer / buy price (buy), else the
+    product offer price, else the product price.
+    """
+    original_price = int(product.price or 0)
+    price = 0
+    try:
+        if item.rental_price and item.rental_price > 0:
+            price = int(item.rental_price)
+        elif item.rental_type == 'rent' and item.rental_duration:
+            price = int(option.get_rental_price(item.rental_duration) or 0)
+        elif item.rental_type == 'buy':
+            price = int(option.get_buy_offer_price() or 0) or int(option.get_buy_price() or 0)
+    except (TypeError, ValueError):
+        price = 0
+    if price <= 0 and product.offer_price and product.offer_price > 0:
+        price = int(product.offer_price)
+    return price if price > 0 else original_price
+
+
+def rental_end_date(item):
+    if item.rental_type != 'rent' or not item.selected_date:
+        return None
+    days = DURATION_DAYS.get(item.rental_duration, 1)
+    return (item.selected_date + datetime.timedelta(days=days - 1)).strftime('%Y-%m-%d')
+
+
+def _line(item, wishlist_ids):
+    option = item.product_option
+    product = option.product
+    images = option.cart_images
+    image = images[0].image if images and images[0].image else None
+
+    original_price = int(product.price or 0)
+    price = line_price(item, option, product)
+    quantity = int(item.quantity or 1)
+    security = int(getattr(product, 'security_amount', 0) or 0)
+    return {
+        'id': str(item.id),
+        'product_option_id': str(option.id),
+        'product_id': str(product.id),
+        'title': f"({option.option}) {product.title}" if option.option else product.title,
+        # Relative to the media root until cart_payload() makes it absolute
+        'image': image.url if image else None,
+        'price': original_price,
+        'offer_price': int(product.offer_price) if product.offer_price and product.offer_price > 0 else original_price,
+        'quantity': quantity,
+        'cod': bool(product.cod),
+        'delivery_charge': int(product.delivery_charge or 0),
+        'savings': max(original_price - price, 0),
+        'in_stock': option.quantity > 0,
+        'stock_quantity': int(option.quantity or 0),
+        'in_wishlist': option.id in wishlist_ids,
+        'selected_date': item.selected_date.strftime('%Y-%m-%d') if item.selected_date else None,
+        'rental_type': item.rental_type or 'buy',
+        'rental_duration': item.rental_duration or '',
+        'rental_price': price,
+        'rental_end_date': rental_end_date(item),
+        'security_amount': security,
+        'security_total': security * quantity,
+    }
+
+
+def summarize(lines):
+    total_amount = sum(line['price'] * line['quantity'] for line in lines)
+    offer_amount = sum(line['rental_price'] * line['quantity'] for line in lines)
+    total_savings = sum(line['savings'] * line['quantity'] for line in lines)
+    security_amount = sum(line['security_total'] for line in lines)
+
+    threshold = getattr(settings, 'CART_FREE_DELIVERY_THRESHOLD', 500)
+    free_delivery = offer_amount >= threshold
+    delivery_charges = 0 if free_delivery else sum(line['delivery_charge'] for line in lines)
+    return {
+        'total_amount': total_amount,
+        'offer_amount': offer_amount,
+        'total_savings': total_savings,
+        'delivery_charges': delivery_charges,
+        'security_amount': security_amount,
+        'final_amount': offer_amount + delivery_charges + security_amount,
+        'total_items': len(lines),
+        'total_quantity': sum(line['quantity'] for line in lines),
+        'free_delivery_threshold': threshold,
+        'free_delivery_eligible': free_delivery,
+        'amount_for_free_delivery': max(0, threshold - offer_amount),
+    }
+
+
+def build_cart(user_id):
+    """Price a user's cart from the database: {'items': [...], 'summary': {...}}."""
+    from backend.models import CartItem, ProductImage, User
+
+    items = CartItem.objects.filter(user_id=user_id).select_related(
+        'product_option__product',
+    ).prefetch_related(
+        Prefetch(
+            'product_option__images_set',
+            queryset=ProductImage.objects.order_by('position', 'pk'),
+            to_attr='cart_images',
+        ),
+    ).order_by('-created_at')
+    wishlist_ids = set(User.wishlist.through.objects.filter(user_id=user_id).values_list('productoption_id', flat=True))
+
+    lines = [_line(item, wishlist_ids) for item in items]
+    return {'items': lines, 'summary': summarize(lines)}
+
+
+# =============================================================================
+# CACHE
+# =============================================================================
+
+def get_cart(user, refresh=False):
+    """The user's priced cart, from the cache when the cart has not changed since it was stored."""
+    from backend.models import User
+
+    version = User.objects.filter(pk=user.pk).values_list('cart_version', flat=True).first()
+    key = _cache_key(user.pk, version)
+    cart = None if refresh else cache.get(key)
+    if cart is None:
+        cart = build_cart(user.pk)
+        cache.set(key, cart, getattr(settings, 'CART_CACHE_SECONDS', 300))
+    return cart
+
+
+def cart_payload(cart, request=None):
+    """(items, summary) for a response, with absolute image URLs. The cached cart is not modified."""
+    items = copy.deepcopy(cart['items'])
+    if request is not None:
+        for item in items:
+            if item['image']:
+                item['image'] = request.build_absolute_uri(item['image'])
+    return items, dict(cart['summary'])
+
+
+def option_ids(cart):
+    """Product option ids (strings) in the cart."""
+    return {item['product_option_id'] for item in cart['items']}
+
+
+def invalidate(user_ids):
+    """Make the cached carts of these users stale."""
+    from backend.models import User
+
+    user_ids = [pk for pk in user_ids if pk is not None]
+    if user_ids:
+        User.objects.filter(pk__in=user_ids).update(cart_version=F('cart_version') + 1)
+
+
+def invalidate_for_options(product_option_ids):
+    """Make stale the carts holding any of these product options."""
+    from backend.models import CartItem, User
+
+    holders = CartItem.objects.filter(product_option_id__in=product_option_ids).values('user_id')
+    User.objects.filter(pk__in=holders).update(cart_version=F('cart_version') + 1)
+
+
+def invalidate_for_product(product_id):
+    from backend.models import ProductOption
+    invalidate_for_options(ProductOption.objects.filter(product_id=product_id).values('pk'))
+
+
+# =============================================================================
+# LEGACY M2M CART
+# =============================================================================
+
+def migrate_legacy(dry_run=False):
+    """
+    Move User.cart rows into CartItem (one-day rentals, the add-to-cart default)
+    unless the user already has a CartItem for that option, then empty User.cart.
+    Returns (rows moved, rows already in CartItem).
+    """
+    from backend import user_counters
+    from backend.models import CartItem, ProductOption, User
+
+    through = User.cart.through
+    legacy = list(through.objects.values_list('user_id', 'productoption_id'))
+    existing = set(CartItem.objects.values_list('user_id', 'product_option_id'))
+    to_move = [pair for pair in legacy if pair not in existing]
+    if dry_run:
+        return len(to_move), len(legacy) - len(to_move)
+
+    options = ProductOption.objects.select_related('product').in_bulk({option_id for _, option_id in to_move})
+    with transaction.atomic():
+        CartItem.objects.bulk_create([
+            CartItem(
+                user_id=user_id,
+                product_option_id=option_id,
+                quantity=1,
+                rental_type='rent',
+                rental_duration='1_day',
+                rental_price=options[option_id].get_rental_price('1_day'),
+            )
+            for user_id, option_id in to_move
+        ], batch_size=1000)
+        through.objects.all().delete()
+        # bulk_create sends no signals
+        user_ids = {user_id for user_id, _ in legacy}
+        user_counters.repair(user_ids)
+        invalidate(user_ids)
+    return len(to_move), len(legacy) - len(to_move)
@@ -0,0 +1,456 @@
+"""
+Bulk catalog import: a CSV/JSONL manifest (one row per product option) plus an
+optional zip of images, processed as a resumable CatalogImportJob.
+
+Manifest columns (CSV header / JSONL keys):
+  product_ref   rows with the same ref belong to one product (default: title)
+  title, description, category_id, price             product (taken from its first row)
+  offer_price, delivery_charge, cod, security_amount,
+  rent_price_1_day .. rent_price_30_days, buy_price, buy_offer_price,
+  requires_date_selection, max_bookings_per_date
+  option, quantity                                    option (one per row)
+  option_price, option_offer_price, option_rent_1_day .. option_rent_30_days,
+  option_buy_price, option_buy_offer_price, auto_calculate_rental_prices,
+  is_rent_available, is_buy_available
+  images        zip member paths for the option, separated by '|'
+
+The manifest is streamed in batches of CATALOG_IMPORT_BATCH_SIZE rows. Each batch:
+rows are validated (bad rows are reported and skipped), its images are read from
+the zip and verified/stored by a thread pool, then products, options and images are
+bulk_created in one transaction together with the job's resume cursor.
+"""
+import csv
+import datetime
+import io
+import json
+import logging
+import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+MAX_STORED_ERRORS = 200
+MAX_IMAGE_BYTES = 5 * 1024 * 1024  # same limit as vendor_upload_product_image
+IMAGE_SEPARATOR = '|'
+
+RENT_DURATIONS = ('1_day', '2_days', '3_days', '7_days', '14_days', '30_days')
+PRODUCT_INT_FIELDS = (
+    ['offer_price', 'delivery_charge', 'security_amount', 'buy_price', 'buy_offer_price']
+    + [f'rent_price_{d}' for d in RENT_DURATIONS]
+)
+OPTION_INT_FIELDS = (
+    ['option_price', 'option_offer_price', 'option_buy_price', 'option_buy_offer_price']
+    + [f'option_rent_{d}' for d in RENT_DURATIONS]
+)
+
+
+class RowError(ValueError):
+    pass
+
+
+class JobTakenOver(RuntimeError):
+    """Another runner claimed the job (stale heartbeat) and committed first."""
+
+
+# =============================================================================
+# PARSING
+# =============================================================================
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _is_jsonl(name):
+    return os.path.splitext(name or '')[1].lower() in ('.jsonl', '.ndjson', '.json')
+
+
+def iter_manifest_rows(fileobj, name):
+    """Yield manifest rows (dicts) one at a time from a binary file object."""
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    if _is_jsonl(name):
+        for line in text:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = {'__error__': 'Invalid JSON line'}
+            yield row if isinstance(row, dict) else {'__error__': 'Each JSONL line must be an object'}
+    else:
+        for row in csv.DictReader(text):
+            yield {(k or '').strip(): (v.strip() if isinstance(v, str) else v) for k, v in row.items()}
+
+
+def _int(row, field, default=0, minimum=0):
+    value = row.get(field)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(float(value))
+    except (TypeError, ValueError):
+        raise RowError(f'{field} must be a number')
+    if minimum is not None and value < minimum:
+        raise RowError(f'{field} cannot be negative')
+    return value
+
+
+def _bool(row, field, default):
+    value = row.get(field)
+    if value in (None, ''):
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+def parse_product(row):
+    """Product field values from a manifest row (same rules as vendor_create_product)."""
+    title = str(row.get('title') or '').strip()
+    if not title:
+        raise RowError('title is required')
+    if row.get('category_id') in (None, ''):
+        raise RowError('category_id is required')
+    try:
+        category_id = int(row.get('category_id'))
+    except (TypeError, ValueError):
+        raise RowError('category_id must be a number')
+
+    fields = {f: _int(row, f) for f in PRODUCT_INT_FIELDS}
+    fields.update(
+        title=title[:500],
+        description=str(row.get('description') or ''),
+        category_id=category_id,
+        price=_int(row, 'price'),
+        cod=_bool(row, 'cod', True),
+        requires_date_selection=_bool(row, 'requires_date_selection', True),
+        max_bookings_per_date=_int(row, 'max_bookings_per_date', default=1),
+    )
+    if fields['price'] <= 0:
+        raise RowError('Price must be greater than 0')
+    if fields['offer_price'] > fields['price']:
+        raise RowError('Offer price cannot be greater than price')
+    if fields['buy_price'] > 0 and fields['buy_offer_price'] > fields['buy_price']:
+        raise RowError('Buy offer price cannot be greater than buy price')
+    return fields
+
+
+def parse_option(row):
+    """ProductOption field values from a manifest row (same rules as vendor_create_product_option)."""
+    fields = {f: _int(row, f) for f in OPTION_INT_FIELDS}
+    fields.update(
+        option=str(row.get('option') or '').strip()[:50],
+        quantity=_int(row, 'quantity'),
+        auto_calculate_rental_prices=_bool(row, 'auto_calculate_rental_prices', True),
+        is_rent_available=_bool(row, 'is_rent_available', True),
+        is_buy_available=_bool(row, 'is_buy_available', True),
+    )
+    if fields['option_price'] > 0 and fields['option_offer_price'] > fields['option_price']:
+        raise RowError('Offer price cannot be greater than price')
+    if fields['option_buy_price'] > 0 and fields['option_buy_offer_price'] > fields['option_buy_price']:
+        raise RowError('Buy offer price cannot be greater than buy price')
+    return fields
+
+
+def parse_images(row):
+    value = row.get('images') or []
+    if isinstance(value, str):
+        value = value.split(IMAGE_SEPARATOR)
+    return [str(v).strip().lstrip('/') for v in value if str(v).strip()]
+
+
+# =============================================================================
+# IMAGES
+# =============================================================================
+
+def _store_image(member, data):
+    """Verify and store one image (runs in the worker pool). Returns the stored name."""
+    from PIL import Image
+    from backend.models import ProductImage
+
+    if len(data) > MAX_IMAGE_BYTES:
+        raise RowError(f'{member}: image file too large (max 5MB)')
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.verify()
+    except Exception:
+        raise RowError(f'{member}: not a valid image')
+
+    field = ProductImage._meta.get_field('image')
+    name = field.generate_filename(None, os.path.basename(member))
+    return field.storage.save(name, ContentFile(data))
+
+
+def _store_images(archive, requests):
+    """
+    requests: [(key, member)] -> ({key: stored name}, {key: error message}).
+    Members are read sequentially from the zip; verify + storage writes run in a thread pool.
+    """
+    stored, failed = {}, {}
+    payloads = []
+    for key, member in requests:
+        if archive is None:
+            failed[key] = f'{member}: no images zip uploaded'
+            continue
+        try:
+            info = archive.getinfo(member)
+        except KeyError:
+            failed[key] = f'{member}: not found in images zip'
+            continue
+        if info.file_size > MAX_IMAGE_BYTES:
+            failed[key] = f'{member}: image file too large (max 5MB)'
+            continue
+        payloads.append((key, member, archive.read(info)))
+
+    if not payloads:
+        return stored, failed
+    workers = max(1, int(_setting('CATALOG_IMPORT_IMAGE_WORKERS', 4)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {key: pool.submit(_store_image, member, data) for key, member, data in payloads}
+        for key, future in futures.items():
+            try:
+                stored[key] = future.result()
+            except RowError as e:
+                failed[key] = str(e)
+            except Exception as e:
+                logger.exception('Catalog import: storing image failed')
+                failed[key] = f'image could not be stored: {e}'
+    return stored, failed
+
+
+# =============================================================================
+# JOB RUNNER
+# =============================================================================
+
+class _Run:
+    """State of one job run (categories, positions, product refs)."""
+
+    def __init__(self, job):
+        from backend.models import Category
+
+        self.job = job
+        self.category_ids = set(Category.objects.values_list('id', flat=True))
+        self.positions = {}
+        self.product_refs = dict(job.product_refs or {})
+        self.errors = list(job.errors or [])
+        self.error_count = job.error_count
+
+    def error(self, row_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_STORED_ERRORS:
+            self.errors.append({'row': row_number, 'message': str(message)})
+
+    def next_position(self, category_id):
+        from backend.models import Product
+
+        if category_id not in self.positions:
+            last = Product.objects.filter(category_id=category_id).aggregate(Max('position'))['position__max']
+            self.positions[category_id] = last or 0
+        self.positions[category_id] += 1
+        return self.positions[category_id]
+
+    def process_batch(self, batch, archive):
+        """batch: [(row_number, row)]. Commits the batch and the job cursor together."""
+        from backend import media_blobs
+        from backend.models import CatalogImportJob, Product, ProductImage, ProductOption
+
+        job = self.job
+        vendor_id = job.vendor_id
+        new_products = {}
+        options = []
+        image_requests = []
+
+        for row_number, row in batch:
+            try:
+                if row.get('__error__'):
+                    raise RowError(row['__error__'])
+                ref = str(row.get('product_ref') or row.get('title') or '').strip()
+                if not ref:
+                    raise RowError('product_ref or title is required')
+                option_fields = parse_option(row)
+                product_id = self.product_refs.get(ref)
+                if product_id is None and ref in new_products:
+                    product_id = new_products[ref].id
+                if product_id is None:
+                    fields = parse_product(row)
+                    if fields['category_id'] not in self.category_ids:
+                        raise RowError('Invalid category')
+                    product = Product(vendor_id=vendor_id, position=self.next_position(fields['category_id']), **fields)
+                    new_products[ref] = product
+                    product_id = product.id
+                option = ProductOption(product_id=product_id, **option_fields)
+                options.append(option)
+                for position, member in enumerate(parse_images(row)):
+                    image_requests.append(((row_number, option.id, position), member))
+            except RowError as e:
+                self.error(row_number, e)
+
+        stored, failed = _store_images(archive, image_requests)
+        for (row_number, _, _), message in failed.items():
+            self.error(row_number, message)
+        images = [
+            ProductImage(product_option_id=option_id, position=position, image=name)
+            for (row_number, option_id, position), name in stored.items()
+        ]
+
+        with transaction.atomic():
+            # Another runner may have taken over (stale heartbeat); never write twice.
+            current = CatalogImportJob.objects.select_for_update().only('rows_processed').get(pk=job.pk)
+            if current.rows_processed != job.rows_processed:
+                raise JobTakenOver()
+
+            Product.objects.bulk_create(new_products.values(), batch_size=500)
+            ProductOption.objects.bulk_create(options, batch_size=500)
+            ProductImage.objects.bulk_create(images, batch_size=500)
+            media_blobs.acquire(*(image.image.name for image in images))
+            for ref, product in new_products.items():
+                self.product_refs[ref] = str(product.id)
+
+            job.rows_processed += len(batch)
+            job.products_created += len(new_products)
+            job.options_created += len(options)
+            job.images_created += len(images)
+            job.error_count = self.error_count
+            job.errors = self.errors
+            job.product_refs = self.product_refs
+            job.heartbeat_at = timezone.now()
+            job.save(update_fields=[
+                'rows_processed', 'products_created', 'options_created', 'images_created',
+                'error_count', 'errors', 'product_refs', 'heartbeat_at',
+            ])
+
+        if new_products or options:
+            # bulk_create sends no signals; add what the rows contribute to the dashboard
+            from backend import vendor_stats
+            vendor_stats.add_vendor(vendor_id, vendor_stats.combine(
+                {'total_products': len(new_products)},
+                *(vendor_stats.option_counts(option.quantity) for option in options),
+            ))
+        if images:
+            from backend.image_variants import schedule_variants_for
+            schedule_variants_for(ProductImage, [image.pk for image in images])
+
+
+def _open_archive(job):
+    if not job.images_zip:
+        return None
+    job.images_zip.open('rb')
+    return zipfile.ZipFile(job.images_zip.file)
+
+
+def _count_rows(job):
+    with job.manifest.open('rb') as f:
+        return sum(1 for _ in iter_manifest_rows(f, job.manifest.name))
+
+
+def claim_job(job_id):
+    """Atomically mark a job RUNNING if it is pending, failed or stale. Returns True if claimed."""
+    from backend.models import CatalogImportJob
+
+    now = timezone.now()
+    stale = now - datetime.timedelta(minutes=_setting('CATALOG_IMPORT_STALE_MINUTES', 5))
+    claimable = (
+        Q(status__in=[CatalogImportJob.STATUS_PENDING, CatalogImportJob.STATUS_FAILED])
+        | Q(status=CatalogImportJob.STATUS_RUNNING, heartbeat_at__lt=stale)
+    )
+    return CatalogImportJob.objects.filter(claimable, pk=job_id).update(
+        status=CatalogImportJob.STATUS_RUNNING, heartbeat_at=now, message='',
+    ) == 1
+
+
+def run_job(job_id):
+    """Claim and run (or resume) an import job. Returns the job."""
+    from backend.models import CatalogImportJob
+
+    if not claim_job(job_id):
+        return CatalogImportJob.objects.get(pk=job_id)
+
+    job = CatalogImportJob.objects.get(pk=job_id)
+    if job.started_at is None:
+        job.started_at = timezone.now()
+        job.save(update_fields=['started_at'])
+
+    archive = None
+    try:
+        if job.rows_total is None:
+            job.rows_total = _count_rows(job)
+            job.save(update_fields=['rows_total'])
+
+        run = _Run(job)
+        archive = _open_archive(job)
+        batch_size = max(1, int(_setting('CATALOG_IMPORT_BATCH_SIZE', 200)))
+        batch = []
+        with job.manifest.open('rb') as f:
+            for row_number, row in enumerate(iter_manifest_rows(f, job.manifest.name), start=1):
+                if row_number <= job.rows_processed:
+                    continue  # committed by an earlier run
+                batch.append((row_number, row))
+                if len(batch) >= batch_size:
+                    run.process_batch(batch, archive)
+                    batch = []
+            if batch:
+                run.process_batch(batch, archive)
+
+        job.status = CatalogImportJob.STATUS_COMPLETED
+        job.message = (
+            f'{job.products_created} products, {job.options_created} options, '
+            f'{job.images_created} images; {job.error_count} row error(s)'
+        )
+    except JobTakenOver:
+        logger.warning('Catalog import %s was taken over by another runner', job_id)
+        return CatalogImportJob.objects.get(pk=job_id)
+    except Exception as e:
+        logger.exception('Catalog import %s failed', job_id)
+        job.status = CatalogImportJob.STATUS_FAILED
+        job.message = f'Stopped after row {job.rows_processed}: {e}'
+    finally:
+        if archive is not None:
+            archive.close()
+            job.images_zip.close()
+
+    job.finished_at = timezone.now()
+    job.heartbeat_at = job.finished_at
+    job.save(update_fields=['status', 'message', 'finished_at', 'heartbeat_at'])
+    return job
+
+
+def start_job(job_id):
+    """Run a job in a background thread of this process (resume later with run_catalog_imports)."""
+    def _target():
+        close_old_connections()
+        try:
+            run_job(job_id)
+        finally:
+            connection.close()
+
+    # Start after the job row is committed
+    transaction.on_commit(
+        lambda: threading.Thread(target=_target, name=f'catalog-import-{job_id}', daemon=True).start()
+    )
+
+
+def job_status(job):
+    """JSON-serializable job status for the API."""
+    return {
+        'id': str(job.id),
+        'status': job.status,
+        'rows_total': job.rows_total,
+        'rows_processed': job.rows_processed,
+        'products_created': job.products_created,
+        'options_created': job.options_created,
+        'images_created': job.images_created,
+        'error_count': job.error_count,
+        'errors': job.errors,
+        'message': job.message,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
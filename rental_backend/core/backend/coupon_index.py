@@ -0,0 +1,295 @@
+"""
+In-process coupon eligibility index behind coupon validation
+(utils.validate_coupon_and_calculate_discount) and POST /api/cart/best-coupon/.
+
+Active, unexpired coupons are compiled once into CompiledCoupon records: the
+discount terms, time window, minimum amount, first-order flag, per-user limit
+and the applicable product / category / service id sets. Checking a code, or
+every coupon against a cart, then needs no coupon queries. What a check still reads
+from the database, once per cart and only when some candidate needs it:
+    the cart's product and category ids (coupons restricted to either),
+    whether the user has ordered before (first-order coupons),
+    total uses of coupons with a usage limit, and the user's own uses of
+    coupons with a per-user limit (both change on every use, so they are not
+    part of the index; see backend/coupon_usage.py).
+
+backend/signals.py marks the index stale after a coupon or its applicable sets
+change; other processes notice through a fingerprint (coupon count / latest
+updated_at and the sizes of the applicable sets) checked at most every
+COUPON_INDEX_CHECK_SECONDS.
+"""
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from backend import coupon_usage
+
+MSG_REQUIRED = 'Coupon code is required'
+MSG_INVALID = 'Invalid or expired coupon code'
+MSG_NOT_YET_VALID = 'This coupon is not yet valid'
+MSG_USAGE_LIMIT = coupon_usage.MSG_USAGE_LIMIT
+MSG_PER_USER_LIMIT = coupon_usage.MSG_PER_USER_LIMIT
+MSG_FIRST_ORDER = 'This coupon is valid for first order only'
+MSG_SERVICE = 'This coupon is not applicable to this service'
+MSG_CART_ITEMS = 'This coupon is not applicable to your cart items'
+MSG_APPLIED = 'Coupon applied successfully'
+
+_lock = threading.Lock()
+_index = None
+_stale = False
+
+
+def _key(pk):
+    return str(pk).strip().lower()
+
+
+class CompiledCoupon:
+    __slots__ = (
+        'pk', 'code', 'description', 'discount_type', 'discount_value', 'minimum_order_amount',
+        'maximum_discount_amount', 'valid_from', 'valid_until', 'usage_limit', 'first_order_only',
+        'per_user_limit', 'product_ids', 'category_ids', 'service_ids',
+    )
+
+    def __init__(self, row, product_ids, category_ids, service_ids):
+        for field, value in row.items():
+            setattr(self, field, value)
+        self.product_ids = frozenset(product_ids)
+        self.category_ids = frozenset(category_ids)
+        self.service_ids = frozenset(service_ids)
+
+    def discount(self, cart_total):
+        """Whole-rupee discount on cart_total (capped, never above the total)."""
+        from backend.models import Coupon
+
+        cart_total = Decimal(str(cart_total))
+        if self.discount_type == Coupon.DISCOUNT_PERCENTAGE:
+            discount = (cart_total * self.discount_value) / Decimal('100')
+        else:
+            discount = self.discount_value
+        if self.maximum_discount_amount is not None and self.maximum_discount_amount > 0:
+            discount = min(discount, self.maximum_discount_amount)
+        return min(int(discount), int(cart_total))
+
+    def as_model(self):
+        """A Coupon instance with this row's pk and terms, built without a query (used_count is not loaded)."""
+        from backend.models import Coupon
+
+        return Coupon(pk=self.pk, **{
+            field: getattr(self, field) for field in self.__slots__
+            if field not in ('pk', 'product_ids', 'category_ids', 'service_ids')
+        })
+
+
+class CouponIndex:
+    def __init__(self, coupons):
+        self.coupons = coupons
+        self.by_code = {coupon.code.upper(): coupon for coupon in coupons}
+
+
+# =============================================================================
+# BUILD / INVALIDATION
+# =============================================================================
+
+def _fingerprint():
+    from backend.models import Coupon
+
+    return (
+        tuple(Coupon.objects.aggregate(n=Count('id'), at=Max('updated_at')).values())
+        + tuple(getattr(Coupon, field).through.objects.count() for field in (
+            'applicable_products', 'applicable_categories', 'applicable_services',
+        ))
+    )
+
+
+def _load():
+    from backend.models import Coupon
+
+    fingerprint = _fingerprint()
+    rows = list(Coupon.objects.filter(is_active=True, valid_until__gte=timezone.now()).values(
+        'pk', 'code', 'description', 'discount_type', 'discount_value', 'minimum_order_amount',
+        'maximum_discount_amount', 'valid_from', 'valid_until', 'usage_limit', 'first_order_only', 'per_user_limit',
+    ))
+    coupon_ids = [row['pk'] for row in rows]
+    applicable = {}
+    for field, target in (
+        ('applicable_products', 'product_id'),
+        ('applicable_categories', 'category_id'),
+        ('applicable_services', 'service_id'),
+    ):
+        for coupon_id, target_id in getattr(Coupon, field).through.objects.filter(
+            coupon_id__in=coupon_ids,
+        ).values_list('coupon_id', target):
+            applicable.setdefault((field, coupon_id), []).append(_key(target_id))
+
+    index = CouponIndex([
+        CompiledCoupon(
+            row,
+            applicable.get(('applicable_products', row['pk']), ()),
+            applicable.get(('applicable_categories', row['pk']), ()),
+            applicable.get(('applicable_services', row['pk']), ()),
+        )
+        for row in rows
+    ])
+    index.fingerprint = fingerprint
+    index.checked_at = time.monotonic()
+    return index
+
+
+def _mark_stale():
+    global _stale
+    with _lock:
+        _stale = True
+
+
+def invalidate():
+    """Rebuild the index on next use, once the current transaction commits."""
+    transaction.on_commit(_mark_stale)
+
+
+def get_index():
+    global _index, _stale
+    with _lock:
+        now = time.monotonic()
+        check_every = getattr(settings, 'COUPON_INDEX_CHECK_SECONDS', 60)
+        if _index is not None and not _stale and now - _index.checked_at >= check_every:
+            if _fingerprint() == _index.fingerprint:
+                _index.checked_at = now
+            else:
+                _stale = True
+        if _index is None or _stale:
+            _stale = False
+            _index = _load()
+        return _index
+
+
+# =============================================================================
+# EVALUATION
+# =============================================================================
+
+class CartContext:
+    """
+    One cart (or service booking) being checked against coupons. Database
+    facts a coupon may need are loaded on first use and shared by all coupons.
+    """
+
+    def __init__(self, user, cart_total, product_option_ids=None, product_ids=None, service_ids=None):
+        self.user = user
+        self.cart_total = cart_total
+        self.product_option_ids = list(product_option_ids or [])
+        self._product_ids = {_key(pk) for pk in product_ids} if product_ids else None
+        self.service_ids = {_key(pk) for pk in service_ids or []}
+        self._category_ids = None
+        self._has_orders = None
+        self._used_counts = {}
+        self._user_uses = {}
+
+    def _resolve_products(self):
+        from backend.models import Product, ProductOption
+
+        if self._product_ids is not None:
+            pairs = Product.objects.filter(id__in=self._product_ids).values_list('id', 'category_id')
+        elif self.product_option_ids:
+            pairs = ProductOption.objects.filter(id__in=self.product_option_ids).values_list(
+                'product_id', 'product__category_id',
+            )
+        else:
+            pairs = []
+        pairs = list(pairs)
+        if self._product_ids is None:
+            self._product_ids = {_key(product_id) for product_id, _ in pairs}
+        self._category_ids = {_key(category_id) for _, category_id in pairs if category_id is not None}
+
+    @property
+    def product_ids(self):
+        if self._product_ids is None:
+            self._resolve_products()
+        return self._product_ids
+
+    @property
+    def category_ids(self):
+        if self._category_ids is None:
+            self._resolve_products()
+        return self._category_ids
+
+    @property
+    def has_orders(self):
+        if self._has_orders is None:
+            from backend.models import Order
+            self._has_orders = Order.objects.filter(user=self.user).exists()
+        return self._has_orders
+
+    def load_used_counts(self, coupons):
+        wanted = [c.pk for c in coupons if c.usage_limit > 0 and c.pk not in self._used_counts]
+        if wanted:
+            self._used_counts.update(coupon_usage.used_counts(wanted))
+
+    def used_count(self, coupon):
+        if coupon.pk not in self._used_counts:
+            self.load_used_counts([coupon])
+        # A coupon deleted since the index was built has no row left
+        return self._used_counts.get(coupon.pk, coupon.usage_limit)
+
+    def load_user_uses(self, coupons):
+        wanted = [c.pk for c in coupons if c.per_user_limit > 0 and c.pk not in self._user_uses]
+        if wanted:
+            counts = coupon_usage.user_use_counts(self.user, wanted)
+            self._user_uses.update({pk: counts.get(pk, 0) for pk in wanted})
+
+    def user_uses(self, coupon):
+        if coupon.pk not in self._user_uses:
+            self.load_user_uses([coupon])
+        return self._user_uses[coupon.pk]
+
+
+def evaluate(coupon, context, now=None):
+    """(eligible, message, discount) for one compiled coupon against a cart, checks in the order users see them."""
+    now = now or timezone.now()
+    if now < coupon.valid_from:
+        return False, MSG_NOT_YET_VALID, 0
+    if now > coupon.valid_until:
+        return False, MSG_INVALID, 0
+    if coupon.usage_limit > 0 and context.used_count(coupon) >= coupon.usage_limit:
+        return False, MSG_USAGE_LIMIT, 0
+    if coupon.per_user_limit > 0 and context.user_uses(coupon) >= coupon.per_user_limit:
+        return False, MSG_PER_USER_LIMIT, 0
+    if coupon.first_order_only and context.has_orders:
+        return False, MSG_FIRST_ORDER, 0
+    if Decimal(str(context.cart_total)) < coupon.minimum_order_amount:
+        return False, f'Minimum order value of ₹{coupon.minimum_order_amount} required for this coupon', 0
+
+    if context.service_ids:
+        # Service booking: only the service restriction applies
+        if coupon.service_ids and not (context.service_ids & coupon.service_ids):
+            return False, MSG_SERVICE, 0
+    else:
+        if coupon.product_ids and not (context.product_ids & coupon.product_ids):
+            return False, MSG_CART_ITEMS, 0
+        if coupon.category_ids and not (context.category_ids & coupon.category_ids):
+            return False, MSG_CART_ITEMS, 0
+    return True, MSG_APPLIED, coupon.discount(context.cart_total)
+
+
+def find(code):
+    """The compiled active coupon for a code, or None."""
+    return get_index().by_code.get((code or '').strip().upper())
+
+
+def applicable_coupons(context):
+    """[(discount, coupon)] of every active coupon the cart qualifies for, best first."""
+    now = timezone.now()
+    coupons = [c for c in get_index().coupons if c.valid_from <= now <= c.valid_until]
+    context.load_used_counts(coupons)
+    context.load_user_uses(coupons)
+    found = []
+    for coupon in coupons:
+        eligible, _, discount = evaluate(coupon, context, now)
+        if eligible and discount > 0:
+            found.append((discount, coupon))
+    # Equal discounts: alphabetical by code, so the answer is stable
+    found.sort(key=lambda pair: (-pair[0], pair[1].code))
+    return found
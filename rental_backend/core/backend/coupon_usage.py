@@ -0,0 +1,140 @@
+"""
+Coupon usage accounting at checkout.
+
+redeem() claims one use of a coupon inside the checkout's transaction:
+    per user:  a CouponUsage row taking the lowest free number in
+               1..per_user_limit; the conditional unique index (coupon, user,
+               use_number) rejects a second checkout racing for the same
+               number, so only that user's checkouts ever wait on each other;
+    globally:  UPDATE coupon SET used_count = used_count + 1
+               WHERE used_count < usage_limit (or no limit), checked in SQL.
+Nothing is read and then written back, so a limit can't be exceeded.
+
+The global UPDATE locks the coupon row until the checkout commits, which
+queues concurrent checkouts of one popular code. Such codes can spread the
+counter over CouponCounterShard rows (`python manage.py coupon_counter_shards
+CODE --shards N`): the remaining limit is split between the shards and a use
+is claimed from a random shard with room, with the same conditional UPDATE.
+
+backend/tests.py (CouponRedeemConcurrencyTests, PostgreSQL only) redeems a
+coupon from many threads and checks the limits held.
+"""
+import random
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+MSG_USAGE_LIMIT = 'This coupon has reached its usage limit'
+MSG_PER_USER_LIMIT = 'You have already used this coupon'
+
+
+class CouponUnavailable(Exception):
+    """A coupon limit was reached while redeeming; the message is shown to the user."""
+
+
+# =============================================================================
+# CLAIMS
+# =============================================================================
+
+def _record_user_use(coupon, user, order=None, service_booking=None):
+    from backend.models import CouponUsage
+
+    fields = {'coupon_id': coupon.pk, 'user': user, 'order': order, 'service_booking': service_booking}
+    if not coupon.per_user_limit:
+        return CouponUsage.objects.create(use_number=0, **fields)
+
+    # Claim the lowest free number, not count + 1: a usage deleted with its
+    # order or booking leaves a gap below the highest number taken
+    taken = list(CouponUsage.objects.filter(coupon_id=coupon.pk, user=user).values_list('use_number', flat=True))
+    if len(taken) >= coupon.per_user_limit:
+        raise CouponUnavailable(MSG_PER_USER_LIMIT)
+    for number in sorted(set(range(1, coupon.per_user_limit + 1)) - set(taken)):
+        try:
+            with transaction.atomic():
+                return CouponUsage.objects.create(use_number=number, **fields)
+        except IntegrityError:
+            # Another checkout of this user took the number; try the next
+            continue
+    raise CouponUnavailable(MSG_PER_USER_LIMIT)
+
+
+def _claim_global(coupon):
+    from backend.models import Coupon, CouponCounterShard
+
+    shards = list(CouponCounterShard.objects.filter(coupon_id=coupon.pk).values_list('shard', flat=True))
+    if not shards:
+        return bool(Coupon.objects.filter(
+            Q(usage_limit__lte=0) | Q(used_count__lt=F('usage_limit')), pk=coupon.pk,
+        ).update(used_count=F('used_count') + 1))
+
+    # Random order: checkouts spread over the shards, a full one only costs one more UPDATE
+    random.shuffle(shards)
+    for shard in shards:
+        if CouponCounterShard.objects.filter(
+            Q(capacity__isnull=True) | Q(used__lt=F('capacity')), coupon_id=coupon.pk, shard=shard,
+        ).update(used=F('used') + 1):
+            return True
+    return False
+
+
+def redeem(coupon, user, order=None, service_booking=None):
+    """
+    Claim one use of the coupon for the user and record it (returns the
+    CouponUsage). Call inside the checkout's transaction, after its other
+    writes: the claimed counter row stays locked until commit. Raises
+    CouponUnavailable, with nothing recorded, when a limit is reached.
+    """
+    with transaction.atomic():
+        usage = _record_user_use(coupon, user, order, service_booking)
+        if not _claim_global(coupon):
+            raise CouponUnavailable(MSG_USAGE_LIMIT)
+    return usage
+
+
+# =============================================================================
+# COUNTS / SHARDS
+# =============================================================================
+
+def used_counts(coupon_ids):
+    """{coupon_id: total uses} (used_count plus shard counters)."""
+    from backend.models import Coupon
+
+    rows = Coupon.objects.filter(pk__in=coupon_ids).annotate(shard_used=Sum('counter_shards__used'))
+    return {pk: used + (shard_used or 0) for pk, used, shard_used in rows.values_list('pk', 'used_count', 'shard_used')}
+
+
+def user_use_counts(user, coupon_ids):
+    """{coupon_id: uses by this user}."""
+    from backend.models import CouponUsage
+
+    rows = CouponUsage.objects.filter(user=user, coupon_id__in=coupon_ids).values('coupon_id').annotate(n=Count('pk'))
+    return {row['coupon_id']: row['n'] for row in rows}
+
+
+def set_shards(coupon_id, shards):
+    """
+    Spread a coupon's counter over `shards` rows (0 = back to the single
+    used_count). Existing shard counts are folded into used_count first and the
+    remaining usage_limit is split evenly. Returns the total uses so far.
+    """
+    from backend import coupon_index
+    from backend.models import Coupon, CouponCounterShard
+
+    with transaction.atomic():
+        coupon = Coupon.objects.select_for_update().get(pk=coupon_id)
+        current = CouponCounterShard.objects.select_for_update().filter(coupon=coupon)
+        used = coupon.used_count + sum(current.values_list('used', flat=True))
+        current.delete()
+        Coupon.objects.filter(pk=coupon.pk).update(used_count=used)
+
+        remaining = max(coupon.usage_limit - used, 0) if coupon.usage_limit > 0 else None
+        CouponCounterShard.objects.bulk_create([
+            CouponCounterShard(
+                coupon=coupon,
+                shard=shard,
+                capacity=None if remaining is None else remaining // shards + (1 if shard < remaining % shards else 0),
+            )
+            for shard in range(shards)
+        ])
+        coupon_index.invalidate()
+    return used
@@ -0,0 +1,270 @@
+"""
+In-process spatial indexes for "near me" lookups (GET /api/nearby/).
+
+Two indexes, each a KDTree over points on the unit sphere:
+    locations: active ServiceableLocation rows with coordinates;
+    services:  listed services (artists) at their service vendor's position,
+               i.e. ServiceVendor.latitude/longitude, or the coordinates of the
+               vendor's pincode (ServiceableLocation, else the offline pincode
+               centroid) when the vendor has not shared a GPS fix.
+Points are stored as 3-d unit vectors, so straight-line (chord) distance
+orders them exactly like great-circle distance; results carry haversine
+metres from backend.geo_utils. Nothing here calls an external geocoder.
+
+Indexes are built on first use. backend/signals.py marks them stale after a
+relevant save/delete commits; changes made by other processes (or through
+queryset.update) are noticed by a row count / updated_at fingerprint checked at
+most every GEO_INDEX_CHECK_SECONDS.
+"""
+import heapq
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+
+from backend import pincode_geocoder
+from backend.geo_utils import EARTH_RADIUS_M, haversine_m
+
+INDEX_LOCATIONS = 'locations'
+INDEX_SERVICES = 'services'
+
+_lock = threading.Lock()
+_indexes = {}  # name -> _Index
+_stale = set()
+
+
+def _unit_vector(lat, lng):
+    lat, lng = math.radians(float(lat)), math.radians(float(lng))
+    cos_lat = math.cos(lat)
+    return cos_lat * math.cos(lng), cos_lat * math.sin(lng), math.sin(lat)
+
+
+def _chord(metres):
+    """Chord length on the unit sphere for a great-circle distance in metres."""
+    return 2 * math.sin(min(metres / EARTH_RADIUS_M, math.pi) / 2)
+
+
+# =============================================================================
+# KD-TREE
+# =============================================================================
+
+class KDTree:
+    """
+    Static 3-d tree over (lat, lng, key) points.
+
+    nearest() and within() return [(distance_m, key)] sorted by distance.
+    """
+
+    def __init__(self, points):
+        self._points = [(lat, lng, key, _unit_vector(lat, lng)) for lat, lng, key in points]
+        # Flat node arrays: point index, split axis, left child, right child (-1 = none)
+        self._point, self._axis, self._left, self._right = [], [], [], []
+        self._root = self._build(list(range(len(self._points))), 0)
+
+    def __len__(self):
+        return len(self._points)
+
+    def _build(self, indexes, depth):
+        if not indexes:
+            return -1
+        axis = depth % 3
+        indexes.sort(key=lambda i: self._points[i][3][axis])
+        middle = len(indexes) // 2
+        node = len(self._point)
+        self._point.append(indexes[middle])
+        self._axis.append(axis)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._left[node] = self._build(indexes[:middle], depth + 1)
+        self._right[node] = self._build(indexes[middle + 1:], depth + 1)
+        return node
+
+    def _search(self, target, limit, k):
+        """Points within chord `limit` of target, k closest when k is set: [(chord², point index)]."""
+        best = []  # max-heap of (-chord², point index)
+        limit_sq = limit * limit
+        stack = [self._root] if self._root != -1 else []
+        while stack:
+            node = stack.pop()
+            index = self._point[node]
+            vector = self._points[index][3]
+            dist_sq = sum((a - b) ** 2 for a, b in zip(vector, target))
+            if dist_sq <= limit_sq:
+                if k is None or len(best) < k:
+                    heapq.heappush(best, (-dist_sq, index))
+                elif dist_sq < -best[0][0]:
+                    heapq.heapreplace(best, (-dist_sq, index))
+                if k is not None and len(best) == k:
+                    limit_sq = -best[0][0]
+
+            delta = target[self._axis[node]] - vector[self._axis[node]]
+            near, far = (self._right[node], self._left[node]) if delta > 0 else (self._left[node], self._right[node])
+            # Visit the far side only if the splitting plane is within reach (pushed first = visited last)
+            if far != -1 and delta * delta <= limit_sq:
+                stack.append(far)
+            if near != -1:
+                stack.append(near)
+        return sorted((-neg, index) for neg, index in best)
+
+    def _results(self, lat, lng, found):
+        results = []
+        for _, index in found:
+            p_lat, p_lng, key, _ = self._points[index]
+            results.append((haversine_m(lat, lng, p_lat, p_lng), key))
+        results.sort(key=lambda r: r[0])
+        return results
+
+    def nearest(self, lat, lng, k=1, max_distance_m=None):
+        limit = 2.0 if max_distance_m is None else _chord(max_distance_m)
+        return self._results(lat, lng, self._search(_unit_vector(lat, lng), limit, max(int(k), 1)))
+
+    def within(self, lat, lng, radius_m):
+        return self._results(lat, lng, self._search(_unit_vector(lat, lng), _chord(radius_m), None))
+
+
+# =============================================================================
+# INDEX SOURCES
+# =============================================================================
+
+def _location_points():
+    from backend.models import ServiceableLocation
+
+    rows = ServiceableLocation.objects.filter(
+        is_active=True, latitude__isnull=False, longitude__isnull=False,
+    ).values(
+        'pincode', 'area_name', 'city', 'state', 'latitude', 'longitude',
+        'rent_available', 'service_available', 'delivery_charge', 'delivery_time',
+    )
+    points, payloads = [], {}
+    for row in rows:
+        row['latitude'], row['longitude'] = float(row['latitude']), float(row['longitude'])
+        points.append((row['latitude'], row['longitude'], row['pincode']))
+        payloads[row['pincode']] = row
+    return points, payloads
+
+
+def _service_points():
+    from backend.models import Service, ServiceableLocation
+
+    pincode_coords = {
+        pincode: (float(lat), float(lng))
+        for pincode, lat, lng in ServiceableLocation.objects.filter(
+            latitude__isnull=False, longitude__isnull=False,
+        ).values_list('pincode', 'latitude', 'longitude')
+    }
+    rows = Service.objects.filter(
+        availability=True, service_vendor__is_active=True,
+    ).values_list(
+        'id', 'service_vendor_id', 'service_vendor__latitude', 'service_vendor__longitude', 'service_vendor__pincode',
+    )
+    points, payloads = [], {}
+    for service_id, vendor_id, lat, lng, pincode in rows:
+        if lat is not None and lng is not None:
+            position, located_by = (float(lat), float(lng)), 'gps'
+        else:
+            pincode = (pincode or '').strip()
+            position, located_by = pincode_coords.get(pincode), 'pincode'
+            if position is None and pincode:
+                position = pincode_geocoder.get_index().pincode_point(pincode)
+        if position is None:
+            continue
+        points.append((position[0], position[1], service_id))
+        payloads[service_id] = {'service_vendor_id': vendor_id, 'located_by': located_by}
+    return points, payloads
+
+
+def _fingerprint_location():
+    from backend.models import ServiceableLocation
+    return tuple(ServiceableLocation.objects.aggregate(n=Count('id'), at=Max('updated_at')).values())
+
+
+def _fingerprint_services():
+    from backend.models import Service, ServiceVendor
+    return (
+        tuple(Service.objects.aggregate(n=Count('id'), at=Max('updated_at')).values())
+        + tuple(ServiceVendor.objects.aggregate(n=Count('id'), at=Max('updated_at')).values())
+        + _fingerprint_location()
+        + pincode_geocoder.get_index().fingerprint
+    )
+
+
+_SOURCES = {
+    INDEX_LOCATIONS: (_location_points, _fingerprint_location),
+    INDEX_SERVICES: (_service_points, _fingerprint_services),
+}
+
+
+class _Index:
+    def __init__(self, name):
+        load_points, fingerprint = _SOURCES[name]
+        self.fingerprint = fingerprint()
+        points, self.payloads = load_points()
+        self.tree = KDTree(points)
+        self.checked_at = time.monotonic()
+
+
+# =============================================================================
+# INVALIDATION
+# =============================================================================
+
+def _mark_stale(names):
+    with _lock:
+        _stale.update(names)
+
+
+def invalidate(*names):
+    """Rebuild these indexes (all when none given) on next use, once the current transaction commits."""
+    names = set(names or _SOURCES)
+    transaction.on_commit(lambda: _mark_stale(names))
+
+
+def get_index(name):
+    with _lock:
+        index = _indexes.get(name)
+        check_every = getattr(settings, 'GEO_INDEX_CHECK_SECONDS', 60)
+        if index is not None and name not in _stale and time.monotonic() - index.checked_at >= check_every:
+            if _SOURCES[name][1]() == index.fingerprint:
+                index.checked_at = time.monotonic()
+            else:
+                index = None
+        if index is None or name in _stale:
+            _stale.discard(name)
+            index = _indexes[name] = _Index(name)
+        return index
+
+
+# =============================================================================
+# QUERIES
+# =============================================================================
+
+def _query(index, lat, lng, k=None, radius_m=None):
+    tree = index.tree
+    if k is None:
+        return tree.within(lat, lng, radius_m)
+    return tree.nearest(lat, lng, k=k, max_distance_m=radius_m)
+
+
+def nearby_locations(lat, lng, k=None, radius_m=None):
+    """Serviceable locations nearest to (lat, lng): k nearest, within radius_m, or k nearest within radius_m."""
+    index = get_index(INDEX_LOCATIONS)
+    return [
+        dict(index.payloads[pincode], distance_m=distance)
+        for distance, pincode in _query(index, lat, lng, k, radius_m)
+    ]
+
+
+def nearest_location(lat, lng, max_distance_m=None):
+    found = nearby_locations(lat, lng, k=1, radius_m=max_distance_m)
+    return found[0] if found else None
+
+
+def nearby_services(lat, lng, k=None, radius_m=None):
+    """[(distance_m, service_id, payload)] for listed services nearest to (lat, lng)."""
+    index = get_index(INDEX_SERVICES)
+    return [
+        (distance, service_id, index.payloads[service_id])
+        for distance, service_id in _query(index, lat, lng, k, radius_m)
+    ]
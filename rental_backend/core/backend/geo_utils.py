@@ -0,0 +1,41 @@
+"""
+Small geo helpers shared by analytics and location features.
+
+Grid cells: the world is split into GRID_SIZE_DEG x GRID_SIZE_DEG squares
+(0.01 deg ~ 1.1 km at the equator). A cell id is a single integer so
+demand-by-area queries are plain index lookups:
+    cell = lat_index * GRID_COLUMNS + lng_index
+Changing GRID_SIZE_DEG invalidates stored cell ids.
+"""
+import math
+
+EARTH_RADIUS_M = 6371000.0
+
+GRID_SIZE_DEG = 0.01
+GRID_COLUMNS = int(round(360 / GRID_SIZE_DEG))
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in metres between two lat/lng points."""
+    lat1, lng1, lat2, lng2 = (math.radians(float(v)) for v in (lat1, lng1, lat2, lng2))
+    dlat = lat2 - lat1
+    dlng = lng2 - lng1
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def grid_cell(lat, lng):
+    """Integer grid cell id containing (lat, lng)."""
+    lat = min(max(float(lat), -90.0), 90.0 - 1e-9)
+    lng = ((float(lng) + 180.0) % 360.0) - 180.0
+    row = int(math.floor((lat + 90.0) / GRID_SIZE_DEG))
+    col = int(math.floor((lng + 180.0) / GRID_SIZE_DEG))
+    return row * GRID_COLUMNS + col
+
+
+def grid_cell_center(cell):
+    """(lat, lng) of the centre of a grid cell id."""
+    row, col = divmod(int(cell), GRID_COLUMNS)
+    lat = row * GRID_SIZE_DEG - 90.0 + GRID_SIZE_DEG / 2
+    lng = col * GRID_SIZE_DEG - 180.0 + GRID_SIZE_DEG / 2
+    return round(lat, 6), round(lng, 6)
@@ -0,0 +1,262 @@
+"""
+Resized WebP variants of uploaded images.
+
+Every model listed in VARIANT_MODELS gets an `image_variants` JSON field:
+    {'source': '<original name>', 'thumb': '<name>', 'medium': '<name>', 'full': '<name>'}
+After an image is saved (backend/signals.py) the variants are rendered in a
+process pool (Pillow work is CPU bound and would otherwise hold the GIL in the
+web process) and stored in the default storage under variants/, named after the
+source file. The row is updated only if its image is still the one that was
+rendered. Content-addressed sources (backend/media_blobs.py) render once: a
+re-upload of the same content reuses the variant files already on disk, which
+are deleted together with the source blob.
+
+Serializers use variant_urls(), which falls back to the original for images
+that have no variants yet, so clients can switch to thumb/medium/full at once.
+Existing media is handled by `python manage.py build_image_variants`.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# name -> longest side in pixels (images are never upscaled)
+VARIANT_SIZES = {
+    'thumb': 240,
+    'medium': 720,
+    'full': 1600,
+}
+
+# (app label.model name, image field); each model has an `image_variants` JSONField
+VARIANT_MODELS = [
+    ('backend.ProductImage', 'image'),
+    ('backend.ServiceImage', 'image'),
+    ('backend.Category', 'image'),
+    ('backend.Slide', 'image'),
+    ('backend.HomeBanner', 'image'),
+    ('backend.PageItem', 'image'),
+    ('backend.HomePageItem', 'image'),
+]
+
+VARIANT_DIR = 'variants'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# =============================================================================
+# RENDERING (runs in worker processes; Pillow only, no Django)
+# =============================================================================
+
+def render_variants(data, sizes, quality):
+    """
+    Render WebP variants of one image.
+    Returns {variant: bytes}; raises on undecodable input.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+
+        out = {}
+        # Largest first so each smaller variant resamples an already reduced image
+        for name, size in sorted(sizes.items(), key=lambda kv: -kv[1]):
+            img.thumbnail((size, size), Image.LANCZOS)
+            buf = io.BytesIO()
+            img.save(buf, 'WEBP', quality=quality, method=4)
+            out[name] = buf.getvalue()
+        return out
+
+
+def get_pool():
+    """Process pool shared by uploads in this process (spawned lazily)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, int(_setting('IMAGE_VARIANT_WORKERS', 2))),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+# =============================================================================
+# STORAGE
+# =============================================================================
+
+def variant_name(source_name, variant):
+    root, _ = os.path.splitext(source_name)
+    return f'{VARIANT_DIR}/{root}_{variant}.webp'
+
+
+def delete_source_variants(source_name):
+    """Delete the variant files rendered from one source file."""
+    for variant in (_setting('IMAGE_VARIANT_SIZES', None) or VARIANT_SIZES):
+        name = variant_name(source_name, variant)
+        try:
+            default_storage.delete(name)
+        except Exception:
+            logger.warning('Could not delete image variant %s', name)
+
+
+def existing_variants(source_name):
+    """Variants dict for a content-addressed source whose variant files already exist, else None."""
+    from backend.media_blobs import is_blob_name
+
+    if not is_blob_name(source_name):
+        return None
+    variants = {'source': source_name}
+    for variant in (_setting('IMAGE_VARIANT_SIZES', None) or VARIANT_SIZES):
+        name = variant_name(source_name, variant)
+        if not default_storage.exists(name):
+            return None
+        variants[variant] = name
+    return variants
+
+
+def read_source(field_file):
+    field_file.open('rb')
+    try:
+        return field_file.read()
+    finally:
+        field_file.close()
+
+
+def store_variants(instance, field_name, source_name, rendered):
+    """
+    Save rendered variants and record them on the row, unless the row's image
+    changed (or the row was deleted) in the meantime. Returns True if recorded.
+    """
+    variants = {'source': source_name}
+    for variant, data in rendered.items():
+        name = variant_name(source_name, variant)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        variants[variant] = default_storage.save(name, ContentFile(data))
+    return record_variants(instance, field_name, variants)
+
+
+def record_variants(instance, field_name, variants):
+    model = type(instance)
+    updated = model.objects.filter(pk=instance.pk, **{field_name: variants['source']}).update(
+        image_variants=variants,
+    )
+    if updated:
+        instance.image_variants = variants
+    return bool(updated)
+
+
+def needs_variants(instance, field_name='image'):
+    field_file = getattr(instance, field_name)
+    return bool(field_file) and (instance.image_variants or {}).get('source') != field_file.name
+
+
+def submit_variants(instance, field_name='image', pool=None):
+    """Read the image and queue its rendering. Returns (source name, future)."""
+    field_file = getattr(instance, field_name)
+    source_name = field_file.name
+    data = read_source(field_file)
+    sizes = _setting('IMAGE_VARIANT_SIZES', None) or VARIANT_SIZES
+    quality = int(_setting('IMAGE_VARIANT_QUALITY', 80))
+    return source_name, (pool or get_pool()).submit(render_variants, data, sizes, quality)
+
+
+def generate_variants(instances, field_name='image', pool=None, reuse=True):
+    """
+    Render variants for several rows in parallel, then store them. Keep the batch
+    modest: every source image is held in memory until its variants are stored.
+    Returns (recorded, failed).
+    """
+    pending = []
+    recorded = failed = 0
+    for instance in instances:
+        if not needs_variants(instance, field_name):
+            continue
+        existing = existing_variants(getattr(instance, field_name).name) if reuse else None
+        if existing:
+            recorded += record_variants(instance, field_name, existing)
+            continue
+        try:
+            pending.append((instance, *submit_variants(instance, field_name, pool)))
+        except Exception:
+            failed += 1
+            logger.exception('Could not read image of %s %s', type(instance).__name__, instance.pk)
+
+    for instance, source_name, future in pending:
+        try:
+            if store_variants(instance, field_name, source_name, future.result()):
+                recorded += 1
+        except Exception:
+            failed += 1
+            logger.exception('Image variants failed for %s %s', type(instance).__name__, instance.pk)
+    return recorded, failed
+
+
+# =============================================================================
+# SCHEDULING
+# =============================================================================
+
+def _generate_in_background(model, pks, field_name):
+    try:
+        generate_variants(model.objects.filter(pk__in=pks), field_name)
+    except Exception:
+        logger.exception('Image variants failed for %s %s', model.__name__, pks)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(instance, field_name='image'):
+    """Render variants for `instance` after the current transaction commits."""
+    if needs_variants(instance, field_name):
+        schedule_variants_for(type(instance), [instance.pk], field_name)
+
+
+def schedule_variants_for(model, pks, field_name='image'):
+    """Render variants for rows written without signals (bulk_create) after commit."""
+    pks = [pk for pk in pks if pk is not None]
+    if not pks or not _setting('IMAGE_VARIANTS_ENABLED', True):
+        return
+
+    def start():
+        threading.Thread(
+            target=_generate_in_background, args=(model, pks, field_name),
+            name=f'image-variants-{model.__name__}', daemon=True,
+        ).start()
+
+    transaction.on_commit(start)
+
+
+# =============================================================================
+# READ
+# =============================================================================
+
+def variant_urls(field_file, variants, request=None):
+    """
+    {'thumb', 'medium', 'full'} absolute URLs for an image field. Missing or
+    outdated variants fall back to the original image URL; None without an image.
+    """
+    if not field_file:
+        return {variant: None for variant in VARIANT_SIZES}
+    variants = variants or {}
+    fresh = variants.get('source') == field_file.name
+    urls = {}
+    for variant in VARIANT_SIZES:
+        name = variants.get(variant) if fresh else None
+        url = default_storage.url(name) if name else field_file.url
+        urls[variant] = request.build_absolute_uri(url) if request else url
+    return urls
@@ -0,0 +1,49 @@
+"""
+Fill OrderedProduct.vendor from product_option.product.vendor for existing rows.
+
+Run from project root (rental_backend/core):
+    python manage.py backfill_ordered_product_vendor          # rows with no vendor yet
+    python manage.py backfill_ordered_product_vendor --all    # re-sync every row (e.g. after moving products between vendors)
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+
+from backend.models import OrderedProduct, ProductOption
+
+
+class Command(BaseCommand):
+    help = "Backfill the denormalized OrderedProduct.vendor used by the vendor order listings."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recompute vendor for every ordered product, not only empty ones.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Rows per UPDATE (default: 2000).',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options.get('batch_size') or 2000)
+        qs = OrderedProduct.objects.all()
+        if not options.get('all'):
+            qs = qs.filter(vendor__isnull=True)
+
+        product_vendor = Subquery(
+            ProductOption.objects.filter(pk=OuterRef('product_option_id')).values('product__vendor_id')[:1]
+        )
+
+        ids = list(qs.order_by('created_at').values_list('id', flat=True))
+        updated = 0
+        for i in range(0, len(ids), batch_size):
+            updated += OrderedProduct.objects.filter(id__in=ids[i:i + batch_size]).update(vendor_id=product_vendor)
+
+        missing = OrderedProduct.objects.filter(vendor__isnull=True).count()
+        self.stdout.write(f"Ordered products updated: {updated}")
+        if missing:
+            self.stdout.write(self.style.WARNING(f"{missing} ordered product(s) still have no vendor (product has no vendor)."))
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,45 @@
+"""
+Incrementally build the rollup tables read by the admin analytics dashboards.
+
+Run from project root (rental_backend/core):
+    python manage.py build_analytics_rollups            # only days with new rows
+    python manage.py build_analytics_rollups --full     # rebuild every day
+
+On Vercel, the cron in vercel.json runs it every 10 minutes through
+GET /api/cron/analytics-rollups/. Elsewhere, schedule it (e.g. cron every 5-15 minutes):
+    */10 * * * * cd /path/to/rental_backend/core && python manage.py build_analytics_rollups
+"""
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from backend.analytics_rollups import build_screen_rollups, build_order_rollups
+
+
+class Command(BaseCommand):
+    help = "Update ScreenDailyRollup / ScreenHourlyRollup / PlatformDailyRollup / OrderDailyRollup past the watermark."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Ignore the watermark and rebuild rollups for every day with data.',
+        )
+        parser.add_argument(
+            '--overlap-minutes',
+            type=int,
+            default=15,
+            help='Re-scan this many minutes behind the watermark for late-arriving events (default: 15).',
+        )
+
+    def handle(self, *args, **options):
+        full = options.get('full', False)
+        overlap = datetime.timedelta(minutes=max(0, options.get('overlap_minutes') or 0))
+
+        screen_days = build_screen_rollups(full=full, overlap=overlap)
+        self.stdout.write(f"Screen/platform rollups: {screen_days} day(s) rebuilt")
+
+        order_days = build_order_rollups(full=full, overlap=overlap)
+        self.stdout.write(f"Order rollups: {order_days} day(s) rebuilt")
+
+        self.stdout.write(self.style.SUCCESS("Analytics rollups up to date."))
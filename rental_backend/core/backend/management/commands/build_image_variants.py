@@ -0,0 +1,60 @@
+"""
+Render thumb/medium/full WebP variants for images that do not have them yet.
+
+Run from project root (rental_backend/core):
+    python manage.py build_image_variants                        # every image model
+    python manage.py build_image_variants --model ProductImage   # one model
+    python manage.py build_image_variants --force                # re-render everything (e.g. after changing sizes)
+
+New uploads get their variants automatically; this is for existing media.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from backend.image_variants import VARIANT_MODELS, generate_variants, needs_variants
+
+
+class Command(BaseCommand):
+    help = "Build resized WebP variants (thumb/medium/full) for existing images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', type=str, default='', help='Only this model (e.g. ProductImage).')
+        parser.add_argument('--force', action='store_true', help='Re-render images that already have variants.')
+        parser.add_argument('--batch-size', type=int, default=50, help='Images read and rendered per batch.')
+        parser.add_argument('--workers', type=int, default=None, help='Render processes (default: CPU count).')
+
+    def handle(self, *args, **options):
+        only = (options.get('model') or '').strip().lower()
+        targets = [(apps.get_model(label), field) for label, field in VARIANT_MODELS]
+        if only:
+            targets = [(m, f) for m, f in targets if m.__name__.lower() == only]
+            if not targets:
+                names = ', '.join(label.split('.')[-1] for label, _ in VARIANT_MODELS)
+                raise CommandError(f'Unknown model "{options["model"]}". Choose from: {names}')
+        batch_size = max(1, options['batch_size'])
+        force = options['force']
+
+        with ProcessPoolExecutor(max_workers=options.get('workers')) as pool:
+            for model, field in targets:
+                recorded = failed = 0
+                qs = model.objects.exclude(Q(**{field: ''}) | Q(**{f'{field}__isnull': True})).order_by('pk')
+                last_pk = None
+                while True:
+                    batch_qs = qs if last_pk is None else qs.filter(pk__gt=last_pk)
+                    batch = list(batch_qs[:batch_size])
+                    if not batch:
+                        break
+                    last_pk = batch[-1].pk
+                    if force:
+                        for instance in batch:
+                            instance.image_variants = {}
+                    todo = [i for i in batch if needs_variants(i, field)]
+                    ok, bad = generate_variants(todo, field, pool=pool, reuse=not force)
+                    recorded += ok
+                    failed += bad
+                self.stdout.write(f"{model.__name__}: {recorded} rendered, {failed} failed")
+
+        self.stdout.write(self.style.SUCCESS("Image variants built."))
@@ -0,0 +1,54 @@
+"""
+Incrementally update session funnel step counts and screen transitions.
+
+Run from project root (rental_backend/core):
+    python manage.py build_session_funnels            # only sessions with new events
+    python manage.py build_session_funnels --full     # rebuild the tracked window (after editing ANALYTICS_FUNNELS)
+
+On Vercel, the cron in vercel.json runs it every 10 minutes through
+GET /api/cron/session-funnels/. Elsewhere, schedule it (e.g. cron every
+5-15 minutes), not concurrently with itself:
+    */10 * * * * cd /path/to/rental_backend/core && python manage.py build_session_funnels
+"""
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from backend.analytics_funnels import build_session_funnels, get_funnels
+
+
+class Command(BaseCommand):
+    help = "Update FunnelStepDaily / ScreenTransitionDaily from ScreenViewEvent rows received since the last run."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Drop session state and rebuild counters for the last --state-days days.',
+        )
+        parser.add_argument(
+            '--overlap-minutes',
+            type=int,
+            default=15,
+            help='Re-scan this many minutes behind the watermark (default: 15). Safe: re-runs are idempotent.',
+        )
+        parser.add_argument(
+            '--state-days',
+            type=int,
+            default=None,
+            help='Track sessions (and accept late events) for this many days (default: ANALYTICS_FUNNEL_STATE_DAYS).',
+        )
+
+    def handle(self, *args, **options):
+        funnels = get_funnels()
+        if not funnels:
+            self.stdout.write(self.style.WARNING("ANALYTICS_FUNNELS is empty; only screen transitions are counted."))
+
+        overlap = datetime.timedelta(minutes=max(0, options.get('overlap_minutes') or 0))
+        sessions, events = build_session_funnels(
+            full=options.get('full', False),
+            overlap=overlap,
+            state_days=options.get('state_days'),
+        )
+        self.stdout.write(f"Sessions updated: {sessions} ({events} event(s) walked)")
+        self.stdout.write(self.style.SUCCESS("Session funnels up to date."))
@@ -0,0 +1,43 @@
+"""
+Spread a busy coupon's usage counter over several rows.
+
+Run from project root (rental_backend/core):
+    python manage.py coupon_counter_shards DIWALI50 --shards 8    # split the remaining limit over 8 rows
+    python manage.py coupon_counter_shards DIWALI50 --shards 0    # back to the single Coupon.used_count
+    python manage.py coupon_counter_shards DIWALI50               # show the shards
+
+Every checkout that redeems a coupon updates its counter row and holds that
+row until the checkout commits (backend/coupon_usage.py). With shards, each
+checkout claims a use from a random shard, so checkouts of one code rarely
+wait on each other. Changing the coupon's usage_limit later re-splits it.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from backend import coupon_usage
+from backend.models import Coupon
+
+
+class Command(BaseCommand):
+    help = "Set (or show) the number of usage counter shards of a coupon."
+
+    def add_arguments(self, parser):
+        parser.add_argument('code', help='Coupon code (case-insensitive).')
+        parser.add_argument('--shards', type=int, help='Number of shards; 0 removes them.')
+
+    def handle(self, *args, **options):
+        coupon = Coupon.objects.filter(code__iexact=options['code'].strip()).first()
+        if coupon is None:
+            raise CommandError(f"No coupon with code {options['code']!r}")
+
+        if options['shards'] is not None:
+            if options['shards'] < 0:
+                raise CommandError('--shards must be 0 or more')
+            used = coupon_usage.set_shards(coupon.pk, options['shards'])
+            self.stdout.write(self.style.SUCCESS(f"{coupon.code}: {options['shards']} shard(s), {used} use(s) so far."))
+
+        coupon.refresh_from_db()
+        limit = coupon.usage_limit if coupon.usage_limit > 0 else 'unlimited'
+        self.stdout.write(f"{coupon.code}: used_count={coupon.used_count}, usage_limit={limit}")
+        for shard in coupon.counter_shards.all():
+            capacity = shard.capacity if shard.capacity is not None else 'unlimited'
+            self.stdout.write(f"  shard {shard.shard}: {shard.used}/{capacity}")
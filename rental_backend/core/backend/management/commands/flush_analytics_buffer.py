@@ -0,0 +1,37 @@
+"""
+Replay analytics buffer segments that were never flushed to the database.
+
+Run from project root (rental_backend/core):
+    python manage.py flush_analytics_buffer
+
+Segments belonging to processes that are no longer running (crashed or killed
+workers) are written with bulk inserts and deleted. Use --force only while the
+app server is stopped: it also replays segments of processes that look alive.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backend.analytics_buffer import AnalyticsBuffer
+
+
+class Command(BaseCommand):
+    help = "Replay unflushed analytics buffer segments (ScreenViewEvent / CustomerLocationPing) into the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Replay every segment, including those of running processes (stop the server first).',
+        )
+
+    def handle(self, *args, **options):
+        buffer = AnalyticsBuffer(
+            directory=settings.ANALYTICS_BUFFER_DIR,
+            durability='flush',
+            flush_size=settings.ANALYTICS_BUFFER_FLUSH_SIZE,
+            flush_seconds=settings.ANALYTICS_BUFFER_FLUSH_SECONDS,
+        )
+        written = buffer.replay_orphans(force=options.get('force', False))
+        # screen_end records whose start is still missing are re-queued in memory; try once more
+        written += buffer.flush()
+        self.stdout.write(self.style.SUCCESS(f"Replayed {written} analytics records from {settings.ANALYTICS_BUFFER_DIR}"))
@@ -0,0 +1,55 @@
+"""
+Delete unreferenced image blobs (content-addressed uploads, see backend/media_blobs.py).
+
+Run from project root (rental_backend/core):
+    python manage.py gc_media_blobs              # delete blobs with no references
+    python manage.py gc_media_blobs --recount    # first recount references from the image tables
+    python manage.py gc_media_blobs --dry-run    # only report
+
+Blobs normally go as soon as their last reference is deleted; this sweeps blobs
+kept for the upload grace period, left by failed requests, or miscounted after
+raw SQL / queryset.update() changes to image fields (use --recount for those).
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from backend.media_blobs import collect, grace_period, referenced_names
+from backend.models import MediaBlob
+
+
+class Command(BaseCommand):
+    help = "Garbage-collect MediaBlob files that no image row references."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recount', action='store_true', help='Recompute ref_count from the image tables first.')
+        parser.add_argument('--dry-run', action='store_true', help='Report without changing anything.')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        if options['recount']:
+            counts = referenced_names()
+            fixed = 0
+            known = set()
+            with transaction.atomic():
+                for blob in MediaBlob.objects.select_for_update().only('pk', 'name', 'ref_count'):
+                    known.add(blob.name)
+                    actual = counts.get(blob.name, 0)
+                    if blob.ref_count != actual:
+                        fixed += 1
+                        if not dry_run:
+                            MediaBlob.objects.filter(pk=blob.pk).update(ref_count=actual)
+            missing = len(set(counts) - known)
+            self.stdout.write(f"Reference counts corrected: {fixed}")
+            if missing:
+                self.stdout.write(self.style.WARNING(f"Referenced blob names without a MediaBlob row: {missing}"))
+
+        candidates = MediaBlob.objects.filter(ref_count=0).exclude(last_uploaded_at__gte=timezone.now() - grace_period())
+        names = list(candidates.values_list('name', flat=True))
+        if dry_run:
+            self.stdout.write(f"Would delete {len(names)} blob(s).")
+            return
+
+        deleted = sum(1 for name in names if collect(name))
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} unreferenced blob(s)."))
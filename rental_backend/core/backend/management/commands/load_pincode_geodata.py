@@ -0,0 +1,48 @@
+"""
+Load or update the offline pincode geocoding dataset (PincodeCentroid).
+
+Run from project root (rental_backend/core):
+    python manage.py load_pincode_geodata all_india_pincode_directory.csv
+    python manage.py load_pincode_geodata data.csv --replace     # drop pincodes missing from the file
+    python manage.py load_pincode_geodata data.csv --backfill    # then fill ServiceableLocation coordinates
+    python manage.py load_pincode_geodata --backfill --overwrite # re-geocode every ServiceableLocation
+
+The CSV is the India Post "All India Pincode Directory" (data.gov.in) or any
+file with pincode, latitude and longitude columns (optional: officename /
+area, district, statename). Offices of one pincode are averaged into one
+centroid; rows with missing or out-of-India coordinates are skipped.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.pincode_geocoder import backfill_locations, read_csv, store_centroids
+
+
+class Command(BaseCommand):
+    help = "Import pincode centroids from a CSV and optionally backfill ServiceableLocation coordinates."
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', nargs='?', help='Pincode directory CSV.')
+        parser.add_argument('--replace', action='store_true', help='Delete pincodes not present in the CSV.')
+        parser.add_argument('--backfill', action='store_true', help='Fill missing ServiceableLocation coordinates.')
+        parser.add_argument('--overwrite', action='store_true', help='With --backfill: replace existing coordinates too.')
+
+    def handle(self, *args, **options):
+        if not options['csv_path'] and not options['backfill']:
+            raise CommandError('Give a CSV path and/or --backfill.')
+
+        if options['csv_path']:
+            try:
+                with open(options['csv_path'], newline='', encoding='utf-8-sig') as f:
+                    centroids, read, skipped = read_csv(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(str(e))
+            if not centroids:
+                raise CommandError(f'No usable rows in {options["csv_path"]} ({read} read, {skipped} skipped).')
+            written = store_centroids(centroids, replace=options['replace'])
+            self.stdout.write(f"Rows read: {read}, skipped: {skipped}, pincodes stored: {written}")
+
+        if options['backfill']:
+            updated, not_found = backfill_locations(overwrite=options['overwrite'])
+            self.stdout.write(f"Serviceable locations updated: {updated}, not found: {not_found}")
+
+        self.stdout.write(self.style.SUCCESS("Pincode geodata loaded."))
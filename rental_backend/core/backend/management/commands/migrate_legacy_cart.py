@@ -0,0 +1,28 @@
+"""
+Move carts still stored in the deprecated User.cart M2M into CartItem.
+
+Run from project root (rental_backend/core):
+    python manage.py migrate_legacy_cart             # move rows and empty User.cart
+    python manage.py migrate_legacy_cart --dry-run   # report what would move
+
+Each leftover row becomes a one-day rental CartItem, unless the user already
+has a CartItem for that option. Cart counters of the affected users are
+recounted. Run once after deploying; nothing writes User.cart any more.
+"""
+from django.core.management.base import BaseCommand
+
+from backend.cart import migrate_legacy
+
+
+class Command(BaseCommand):
+    help = "Move User.cart (M2M) rows into CartItem and empty User.cart."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be moved.')
+
+    def handle(self, *args, **options):
+        moved, duplicates = migrate_legacy(dry_run=options['dry_run'])
+        verb = 'would be moved' if options['dry_run'] else 'moved'
+        self.stdout.write(f"Cart rows {verb}: {moved} (already in CartItem: {duplicates})")
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS("Legacy cart migrated."))
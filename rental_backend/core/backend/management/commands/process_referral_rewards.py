@@ -0,0 +1,38 @@
+"""
+Complete qualified referrals and credit rewards whose hold period has passed.
+
+Run from project root (rental_backend/core):
+    python manage.py process_referral_rewards                  # complete, credit, push
+    python manage.py process_referral_rewards --no-notify      # skip the push notifications
+    python manage.py process_referral_rewards --chunk-size 200
+
+Delivered orders and completed bookings no longer touch referrals when they
+are saved, so this must run on a schedule. On Vercel the hourly cron in
+vercel.json calls /api/cron/referral-rewards/ (needs CRON_SECRET), which does
+the same; elsewhere schedule this command (e.g. cron every hour).
+See backend/referral_rewards.py.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from backend import referral_rewards
+
+
+class Command(BaseCommand):
+    help = "Mark qualified referrals completed and credit the rewards that are past their hold period."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=referral_rewards.DEFAULT_CHUNK_SIZE,
+            help=f'Referrals credited per transaction (default {referral_rewards.DEFAULT_CHUNK_SIZE}).',
+        )
+        parser.add_argument('--no-notify', action='store_true', help='Do not send "wallet credited" pushes.')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        completed, credited = referral_rewards.process(
+            chunk_size=options['chunk_size'], notify=not options['no_notify'],
+        )
+        self.stdout.write(f"Referrals completed: {completed}")
+        self.stdout.write(f"Referrals credited: {len(credited)}")
+        self.stdout.write(self.style.SUCCESS("Referral rewards processed."))
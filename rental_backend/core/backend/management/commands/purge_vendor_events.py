@@ -0,0 +1,27 @@
+"""
+Delete old vendor feed events (see backend/vendor_events.py).
+
+Run from project root (rental_backend/core):
+    python manage.py purge_vendor_events                   # older than VENDOR_EVENT_RETENTION_DAYS
+    python manage.py purge_vendor_events --retain-days 3
+
+Clients only need events since their last poll; schedule this daily.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backend.vendor_events import purge_events
+
+
+class Command(BaseCommand):
+    help = "Delete VendorEvent rows older than the retention window."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retain-days', type=int, default=None,
+            help=f'Keep this many days (default: VENDOR_EVENT_RETENTION_DAYS={settings.VENDOR_EVENT_RETENTION_DAYS}).',
+        )
+
+    def handle(self, *args, **options):
+        deleted = purge_events(options.get('retain_days'))
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} vendor event(s)."))
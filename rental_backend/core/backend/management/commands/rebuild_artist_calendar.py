@@ -0,0 +1,25 @@
+"""
+Recompute the stored artist calendar bitmaps (ArtistCalendarMonth / ArtistDaySlots).
+
+Run from project root (rental_backend/core):
+    python manage.py rebuild_artist_calendar                 # every stored row
+    python manage.py rebuild_artist_calendar --artist <id>   # one artist (Service id)
+
+Rows are built on first read and refreshed on every booking / availability
+change; run this after raw SQL fixes or queryset.update() calls on
+ServiceBooking or ArtistAvailability.
+"""
+from django.core.management.base import BaseCommand
+
+from backend.artist_calendar import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild artist month/day availability bitmaps from ServiceBooking and ArtistAvailability."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--artist', action='append', help='Service id (repeatable). Default: all artists.')
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild(options['artist'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} calendar row(s)."))
@@ -0,0 +1,34 @@
+"""
+Rebuild the service listing read model (ServiceListing / ServicePincode).
+
+Run from project root (rental_backend/core):
+    python manage.py rebuild_service_listings                 # every service
+    python manage.py rebuild_service_listings --pincodes-only # just the pincode map
+
+Both tables are kept up to date on writes; run this once after migrating, and
+after bulk imports, raw SQL fixes or queryset.update() calls that bypass model
+signals.
+"""
+from django.core.management.base import BaseCommand
+
+from backend.models import ServiceListing, ServicePincode
+from backend.service_listing import rebuild_all, refresh_pincodes
+
+
+class Command(BaseCommand):
+    help = "Rebuild ServiceListing and ServicePincode from services, service vendors and locations."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pincodes-only', action='store_true', help='Only rebuild the pincode -> service map.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        if options['pincodes_only']:
+            refresh_pincodes(batch_size=batch_size)
+        else:
+            count = rebuild_all(batch_size=batch_size)
+            self.stdout.write(f"Services rebuilt: {count}")
+            self.stdout.write(f"Listing rows: {ServiceListing.objects.count()}")
+        self.stdout.write(f"Pincode rows: {ServicePincode.objects.count()}")
+        self.stdout.write(self.style.SUCCESS("Service listings rebuilt."))
@@ -0,0 +1,54 @@
+"""
+Recompute the vendor dashboard counter cache (VendorStats / ServiceVendorStats).
+
+Run from project root (rental_backend/core):
+    python manage.py rebuild_vendor_stats                    # every vendor and service vendor
+    python manage.py rebuild_vendor_stats --vendor VEN001    # one vendor (vendor_id)
+
+Counters are moved by deltas on writes (backend/vendor_stats.py) and never
+re-aggregated on read; this is the only full aggregate. Run it after raw SQL
+fixes or queryset.update() calls that bypass model signals (e.g. nightly).
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.models import ServiceVendor, Vendor
+from backend.vendor_stats import refresh_service_vendor, refresh_vendor
+
+
+class Command(BaseCommand):
+    help = "Rebuild VendorStats and ServiceVendorStats from the source tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendor', type=str, default='', help='Only this vendor (vendor_id, e.g. VEN001).')
+        parser.add_argument(
+            '--service-vendor', type=str, default='', help='Only this service vendor (service_vendor_id).',
+        )
+
+    def handle(self, *args, **options):
+        vendor_code = (options.get('vendor') or '').strip()
+        service_vendor_code = (options.get('service_vendor') or '').strip()
+
+        vendors = Vendor.objects.all()
+        service_vendors = ServiceVendor.objects.all()
+        if vendor_code or service_vendor_code:
+            vendors = vendors.filter(vendor_id=vendor_code) if vendor_code else vendors.none()
+            service_vendors = (
+                service_vendors.filter(service_vendor_id=service_vendor_code)
+                if service_vendor_code else service_vendors.none()
+            )
+            if not vendors.exists() and not service_vendors.exists():
+                raise CommandError('No matching vendor or service vendor.')
+
+        count = 0
+        for vendor_id in vendors.values_list('id', flat=True).iterator():
+            refresh_vendor(vendor_id)
+            count += 1
+        self.stdout.write(f"Vendors rebuilt: {count}")
+
+        count = 0
+        for service_vendor_id in service_vendors.values_list('id', flat=True).iterator():
+            refresh_service_vendor(service_vendor_id)
+            count += 1
+        self.stdout.write(f"Service vendors rebuilt: {count}")
+
+        self.stdout.write(self.style.SUCCESS("Vendor stats rebuilt."))
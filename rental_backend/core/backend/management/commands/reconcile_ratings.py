@@ -0,0 +1,35 @@
+"""
+Recount product and service rating histograms from the individual ratings.
+
+Run from project root (rental_backend/core):
+    python manage.py reconcile_ratings              # products and services
+    python manage.py reconcile_ratings --services   # services only
+    python manage.py reconcile_ratings --dry-run    # report drift, change nothing
+
+Histograms are updated on every rating and filled by migration 0049; run this
+after raw SQL fixes or queryset.update() calls on ratings.
+"""
+from django.core.management.base import BaseCommand
+
+from backend.ratings import reconcile_products, reconcile_services
+
+
+class Command(BaseCommand):
+    help = "Rebuild Product / Service rating histograms, counts and averages from OrderedProduct / ServiceBooking."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', action='store_true', help='Only products.')
+        parser.add_argument('--services', action='store_true', help='Only services.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report rows that differ.')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        do_products = options['products'] or not options['services']
+        do_services = options['services'] or not options['products']
+        verb = 'would be fixed' if dry_run else 'fixed'
+
+        if do_products:
+            self.stdout.write(f"Products {verb}: {reconcile_products(dry_run=dry_run)}")
+        if do_services:
+            self.stdout.write(f"Services {verb}: {reconcile_services(dry_run=dry_run)}")
+        self.stdout.write(self.style.SUCCESS("Ratings reconciled."))
@@ -0,0 +1,39 @@
+"""
+Recompute referral wallet balances from the WalletTransaction ledger.
+
+Run from project root (rental_backend/core):
+    python manage.py reconcile_wallets              # every user
+    python manage.py reconcile_wallets --user 42    # one user (repeatable)
+    python manage.py reconcile_wallets --dry-run    # report drift, change nothing
+
+Balances follow every entry posted through backend/wallet.py; run this once
+after migrating (it also gives older ledger entries their idempotency key),
+and after raw SQL or queryset.update() on User balances.
+The first run keeps existing balances and posts an "Opening balance" entry
+for each difference; later drift is reset to the ledger sum. Users are
+locked while they are fixed, so it can run alongside checkouts.
+"""
+from django.core.management.base import BaseCommand
+
+from backend.wallet import backfill_keys, reconcile
+
+
+class Command(BaseCommand):
+    help = "Bring User.referral_wallet_balance in line with the user's wallet ledger entries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', type=int, help='User id (repeatable). Default: all users.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report users whose balance differs.')
+
+    def handle(self, *args, **options):
+        if not options['dry_run']:
+            self.stdout.write(f"Older ledger entries keyed: {backfill_keys()}")
+        drift = reconcile(options['user'], dry_run=options['dry_run'])
+        for user_id, cached, ledger, opened in drift:
+            if opened:
+                self.stdout.write(f"  user {user_id}: balance {cached} kept, opening entry {cached - ledger:+}")
+            else:
+                self.stdout.write(f"  user {user_id}: balance {cached} -> ledger {ledger}")
+        verb = 'would be fixed' if options['dry_run'] else 'fixed'
+        self.stdout.write(f"Wallets {verb}: {len(drift)}")
+        self.stdout.write(self.style.SUCCESS("Wallet balances reconciled."))
@@ -0,0 +1,29 @@
+"""
+Recount the per-user cart, wishlist and unread notification counters.
+
+Run from project root (rental_backend/core):
+    python manage.py repair_user_counters              # every user
+    python manage.py repair_user_counters --user 42    # one user (repeatable)
+    python manage.py repair_user_counters --dry-run    # report drift, change nothing
+
+Counters follow every cart / wishlist / notification change made through the
+ORM; run this once after migrating, and after raw SQL, queryset.update() or
+bulk_create() on those tables.
+"""
+from django.core.management.base import BaseCommand
+
+from backend.user_counters import repair
+
+
+class Command(BaseCommand):
+    help = "Recount User.cart_count, wishlist_count and unread_notifications from their source rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', type=int, help='User id (repeatable). Default: all users.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report users whose counters differ.')
+
+    def handle(self, *args, **options):
+        fixed = repair(options['user'], dry_run=options['dry_run'])
+        verb = 'would be fixed' if options['dry_run'] else 'fixed'
+        self.stdout.write(f"Users {verb}: {fixed}")
+        self.stdout.write(self.style.SUCCESS("User counters repaired."))
@@ -0,0 +1,74 @@
+"""
+Fold customer location pings into per-cell daily counts and enforce retention.
+
+Steps:
+  1. fill grid_cell on pings stored before the column existed
+  2. rebuild LocationCellDailyCount for days with new pings, including days
+     past retention that were never counted (first run, or a lagging job)
+  3. delete raw pings older than the retention window whose days are counted
+
+Run from project root (rental_backend/core):
+    python manage.py rollup_location_pings
+    python manage.py rollup_location_pings --retain-days 60
+    python manage.py rollup_location_pings --dry-run
+
+On Vercel, the cron in vercel.json runs the same steps hourly through
+GET /api/cron/location-pings/. Elsewhere, schedule it (e.g. cron hourly):
+    0 * * * * cd /path/to/rental_backend/core && python manage.py rollup_location_pings
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backend.analytics_rollups import (
+    backfill_ping_grid_cells,
+    build_location_rollups,
+    ping_retention_cutoff,
+    purge_location_pings,
+)
+
+
+class Command(BaseCommand):
+    help = "Backfill grid cells, update LocationCellDailyCount and delete raw location pings past retention."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retain-days',
+            type=int,
+            default=None,
+            help='Keep raw pings for this many days (default: LOCATION_PING_RETENTION_DAYS).',
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Ignore the watermark and rebuild counts for every day with raw pings.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many raw pings would be deleted.',
+        )
+
+    def handle(self, *args, **options):
+        from backend.models import CustomerLocationPing
+
+        retain_days = options.get('retain_days')
+        if retain_days is None:
+            retain_days = getattr(settings, 'LOCATION_PING_RETENTION_DAYS', 30)
+        cutoff = ping_retention_cutoff(retain_days)
+
+        if options.get('dry_run'):
+            count = CustomerLocationPing.objects.filter(created_at__lt=cutoff).count()
+            self.stdout.write(f"Would delete {count} raw ping(s) created before {cutoff:%Y-%m-%d %H:%M}.")
+            return
+
+        filled = backfill_ping_grid_cells()
+        self.stdout.write(f"Grid cells backfilled: {filled}")
+
+        # Count before purging: pings past the cutoff may not be rolled up yet
+        days = build_location_rollups(full=options.get('full', False))
+        self.stdout.write(f"Location cell counts: {days} day(s) rebuilt")
+
+        deleted = purge_location_pings(cutoff)
+        self.stdout.write(f"Raw pings deleted (older than {retain_days} days): {deleted}")
+
+        self.stdout.write(self.style.SUCCESS("Location pings rolled up."))
@@ -0,0 +1,49 @@
+"""
+Run pending catalog imports and resume failed or stalled ones.
+
+Run from project root (rental_backend/core):
+    python manage.py run_catalog_imports                 # all pending / stalled jobs
+    python manage.py run_catalog_imports --job <uuid>    # one job (also resumes FAILED)
+
+Jobs normally run in a background thread of the web process that received the
+upload; schedule this (e.g. cron every 5 minutes) to pick up jobs whose worker died.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from backend.catalog_import import run_job
+from backend.models import CatalogImportJob
+
+
+class Command(BaseCommand):
+    help = "Run or resume CatalogImportJob rows (pending, or running with a stale heartbeat)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--job', type=str, default='', help='Only this job id (also resumes a FAILED job).')
+
+    def handle(self, *args, **options):
+        job_id = (options.get('job') or '').strip()
+        if job_id:
+            if not CatalogImportJob.objects.filter(pk=job_id).exists():
+                raise CommandError(f'Import job {job_id} not found.')
+            job_ids = [job_id]
+        else:
+            stale = timezone.now() - datetime.timedelta(minutes=settings.CATALOG_IMPORT_STALE_MINUTES)
+            job_ids = list(
+                CatalogImportJob.objects.filter(
+                    Q(status=CatalogImportJob.STATUS_PENDING)
+                    | Q(status=CatalogImportJob.STATUS_RUNNING, heartbeat_at__lt=stale)
+                ).order_by('created_at').values_list('id', flat=True)
+            )
+
+        for pk in job_ids:
+            job = run_job(pk)
+            self.stdout.write(
+                f"{job.id}: {job.status} - {job.rows_processed}/{job.rows_total or '?'} rows. {job.message}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"{len(job_ids)} import job(s) processed."))
@@ -12,8 +12,8 @@ What it does:
   2. Creates User A (referrer) with a referral code.
   3. Creates User B (referred) linked to A via referral code and creates Referral (pending).
   4. Creates a minimal Order for B with amount >= minimum_order_amount.
-  5. Marks the order's OrderedProduct as DELIVERED to trigger referral completion.
-  6. Simulates "approve & credit" (skips hold period for test): credits referrer wallet and marks referral rewarded.
+  5. Marks the order's OrderedProduct as DELIVERED and runs the referral completion step.
+  6. Runs the reward step (skips hold period for test): credits referrer wallet and marks referral rewarded.
   7. Asserts referral status, wallet balance, and WalletTransaction.
   8. Prints step-by-step results and final PASS/FAIL.
 """
@@ -25,6 +25,7 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.contrib.auth.hashers import make_password
 
+from backend import referral_rewards
 from backend.models import (
     User,
     Token,
@@ -163,10 +164,11 @@ class Command(BaseCommand):
                 )
                 self.stdout.write(self.style.SUCCESS(f"  Order: {order.id}, tx_amount: {order.tx_amount}, OrderedProduct: {op.id}"))
 
-                # --- 5. Mark DELIVERED to trigger referral completion ---
-                self.stdout.write("\n[5/8] Marking OrderedProduct as DELIVERED (triggers referral completion)...")
+                # --- 5. Mark DELIVERED, then run the completion step ---
+                self.stdout.write("\n[5/8] Marking OrderedProduct as DELIVERED and completing referrals...")
                 op.status = 'DELIVERED'
                 op.save()
+                referral_rewards.complete_qualified()
             else:
                 self.stdout.write(self.style.WARNING("  No ProductOption in DB: simulating referral completion (no real order)."))
                 referral.status = Referral.STATUS_COMPLETED
@@ -188,18 +190,7 @@ class Command(BaseCommand):
                 referral.save(update_fields=['hold_until'])
             balance_before = (referrer.referral_wallet_balance or Decimal('0'))
 
-            referrer.refresh_from_db()
-            referrer.referral_wallet_balance = (referrer.referral_wallet_balance or Decimal('0')) + referral.reward_amount
-            referrer.save(update_fields=['referral_wallet_balance'])
-            WalletTransaction.objects.create(
-                user=referrer,
-                amount=referral.reward_amount,
-                type=WalletTransaction.TYPE_CREDIT,
-                description=f"Referral reward for {referred.email}",
-            )
-            referral.status = Referral.STATUS_REWARDED
-            referral.rewarded_at = timezone.now()
-            referral.save(update_fields=['status', 'rewarded_at'])
+            referral_rewards.reward_due(referral_ids=[referral.pk], notify=False)
             self.stdout.write(self.style.SUCCESS(f"  Credited ₹{referral.reward_amount} to referrer wallet."))
 
             # --- 7. Assertions ---
@@ -0,0 +1,189 @@
+"""
+Content-addressed storage for uploaded images.
+
+Image fields of the models in image_variants.VARIANT_MODELS use
+ContentAddressedStorage. An upload is hashed (SHA-256) before anything is
+written. Content that is already stored returns the existing name, so nothing
+is written and the image variants rendered for that name are reused. Otherwise
+the file is stored once under blobs/<aa>/<sha256><ext>.
+
+MediaBlob.ref_count counts the rows that point at a blob. It is maintained by
+backend/signals.py (acquire/release), and by explicit calls for bulk_create.
+When the last reference goes, the blob file, its variants and its row are
+deleted. A blob uploaded within MEDIA_BLOB_GRACE_MINUTES is kept, because the
+row that will reference it may not have committed yet; such blobs, and blobs
+left behind by failed requests, are removed by
+`python manage.py gc_media_blobs`.
+
+Files stored before this existed keep their names; the file and its variants
+are deleted, after commit, when the last row referencing the name goes.
+"""
+import datetime
+import hashlib
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = 'blobs'
+
+
+def grace_period():
+    return datetime.timedelta(minutes=getattr(settings, 'MEDIA_BLOB_GRACE_MINUTES', 10))
+
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(BLOB_DIR + '/')
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that stores identical content once (see module docstring)."""
+
+    def _save(self, name, content):
+        from backend.models import MediaBlob
+
+        sha256 = content_hash(content)
+        ext = os.path.splitext(name)[1].lower()[:10]
+        now = timezone.now()
+
+        blob = MediaBlob.objects.filter(sha256=sha256).first()
+        if blob is None:
+            blob, _ = MediaBlob.objects.get_or_create(
+                sha256=sha256,
+                defaults={
+                    'name': f'{BLOB_DIR}/{sha256[:2]}/{sha256}{ext}',
+                    'size': content.size,
+                    'last_uploaded_at': now,
+                },
+            )
+        # Marks the blob as in use before the referencing row exists (see collect()).
+        if not MediaBlob.objects.filter(pk=blob.pk).update(last_uploaded_at=now):
+            blob = MediaBlob.objects.create(sha256=sha256, name=blob.name, size=content.size, last_uploaded_at=now)
+
+        if self.exists(blob.name):
+            return blob.name
+        stored = super()._save(blob.name, content)
+        if stored != blob.name:
+            # An identical upload wrote the blob first; keep that copy.
+            super().delete(stored)
+        return blob.name
+
+    def delete(self, name):
+        # Blobs may be shared; they are deleted by collect() once unreferenced.
+        if is_blob_name(name):
+            return
+        super().delete(name)
+
+    def delete_blob(self, name):
+        super().delete(name)
+
+
+def get_content_storage():
+    return content_storage
+
+
+content_storage = ContentAddressedStorage()
+
+
+# =============================================================================
+# REFERENCE COUNTING
+# =============================================================================
+
+def acquire(*names):
+    """Count one more reference for each blob name (repeats count several times)."""
+    from backend.models import MediaBlob
+
+    counts = {}
+    for name in names:
+        if is_blob_name(name):
+            counts[name] = counts.get(name, 0) + 1
+    for name, count in counts.items():
+        MediaBlob.objects.filter(name=name).update(ref_count=F('ref_count') + count)
+
+
+def release(*names):
+    """
+    Drop one reference for each name and delete blobs that are no longer used.
+    Files stored before content addressing are deleted with their variants
+    once the transaction commits, unless another row still uses the name.
+    """
+    from backend.models import MediaBlob
+
+    for name in names:
+        if not name:
+            continue
+        if not is_blob_name(name):
+            transaction.on_commit(lambda name=name: _delete_legacy(name))
+            continue
+        MediaBlob.objects.filter(name=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+        transaction.on_commit(lambda name=name: collect(name))
+
+
+def _delete_legacy(name):
+    from django.apps import apps
+    from backend.image_variants import VARIANT_MODELS, delete_source_variants
+
+    for label, field in VARIANT_MODELS:
+        if apps.get_model(label).objects.filter(**{field: name}).exists():
+            return
+    delete_source_variants(name)
+    try:
+        content_storage.delete(name)
+    except Exception:
+        logger.exception('Could not delete media file %s', name)
+
+
+def collect(name):
+    """
+    Delete a blob (file, variants, row) if nothing references it and it was not
+    uploaded within the grace period. Returns True if deleted.
+    """
+    from backend.image_variants import delete_source_variants
+    from backend.models import MediaBlob
+
+    with transaction.atomic():
+        blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+        if blob is None or blob.ref_count > 0:
+            return False
+        if blob.last_uploaded_at and blob.last_uploaded_at > timezone.now() - grace_period():
+            return False
+        # Deleted before commit: an upload of the same content blocked on this row
+        # finds it gone afterwards and writes the file again.
+        try:
+            content_storage.delete_blob(blob.name)
+            delete_source_variants(blob.name)
+        except Exception:
+            logger.exception('Could not delete media blob %s', blob.name)
+            return False
+        blob.delete()
+    return True
+
+
+def referenced_names():
+    """{blob name: number of rows referencing it} over every content-addressed field."""
+    from django.apps import apps
+    from backend.image_variants import VARIANT_MODELS
+
+    counts = {}
+    for label, field in VARIANT_MODELS:
+        model = apps.get_model(label)
+        names = model.objects.filter(**{f'{field}__startswith': BLOB_DIR + '/'}).values_list(field, flat=True)
+        for name in names.iterator():
+            counts[name] = counts.get(name, 0) + 1
+    return counts
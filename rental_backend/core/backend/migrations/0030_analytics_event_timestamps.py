@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-19 04:36
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0029_vendor_serviceable_locations'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customerlocationping',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='screenviewevent',
+            name='started_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
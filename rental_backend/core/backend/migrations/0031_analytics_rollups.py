@@ -0,0 +1,130 @@
+# Generated by Django 5.2.5 on 2026-10-19 04:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0030_analytics_event_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('processed_until', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Analytics watermark',
+                'verbose_name_plural': 'Analytics watermarks',
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('tx_status', models.CharField(blank=True, default='', max_length=100)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('tx_amount', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Order daily rollup',
+                'verbose_name_plural': 'Order daily rollups',
+                'ordering': ['-day', 'tx_status'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PlatformDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('platform', models.CharField(blank=True, default='', max_length=20)),
+                ('events', models.PositiveIntegerField(default=0)),
+                ('app_opens', models.PositiveIntegerField(default=0)),
+                ('unique_users', models.PositiveIntegerField(default=0)),
+                ('unique_devices', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Platform daily rollup',
+                'verbose_name_plural': 'Platform daily rollups',
+                'ordering': ['-day', 'platform'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScreenDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('screen', models.CharField(max_length=150)),
+                ('opens', models.PositiveIntegerField(default=0)),
+                ('unique_users', models.PositiveIntegerField(default=0)),
+                ('unique_devices', models.PositiveIntegerField(default=0)),
+                ('total_seconds', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Screen daily rollup',
+                'verbose_name_plural': 'Screen daily rollups',
+                'ordering': ['-day', '-opens'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScreenHourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('screen', models.CharField(max_length=150)),
+                ('opens', models.PositiveIntegerField(default=0)),
+                ('total_seconds', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Screen hourly rollup',
+                'verbose_name_plural': 'Screen hourly rollups',
+                'ordering': ['-hour', '-opens'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='backend_ord_created_6ca72e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['updated_at'], name='backend_ord_updated_b0cb64_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='screenviewevent',
+            index=models.Index(fields=['started_at'], name='backend_scr_started_0f4f84_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='screenviewevent',
+            index=models.Index(fields=['ended_at'], name='backend_scr_ended_a_28eee2_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='orderdailyrollup',
+            unique_together={('day', 'tx_status')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='platformdailyrollup',
+            unique_together={('day', 'platform')},
+        ),
+        migrations.AddIndex(
+            model_name='screendailyrollup',
+            index=models.Index(fields=['screen', 'day'], name='backend_scr_screen_5b1ed8_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='screendailyrollup',
+            unique_together={('day', 'screen')},
+        ),
+        migrations.AddIndex(
+            model_name='screenhourlyrollup',
+            index=models.Index(fields=['screen', 'hour'], name='backend_scr_screen_0efba9_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='screenhourlyrollup',
+            unique_together={('hour', 'screen')},
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-19 04:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0031_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationCellDailyCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('grid_cell', models.BigIntegerField()),
+                ('pings', models.PositiveIntegerField(default=0)),
+                ('unique_devices', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Location cell daily count',
+                'verbose_name_plural': 'Location cell daily counts',
+                'ordering': ['-day', '-pings'],
+            },
+        ),
+        migrations.AddField(
+            model_name='customerlocationping',
+            name='grid_cell',
+            field=models.BigIntegerField(blank=True, help_text='Grid cell id (backend.geo_utils.grid_cell); null for rows not yet backfilled', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='customerlocationping',
+            index=models.Index(fields=['grid_cell', 'created_at'], name='backend_cus_grid_ce_1d328d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerlocationping',
+            index=models.Index(fields=['created_at'], name='backend_cus_created_3dac71_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='locationcelldailycount',
+            index=models.Index(fields=['grid_cell', 'day'], name='backend_loc_grid_ce_73f56b_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='locationcelldailycount',
+            unique_together={('day', 'grid_cell')},
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.5 on 2026-10-19 04:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0032_location_ping_grid_cells'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FunnelStepDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('funnel', models.CharField(max_length=100)),
+                ('step', models.PositiveSmallIntegerField(help_text='1-based step index')),
+                ('screen', models.CharField(blank=True, default='', max_length=150)),
+                ('sessions', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Funnel step (daily)',
+                'verbose_name_plural': 'Funnel steps (daily)',
+                'ordering': ['-day', 'funnel', 'step'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScreenTransitionDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('from_screen', models.CharField(max_length=150)),
+                ('to_screen', models.CharField(max_length=150)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Screen transition (daily)',
+                'verbose_name_plural': 'Screen transitions (daily)',
+                'ordering': ['-day', '-count'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SessionFunnelState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.CharField(max_length=64, unique=True)),
+                ('day', models.DateField()),
+                ('events', models.PositiveIntegerField(default=0)),
+                ('steps', models.JSONField(blank=True, default=dict, help_text='{funnel: steps reached}')),
+                ('transitions', models.JSONField(blank=True, default=dict, help_text='{"from\\tto": count}')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='screenviewevent',
+            name='received_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='screenviewevent',
+            index=models.Index(fields=['received_at'], name='backend_scr_receive_83b481_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='screenviewevent',
+            index=models.Index(fields=['session_id', 'started_at'], name='backend_scr_session_88036f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='funnelstepdaily',
+            index=models.Index(fields=['funnel', 'day'], name='backend_fun_funnel_db316f_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='funnelstepdaily',
+            unique_together={('day', 'funnel', 'step')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='screentransitiondaily',
+            unique_together={('day', 'from_screen', 'to_screen')},
+        ),
+        migrations.AddIndex(
+            model_name='sessionfunnelstate',
+            index=models.Index(fields=['day'], name='backend_ses_day_30ca0f_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 04:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0033_session_funnels'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderedproduct',
+            name='vendor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ordered_products_set', to='backend.vendor'),
+        ),
+        migrations.AddIndex(
+            model_name='orderedproduct',
+            index=models.Index(fields=['vendor', 'order'], name='backend_ord_vendor__99a2e7_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-19 04:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0034_ordered_product_vendor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceVendorStats',
+            fields=[
+                ('service_vendor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='backend.servicevendor')),
+                ('total_services', models.PositiveIntegerField(default=0)),
+                ('total_bookings', models.PositiveIntegerField(default=0)),
+                ('pending_bookings', models.PositiveIntegerField(default=0)),
+                ('confirmed_bookings', models.PositiveIntegerField(default=0)),
+                ('total_revenue', models.BigIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Service vendor stats',
+                'verbose_name_plural': 'Service vendor stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='VendorStats',
+            fields=[
+                ('vendor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='backend.vendor')),
+                ('total_products', models.PositiveIntegerField(default=0)),
+                ('total_options', models.PositiveIntegerField(default=0)),
+                ('total_stock', models.BigIntegerField(default=0)),
+                ('low_stock_items', models.PositiveIntegerField(default=0)),
+                ('recent_orders', models.PositiveIntegerField(default=0, help_text='Orders in the last 30 days (as of orders_refreshed_at)')),
+                ('pending_orders', models.PositiveIntegerField(default=0)),
+                ('accepted_orders', models.PositiveIntegerField(default=0)),
+                ('total_revenue', models.BigIntegerField(default=0)),
+                ('products_refreshed_at', models.DateTimeField(blank=True, null=True)),
+                ('orders_refreshed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Vendor stats',
+                'verbose_name_plural': 'Vendor stats',
+            },
+        ),
+    ]
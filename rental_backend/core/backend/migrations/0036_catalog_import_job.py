@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-19 04:51
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0035_vendor_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogImportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('manifest', models.FileField(help_text='CSV or JSONL, one row per product option', upload_to='catalog_imports/')),
+                ('images_zip', models.FileField(blank=True, null=True, upload_to='catalog_imports/')),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], db_index=True, default='PENDING', max_length=20)),
+                ('rows_total', models.PositiveIntegerField(blank=True, null=True)),
+                ('rows_processed', models.PositiveIntegerField(default=0, help_text='Resume cursor (manifest rows committed)')),
+                ('products_created', models.PositiveIntegerField(default=0)),
+                ('options_created', models.PositiveIntegerField(default=0)),
+                ('images_created', models.PositiveIntegerField(default=0)),
+                ('error_count', models.PositiveIntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list, help_text='First row errors: [{"row": n, "message": str}]')),
+                ('product_refs', models.JSONField(blank=True, default=dict, help_text='{product_ref: product id} for resume')),
+                ('message', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('vendor', models.ForeignKey(help_text='Products are created for this vendor', on_delete=django.db.models.deletion.CASCADE, related_name='catalog_imports', to='backend.vendor')),
+            ],
+            options={
+                'verbose_name': 'Catalog import',
+                'verbose_name_plural': 'Catalog imports',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.5 on 2026-10-19 04:59
+
+import backend.media_blobs
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0037_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='image',
+            field=models.ImageField(storage=backend.media_blobs.get_content_storage, upload_to='categories/'),
+        ),
+        migrations.AlterField(
+            model_name='homebanner',
+            name='image',
+            field=models.ImageField(storage=backend.media_blobs.get_content_storage, upload_to='home_banners/'),
+        ),
+        migrations.AlterField(
+            model_name='homepageitem',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Optional banner image', null=True, storage=backend.media_blobs.get_content_storage, upload_to='home_page_items/'),
+        ),
+        migrations.AlterField(
+            model_name='pageitem',
+            name='image',
+            field=models.ImageField(blank=True, storage=backend.media_blobs.get_content_storage, upload_to='product/'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=backend.media_blobs.get_content_storage, upload_to='product/'),
+        ),
+        migrations.AlterField(
+            model_name='serviceimage',
+            name='image',
+            field=models.ImageField(storage=backend.media_blobs.get_content_storage, upload_to='services/'),
+        ),
+        migrations.AlterField(
+            model_name='slide',
+            name='image',
+            field=models.ImageField(storage=backend.media_blobs.get_content_storage, upload_to='categories/'),
+        ),
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_uploaded_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'last_uploaded_at'], name='backend_med_ref_cou_4c2896_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-19 05:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0038_media_blobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendorEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('order.created', 'New order'), ('order.cancelled', 'Order cancelled'), ('trial.created', 'New trial booking'), ('trial.cancelled', 'Trial booking cancelled')], max_length=30)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='vendor_events', to='backend.order')),
+                ('trial', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='vendor_events', to='backend.trialbooking')),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='backend.vendor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['vendor', 'id'], name='backend_ven_vendor__a124ed_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('order__isnull', False)), fields=('vendor', 'kind', 'order'), name='uniq_vendor_event_order'), models.UniqueConstraint(condition=models.Q(('trial__isnull', False)), fields=('vendor', 'kind', 'trial'), name='uniq_vendor_event_trial')],
+            },
+        ),
+    ]
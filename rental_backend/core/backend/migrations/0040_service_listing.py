@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-19 05:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0039_vendor_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceListing',
+            fields=[
+                ('service', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='listing', serialize=False, to='backend.service')),
+                ('is_listed', models.BooleanField(default=True)),
+                ('rating', models.DecimalField(decimal_places=1, default=0, max_digits=3)),
+                ('total_reviews', models.IntegerField(default=0)),
+                ('experience_years', models.IntegerField(default=0)),
+                ('min_price', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(help_text='Service.created_at')),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backend.servicecategory')),
+                ('subcategory', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='backend.servicesubcategory')),
+            ],
+            options={
+                'verbose_name': 'Service listing',
+                'verbose_name_plural': 'Service listings',
+                'indexes': [models.Index(fields=['is_listed', '-created_at'], name='backend_ser_is_list_300c8a_idx'), models.Index(fields=['is_listed', '-rating', '-total_reviews'], name='backend_ser_is_list_c27137_idx'), models.Index(fields=['is_listed', 'min_price'], name='backend_ser_is_list_73ea65_idx'), models.Index(fields=['category', 'is_listed', '-created_at'], name='backend_ser_categor_f0eba0_idx'), models.Index(fields=['category', 'is_listed', '-rating', '-total_reviews'], name='backend_ser_categor_2320df_idx'), models.Index(fields=['category', 'is_listed', 'min_price'], name='backend_ser_categor_0808f8_idx'), models.Index(fields=['subcategory', 'is_listed', '-created_at'], name='backend_ser_subcate_40f3de_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ServicePincode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pincode', models.CharField(max_length=6)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='listing_pincodes', to='backend.service')),
+            ],
+            options={
+                'verbose_name': 'Service pincode',
+                'verbose_name_plural': 'Service pincodes',
+                'constraints': [models.UniqueConstraint(fields=('pincode', 'service'), name='uniq_service_pincode')],
+            },
+        ),
+    ]
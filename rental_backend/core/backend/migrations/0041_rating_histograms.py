@@ -0,0 +1,56 @@
+# Generated by Django 5.2.5 on 2026-10-19 05:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0040_service_listing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_average',
+            field=models.DecimalField(decimal_places=1, default=0, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='star_1',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='star_2',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='star_3',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='star_4',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='star_5',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-rating_count'], name='backend_pro_rating__a7916c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-rating_average', '-rating_count'], name='backend_pro_rating__1cbaf9_idx'),
+        ),
+    ]
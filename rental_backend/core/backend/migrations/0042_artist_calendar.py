@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-19 05:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0041_rating_histograms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArtistCalendarMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('booked_days', models.BigIntegerField(default=0)),
+                ('artist_booked_days', models.BigIntegerField(default=0)),
+                ('blocked_days', models.BigIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+                ('artist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calendar_months', to='backend.service')),
+            ],
+            options={
+                'verbose_name': 'Artist calendar month',
+                'verbose_name_plural': 'Artist calendar months',
+                'unique_together': {('artist', 'month')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ArtistDaySlots',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('busy', models.BinaryField(default=b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00', max_length=12)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+                ('artist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calendar_days', to='backend.service')),
+            ],
+            options={
+                'verbose_name': 'Artist day slots',
+                'verbose_name_plural': 'Artist day slots',
+                'unique_together': {('artist', 'date')},
+            },
+        ),
+    ]
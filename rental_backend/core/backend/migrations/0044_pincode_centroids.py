@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-19 05:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0043_service_vendor_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PincodeCentroid',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pincode', models.CharField(max_length=6, unique=True)),
+                ('latitude', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('longitude', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('district', models.CharField(blank=True, default='', max_length=100)),
+                ('state', models.CharField(blank=True, default='', max_length=100)),
+                ('area_names', models.TextField(blank=True, default='', help_text="Post office / locality names, '|'-separated")),
+                ('office_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Pincode Centroid',
+                'verbose_name_plural': 'Pincode Centroids',
+                'ordering': ['pincode'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-19 05:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0044_pincode_centroids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='cart_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='unread_notifications',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='wishlist_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
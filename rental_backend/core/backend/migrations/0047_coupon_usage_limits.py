@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-19 05:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0046_user_cart_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CouponCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('capacity', models.PositiveIntegerField(blank=True, help_text='Uses this shard may hand out (empty = unlimited)', null=True)),
+                ('used', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['coupon', 'shard'],
+            },
+        ),
+        migrations.AddField(
+            model_name='coupon',
+            name='per_user_limit',
+            field=models.PositiveIntegerField(default=0, help_text='Times one user can use this coupon (0 = unlimited)'),
+        ),
+        migrations.AddField(
+            model_name='couponusage',
+            name='use_number',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='couponusage',
+            constraint=models.UniqueConstraint(condition=models.Q(('use_number__gt', 0)), fields=('coupon', 'user', 'use_number'), name='unique_coupon_user_use_number'),
+        ),
+        migrations.AddField(
+            model_name='couponcountershard',
+            name='coupon',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counter_shards', to='backend.coupon'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='couponcountershard',
+            unique_together={('coupon', 'shard')},
+        ),
+    ]
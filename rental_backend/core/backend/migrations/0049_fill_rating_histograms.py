@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-19 07:10
+
+from django.db import migrations
+
+
+def fill_histograms(apps, schema_editor):
+    from backend import ratings
+    ratings.backfill(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0048_wallet_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_histograms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-19 06:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def rebuild_orders_on_read(apps, schema_editor):
+    # Existing rows have no order days yet: their orders section is rebuilt on first read
+    VendorStats = apps.get_model('backend', 'VendorStats')
+    VendorStats.objects.update(orders_refreshed_at=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0049_fill_rating_histograms'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='vendorstats',
+            name='recent_orders',
+        ),
+        migrations.CreateModel(
+            name='VendorOrderDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_days', to='backend.vendor')),
+            ],
+            options={
+                'unique_together': {('vendor', 'day')},
+            },
+        ),
+        migrations.RunPython(rebuild_orders_on_read, migrations.RunPython.noop),
+    ]
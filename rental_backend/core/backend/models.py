@@ -10,6 +10,8 @@ from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 
+from backend.media_blobs import get_content_storage
+
 
 # ============== VENDOR MODEL ==============
 class Vendor(models.Model):
@@ -92,6 +94,9 @@ class ServiceVendor(models.Model):
     phone = models.CharField(max_length=15, unique=True, help_text="Phone used for OTP login")
     area = models.CharField(max_length=200, blank=True, default='')
     pincode = models.CharField(max_length=10, blank=True, default='')
+    # Base location for "near me" search (backend/geo_index.py); falls back to the pincode's coordinates
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
 
     # Admin-created services list (subcategories) the vendor can provide
     service_subcategories = models.ManyToManyField(
@@ -178,7 +183,8 @@ class Category(models.Model):
     ]
     name = models.CharField(max_length=50)
     position = models.IntegerField(default=0)
-    image = models.ImageField(upload_to='categories/')
+    image = models.ImageField(upload_to='categories/', storage=get_content_storage)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     gender = models.CharField(
         max_length=10,
         choices=GENDER_CHOICES,
@@ -192,7 +198,8 @@ class Category(models.Model):
 
 class Slide(models.Model):
     position = models.IntegerField(default=0)
-    image = models.ImageField(upload_to='categories/')
+    image = models.ImageField(upload_to='categories/', storage=get_content_storage)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
 
 class HomeBanner(models.Model):
@@ -210,7 +217,8 @@ class HomeBanner(models.Model):
     ]
 
     title = models.CharField(max_length=200, blank=True, null=True)
-    image = models.ImageField(upload_to='home_banners/')
+    image = models.ImageField(upload_to='home_banners/', storage=get_content_storage)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     redirect_type = models.CharField(
         max_length=20,
         choices=REDIRECT_CHOICES,
@@ -420,11 +428,14 @@ class Product(models.Model):
     buy_price = models.IntegerField(default=0, help_text="Purchase price (if 0, uses regular price)")
     buy_offer_price = models.IntegerField(default=0, help_text="Purchase offer price (if 0, uses offer_price)")
 
+    # Rating histogram and aggregates, kept by backend.ratings (reconcile: python manage.py reconcile_ratings)
     star_5 = models.IntegerField(default=0)
     star_4 = models.IntegerField(default=0)
     star_3 = models.IntegerField(default=0)
     star_2 = models.IntegerField(default=0)
     star_1 = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    rating_average = models.DecimalField(max_digits=3, decimal_places=1, default=0)
     cod = models.BooleanField(default=True)
     position = models.IntegerField(default=9999, help_text="Display order within category (lower = first)")
 
@@ -437,6 +448,12 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-rating_count']),
+            models.Index(fields=['-rating_average', '-rating_count']),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -972,6 +989,7 @@ class User(models.Model):
         on_delete=models.SET_NULL,
         related_name='referrals_made'
     )
+    # Cached sum of the WalletTransaction ledger, moved only by backend/wallet.py
     referral_wallet_balance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     device_id = models.CharField(max_length=255, blank=True, null=True)
     signup_ip = models.GenericIPAddressField(blank=True, null=True)
@@ -981,7 +999,14 @@ class User(models.Model):
     ban_reason = models.CharField(max_length=255, blank=True)
 
     wishlist = models.ManyToManyField(ProductOption, blank=True, related_name="wishlist")
+    # Deprecated: the cart is stored in CartItem (move leftovers with python manage.py migrate_legacy_cart)
     cart = models.ManyToManyField(ProductOption, blank=True, related_name="cart")
+    # Counters kept by backend/user_counters.py (repair: python manage.py repair_user_counters)
+    cart_count = models.PositiveIntegerField(default=0)
+    wishlist_count = models.PositiveIntegerField(default=0)
+    unread_notifications = models.PositiveIntegerField(default=0)
+    # Bumped on every cart change; part of the priced cart's cache key (backend/cart.py)
+    cart_version = models.PositiveIntegerField(default=0)
     service_wishlist = models.ManyToManyField(
         'ServiceOption',
         blank=True,
@@ -997,9 +1022,19 @@ class User(models.Model):
     district = models.CharField(max_length=500, blank=True)
     state = models.CharField(max_length=500, blank=True)
 
+    COUNTER_FIELDS = ('cart_count', 'wishlist_count', 'unread_notifications', 'cart_version', 'referral_wallet_balance')
+
     def __str__(self):
         return self.email
 
+    def save(self, *args, **kwargs):
+        # Counters and the wallet balance are only written through F() updates; a full save of a stale instance must not reset them
+        if not self._state.adding and not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class ServiceWishlistItem(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='service_wishlist_items')
@@ -1036,13 +1071,15 @@ class PasswordResetToken(models.Model):
 
 class ProductImage(models.Model):
     position = models.IntegerField(default=0)
-    image = models.ImageField(upload_to='product/')
+    image = models.ImageField(upload_to='product/', storage=get_content_storage)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     product_option = models.ForeignKey(ProductOption, on_delete=models.CASCADE, related_name='images_set')
 
 
 class PageItem(models.Model):
     position = models.IntegerField(default=0)
-    image = models.ImageField(upload_to='product/', blank=True)
+    image = models.ImageField(upload_to='product/', blank=True, storage=get_content_storage)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='pageitems_set')
     choices = [
         (1, 'BANNER'),
@@ -1169,6 +1206,8 @@ class Order(models.Model):
         indexes = [
             models.Index(fields=['vendor_status', 'created_at']),
             models.Index(fields=['assigned_vendor', 'vendor_status']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['updated_at']),
         ]
 
 
@@ -1300,6 +1339,10 @@ class OrderedProduct(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="orders_set")
     product_option = models.ForeignKey(ProductOption, on_delete=models.CASCADE, related_name="order_options_set")
+    # Denormalized product_option.product.vendor, set on create (backfill: python manage.py backfill_ordered_product_vendor)
+    vendor = models.ForeignKey(
+        Vendor, on_delete=models.SET_NULL, null=True, blank=True, related_name='ordered_products_set',
+    )
     product_price = models.IntegerField(default=0)
     tx_price = models.IntegerField(default=0)
     delivery_price = models.IntegerField(default=0)
@@ -1327,30 +1370,24 @@ class OrderedProduct(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['vendor', 'order']),
+        ]
+
     def __str__(self):
         rental_info = f" [{self.rental_type.upper()}]" if self.rental_type else ""
         return f"{self.product_option}{rental_info}"
 
     def save(self, *args, **kwargs):
         """
-        When an OrderedProduct transitions to DELIVERED, we may trigger referral completion
-        for the referred user (first successful order) based on ReferralSettings.
+        Fills the denormalized vendor on create. Referrals completed by a delivered
+        order are picked up by `python manage.py process_referral_rewards`.
         """
-        old_status = None
-        if self.pk:
-            try:
-                old_status = OrderedProduct.objects.only('status').get(pk=self.pk).status
-            except OrderedProduct.DoesNotExist:
-                old_status = None
-
+        if self._state.adding and self.vendor_id is None and self.product_option_id:
+            self.vendor_id = self.product_option.product.vendor_id
         super().save(*args, **kwargs)
 
-        # Trigger only on first transition to DELIVERED
-        if old_status != 'DELIVERED' and self.status == 'DELIVERED':
-            order = self.order
-            user = order.user
-            _maybe_complete_referral_for_user(user=user, qualifying_amount=order.tx_amount, source_order=order)
-
 
 # ============== COUPON MODELS ==============
 class Coupon(models.Model):
@@ -1408,6 +1445,10 @@ class Coupon(models.Model):
         default=False,
         help_text='If True, only users with no previous orders can use this coupon'
     )
+    per_user_limit = models.PositiveIntegerField(
+        default=0,
+        help_text='Times one user can use this coupon (0 = unlimited)'
+    )
 
     # Optional: restrict to specific products/categories/services. Empty = applicable to all.
     applicable_products = models.ManyToManyField(
@@ -1461,12 +1502,22 @@ class CouponUsage(models.Model):
         blank=True,
         help_text='Set when coupon was used on a service booking',
     )
+    # 1..per_user_limit for coupons with a per-user limit, 0 otherwise; the unique
+    # index makes two concurrent checkouts of one user race for the same number
+    use_number = models.PositiveIntegerField(default=0)
     used_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         verbose_name = 'Coupon Usage'
         verbose_name_plural = 'Coupon Usages'
         ordering = ['-used_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['coupon', 'user', 'use_number'],
+                condition=models.Q(use_number__gt=0),
+                name='unique_coupon_user_use_number',
+            ),
+        ]
 
     def __str__(self):
         if self.order_id:
@@ -1476,6 +1527,25 @@ class CouponUsage(models.Model):
         return f"{self.user.email} - {self.coupon.code}"
 
 
+class CouponCounterShard(models.Model):
+    """
+    One slice of a high-traffic coupon's usage counter (backend/coupon_usage.py).
+    A use is claimed from a random shard, so concurrent checkouts rarely wait
+    on the same row. Total uses = Coupon.used_count + sum of shard `used`.
+    """
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, related_name='counter_shards')
+    shard = models.PositiveSmallIntegerField()
+    capacity = models.PositiveIntegerField(null=True, blank=True, help_text='Uses this shard may hand out (empty = unlimited)')
+    used = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['coupon', 'shard']
+        ordering = ['coupon', 'shard']
+
+    def __str__(self):
+        return f"{self.coupon.code} #{self.shard} ({self.used}/{self.capacity if self.capacity is not None else '-'})"
+
+
 class VendorProduct(models.Model):
     """Link vendors to products they manage"""
     vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name='vendor_products')
@@ -1533,13 +1603,17 @@ class ScreenViewEvent(models.Model):
     session_id = models.CharField(max_length=64, blank=True, default='', db_index=True)
     screen = models.CharField(max_length=150, db_index=True)
 
-    started_at = models.DateTimeField(auto_now_add=True)
+    # default (not auto_now_add) so buffered writes keep the time the event was received
+    started_at = models.DateTimeField(default=timezone.now)
     ended_at = models.DateTimeField(null=True, blank=True)
     duration_seconds = models.PositiveIntegerField(default=0, help_text='Computed on end (seconds)')
 
     platform = models.CharField(max_length=20, blank=True, default='')
     app_version = models.CharField(max_length=40, blank=True, default='')
 
+    # server time the row was written; incremental jobs (funnels) scan by this, not started_at
+    received_at = models.DateTimeField(default=timezone.now)
+
     class Meta:
         verbose_name = 'Screen analytics event'
         verbose_name_plural = 'Screen analytics events'
@@ -1548,6 +1622,11 @@ class ScreenViewEvent(models.Model):
             models.Index(fields=['screen', 'started_at']),
             models.Index(fields=['user', 'started_at']),
             models.Index(fields=['device_id', 'started_at']),
+            # rollup watermarks scan new/closed rows by time
+            models.Index(fields=['started_at']),
+            models.Index(fields=['ended_at']),
+            models.Index(fields=['received_at']),
+            models.Index(fields=['session_id', 'started_at']),
         ]
 
     def __str__(self):
@@ -1567,11 +1646,16 @@ class CustomerLocationPing(models.Model):
     latitude = models.DecimalField(max_digits=9, decimal_places=6)
     longitude = models.DecimalField(max_digits=9, decimal_places=6)
     accuracy_m = models.FloatField(default=0)
+    grid_cell = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text='Grid cell id (backend.geo_utils.grid_cell); null for rows not yet backfilled',
+    )
 
     platform = models.CharField(max_length=20, blank=True, default='')
     app_version = models.CharField(max_length=40, blank=True, default='')
 
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         verbose_name = 'Customer location ping'
@@ -1580,6 +1664,8 @@ class CustomerLocationPing(models.Model):
         indexes = [
             models.Index(fields=['device_id', 'created_at']),
             models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['grid_cell', 'created_at']),
+            models.Index(fields=['created_at']),
         ]
 
     def __str__(self):
@@ -1587,6 +1673,422 @@ class CustomerLocationPing(models.Model):
         return f"{who} @ {self.created_at}"
 
 
+# ============== VENDOR EVENT FEED ==============
+class VendorEvent(models.Model):
+    """
+    Feed of new orders, cancellations and trial bookings for one vendor
+    (see backend/vendor_events.py). `id` is the client's cursor.
+    """
+    KIND_CHOICES = [
+        ('order.created', 'New order'),
+        ('order.cancelled', 'Order cancelled'),
+        ('trial.created', 'New trial booking'),
+        ('trial.cancelled', 'Trial booking cancelled'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name='events')
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True, related_name='vendor_events')
+    trial = models.ForeignKey(
+        TrialBooking, on_delete=models.CASCADE, null=True, blank=True, related_name='vendor_events',
+    )
+    data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['vendor', 'id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['vendor', 'kind', 'order'], condition=models.Q(order__isnull=False),
+                name='uniq_vendor_event_order',
+            ),
+            models.UniqueConstraint(
+                fields=['vendor', 'kind', 'trial'], condition=models.Q(trial__isnull=False),
+                name='uniq_vendor_event_trial',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.vendor_id} {self.kind} #{self.id}"
+
+
+# ============== MEDIA BLOBS ==============
+class MediaBlob(models.Model):
+    """
+    One stored file per distinct image content (see backend/media_blobs.py).
+    ref_count = rows whose image field points at `name`.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_uploaded_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'last_uploaded_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+
+# ============== CATALOG IMPORT ==============
+class CatalogImportJob(models.Model):
+    """
+    Bulk catalog import (CSV/JSONL manifest + optional zip of images), run by
+    backend.catalog_import. rows_processed is the resume cursor: every batch commits
+    its products/options/images together with the cursor, so a crashed or failed
+    job continues from the first uncommitted row.
+    """
+    STATUS_PENDING = 'PENDING'
+    STATUS_RUNNING = 'RUNNING'
+    STATUS_COMPLETED = 'COMPLETED'
+    STATUS_FAILED = 'FAILED'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    vendor = models.ForeignKey(
+        Vendor, on_delete=models.CASCADE, related_name='catalog_imports',
+        help_text='Products are created for this vendor',
+    )
+    manifest = models.FileField(upload_to='catalog_imports/', help_text='CSV or JSONL, one row per product option')
+    images_zip = models.FileField(upload_to='catalog_imports/', blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+
+    rows_total = models.PositiveIntegerField(null=True, blank=True)
+    rows_processed = models.PositiveIntegerField(default=0, help_text='Resume cursor (manifest rows committed)')
+    products_created = models.PositiveIntegerField(default=0)
+    options_created = models.PositiveIntegerField(default=0)
+    images_created = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True, help_text='First row errors: [{"row": n, "message": str}]')
+    product_refs = models.JSONField(default=dict, blank=True, help_text='{product_ref: product id} for resume')
+    message = models.TextField(blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Catalog import'
+        verbose_name_plural = 'Catalog imports'
+
+    def __str__(self):
+        return f"Import {str(self.id)[:8]} ({self.vendor_id}) - {self.status}"
+
+
+# ============== VENDOR DASHBOARD STATS ==============
+class VendorStats(models.Model):
+    """
+    Counter cache behind vendor_dashboard: one row per vendor, moved by
+    backend.vendor_stats deltas when the vendor's products, options or orders
+    change. Rebuild with: python manage.py rebuild_vendor_stats
+    """
+    vendor = models.OneToOneField(Vendor, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    total_products = models.PositiveIntegerField(default=0)
+    total_options = models.PositiveIntegerField(default=0)
+    total_stock = models.BigIntegerField(default=0)
+    low_stock_items = models.PositiveIntegerField(default=0)
+    pending_orders = models.PositiveIntegerField(default=0)
+    accepted_orders = models.PositiveIntegerField(default=0)
+    total_revenue = models.BigIntegerField(default=0)
+    products_refreshed_at = models.DateTimeField(null=True, blank=True)
+    orders_refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Vendor stats'
+        verbose_name_plural = 'Vendor stats'
+
+    def __str__(self):
+        return f"Stats for {self.vendor_id}"
+
+
+class VendorOrderDay(models.Model):
+    """Orders per vendor and local day, summed for the dashboard's recent orders (backend.vendor_stats)."""
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name='order_days')
+    day = models.DateField()
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['vendor', 'day']
+
+    def __str__(self):
+        return f"{self.vendor_id} {self.day}: {self.orders}"
+
+
+class ServiceVendorStats(models.Model):
+    """Counter cache behind service_vendor_dashboard (see VendorStats)."""
+    service_vendor = models.OneToOneField(
+        'ServiceVendor', on_delete=models.CASCADE, primary_key=True, related_name='stats',
+    )
+    total_services = models.PositiveIntegerField(default=0)
+    total_bookings = models.PositiveIntegerField(default=0)
+    pending_bookings = models.PositiveIntegerField(default=0)
+    confirmed_bookings = models.PositiveIntegerField(default=0)
+    total_revenue = models.BigIntegerField(default=0)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Service vendor stats'
+        verbose_name_plural = 'Service vendor stats'
+
+    def __str__(self):
+        return f"Stats for {self.service_vendor_id}"
+
+
+# ============== SERVICE LISTING READ MODEL ==============
+class ServiceListing(models.Model):
+    """
+    Browse/sort columns of one Service, kept by backend.service_listing so that
+    get_all_services filters and sorts on indexed columns. min_price is the
+    lowest available option price (base_price when the service has none).
+    Rebuild with: python manage.py rebuild_service_listings
+    """
+    service = models.OneToOneField(
+        'Service', on_delete=models.CASCADE, primary_key=True, related_name='listing',
+    )
+    category = models.ForeignKey('ServiceCategory', on_delete=models.CASCADE, null=True, related_name='+')
+    subcategory = models.ForeignKey('ServiceSubCategory', on_delete=models.SET_NULL, null=True, related_name='+')
+    is_listed = models.BooleanField(default=True)
+    rating = models.DecimalField(max_digits=3, decimal_places=1, default=0)
+    total_reviews = models.IntegerField(default=0)
+    experience_years = models.IntegerField(default=0)
+    min_price = models.IntegerField(default=0)
+    created_at = models.DateTimeField(help_text='Service.created_at')
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Service listing'
+        verbose_name_plural = 'Service listings'
+        indexes = [
+            models.Index(fields=['is_listed', '-created_at']),
+            models.Index(fields=['is_listed', '-rating', '-total_reviews']),
+            models.Index(fields=['is_listed', 'min_price']),
+            models.Index(fields=['category', 'is_listed', '-created_at']),
+            models.Index(fields=['category', 'is_listed', '-rating', '-total_reviews']),
+            models.Index(fields=['category', 'is_listed', 'min_price']),
+            models.Index(fields=['subcategory', 'is_listed', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"Listing for {self.service_id}"
+
+
+class ServicePincode(models.Model):
+    """
+    Pincodes a service is offered in (see backend.service_listing for the rules).
+    """
+    pincode = models.CharField(max_length=6)
+    service = models.ForeignKey('Service', on_delete=models.CASCADE, related_name='listing_pincodes')
+
+    class Meta:
+        verbose_name = 'Service pincode'
+        verbose_name_plural = 'Service pincodes'
+        constraints = [
+            models.UniqueConstraint(fields=['pincode', 'service'], name='uniq_service_pincode'),
+        ]
+
+    def __str__(self):
+        return f"{self.service_id} in {self.pincode}"
+
+
+# ============== ANALYTICS ROLLUPS ==============
+# Pre-aggregated tables read by the admin analytics dashboards.
+# Built incrementally by `python manage.py build_analytics_rollups`.
+
+class ScreenDailyRollup(models.Model):
+    """Per day x screen totals of ScreenViewEvent."""
+    day = models.DateField()
+    screen = models.CharField(max_length=150)
+    opens = models.PositiveIntegerField(default=0)
+    unique_users = models.PositiveIntegerField(default=0)
+    unique_devices = models.PositiveIntegerField(default=0)
+    total_seconds = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Screen daily rollup'
+        verbose_name_plural = 'Screen daily rollups'
+        ordering = ['-day', '-opens']
+        unique_together = [['day', 'screen']]
+        indexes = [
+            models.Index(fields=['screen', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.screen}: {self.opens}"
+
+
+class ScreenHourlyRollup(models.Model):
+    """Per hour x screen totals of ScreenViewEvent (intraday charts)."""
+    hour = models.DateTimeField()
+    screen = models.CharField(max_length=150)
+    opens = models.PositiveIntegerField(default=0)
+    total_seconds = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Screen hourly rollup'
+        verbose_name_plural = 'Screen hourly rollups'
+        ordering = ['-hour', '-opens']
+        unique_together = [['hour', 'screen']]
+        indexes = [
+            models.Index(fields=['screen', 'hour']),
+        ]
+
+    def __str__(self):
+        return f"{self.hour} {self.screen}: {self.opens}"
+
+
+class PlatformDailyRollup(models.Model):
+    """Per day x platform totals of ScreenViewEvent."""
+    day = models.DateField()
+    platform = models.CharField(max_length=20, blank=True, default='')
+    events = models.PositiveIntegerField(default=0)
+    app_opens = models.PositiveIntegerField(default=0)
+    unique_users = models.PositiveIntegerField(default=0)
+    unique_devices = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Platform daily rollup'
+        verbose_name_plural = 'Platform daily rollups'
+        ordering = ['-day', 'platform']
+        unique_together = [['day', 'platform']]
+
+    def __str__(self):
+        return f"{self.day} {self.platform or 'unknown'}: {self.events}"
+
+
+class OrderDailyRollup(models.Model):
+    """Per day (of Order.created_at) x tx_status order counts and amounts."""
+    day = models.DateField()
+    tx_status = models.CharField(max_length=100, blank=True, default='')
+    orders = models.PositiveIntegerField(default=0)
+    tx_amount = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Order daily rollup'
+        verbose_name_plural = 'Order daily rollups'
+        ordering = ['-day', 'tx_status']
+        unique_together = [['day', 'tx_status']]
+
+    def __str__(self):
+        return f"{self.day} {self.tx_status or 'UNKNOWN'}: {self.orders}"
+
+
+class LocationCellDailyCount(models.Model):
+    """
+    Per day x grid cell counts of CustomerLocationPing. Kept after raw pings
+    pass the retention window; the admin heatmap reads only this table.
+    """
+    day = models.DateField()
+    grid_cell = models.BigIntegerField()
+    pings = models.PositiveIntegerField(default=0)
+    unique_devices = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Location cell daily count'
+        verbose_name_plural = 'Location cell daily counts'
+        ordering = ['-day', '-pings']
+        unique_together = [['day', 'grid_cell']]
+        indexes = [
+            models.Index(fields=['grid_cell', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.day} cell {self.grid_cell}: {self.pings}"
+
+
+class FunnelStepDaily(models.Model):
+    """
+    Sessions (by day of their first event) that reached each step of a funnel
+    defined in settings.ANALYTICS_FUNNELS. Maintained by build_session_funnels.
+    """
+    day = models.DateField()
+    funnel = models.CharField(max_length=100)
+    step = models.PositiveSmallIntegerField(help_text='1-based step index')
+    screen = models.CharField(max_length=150, blank=True, default='')
+    sessions = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Funnel step (daily)'
+        verbose_name_plural = 'Funnel steps (daily)'
+        ordering = ['-day', 'funnel', 'step']
+        unique_together = [['day', 'funnel', 'step']]
+        indexes = [
+            models.Index(fields=['funnel', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.funnel} #{self.step}: {self.sessions}"
+
+
+class ScreenTransitionDaily(models.Model):
+    """
+    Count of consecutive screen pairs (from -> to) within sessions, by day of the
+    session's first event. Maintained by build_session_funnels.
+    """
+    day = models.DateField()
+    from_screen = models.CharField(max_length=150)
+    to_screen = models.CharField(max_length=150)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Screen transition (daily)'
+        verbose_name_plural = 'Screen transitions (daily)'
+        ordering = ['-day', '-count']
+        unique_together = [['day', 'from_screen', 'to_screen']]
+
+    def __str__(self):
+        return f"{self.day} {self.from_screen} -> {self.to_screen}: {self.count}"
+
+
+class SessionFunnelState(models.Model):
+    """
+    What one session currently contributes to FunnelStepDaily / ScreenTransitionDaily.
+    When a session gets new (or late) events it is recomputed and only the
+    difference is applied to the daily counters. Pruned after ANALYTICS_FUNNEL_STATE_DAYS.
+    """
+    session_id = models.CharField(max_length=64, unique=True)
+    day = models.DateField()
+    events = models.PositiveIntegerField(default=0)
+    steps = models.JSONField(default=dict, blank=True, help_text='{funnel: steps reached}')
+    transitions = models.JSONField(default=dict, blank=True, help_text='{"from\\tto": count}')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+
+    def __str__(self):
+        return f"{self.session_id} ({self.day})"
+
+
+class AnalyticsWatermark(models.Model):
+    """Last processed position of an incremental analytics job."""
+    name = models.CharField(max_length=100, unique=True)
+    processed_until = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Analytics watermark'
+        verbose_name_plural = 'Analytics watermarks'
+
+    def __str__(self):
+        return f"{self.name} @ {self.processed_until}"
+
+
 class AdminNotificationLog(models.Model):
     """Log of push notifications sent from admin panel."""
     TARGET_ALL = 'all'
@@ -1786,6 +2288,12 @@ class Service(models.Model):
     base_price = models.IntegerField(default=0, help_text="Starting price")
     rating = models.DecimalField(max_digits=3, decimal_places=1, default=0.0)
     total_reviews = models.IntegerField(default=0)
+    # Rating histogram behind rating / total_reviews, kept by backend.ratings
+    star_5 = models.IntegerField(default=0)
+    star_4 = models.IntegerField(default=0)
+    star_3 = models.IntegerField(default=0)
+    star_2 = models.IntegerField(default=0)
+    star_1 = models.IntegerField(default=0)
     experience_years = models.IntegerField(default=0, help_text="Years of experience")
     availability = models.BooleanField(default=True)
     location = models.CharField(max_length=500, blank=True)
@@ -1852,7 +2360,8 @@ class ServiceOption(models.Model):
 
 class ServiceImage(models.Model):
     position = models.IntegerField(default=0)
-    image = models.ImageField(upload_to='services/')
+    image = models.ImageField(upload_to='services/', storage=get_content_storage)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     service_option = models.ForeignKey(ServiceOption, on_delete=models.CASCADE, related_name='images_set')
 
     class Meta:
@@ -1927,34 +2436,6 @@ class ServiceBooking(models.Model):
     def __str__(self):
         return f"{self.customer_name} - {self.service_option.service.title} on {self.booking_date}"
 
-    def save(self, *args, **kwargs):
-        """
-        When a ServiceBooking transitions to COMPLETED with PAID payment_status, we may
-        trigger referral completion for the referred user based on ReferralSettings.
-        """
-        old_status = None
-        old_payment_status = None
-        if self.pk:
-            try:
-                old = ServiceBooking.objects.only('status', 'payment_status').get(pk=self.pk)
-                old_status = old.status
-                old_payment_status = old.payment_status
-            except ServiceBooking.DoesNotExist:
-                old_status = None
-                old_payment_status = None
-
-        super().save(*args, **kwargs)
-
-        # Trigger when we newly reach COMPLETED + PAID
-        if (old_status != 'COMPLETED' or old_payment_status != 'PAID') and \
-                self.status == 'COMPLETED' and self.payment_status == 'PAID':
-            _maybe_complete_referral_for_user(
-                user=self.user,
-                qualifying_amount=self.total_amount,
-                source_order=None,
-                source_booking=self,
-            )
-
 
 class ReferralSettings(models.Model):
     """Configurable settings for the referral & wallet system."""
@@ -2041,6 +2522,49 @@ class ArtistAvailability(models.Model):
         return f"{self.artist.title} - {self.date} ({self.status})"
 
 
+# ============== ARTIST CALENDAR BITMAPS ==============
+# Kept by backend.artist_calendar from ServiceBooking and ArtistAvailability.
+
+class ArtistCalendarMonth(models.Model):
+    """
+    One artist's month as day bitmaps (bit d-1 = day d): days with active
+    customer bookings, days the admin marked booked, and blocked days.
+    """
+    artist = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='calendar_months')
+    month = models.DateField(help_text='First day of the month')
+    booked_days = models.BigIntegerField(default=0)
+    artist_booked_days = models.BigIntegerField(default=0)
+    blocked_days = models.BigIntegerField(default=0)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Artist calendar month'
+        verbose_name_plural = 'Artist calendar months'
+        unique_together = [['artist', 'month']]
+
+    def __str__(self):
+        return f"{self.artist_id} {self.month:%Y-%m}"
+
+
+class ArtistDaySlots(models.Model):
+    """
+    One artist's day as a bitmap of 15-minute slots (bit n = minutes 15n..15n+15)
+    covered by active bookings, each for its own duration.
+    """
+    artist = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='calendar_days')
+    date = models.DateField()
+    busy = models.BinaryField(max_length=12, default=bytes(12))
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Artist day slots'
+        verbose_name_plural = 'Artist day slots'
+        unique_together = [['artist', 'date']]
+
+    def __str__(self):
+        return f"{self.artist_id} {self.date}"
+
+
 class ServiceableLocation(models.Model):
     """
     Pincodes where services are available
@@ -2075,6 +2599,30 @@ class ServiceableLocation(models.Model):
         return f"{self.pincode} - {self.area_name}"
 
 
+class PincodeCentroid(models.Model):
+    """
+    Offline geocoding data: one centroid per Indian pincode (mean of its post
+    office coordinates). Loaded by `python manage.py load_pincode_geodata`,
+    served from memory by backend/pincode_geocoder.py.
+    """
+    pincode = models.CharField(max_length=6, unique=True)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    district = models.CharField(max_length=100, blank=True, default='')
+    state = models.CharField(max_length=100, blank=True, default='')
+    area_names = models.TextField(blank=True, default='', help_text="Post office / locality names, '|'-separated")
+    office_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Pincode Centroid"
+        verbose_name_plural = "Pincode Centroids"
+        ordering = ['pincode']
+
+    def __str__(self):
+        return f"{self.pincode} ({self.latitude}, {self.longitude})"
+
+
 class Referral(models.Model):
     """
     Tracks referral relationships and reward lifecycle.
@@ -2190,7 +2738,10 @@ class ServiceCategoryAvailability(models.Model):
 
 
 class WalletTransaction(models.Model):
-    """Immutable ledger of all wallet credits/debits for referral wallet."""
+    """
+    Append-only ledger of all referral wallet credits/debits; posted through
+    backend/wallet.py, which keeps User.referral_wallet_balance in step.
+    """
     TYPE_CREDIT = 'credit'
     TYPE_DEBIT = 'debit'
     TYPE_CHOICES = [
@@ -2202,6 +2753,8 @@ class WalletTransaction(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     type = models.CharField(max_length=10, choices=TYPE_CHOICES)
     description = models.CharField(max_length=255)
+    # One per business event (e.g. "referral:12:reward"); a repeated post is a no-op
+    idempotency_key = models.CharField(max_length=100, unique=True, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     # Optional linkage for better auditability
@@ -2219,6 +2772,13 @@ class WalletTransaction(models.Model):
         blank=True,
         related_name='wallet_transactions',
     )
+    referral = models.ForeignKey(
+        Referral,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='wallet_transactions',
+    )
 
     class Meta:
         verbose_name = "Wallet Transaction"
@@ -2228,94 +2788,10 @@ class WalletTransaction(models.Model):
     def __str__(self):
         return f"{self.user.email} - {self.type} ₹{self.amount}"
 
-
-def _maybe_complete_referral_for_user(user, qualifying_amount, source_order=None, source_booking=None):
-    """
-    When referred user completes first qualifying order (delivered / booking completed):
-    automatically credit reward to referrer's wallet, mark referral as REWARDED,
-    and send push notification. No admin approval required.
-    """
-    # Basic safety: don't process banned users
-    if getattr(user, 'is_banned', False):
-        return
-
-    # Load settings
-    settings_obj = ReferralSettings.get_active()
-    if not settings_obj:
-        return
-
-    try:
-        amount_int = int(qualifying_amount or 0)
-    except (TypeError, ValueError):
-        amount_int = 0
-
-    if amount_int < int(settings_obj.minimum_order_amount or 0):
-        return
-
-    # Find pending, non-suspicious referral for this user
-    referral = Referral.objects.filter(
-        referred_user=user,
-        status=Referral.STATUS_PENDING,
-        is_suspicious=False,
-    ).select_related('referrer', 'referred_user').first()
-
-    if not referral:
-        return
-
-    referrer = referral.referrer
-    if not referrer or getattr(referrer, 'is_banned', False):
-        return
-
-    reward_amount = referral.reward_amount or 0
-    if not reward_amount or reward_amount <= 0:
-        return
-
-    now = timezone.now()
-    from datetime import timedelta
-
-    # Mark completed and set hold_until (for audit; we credit immediately)
-    referral.status = Referral.STATUS_COMPLETED
-    referral.completed_at = now
-    referral.hold_until = now + timedelta(days=settings_obj.reward_hold_days or 0)
-    referral.save(update_fields=['status', 'completed_at', 'hold_until'])
-
-    # Auto-credit: add to referrer's wallet and mark as REWARDED (no admin approval)
-    wallet_balance = int(referrer.referral_wallet_balance or 0)
-    referrer.referral_wallet_balance = wallet_balance + int(reward_amount)
-    referrer.save(update_fields=['referral_wallet_balance'])
-
-    WalletTransaction.objects.create(
-        user=referrer,
-        amount=reward_amount,
-        type=WalletTransaction.TYPE_CREDIT,
-        description=f"Referral reward for {referral.referred_user.email}",
-    )
-
-    referral.status = Referral.STATUS_REWARDED
-    referral.rewarded_at = now
-    referral.save(update_fields=['status', 'rewarded_at'])
-
-    # Push: Wallet credited
-    referred_name = (
-        referral.referred_user.fullname
-        or referral.referred_user.email
-        or referral.referred_user.phone
-        or 'Your friend'
-    )
-    referred_name = str(referred_name)[:50]
-    reward_str = str(int(reward_amount))
-
-    try:
-        from backend.fcm_utils import send_fcm_to_user
-        send_fcm_to_user(
-            referrer,
-            'Wallet credited 💰',
-            f'{referred_name} completed their first order! Your ₹{reward_str} has been credited to your referral wallet.',
-            data={'screen': 'referral', 'type': 'referral_wallet_credited'},
-        )
-    except Exception as e:
-        import logging
-        logging.getLogger(__name__).warning('Referral push (wallet credited) failed: %s', e)
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Wallet transactions are append-only; post a correcting entry instead')
+        super().save(*args, **kwargs)
 
 
 # models.py - Add this new model
@@ -2375,10 +2851,12 @@ class HomePageItem(models.Model):
 
     image = models.ImageField(
         upload_to='home_page_items/',
+        storage=get_content_storage,
         blank=True,
         null=True,
         help_text="Optional banner image"
     )
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     # Category association - âœ… MADE OPTIONAL
     category = models.ForeignKey(
@@ -0,0 +1,320 @@
+"""
+Offline geocoding for Indian pincodes (replaces the Nominatim calls in utils).
+
+PincodeCentroid rows (loaded by `python manage.py load_pincode_geodata`) are
+held in memory as flat arrays sorted by grid cell:
+    reverse: lat/lng -> nearest pincode, scanning grid cells in growing rings;
+    forward: pincode -> centroid by binary search, area / post office name ->
+             centroid through a name map, narrowed by city (district) / state.
+The dataset is the India Post pincode directory CSV (data.gov.in) or any CSV
+with pincode, latitude and longitude columns.
+
+The index is built on first use. Other processes notice a reload through a
+row count / updated_at fingerprint, checked at most every GEO_INDEX_CHECK_SECONDS.
+"""
+import csv
+import math
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from backend.geo_utils import haversine_m
+
+CELL_DEG = 0.2
+# Pincode centroids outside this box are data errors (swapped or missing digits)
+INDIA_BOUNDS = (6.0, 38.0, 68.0, 98.0)
+METRES_PER_DEG = 111195.0
+
+_OFFICE_SUFFIX_RE = re.compile(r'\b(b\.?o|s\.?o|h\.?o|g\.?p\.?o)\.?$')
+_NON_WORD_RE = re.compile(r'[^a-z0-9]+')
+
+_lock = threading.Lock()
+_index = None
+_checked_at = 0.0
+
+
+def normalize_name(name):
+    """'Agar Malwa S.O' -> 'agar malwa'."""
+    name = _OFFICE_SUFFIX_RE.sub('', (name or '').strip().lower())
+    return _NON_WORD_RE.sub(' ', name).strip()
+
+
+def _cell(lat, lng):
+    return int(math.floor(lat / CELL_DEG)), int(math.floor(lng / CELL_DEG))
+
+
+# =============================================================================
+# INDEX
+# =============================================================================
+
+class PincodeIndex:
+    """Array-backed pincode centroid index. rows: (pincode, lat, lng, district, state, area names)."""
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda r: (_cell(r[1], r[2]), r[0]))
+        self.codes = array('l', (int(r[0]) for r in rows))
+        self.lats = array('d', (r[1] for r in rows))
+        self.lngs = array('d', (r[2] for r in rows))
+        self.districts = [normalize_name(r[3]) for r in rows]
+        self.states = [normalize_name(r[4]) for r in rows]
+
+        self.cells = {}  # (row, col) -> (start, end) into the arrays
+        for position, row in enumerate(rows):
+            key = _cell(row[1], row[2])
+            start, _ = self.cells.get(key, (position, position))
+            self.cells[key] = (start, position + 1)
+
+        order = sorted(range(len(rows)), key=self.codes.__getitem__)
+        self.sorted_codes = array('l', (self.codes[i] for i in order))
+        self.code_positions = array('l', order)
+
+        self.areas = {}  # normalized name -> positions
+        for position, row in enumerate(rows):
+            for name in row[5]:
+                key = normalize_name(name)
+                if key:
+                    self.areas.setdefault(key, []).append(position)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _pincode(self, position):
+        return f'{self.codes[position]:06d}'
+
+    def _point(self, position):
+        return round(self.lats[position], 6), round(self.lngs[position], 6)
+
+    def reverse(self, lat, lng, max_distance_m):
+        """(pincode, distance_m) of the nearest centroid within max_distance_m, or None."""
+        if not len(self):
+            return None
+        row, col = _cell(lat, lng)
+        # Rings that cover max_distance_m (a degree of longitude is >= half a degree of latitude below 60N)
+        max_rings = int(max_distance_m / (METRES_PER_DEG * CELL_DEG * 0.5)) + 1
+        best, best_position = max_distance_m, None
+        for ring in range(max_rings + 1):
+            for r in range(row - ring, row + ring + 1):
+                edge = r in (row - ring, row + ring)
+                for c in (range(col - ring, col + ring + 1) if edge else (col - ring, col + ring)):
+                    span = self.cells.get((r, c))
+                    if span is None:
+                        continue
+                    for position in range(*span):
+                        distance = haversine_m(lat, lng, self.lats[position], self.lngs[position])
+                        if distance <= best:
+                            best, best_position = distance, position
+            # Cells beyond this ring are at least `ring` cells away; stop when the best is closer than that
+            reach_lat = min(89.0, abs(lat) + (ring + 1) * CELL_DEG)
+            if best_position is not None and best <= ring * CELL_DEG * METRES_PER_DEG * math.cos(math.radians(reach_lat)):
+                break
+        if best_position is None:
+            return None
+        return self._pincode(best_position), best
+
+    def pincode_point(self, pincode):
+        try:
+            code = int(str(pincode).strip())
+        except (TypeError, ValueError):
+            return None
+        i = bisect_left(self.sorted_codes, code)
+        if i < len(self.sorted_codes) and self.sorted_codes[i] == code:
+            return self._point(self.code_positions[i])
+        return None
+
+    def area_point(self, area_name, city=None, state=None):
+        positions = self.areas.get(normalize_name(area_name))
+        if not positions:
+            return None
+        city, state = normalize_name(city), normalize_name(state)
+        # Prefer the match in the same district, then the same state
+        for wanted in (
+            lambda p: city and self.districts[p] == city,
+            lambda p: state and self.states[p] == state,
+            lambda p: True,
+        ):
+            for position in positions:
+                if wanted(position):
+                    return self._point(position)
+        return None
+
+
+def _fingerprint():
+    from backend.models import PincodeCentroid
+    return tuple(PincodeCentroid.objects.aggregate(n=Count('id'), at=Max('updated_at')).values())
+
+
+def _load():
+    from backend.models import PincodeCentroid
+
+    fingerprint = _fingerprint()
+    rows = [
+        (pincode, float(lat), float(lng), district, state, [a for a in areas.split('|') if a])
+        for pincode, lat, lng, district, state, areas in PincodeCentroid.objects.values_list(
+            'pincode', 'latitude', 'longitude', 'district', 'state', 'area_names',
+        ).iterator(chunk_size=5000)
+    ]
+    index = PincodeIndex(rows)
+    index.fingerprint = fingerprint
+    return index
+
+
+def get_index():
+    global _index, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if _index is not None and now - _checked_at >= getattr(settings, 'GEO_INDEX_CHECK_SECONDS', 60):
+            if _fingerprint() != _index.fingerprint:
+                _index = None
+            _checked_at = now
+        if _index is None:
+            _index = _load()
+            _checked_at = now
+        return _index
+
+
+def invalidate():
+    global _index
+    with _lock:
+        _index = None
+
+
+# =============================================================================
+# LOOKUPS
+# =============================================================================
+
+def reverse_geocode(latitude, longitude, max_distance_m=None):
+    """Nearest pincode to a lat/lng, or None when nothing is within PINCODE_GEOCODER_MAX_KM."""
+    if max_distance_m is None:
+        max_distance_m = getattr(settings, 'PINCODE_GEOCODER_MAX_KM', 30) * 1000
+    found = get_index().reverse(float(latitude), float(longitude), max_distance_m)
+    return found[0] if found else None
+
+
+def geocode(pincode=None, area_name=None, city=None, state=None):
+    """(latitude, longitude) of a pincode, else of an area / post office name; (None, None) if unknown."""
+    index = get_index()
+    point = None
+    if pincode:
+        point = index.pincode_point(pincode)
+    if point is None and area_name:
+        point = index.area_point(area_name, city, state)
+    if point is None and city:
+        point = index.area_point(city, city, state)
+    return point or (None, None)
+
+
+# =============================================================================
+# DATASET IMPORT / BACKFILL
+# =============================================================================
+
+_COLUMNS = {
+    'pincode': ('pincode', 'pin', 'pin_code', 'postcode'),
+    'latitude': ('latitude', 'lat'),
+    'longitude': ('longitude', 'lng', 'lon', 'long'),
+    'area': ('officename', 'office_name', 'area', 'area_name', 'locality'),
+    'district': ('district', 'districtname', 'city'),
+    'state': ('statename', 'state_name', 'state'),
+}
+
+
+def _column_map(header):
+    normalized = {h.strip().lower().replace(' ', '_'): h for h in header}
+    columns = {}
+    for field, aliases in _COLUMNS.items():
+        columns[field] = next((normalized[a] for a in aliases if a in normalized), None)
+    missing = [f for f in ('pincode', 'latitude', 'longitude') if columns[f] is None]
+    if missing:
+        raise ValueError(f"CSV is missing column(s): {', '.join(missing)}")
+    return columns
+
+
+def read_csv(fileobj):
+    """
+    Aggregate a pincode CSV into {pincode: dict} centroids (mean of valid office
+    coordinates). Returns (centroids, rows read, rows skipped).
+    """
+    reader = csv.DictReader(fileobj)
+    columns = _column_map(reader.fieldnames or [])
+    min_lat, max_lat, min_lng, max_lng = INDIA_BOUNDS
+    sums = {}
+    read = skipped = 0
+    for row in reader:
+        read += 1
+        pincode = ''.join(ch for ch in (row.get(columns['pincode']) or '') if ch.isdigit())
+        try:
+            lat = float(row[columns['latitude']])
+            lng = float(row[columns['longitude']])
+        except (TypeError, ValueError):
+            lat = lng = None
+        if len(pincode) != 6 or lat is None or not (min_lat <= lat <= max_lat and min_lng <= lng <= max_lng):
+            skipped += 1
+            continue
+        entry = sums.setdefault(pincode, {'lat': 0.0, 'lng': 0.0, 'n': 0, 'areas': [], 'district': '', 'state': ''})
+        entry['lat'] += lat
+        entry['lng'] += lng
+        entry['n'] += 1
+        for field in ('district', 'state'):
+            if columns[field] and not entry[field]:
+                entry[field] = (row.get(columns[field]) or '').strip().title()
+        if columns['area']:
+            area = _OFFICE_SUFFIX_RE.sub('', (row.get(columns['area']) or '').strip().lower()).strip().title()
+            if area and area not in entry['areas']:
+                entry['areas'].append(area)
+
+    centroids = {
+        pincode: {
+            'latitude': round(e['lat'] / e['n'], 6),
+            'longitude': round(e['lng'] / e['n'], 6),
+            'district': e['district'][:100],
+            'state': e['state'][:100],
+            'area_names': '|'.join(e['areas']),
+            'office_count': e['n'],
+        }
+        for pincode, e in sums.items()
+    }
+    return centroids, read, skipped
+
+
+def store_centroids(centroids, replace=False, batch_size=2000):
+    """Upsert centroids; with replace, pincodes missing from the dataset are deleted. Returns rows written."""
+    from backend.models import PincodeCentroid
+
+    fields = ['latitude', 'longitude', 'district', 'state', 'area_names', 'office_count']
+    rows = [PincodeCentroid(pincode=pincode, **values) for pincode, values in centroids.items()]
+    with transaction.atomic():
+        if replace:
+            PincodeCentroid.objects.exclude(pincode__in=list(centroids)).delete()
+        for start in range(0, len(rows), batch_size):
+            PincodeCentroid.objects.bulk_create(
+                rows[start:start + batch_size],
+                update_conflicts=True, unique_fields=['pincode'], update_fields=fields + ['updated_at'],
+            )
+    invalidate()
+    return len(rows)
+
+
+def backfill_locations(overwrite=False):
+    """Fill ServiceableLocation coordinates from the dataset. Returns (updated, not found)."""
+    from backend.models import ServiceableLocation
+
+    locations = ServiceableLocation.objects.all()
+    if not overwrite:
+        locations = locations.filter(Q(latitude__isnull=True) | Q(longitude__isnull=True))
+
+    updated = not_found = 0
+    with transaction.atomic():
+        for location in locations:
+            lat, lng = geocode(location.pincode, location.area_name, location.city, location.state)
+            if lat is None:
+                not_found += 1
+                continue
+            location.latitude, location.longitude = lat, lng
+            location.save(update_fields=['latitude', 'longitude', 'updated_at'])
+            updated += 1
+    return updated, not_found
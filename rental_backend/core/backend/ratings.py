@@ -0,0 +1,163 @@
+"""
+Rating histograms and averages for products and services.
+
+Product ratings live on OrderedProduct.rating (0 = not rated), service ratings
+on ServiceBooking.rating (None = not rated). Product and Service each keep a
+star_1..star_5 histogram plus a count and a one-decimal average:
+    Product: rating_count, rating_average
+    Service: total_reviews, rating
+backend/signals.py applies every rate, re-rate and delete as a delta to the
+target row. The row is locked, its histogram adjusted and count/average derived
+from it, so one update touches one row whatever the number of reviews.
+Migration 0049 fills the histograms from the existing ratings. Drift (raw SQL,
+queryset.update, rows moved between products) is repaired by
+`python manage.py reconcile_ratings`.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+STARS = (1, 2, 3, 4, 5)
+STAR_FIELDS = [f'star_{n}' for n in STARS]
+
+
+def _valid(rating):
+    return rating if rating in STARS else None
+
+
+def _aggregates(row):
+    """(count, average as Decimal with one place) from a row's histogram."""
+    count = sum(getattr(row, f'star_{n}') for n in STARS)
+    if not count:
+        return 0, Decimal('0.0')
+    total = sum(n * getattr(row, f'star_{n}') for n in STARS)
+    return count, (Decimal(total) / count).quantize(Decimal('0.1'), rounding=ROUND_HALF_UP)
+
+
+# (count field, average field) per model
+_TARGETS = {
+    'Product': ('rating_count', 'rating_average'),
+    'Service': ('total_reviews', 'rating'),
+}
+
+
+def _write(row):
+    """Write the row's histogram and derived count/average (one UPDATE, no model signals)."""
+    model = type(row)
+    count_field, average_field = _TARGETS[model.__name__]
+    count, average = _aggregates(row)
+    values = {field: getattr(row, field) for field in STAR_FIELDS}
+    values.update({count_field: count, average_field: average})
+    model.objects.filter(pk=row.pk).update(**values)
+
+
+def _store(row):
+    """_write, then refresh the service listings that show the rating."""
+    _write(row)
+    if type(row).__name__ == 'Service':
+        from backend.service_listing import schedule_listings
+        schedule_listings(row.pk)
+
+
+# =============================================================================
+# INCREMENTAL UPDATES
+# =============================================================================
+
+def apply_change(model, pk, old_rating=None, new_rating=None):
+    """Move one rating from old_rating to new_rating (either may be unset) on the target row."""
+    old_rating, new_rating = _valid(old_rating), _valid(new_rating)
+    if pk is None or old_rating == new_rating:
+        return
+    with transaction.atomic():
+        row = model.objects.select_for_update().only('pk', *STAR_FIELDS).filter(pk=pk).first()
+        if row is None:
+            return
+        if old_rating:
+            field = f'star_{old_rating}'
+            setattr(row, field, max(0, getattr(row, field) - 1))
+        if new_rating:
+            field = f'star_{new_rating}'
+            setattr(row, field, getattr(row, field) + 1)
+        _store(row)
+
+
+def product_rating_changed(product_id, old_rating=None, new_rating=None):
+    from backend.models import Product
+    apply_change(Product, product_id, old_rating, new_rating)
+
+
+def service_rating_changed(service_id, old_rating=None, new_rating=None):
+    from backend.models import Service
+    apply_change(Service, service_id, old_rating, new_rating)
+
+
+# =============================================================================
+# RECONCILIATION
+# =============================================================================
+
+def _reconcile(model, histograms, ids=None, dry_run=False, store=_store):
+    """
+    Compare stored histograms with `histograms` ({pk: {star_n: count}}) and fix
+    rows that differ. Returns the number of rows that were (or would be) fixed.
+    """
+    rows = model.objects.all()
+    if ids is not None:
+        rows = rows.filter(pk__in=ids)
+    count_field, average_field = _TARGETS[model.__name__]
+    empty = {field: 0 for field in STAR_FIELDS}
+
+    fixed = 0
+    for row in rows.only('pk', *STAR_FIELDS, count_field, average_field).iterator():
+        expected = histograms.get(row.pk, empty)
+        stored = [getattr(row, field) for field in STAR_FIELDS] + [getattr(row, count_field), getattr(row, average_field)]
+        for field in STAR_FIELDS:
+            setattr(row, field, expected[field])
+        if stored == [expected[field] for field in STAR_FIELDS] + list(_aggregates(row)):
+            continue
+        fixed += 1
+        if not dry_run:
+            store(row)
+    return fixed
+
+
+def _star_counts(queryset, group_by):
+    annotations = {f'star_{n}': Count('pk', filter=Q(rating=n)) for n in STARS}
+    return {
+        row.pop(group_by): row
+        for row in queryset.filter(rating__in=STARS).values(group_by).annotate(**annotations)
+    }
+
+
+def reconcile_products(ids=None, dry_run=False):
+    from backend.models import OrderedProduct, Product
+
+    source = OrderedProduct.objects.all()
+    if ids is not None:
+        source = source.filter(product_option__product_id__in=ids)
+    return _reconcile(Product, _star_counts(source, 'product_option__product_id'), ids, dry_run)
+
+
+def reconcile_services(ids=None, dry_run=False):
+    from backend.models import Service, ServiceBooking
+
+    source = ServiceBooking.objects.all()
+    if ids is not None:
+        source = source.filter(service_option__service_id__in=ids)
+    return _reconcile(Service, _star_counts(source, 'service_option__service_id'), ids, dry_run)
+
+
+def backfill(apps):
+    """
+    Fill every histogram, count and average from the individual ratings using
+    the migration's historical models (migration 0049): the columns were
+    added at 0, and the first rating after that would otherwise overwrite
+    the existing count and average from an empty histogram.
+    """
+    Product = apps.get_model('backend', 'Product')
+    Service = apps.get_model('backend', 'Service')
+    OrderedProduct = apps.get_model('backend', 'OrderedProduct')
+    ServiceBooking = apps.get_model('backend', 'ServiceBooking')
+
+    _reconcile(Product, _star_counts(OrderedProduct.objects.all(), 'product_option__product_id'), store=_write)
+    _reconcile(Service, _star_counts(ServiceBooking.objects.all(), 'service_option__service_id'), store=_write)
@@ -0,0 +1,146 @@
+"""
+Scheduled referral processing: hourly through the Vercel cron in vercel.json
+(GET /api/cron/referral-rewards/) or `python manage.py process_referral_rewards`.
+Order and booking saves do no referral work.
+
+One run:
+    complete:  pending, non-suspicious referrals whose referred user has a
+               delivered order item (order total >= minimum_order_amount) or a
+               completed, paid service booking (total >= minimum) become
+               COMPLETED, with hold_until = now + reward_hold_days; one UPDATE;
+    reward:    COMPLETED, non-suspicious referrals whose hold has passed (and
+               whose referrer is not banned) are credited chunk by chunk: each
+               chunk is one transaction with one ledger insert and one balance
+               UPDATE (backend/wallet.py credit_referrals) and is then marked
+               REWARDED;
+    notify:    after all chunks commit, referrers get one push per distinct
+               credited total, sent as FCM multicasts.
+The admin "approve & credit" action runs the reward step for its selection.
+"""
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+# =============================================================================
+# COMPLETION
+# =============================================================================
+
+def complete_qualified(now=None):
+    """Mark pending referrals whose referred user has qualified as COMPLETED. Returns the number marked."""
+    from datetime import timedelta
+
+    from backend.models import OrderedProduct, Referral, ReferralSettings, ServiceBooking
+
+    settings_obj = ReferralSettings.get_active()
+    if not settings_obj:
+        return 0
+    now = now or timezone.now()
+    minimum = settings_obj.minimum_order_amount or 0
+
+    delivered = OrderedProduct.objects.filter(
+        order__user=OuterRef('referred_user'), status='DELIVERED', order__tx_amount__gte=minimum,
+    )
+    completed_booking = ServiceBooking.objects.filter(
+        user=OuterRef('referred_user'), status='COMPLETED', payment_status='PAID', total_amount__gte=minimum,
+    )
+    return Referral.objects.filter(
+        Exists(delivered) | Exists(completed_booking),
+        status=Referral.STATUS_PENDING,
+        is_suspicious=False,
+        referred_user__is_banned=False,
+    ).update(
+        status=Referral.STATUS_COMPLETED,
+        completed_at=now,
+        hold_until=now + timedelta(days=settings_obj.reward_hold_days or 0),
+    )
+
+
+# =============================================================================
+# REWARDS
+# =============================================================================
+
+def eligible(now=None, referral_ids=None):
+    """Referrals the reward step would credit now."""
+    from backend.models import Referral
+
+    now = now or timezone.now()
+    referrals = Referral.objects.filter(
+        Q(hold_until__isnull=True) | Q(hold_until__lte=now),
+        status=Referral.STATUS_COMPLETED,
+        is_suspicious=False,
+        referrer__is_banned=False,
+        reward_amount__gt=0,
+    )
+    if referral_ids is not None:
+        referrals = referrals.filter(pk__in=referral_ids)
+    return referrals
+
+
+def _reward_chunk(ids, now):
+    from backend import wallet
+    from backend.models import Referral
+
+    with transaction.atomic():
+        referrals = list(
+            eligible(now).filter(pk__in=ids).select_for_update(skip_locked=True, of=('self',)).select_related(
+                'referred_user',
+            )
+        )
+        credited = wallet.credit_referrals(referrals)
+        # Already in the ledger (credited before): only the status was behind
+        Referral.objects.filter(pk__in=[referral.pk for referral in referrals]).update(
+            status=Referral.STATUS_REWARDED, rewarded_at=now,
+        )
+    return credited
+
+
+def reward_due(now=None, referral_ids=None, chunk_size=DEFAULT_CHUNK_SIZE, notify=True):
+    """Credit every eligible referral (of these ids). Returns the referrals credited."""
+    now = now or timezone.now()
+    ids = list(eligible(now, referral_ids).order_by('hold_until', 'pk').values_list('pk', flat=True))
+    credited = []
+    for start in range(0, len(ids), chunk_size):
+        credited.extend(_reward_chunk(ids[start:start + chunk_size], now))
+    if notify:
+        notify_credited(credited)
+    return credited
+
+
+def process(now=None, chunk_size=DEFAULT_CHUNK_SIZE, notify=True):
+    """One scheduled run: complete, then reward. Returns (completed, credited referrals)."""
+    now = now or timezone.now()
+    completed = complete_qualified(now)
+    return completed, reward_due(now, chunk_size=chunk_size, notify=notify)
+
+
+# =============================================================================
+# NOTIFICATIONS
+# =============================================================================
+
+def notify_credited(referrals):
+    """Push "wallet credited" to the referrers: one multicast per distinct credited total."""
+    import logging
+
+    from backend.fcm_utils import send_fcm_to_users
+    from backend.models import User
+
+    totals = {}
+    for referral in referrals:
+        totals[referral.referrer_id] = totals.get(referral.referrer_id, 0) + referral.reward_amount
+    by_total = {}
+    for user_id, total in totals.items():
+        by_total.setdefault(total, []).append(user_id)
+
+    for total, user_ids in by_total.items():
+        try:
+            send_fcm_to_users(
+                User.objects.filter(pk__in=user_ids),
+                'Wallet credited 💰',
+                f'₹{int(total)} has been credited to your referral wallet.',
+                data={'screen': 'referral', 'type': 'referral_wallet_credited'},
+            )
+        except Exception as e:
+            logging.getLogger(__name__).warning('Referral push (wallet credited) failed: %s', e)
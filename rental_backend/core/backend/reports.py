@@ -0,0 +1,62 @@
+"""
+Reusable reporting queries for admin reports.
+
+Everything here is aggregated in the database; callers get small lists of dicts
+that can be rendered or json.dumps()'d directly.
+"""
+from django.db.models import CharField, Count, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def city_for_pincode(pincode_field):
+    """
+    Expression resolving an integer pincode field (e.g. 'pincode', 'user__pincode')
+    to its ServiceableLocation city (falling back to area name, then the pincode itself).
+    """
+    from backend.models import ServiceableLocation
+
+    pincode_str = Cast(pincode_field, output_field=CharField())
+    location_label = (
+        ServiceableLocation.objects
+        .filter(pincode=Cast(OuterRef(pincode_field), output_field=CharField()))
+        .order_by()
+        .annotate(label=Coalesce(NullIf('city', Value('')), NullIf('area_name', Value(''))))
+        .values('label')[:1]
+    )
+    return Coalesce(Subquery(location_label, output_field=CharField()), pincode_str)
+
+
+def count_by_city(queryset, pincode_field='pincode', limit=12):
+    """
+    Group any queryset by the city of `pincode_field` and count rows.
+    Returns [{'city': str, 'count': int}, ...] sorted by count desc.
+    """
+    rows = (
+        queryset.filter(**{f'{pincode_field}__isnull': False})
+        .annotate(city=city_for_pincode(pincode_field))
+        .values('city')
+        .annotate(count=Count('pk'))
+        .order_by('-count', 'city')
+    )
+    if limit:
+        # fetch a little extra: legacy blank pincodes are dropped below
+        rows = rows[:limit + 1]
+    result = [{'city': r['city'], 'count': int(r['count'])} for r in rows if r['city']]
+    return result[:limit] if limit else result
+
+
+def users_by_city(limit=12):
+    """Registered users grouped by the city of their profile pincode."""
+    from backend.models import User
+    return count_by_city(User.objects.all(), 'pincode', limit)
+
+
+def orders_by_city(start_dt=None, end_dt=None, limit=12):
+    """Orders (optionally within created_at range) grouped by the city of the ordering user's pincode."""
+    from backend.models import Order
+    qs = Order.objects.all()
+    if start_dt is not None:
+        qs = qs.filter(created_at__gte=start_dt)
+    if end_dt is not None:
+        qs = qs.filter(created_at__lte=end_dt)
+    return count_by_city(qs, 'user__pincode', limit)
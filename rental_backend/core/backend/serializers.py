@@ -10,6 +10,7 @@ from django.db.models import Sum, Count, Avg, Q
 
 
 from backend import models
+from backend.image_variants import variant_urls
 from backend.models import User, Category, Slide, Product, ProductOption, ProductImage, PageItem, OrderedProduct, \
     Notification, ContactInfo, InformMe, AppVersion, ServiceImage, ServiceOption, ServiceCategory, ServiceSubCategory, Service, \
     ServicePageItem, ServiceBooking, ProductBooking, Order, ServiceableLocation, HomePageItem, ServiceWishlistItem
@@ -17,14 +18,18 @@ from backend.models import User, Category, Slide, Product, ProductOption, Produc
 
 class UserSerializer(ModelSerializer):
     notifications = SerializerMethodField()
+    cart = SerializerMethodField()
     class Meta:
         model = User
         fields = ['email','notifications', 'phone', 'fullname', 'wishlist', 'cart', 'name', 'address', 'contact_no', 'pincode', 'state',
                   'district']
 
     def get_notifications(self,obj):
-        list = obj.notifications_set.filter(seen=False)
-        return len(list)
+        return obj.unread_notifications
+
+    def get_cart(self, obj):
+        # Product option ids in the cart (CartItem; the User.cart M2M is no longer used)
+        return list(obj.cart_items.values_list('product_option_id', flat=True).distinct())
 
     def to_representation(self, instance):
         if instance is None:
@@ -38,12 +43,39 @@ class AddressSerializer(ModelSerializer):
         fields = ['name', 'address', 'contact_no', 'pincode', 'state', 'district']
 
 
-class CategorySerializer(ModelSerializer):
+class ImageVariantsMixin(serializers.Serializer):
+    """thumb / medium / full URLs of the model's `image` (see backend/image_variants.py)."""
+    thumb = serializers.SerializerMethodField()
+    medium = serializers.SerializerMethodField()
+    full = serializers.SerializerMethodField()
+
+    def _image_urls(self, obj):
+        return variant_urls(obj.image, obj.image_variants, self.context.get('request'))
+
+    def get_thumb(self, obj):
+        return self._image_urls(obj)['thumb']
+
+    def get_medium(self, obj):
+        return self._image_urls(obj)['medium']
+
+    def get_full(self, obj):
+        return self._image_urls(obj)['full']
+
+
+def first_image_urls(option, request=None):
+    """thumb / medium / full URLs of an option's first image (for list cards)."""
+    first_image = option.images_set.order_by('position').first()
+    if first_image is None:
+        return variant_urls(None, None)
+    return variant_urls(first_image.image, first_image.image_variants, request)
+
+
+class CategorySerializer(ImageVariantsMixin, ModelSerializer):
     image = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
-        fields = ['id', 'name', 'position', 'image', 'gender']
+        fields = ['id', 'name', 'position', 'image', 'thumb', 'medium', 'full', 'gender']
 
     def get_image(self, obj):
         request = self.context.get('request')
@@ -53,10 +85,10 @@ class CategorySerializer(ModelSerializer):
         return None
 
 
-class SlideSerializer(ModelSerializer):
+class SlideSerializer(ImageVariantsMixin, ModelSerializer):
     class Meta:
         model = Slide
-        fields = ['position', 'image']
+        fields = ['position', 'image', 'thumb', 'medium', 'full']
 
 
 # Enhanced ProductSerializer with better image handling
@@ -198,12 +230,12 @@ class ProductOptionSerializer(ModelSerializer):
     def get_offer_price_per_day(self, obj):
         return obj.get_price_per_day('1_day')
 
-class ProductImageSerializer(ModelSerializer):
+class ProductImageSerializer(ImageVariantsMixin, ModelSerializer):
     image = serializers.SerializerMethodField()  # âœ… Add this
 
     class Meta:
         model = ProductImage
-        fields = ['position', 'image', 'product_option']
+        fields = ['position', 'image', 'thumb', 'medium', 'full', 'product_option']
 
     def get_image(self, obj):
         """âœ… Build absolute URL for images"""
@@ -221,6 +253,7 @@ class WishlistSerializer(ModelSerializer):
     price = SerializerMethodField()
     offer_price = SerializerMethodField()
     image = SerializerMethodField()
+    image_urls = SerializerMethodField()
     rent_for_1_day = SerializerMethodField()
     offer_price_per_day = SerializerMethodField()
     rental_label = SerializerMethodField()
@@ -241,6 +274,9 @@ class WishlistSerializer(ModelSerializer):
         return ProductImageSerializer(obj.images_set.order_by('position').first(), many=False).data.get(
             'image')
 
+    def get_image_urls(self, obj):
+        return first_image_urls(obj, self.context.get('request'))
+
     def get_rent_for_1_day(self, obj):
         """Get 1-day rental price from ProductOption"""
         return obj.get_rental_price('1_day')
@@ -256,7 +292,8 @@ class WishlistSerializer(ModelSerializer):
 
     class Meta:
         model = ProductOption
-        fields = ['id', 'title', 'image', 'price', 'offer_price', 'rent_for_1_day', 'offer_price_per_day', 'rental_label']
+        fields = ['id', 'title', 'image', 'image_urls', 'price', 'offer_price', 'rent_for_1_day', 'offer_price_per_day',
+                  'rental_label']
 
 class CartSerializer(WishlistSerializer):
     cod = SerializerMethodField()
@@ -274,15 +311,16 @@ class CartSerializer(WishlistSerializer):
 
     class Meta:
         model = ProductOption
-        fields = ['id', 'title', 'image', 'price', 'offer_price', 'quantity', 'cod', 'delivery_charge']
+        fields = ['id', 'title', 'image', 'image_urls', 'price', 'offer_price', 'quantity', 'cod', 'delivery_charge']
 
 
-class PageItemSerializer(ModelSerializer):
+class PageItemSerializer(ImageVariantsMixin, ModelSerializer):
     product_options = SerializerMethodField()
 
     class Meta:
         model = PageItem
-        fields = ['id', 'position', 'image', 'category', 'title', 'viewtype', 'product_options']
+        fields = ['id', 'position', 'image', 'thumb', 'medium', 'full', 'category', 'title', 'viewtype',
+                  'product_options']
 
     def get_product_options(self, obj):
         options = obj.product_options.all()[:8]
@@ -298,6 +336,7 @@ class PageItemSerializer(ModelSerializer):
                 'option_id': str(option.id),
                 'image': ProductImageSerializer(option.images_set.order_by('position').first(), many=False).data.get(
                     'image'),
+                'image_urls': first_image_urls(option, self.context.get('request')),
                 'title': option.__str__(),
                 'price': price_val,
                 'offer_price': offer_val,
@@ -671,12 +710,12 @@ class ServiceSubCategorySerializer(serializers.ModelSerializer):
         return Service.objects.filter(subcategory=obj, availability=True).count()
 
 
-class ServiceImageSerializer(serializers.ModelSerializer):
+class ServiceImageSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
 
     class Meta:
         model = ServiceImage
-        fields = ['position', 'image', 'service_option']
+        fields = ['position', 'image', 'thumb', 'medium', 'full', 'service_option']
 
     def get_image(self, obj):
         request = self.context.get('request')
@@ -730,7 +769,8 @@ class ServiceSerializer(serializers.ModelSerializer):
         options = obj.options_set.all()
 
         for option in options:
-            images = option.images_set.all().order_by('position')
+            # .all() so prefetched images are used (ServiceImage is ordered by position)
+            images = option.images_set.all()
             for image in images:
                 request = self.context.get('request')
                 image_url = None
@@ -998,11 +1038,10 @@ class VendorOrderListSerializer(serializers.ModelSerializer):
         vendor = request.user if request else None
 
         if vendor:
-            # Filter items by vendor's products
-            vendor_product_ids = vendor.products_set.values_list('id', flat=True)
-            vendor_items = obj.orders_set.filter(
-                product_option__product_id__in=vendor_product_ids
-            )
+            # Vendor's items (prefetched as vendor_items by the vendor order views)
+            vendor_items = getattr(obj, 'vendor_items', None)
+            if vendor_items is None:
+                vendor_items = obj.orders_set.filter(vendor=vendor)
             return VendorOrderItemSerializer(
                 vendor_items,
                 many=True,
@@ -1055,7 +1094,7 @@ class LocationCheckResponseSerializer(serializers.Serializer):
 
 # serializers.py - Add these serializers
 
-class HomePageItemSerializer(serializers.ModelSerializer):
+class HomePageItemSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     """Serializer for home page items"""
     items = serializers.SerializerMethodField()
     category_name = serializers.SerializerMethodField()
@@ -1065,7 +1104,7 @@ class HomePageItemSerializer(serializers.ModelSerializer):
         model = HomePageItem
         fields = [
             'id', 'title', 'subtitle', 'item_type', 'position', 'viewtype',
-            'image', 'category_name', 'items', 'total_items'
+            'image', 'thumb', 'medium', 'full', 'category_name', 'items', 'total_items'
         ]
 
     def get_category_name(self, obj):
@@ -1134,6 +1173,11 @@ class HomePageItemSerializer(serializers.ModelSerializer):
                 'option_price': option.option_price if option.option_price > 0 else None,
                 'buy_price': buy_price,
                 'image': image_url,
+                'image_urls': variant_urls(
+                    first_image.image if first_image else None,
+                    first_image.image_variants if first_image else None,
+                    request,
+                ),
                 'quantity_available': option.quantity,
 
                 'rental_price_per_day': rental_price_1_day,
@@ -1169,6 +1213,11 @@ class HomePageItemSerializer(serializers.ModelSerializer):
                 'price': option.price,
                 'duration': option.duration,
                 'image': image_url,
+                'image_urls': variant_urls(
+                    first_image.image if first_image else None,
+                    first_image.image_variants if first_image else None,
+                    request,
+                ),
                 'provider_name': option.service.provider_name,
                 'rating': float(option.service.rating),
             })
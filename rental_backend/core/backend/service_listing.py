@@ -0,0 +1,252 @@
+"""
+Read model behind the service marketplace browse (get_all_services).
+
+ServiceListing holds one row per Service with the columns the listing filters
+and sorts on (category, subcategory, rating, experience, min option price), all
+covered by indexes. ServicePincode maps a pincode to the services offered there.
+A service is offered in pincode P when:
+    1. P is an active ServiceableLocation with service_available;
+    2. the service's category is available in P, by the same whitelist / legacy
+       rules as utils.get_available_service_categories_for_pincode;
+    3. if the service belongs to a service vendor with a pincode, P is in the
+       same city as that pincode (nowhere if it is not a ServiceableLocation).
+
+Writes (see backend/signals.py) schedule refreshes that run once per service
+after the surrounding transaction commits. Changes to locations or category
+availability rebuild the whole pincode map. Anything that bypasses signals is
+fixed by `python manage.py rebuild_service_listings`.
+"""
+import logging
+import threading
+
+from django.db import transaction
+from django.db.models import Min
+
+logger = logging.getLogger(__name__)
+
+SECTION_LISTING = 'listing'
+SECTION_PINCODES = 'pincodes'
+ALL = '*'
+
+_local = threading.local()
+_built = False
+
+
+# =============================================================================
+# REFRESH
+# =============================================================================
+
+def refresh_listings(service_ids):
+    """Rewrite (or drop) the ServiceListing rows of these services."""
+    from backend.models import Service, ServiceListing, ServiceOption
+
+    service_ids = set(service_ids)
+    services = Service.objects.filter(id__in=service_ids).select_related('subcategory')
+    min_prices = dict(
+        ServiceOption.objects.filter(service_id__in=service_ids, available=True)
+        .values('service_id').annotate(min_price=Min('price')).values_list('service_id', 'min_price')
+    )
+
+    rows = []
+    for service in services:
+        min_price = min_prices.get(service.id)
+        rows.append(ServiceListing(
+            service=service,
+            category_id=service.subcategory.category_id if service.subcategory else service.category_id,
+            subcategory_id=service.subcategory_id,
+            is_listed=service.availability,
+            rating=service.rating,
+            total_reviews=service.total_reviews,
+            experience_years=service.experience_years,
+            min_price=service.base_price if min_price is None else min_price,
+            created_at=service.created_at,
+        ))
+    with transaction.atomic():
+        ServiceListing.objects.filter(service_id__in=service_ids).delete()
+        ServiceListing.objects.bulk_create(rows)
+
+
+def _location_rules():
+    """Serviceable pincodes, the city of every known pincode and the category whitelist per pincode."""
+    from backend.models import ServiceableLocation, ServiceCategoryAvailability
+
+    city_of = {}
+    pincodes_by_city = {}
+    servable = []
+    for pincode, city, is_active, service_available in ServiceableLocation.objects.values_list(
+        'pincode', 'city', 'is_active', 'service_available',
+    ):
+        city_of[pincode] = city
+        if is_active and service_available:
+            servable.append(pincode)
+            pincodes_by_city.setdefault(city, []).append(pincode)
+
+    configured = {}  # pincode with any rows -> enabled category ids
+    restricted = set()  # categories with rows anywhere
+    for pincode, category_id, is_available in ServiceCategoryAvailability.objects.values_list(
+        'location__pincode', 'service_category_id', 'is_available',
+    ):
+        enabled = configured.setdefault(pincode, set())
+        restricted.add(category_id)
+        if is_available:
+            enabled.add(category_id)
+
+    def category_allowed(category_id, pincode):
+        if category_id is None:
+            return True
+        if pincode in configured:
+            return category_id in configured[pincode]
+        # Not configured here: categories restricted elsewhere are hidden
+        return category_id not in restricted
+
+    return set(servable), city_of, pincodes_by_city, category_allowed
+
+
+def _pincodes_for(service, rules):
+    servable, city_of, pincodes_by_city, category_allowed = rules
+    vendor_pincode = (service['service_vendor__pincode'] or '').strip()
+    if vendor_pincode:
+        candidates = pincodes_by_city.get(city_of.get(vendor_pincode), [])
+    else:
+        candidates = servable
+    return [p for p in candidates if category_allowed(service['category_id'], p)]
+
+
+def refresh_pincodes(service_ids=None, batch_size=500):
+    """Rewrite the ServicePincode rows of these services (every service when None)."""
+    from backend.models import Service, ServicePincode
+
+    rules = _location_rules()
+    services = Service.objects.values('id', 'category_id', 'subcategory__category_id', 'service_vendor__pincode')
+    if service_ids is not None:
+        services = services.filter(id__in=set(service_ids))
+
+    with transaction.atomic():
+        if service_ids is None:
+            ServicePincode.objects.all().delete()
+        else:
+            ServicePincode.objects.filter(service_id__in=set(service_ids)).delete()
+        rows = []
+        for service in services.iterator():
+            service['category_id'] = service['subcategory__category_id'] or service['category_id']
+            rows.extend(ServicePincode(pincode=p, service_id=service['id']) for p in _pincodes_for(service, rules))
+            if len(rows) >= batch_size:
+                ServicePincode.objects.bulk_create(rows)
+                rows = []
+        ServicePincode.objects.bulk_create(rows)
+
+
+def rebuild_all(batch_size=500):
+    """Rebuild every ServiceListing row and the whole pincode map. Returns services processed."""
+    from backend.models import Service, ServiceListing
+
+    ids = list(Service.objects.values_list('id', flat=True))
+    ServiceListing.objects.exclude(service_id__in=Service.objects.values('id')).delete()
+    for start in range(0, len(ids), batch_size):
+        refresh_listings(ids[start:start + batch_size])
+    refresh_pincodes(batch_size=batch_size)
+    return len(ids)
+
+
+# =============================================================================
+# SCHEDULING (coalesced until commit)
+# =============================================================================
+
+def _flush_pending():
+    pending = getattr(_local, 'pending', None)
+    if not pending:
+        return
+    _local.pending = set()
+    listing_ids = {key for section, key in pending if section == SECTION_LISTING}
+    pincode_ids = {key for section, key in pending if section == SECTION_PINCODES}
+    try:
+        if listing_ids:
+            refresh_listings(listing_ids)
+        if ALL in pincode_ids:
+            refresh_pincodes()
+        elif pincode_ids:
+            refresh_pincodes(pincode_ids)
+    except Exception:
+        logger.exception('Service listing refresh failed')
+
+
+def _schedule(section, keys):
+    keys = {k for k in keys if k}
+    if not keys:
+        return
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        pending = _local.pending = set()
+    pending.update((section, k) for k in keys)
+    transaction.on_commit(_flush_pending)
+
+
+def schedule_services(*service_ids):
+    """Refresh listing columns and pincodes of these services."""
+    _schedule(SECTION_LISTING, service_ids)
+    _schedule(SECTION_PINCODES, service_ids)
+
+
+def schedule_listings(*service_ids):
+    """Refresh listing columns only (rating, prices, availability)."""
+    _schedule(SECTION_LISTING, service_ids)
+
+
+def schedule_pincodes(*service_ids):
+    _schedule(SECTION_PINCODES, service_ids)
+
+
+def schedule_all_pincodes():
+    _schedule(SECTION_PINCODES, [ALL])
+
+
+# =============================================================================
+# READ
+# =============================================================================
+
+SORT_ORDERS = {
+    'price_low_high': ['min_price', 'service_id'],
+    'price_high_low': ['-min_price', 'service_id'],
+    'rating': ['-rating', '-total_reviews', 'service_id'],
+    'experience': ['-experience_years', 'service_id'],
+    'relevance': ['-created_at', 'service_id'],
+}
+
+
+def ensure_built():
+    """Build the read model on first use when it is still empty (e.g. right after migrating)."""
+    global _built
+    from backend.models import Service, ServiceListing
+
+    if _built:
+        return
+    if not ServiceListing.objects.exists() and Service.objects.exists():
+        rebuild_all()
+    _built = True
+
+
+def listing_queryset(category_id=None, subcategory_id=None, pincode=None, sort_by='relevance'):
+    """Listed ServiceListing rows, filtered and ordered for get_all_services."""
+    from backend.models import ServiceListing, ServicePincode
+
+    ensure_built()
+    listings = ServiceListing.objects.filter(is_listed=True)
+    if subcategory_id is not None:
+        listings = listings.filter(subcategory_id=subcategory_id)
+    elif category_id is not None:
+        listings = listings.filter(category_id=category_id)
+    if pincode:
+        listings = listings.filter(
+            service_id__in=ServicePincode.objects.filter(pincode=pincode).values('service_id'),
+        )
+    return listings.order_by(*SORT_ORDERS.get(sort_by, SORT_ORDERS['relevance']))
+
+
+def services_for_page(service_ids):
+    """Service objects for one page of listing ids, in that order, with what ServiceSerializer reads."""
+    from backend.models import Service
+
+    services = Service.objects.select_related('category', 'subcategory').prefetch_related(
+        'options_set__images_set'
+    ).in_bulk(list(service_ids))
+    return [services[pk] for pk in service_ids if pk in services]
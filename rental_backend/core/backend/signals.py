@@ -0,0 +1,680 @@
+"""
+Model signal receivers. Connected in BackendConfig.ready().
+"""
+from django.apps import apps
+from django.db.models import Count, Q, Sum
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from backend import (
+    artist_calendar, cart, coupon_index, coupon_usage, geo_index, image_variants, media_blobs, ratings, service_listing, user_counters, vendor_events,
+    vendor_stats,
+)
+from backend.models import (
+    ArtistAvailability, CartItem, Coupon, CouponCounterShard, Notification, Order, OrderedProduct, Product, ProductImage, ProductOption,
+    Service, ServiceableLocation, ServiceBooking, ServiceCategoryAvailability, ServiceOption, ServiceSubCategory,
+    ServiceVendor, TrialBooking, User,
+)
+
+
+# =============================================================================
+# VENDOR DASHBOARD STATS (backend/vendor_stats.py)
+# =============================================================================
+
+def _product_vendor(product_id):
+    return Product.objects.filter(pk=product_id).values_list('vendor_id', flat=True).first()
+
+
+def _service_option_vendor(service_option_id):
+    return (
+        ServiceOption.objects.filter(pk=service_option_id)
+        .values_list('service__service_vendor_id', flat=True)
+        .first()
+    )
+
+
+@receiver(pre_save, sender=Product)
+def _product_remember_vendor(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._stats_old_vendor_id = _product_vendor(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def _product_saved_stats(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        vendor_stats.add_vendor(instance.vendor_id, {'total_products': 1})
+        return
+    old_vendor_id = getattr(instance, '_stats_old_vendor_id', None)
+    if old_vendor_id == instance.vendor_id:
+        return
+    # Moved to another vendor: the product and its options go with it
+    options = ProductOption.objects.filter(product_id=instance.pk).aggregate(
+        total_options=Count('id'),
+        total_stock=Sum('quantity'),
+        low_stock_items=Count('id', filter=Q(quantity__lt=vendor_stats.LOW_STOCK_THRESHOLD, quantity__gt=0)),
+    )
+    moved = {field: value or 0 for field, value in options.items()}
+    moved['total_products'] = 1
+    vendor_stats.add_vendor(old_vendor_id, vendor_stats.scale(moved, -1))
+    vendor_stats.add_vendor(instance.vendor_id, moved)
+
+
+@receiver(post_delete, sender=Product)
+def _product_deleted_stats(sender, instance, **kwargs):
+    vendor_stats.add_vendor(instance.vendor_id, {'total_products': -1})
+
+
+@receiver(pre_save, sender=ProductOption)
+def _product_option_remember_stock(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    old = ProductOption.objects.filter(pk=instance.pk).values_list('product_id', 'quantity').first()
+    if old:
+        instance._stats_old = (old[0], _product_vendor(old[0]), old[1])
+
+
+@receiver(post_save, sender=ProductOption)
+def _product_option_saved_stats(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    new_counts = vendor_stats.option_counts(instance.quantity)
+    old = None if created else getattr(instance, '_stats_old', None)
+    if old is None:
+        vendor_stats.add_vendor(_product_vendor(instance.product_id), new_counts)
+        return
+    old_product_id, old_vendor_id, old_quantity = old
+    old_counts = vendor_stats.option_counts(old_quantity)
+    vendor_id = old_vendor_id if old_product_id == instance.product_id else _product_vendor(instance.product_id)
+    if vendor_id == old_vendor_id:
+        vendor_stats.add_vendor(vendor_id, vendor_stats.diff(new_counts, old_counts))
+    else:
+        vendor_stats.add_vendor(old_vendor_id, vendor_stats.scale(old_counts, -1))
+        vendor_stats.add_vendor(vendor_id, new_counts)
+    instance._stats_old = (instance.product_id, vendor_id, instance.quantity)
+
+
+@receiver(pre_delete, sender=ProductOption)
+def _product_option_remember_vendor(sender, instance, **kwargs):
+    # Before a cascade from Product removes the row the vendor is read from
+    instance._stats_vendor_id = _product_vendor(instance.product_id)
+
+
+@receiver(post_delete, sender=ProductOption)
+def _product_option_deleted_stats(sender, instance, **kwargs):
+    vendor_id = getattr(instance, '_stats_vendor_id', None)
+    vendor_stats.add_vendor(vendor_id, vendor_stats.scale(vendor_stats.option_counts(instance.quantity), -1))
+
+
+@receiver(pre_save, sender=Order)
+def _order_remember_stats(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._stats_old = (
+        Order.objects.filter(pk=instance.pk).values_list('vendor_status', 'tx_status', 'tx_amount').first()
+    )
+
+
+@receiver(post_save, sender=Order)
+def _order_saved_stats(sender, instance, created=False, raw=False, **kwargs):
+    # A new order has no items yet; it starts counting for a vendor with its first item
+    if raw or created:
+        return
+    old = getattr(instance, '_stats_old', None)
+    if old is None:
+        return
+    delta = vendor_stats.diff(
+        vendor_stats.order_counts(instance.vendor_status, instance.tx_status, instance.tx_amount),
+        vendor_stats.order_counts(*old),
+    )
+    instance._stats_old = (instance.vendor_status, instance.tx_status, instance.tx_amount)
+    if not any(delta.values()):
+        return
+    vendor_ids = OrderedProduct.objects.filter(order_id=instance.pk).values_list('vendor_id', flat=True).distinct()
+    for vendor_id in set(vendor_ids):
+        vendor_stats.add_vendor(vendor_id, delta)
+
+
+def _order_membership_changed(ordered_product, sign):
+    """The vendor's first item joined the order (sign=1) or its last item left (sign=-1)."""
+    if not ordered_product.vendor_id:
+        return
+    if OrderedProduct.objects.filter(
+        order_id=ordered_product.order_id, vendor_id=ordered_product.vendor_id,
+    ).exclude(pk=ordered_product.pk).exists():
+        return
+    # A multi-row delete removes all rows before the first post_delete: leave once
+    if not vendor_stats.mark_order_left(ordered_product.order_id, ordered_product.vendor_id, sign):
+        return
+    order = (
+        Order.objects.filter(pk=ordered_product.order_id)
+        .values_list('vendor_status', 'tx_status', 'tx_amount', 'created_at')
+        .first()
+    )
+    if order is None:
+        return
+    vendor_stats.add_order(ordered_product.vendor_id, order[3], vendor_stats.order_counts(*order[:3]), sign)
+
+
+@receiver(post_save, sender=OrderedProduct)
+def _ordered_product_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw or not created:
+        return
+    _order_membership_changed(instance, 1)
+
+
+@receiver(post_delete, sender=OrderedProduct)
+def _ordered_product_deleted(sender, instance, **kwargs):
+    _order_membership_changed(instance, -1)
+
+
+@receiver(pre_save, sender=Service)
+def _service_remember_vendor(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._stats_old_vendor_id = (
+        Service.objects.filter(pk=instance.pk).values_list('service_vendor_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Service)
+def _service_saved_stats(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        vendor_stats.add_service_vendor(instance.service_vendor_id, {'total_services': 1})
+        return
+    old_vendor_id = getattr(instance, '_stats_old_vendor_id', None)
+    if old_vendor_id == instance.service_vendor_id:
+        return
+    # Moved to another service vendor: the service and its bookings go with it
+    bookings = ServiceBooking.objects.filter(service_option__service_id=instance.pk).aggregate(
+        total_bookings=Count('id'),
+        pending_bookings=Count('id', filter=Q(status='PENDING')),
+        confirmed_bookings=Count('id', filter=Q(status='CONFIRMED')),
+        total_revenue=Sum('total_amount', filter=Q(payment_status='PAID')),
+    )
+    moved = {field: value or 0 for field, value in bookings.items()}
+    moved['total_services'] = 1
+    vendor_stats.add_service_vendor(old_vendor_id, vendor_stats.scale(moved, -1))
+    vendor_stats.add_service_vendor(instance.service_vendor_id, moved)
+
+
+@receiver(post_delete, sender=Service)
+def _service_deleted_stats(sender, instance, **kwargs):
+    vendor_stats.add_service_vendor(instance.service_vendor_id, {'total_services': -1})
+
+
+def _booking_stats_state(booking):
+    return (
+        _service_option_vendor(booking.service_option_id),
+        vendor_stats.booking_counts(booking.status, booking.payment_status, booking.total_amount),
+    )
+
+
+@receiver(pre_save, sender=ServiceBooking)
+def _service_booking_remember_stats(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    old = (
+        ServiceBooking.objects.filter(pk=instance.pk)
+        .values_list('service_option__service__service_vendor_id', 'status', 'payment_status', 'total_amount')
+        .first()
+    )
+    if old:
+        instance._stats_old = (old[0], vendor_stats.booking_counts(*old[1:]))
+
+
+@receiver(post_save, sender=ServiceBooking)
+def _service_booking_saved_stats(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    service_vendor_id, counts = _booking_stats_state(instance)
+    old = None if created else getattr(instance, '_stats_old', None)
+    if old is None:
+        vendor_stats.add_service_vendor(service_vendor_id, counts)
+    elif old[0] == service_vendor_id:
+        vendor_stats.add_service_vendor(service_vendor_id, vendor_stats.diff(counts, old[1]))
+    else:
+        vendor_stats.add_service_vendor(old[0], vendor_stats.scale(old[1], -1))
+        vendor_stats.add_service_vendor(service_vendor_id, counts)
+    instance._stats_old = (service_vendor_id, counts)
+
+
+@receiver(pre_delete, sender=ServiceBooking)
+def _service_booking_remember_vendor(sender, instance, **kwargs):
+    # Before a cascade from ServiceOption / Service removes the rows the vendor is read from
+    instance._stats_deleted = _booking_stats_state(instance)
+
+
+@receiver(post_delete, sender=ServiceBooking)
+def _service_booking_deleted_stats(sender, instance, **kwargs):
+    service_vendor_id, counts = getattr(instance, '_stats_deleted', (None, {}))
+    vendor_stats.add_service_vendor(service_vendor_id, vendor_stats.scale(counts, -1))
+
+
+# =============================================================================
+# VENDOR EVENT FEED (backend/vendor_events.py)
+# =============================================================================
+
+@receiver(pre_save, sender=Order)
+def _order_remember_tx_status(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._events_old_tx_status = (
+        Order.objects.filter(pk=instance.pk).values_list('tx_status', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Order)
+def _order_events(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created or instance.tx_status != 'CANCELLED':
+        return
+    if getattr(instance, '_events_old_tx_status', None) == 'CANCELLED':
+        return
+    vendor_ids = OrderedProduct.objects.filter(order_id=instance.pk).values_list('vendor_id', flat=True)
+    vendor_events.publish_order_cancelled(vendor_ids, instance)
+
+
+@receiver(post_save, sender=OrderedProduct)
+def _ordered_product_events(sender, instance, created=False, raw=False, **kwargs):
+    if raw or not created:
+        return
+    vendor_events.publish_order_created(instance.vendor_id, instance.order)
+
+
+@receiver(pre_save, sender=TrialBooking)
+def _trial_remember_status(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._events_old_status = (
+        TrialBooking.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=TrialBooking)
+def _trial_events(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        vendor_events.publish_trial_created(instance)
+        return
+    # A vendor's own rejection also sets CANCELLED; only customer-side cancellations are news
+    if (
+        instance.status == TrialBooking.STATUS_CANCELLED
+        and getattr(instance, '_events_old_status', None) != TrialBooking.STATUS_CANCELLED
+        and instance.vendor_decision != TrialBooking.DECISION_REJECTED
+    ):
+        vendor_events.publish_trial_cancelled(instance)
+
+
+# =============================================================================
+# SERVICE LISTING READ MODEL (backend/service_listing.py)
+# =============================================================================
+
+@receiver(post_save, sender=Service)
+def _service_listing_changed(sender, instance, raw=False, **kwargs):
+    # Deleting a service cascades to its listing and pincode rows
+    if raw:
+        return
+    service_listing.schedule_services(instance.pk)
+
+
+@receiver(post_save, sender=ServiceOption)
+@receiver(post_delete, sender=ServiceOption)
+def _service_option_listing_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    service_listing.schedule_listings(instance.service_id)
+
+
+@receiver(post_save, sender=ServiceSubCategory)
+def _service_subcategory_changed(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    service_listing.schedule_services(*Service.objects.filter(subcategory=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=ServiceVendor)
+def _service_vendor_listing_changed(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    service_listing.schedule_pincodes(*Service.objects.filter(service_vendor=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=ServiceableLocation)
+@receiver(post_delete, sender=ServiceableLocation)
+@receiver(post_save, sender=ServiceCategoryAvailability)
+@receiver(post_delete, sender=ServiceCategoryAvailability)
+def _service_locations_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    service_listing.schedule_all_pincodes()
+
+
+# =============================================================================
+# NEARBY SEARCH INDEXES (backend/geo_index.py)
+# =============================================================================
+
+@receiver(post_save, sender=ServiceableLocation)
+@receiver(post_delete, sender=ServiceableLocation)
+def _geo_locations_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    geo_index.invalidate(geo_index.INDEX_LOCATIONS, geo_index.INDEX_SERVICES)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=ServiceVendor)
+@receiver(post_delete, sender=ServiceVendor)
+def _geo_services_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    geo_index.invalidate(geo_index.INDEX_SERVICES)
+
+
+# =============================================================================
+# USER COUNTERS (backend/user_counters.py)
+# =============================================================================
+
+def _user_m2m_counter(field, instance, action, reverse, pk_set):
+    """Forward: instance is a User and pk_set ProductOption ids; reverse: the other way round."""
+    counter = user_counters.M2M_COUNTERS[field]
+    if action == 'post_add':
+        # pk_set only holds the rows that were actually inserted
+        if reverse:
+            user_counters.adjust(pk_set, counter, 1)
+        else:
+            user_counters.adjust([instance.pk], counter, len(pk_set), instance)
+    elif action in ('pre_remove', 'pre_clear'):
+        # remove() reports every requested id; count the rows that exist
+        rows = getattr(User, field).through.objects.filter(**{'productoption_id' if reverse else 'user_id': instance.pk})
+        if action == 'pre_remove':
+            rows = rows.filter(**{'user_id__in' if reverse else 'productoption_id__in': pk_set})
+        instance._counter_removed = list(rows.values_list('user_id', flat=True))
+    elif action in ('post_remove', 'post_clear'):
+        removed = getattr(instance, '_counter_removed', [])
+        if reverse:
+            user_counters.adjust(removed, counter, -1)
+        elif action == 'post_clear':
+            user_counters.reset([instance.pk], counter, instance)
+        else:
+            user_counters.adjust([instance.pk], counter, -len(removed), instance)
+
+
+@receiver(post_save, sender=CartItem)
+def _cart_item_added(sender, instance, created=False, raw=False, **kwargs):
+    if raw or not created:
+        return
+    user = instance.user if CartItem.user.is_cached(instance) else None
+    user_counters.adjust([instance.user_id], user_counters.CART, 1, user)
+
+
+@receiver(post_delete, sender=CartItem)
+def _cart_item_removed(sender, instance, **kwargs):
+    user = instance.user if CartItem.user.is_cached(instance) else None
+    user_counters.adjust([instance.user_id], user_counters.CART, -1, user)
+
+
+@receiver(m2m_changed, sender=User.wishlist.through)
+def _user_wishlist_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _user_m2m_counter('wishlist', instance, action, reverse, pk_set)
+
+
+@receiver(pre_delete, sender=ProductOption)
+def _product_option_leaves_wishlists(sender, instance, **kwargs):
+    # Cascaded M2M rows are deleted without m2m_changed (cascaded CartItems do send post_delete)
+    for field, counter in user_counters.M2M_COUNTERS.items():
+        user_ids = getattr(User, field).through.objects.filter(productoption_id=instance.pk).values_list('user_id', flat=True)
+        user_counters.adjust(list(user_ids), counter, -1)
+
+
+@receiver(pre_save, sender=Notification)
+def _notification_remember_seen(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._old_seen = Notification.objects.filter(pk=instance.pk).values_list('seen', flat=True).first()
+
+
+@receiver(post_save, sender=Notification)
+def _notification_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    was_unread = not created and getattr(instance, '_old_seen', None) is False
+    delta = int(not instance.seen) - int(was_unread)
+    user = instance.user if Notification.user.is_cached(instance) else None
+    user_counters.adjust([instance.user_id], user_counters.UNREAD_NOTIFICATIONS, delta, user)
+
+
+@receiver(post_delete, sender=Notification)
+def _notification_deleted(sender, instance, **kwargs):
+    if not instance.seen:
+        user_counters.adjust([instance.user_id], user_counters.UNREAD_NOTIFICATIONS, -1)
+
+
+# =============================================================================
+# PRICED CART CACHE (backend/cart.py)
+# =============================================================================
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def _cart_item_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cart.invalidate([instance.user_id])
+
+
+@receiver(m2m_changed, sender=User.wishlist.through)
+def _wishlist_cart_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Cart lines carry in_wishlist
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        cart.invalidate_for_options([instance.pk])
+    else:
+        cart.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def _product_cart_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cart.invalidate_for_product(instance.pk)
+
+
+@receiver(post_save, sender=ProductOption)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def _product_option_cart_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cart.invalidate_for_options([instance.product_option_id if sender is ProductImage else instance.pk])
+
+
+# =============================================================================
+# COUPON ELIGIBILITY INDEX (backend/coupon_index.py)
+# =============================================================================
+
+@receiver(pre_save, sender=Coupon)
+def _coupon_remember_limit(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._old_usage_limit = Coupon.objects.filter(pk=instance.pk).values_list('usage_limit', flat=True).first()
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def _coupon_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    coupon_index.invalidate()
+
+
+@receiver(post_save, sender=Coupon)
+def _coupon_reshard_on_new_limit(sender, instance, created=False, raw=False, **kwargs):
+    """A sharded coupon's new usage_limit is split over its shards again (backend/coupon_usage.py)."""
+    if raw or created or getattr(instance, '_old_usage_limit', instance.usage_limit) == instance.usage_limit:
+        return
+    shards = CouponCounterShard.objects.filter(coupon=instance).count()
+    if shards:
+        coupon_usage.set_shards(instance.pk, shards)
+
+
+@receiver(m2m_changed, sender=Coupon.applicable_products.through)
+@receiver(m2m_changed, sender=Coupon.applicable_categories.through)
+@receiver(m2m_changed, sender=Coupon.applicable_services.through)
+def _coupon_targets_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        coupon_index.invalidate()
+
+
+# =============================================================================
+# RATING HISTOGRAMS (backend/ratings.py)
+# =============================================================================
+
+@receiver(pre_save, sender=OrderedProduct)
+def _ordered_product_remember_rating(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._old_rating = (
+        OrderedProduct.objects.filter(pk=instance.pk).values_list('rating', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=OrderedProduct)
+def _ordered_product_rated(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    old_rating = None if created else getattr(instance, '_old_rating', None)
+    if old_rating != instance.rating:
+        product_id = ProductOption.objects.filter(pk=instance.product_option_id).values_list('product_id', flat=True).first()
+        ratings.product_rating_changed(product_id, old_rating, instance.rating)
+    instance._old_rating = instance.rating
+
+
+@receiver(post_delete, sender=OrderedProduct)
+def _ordered_product_rating_deleted(sender, instance, **kwargs):
+    if instance.rating:
+        product_id = ProductOption.objects.filter(pk=instance.product_option_id).values_list('product_id', flat=True).first()
+        ratings.product_rating_changed(product_id, instance.rating, None)
+
+
+@receiver(pre_save, sender=ServiceBooking)
+def _service_booking_remember_rating(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._old_rating = (
+        ServiceBooking.objects.filter(pk=instance.pk).values_list('rating', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=ServiceBooking)
+def _service_booking_rated(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    old_rating = None if created else getattr(instance, '_old_rating', None)
+    if old_rating != instance.rating:
+        service_id = ServiceOption.objects.filter(pk=instance.service_option_id).values_list('service_id', flat=True).first()
+        ratings.service_rating_changed(service_id, old_rating, instance.rating)
+    instance._old_rating = instance.rating
+
+
+@receiver(post_delete, sender=ServiceBooking)
+def _service_booking_rating_deleted(sender, instance, **kwargs):
+    if instance.rating:
+        service_id = ServiceOption.objects.filter(pk=instance.service_option_id).values_list('service_id', flat=True).first()
+        ratings.service_rating_changed(service_id, instance.rating, None)
+
+
+# =============================================================================
+# ARTIST CALENDAR BITMAPS (backend/artist_calendar.py)
+# =============================================================================
+
+def _booking_artist_day(pk):
+    return ServiceBooking.objects.filter(pk=pk).values_list('service_option__service_id', 'booking_date').first()
+
+
+@receiver(pre_save, sender=ServiceBooking)
+def _service_booking_remember_day(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._calendar_old_day = _booking_artist_day(instance.pk)
+
+
+@receiver(post_save, sender=ServiceBooking)
+def _service_booking_calendar(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    artist_calendar.schedule_refresh(
+        *filter(None, [_booking_artist_day(instance.pk), getattr(instance, '_calendar_old_day', None)])
+    )
+
+
+@receiver(post_delete, sender=ServiceBooking)
+def _service_booking_calendar_deleted(sender, instance, **kwargs):
+    artist_id = ServiceOption.objects.filter(pk=instance.service_option_id).values_list('service_id', flat=True).first()
+    artist_calendar.schedule_refresh((artist_id, instance.booking_date))
+
+
+@receiver(pre_save, sender=ArtistAvailability)
+def _artist_availability_remember_day(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._calendar_old_day = (
+        ArtistAvailability.objects.filter(pk=instance.pk).values_list('artist_id', 'date').first()
+    )
+
+
+@receiver(post_save, sender=ArtistAvailability)
+def _artist_availability_calendar(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    new_day = ArtistAvailability.objects.filter(pk=instance.pk).values_list('artist_id', 'date').first()
+    artist_calendar.schedule_refresh(*filter(None, [new_day, getattr(instance, '_calendar_old_day', None)]))
+
+
+@receiver(post_delete, sender=ArtistAvailability)
+def _artist_availability_calendar_deleted(sender, instance, **kwargs):
+    artist_calendar.schedule_refresh((instance.artist_id, instance.date))
+
+
+# =============================================================================
+# IMAGES: blob reference counts (backend/media_blobs.py) and variants
+# (backend/image_variants.py)
+# =============================================================================
+
+_IMAGE_FIELDS = {apps.get_model(label): field for label, field in image_variants.VARIANT_MODELS}
+
+
+def _image_remember_name(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._old_image_name = (
+        sender.objects.filter(pk=instance.pk).values_list(_IMAGE_FIELDS[sender], flat=True).first()
+    )
+
+
+def _image_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    field_name = _IMAGE_FIELDS[sender]
+    name = getattr(instance, field_name).name or ''
+    old_name = '' if created else (getattr(instance, '_old_image_name', None) or '')
+    if name != old_name:
+        media_blobs.acquire(name)
+        media_blobs.release(old_name)
+    instance._old_image_name = name
+    image_variants.schedule_variants(instance, field_name)
+
+
+def _image_deleted(sender, instance, **kwargs):
+    media_blobs.release(getattr(instance, _IMAGE_FIELDS[sender]).name or '')
+
+
+for _model in _IMAGE_FIELDS:
+    pre_save.connect(_image_remember_name, sender=_model, dispatch_uid=f'image_name_{_model.__name__}')
+    post_save.connect(_image_saved, sender=_model, dispatch_uid=f'image_saved_{_model.__name__}')
+    post_delete.connect(_image_deleted, sender=_model, dispatch_uid=f'image_deleted_{_model.__name__}')
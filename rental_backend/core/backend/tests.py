@@ -1,3 +1,97 @@
-from django.test import TestCase
+import threading
+import unittest
+from datetime import timedelta
 
-# Create your tests here.
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from backend import coupon_usage
+from backend.models import Coupon, CouponUsage, User
+
+
+@unittest.skipIf(connection.vendor == 'sqlite', 'SQLite serializes writers; run against PostgreSQL')
+class CouponRedeemConcurrencyTests(TransactionTestCase):
+    """
+    Many threads redeem one coupon at once (backend/coupon_usage.py); a few
+    users, so users also race themselves. The limits must hold and the
+    counters must match the CouponUsage rows.
+    """
+    workers = 8
+    attempts = 10
+
+    def _coupon(self, usage_limit=0, per_user_limit=0):
+        now = timezone.now()
+        return Coupon.objects.create(
+            code='CONCURRENT',
+            description='concurrency test',
+            discount_type=Coupon.DISCOUNT_FLAT,
+            discount_value=1,
+            valid_from=now - timedelta(days=1),
+            valid_until=now + timedelta(days=1),
+            usage_limit=usage_limit,
+            per_user_limit=per_user_limit,
+        )
+
+    def _users(self, count=4):
+        return [
+            User.objects.create(email=f'concurrent_{i}@test.local', phone='9999990000', fullname='Concurrent', password='-')
+            for i in range(count)
+        ]
+
+    def _redeem_concurrently(self, coupon, users):
+        outcome = {'redeemed': 0, 'refused': 0, 'errors': []}
+        lock = threading.Lock()
+        start = threading.Barrier(self.workers)
+
+        def worker(number):
+            try:
+                start.wait()
+                for attempt in range(self.attempts):
+                    user = users[(number + attempt) % len(users)]
+                    try:
+                        coupon_usage.redeem(coupon, user)
+                        key = 'redeemed'
+                    except coupon_usage.CouponUnavailable:
+                        key = 'refused'
+                    with lock:
+                        outcome[key] += 1
+            except OperationalError as e:
+                with lock:
+                    outcome['errors'].append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(outcome['errors'], [])
+        return outcome
+
+    def _assert_counters_match(self, coupon, redeemed):
+        self.assertEqual(CouponUsage.objects.filter(coupon=coupon).count(), redeemed)
+        self.assertEqual(coupon_usage.used_counts([coupon.pk])[coupon.pk], redeemed)
+
+    def test_usage_limit_holds(self):
+        coupon = self._coupon(usage_limit=25)
+        outcome = self._redeem_concurrently(coupon, self._users())
+        self.assertEqual(outcome['redeemed'], 25)
+        self._assert_counters_match(coupon, 25)
+
+    def test_usage_limit_holds_with_shards(self):
+        coupon = self._coupon(usage_limit=25)
+        coupon_usage.set_shards(coupon.pk, 4)
+        outcome = self._redeem_concurrently(coupon, self._users())
+        self.assertEqual(outcome['redeemed'], 25)
+        self._assert_counters_match(coupon, 25)
+
+    def test_per_user_limit_holds(self):
+        coupon = self._coupon(per_user_limit=2)
+        users = self._users()
+        outcome = self._redeem_concurrently(coupon, users)
+        self.assertEqual(outcome['redeemed'], 2 * len(users))
+        self._assert_counters_match(coupon, 2 * len(users))
+        for user in users:
+            self.assertEqual(coupon_usage.user_use_counts(user, [coupon.pk])[coupon.pk], 2)
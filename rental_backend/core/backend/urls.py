@@ -17,7 +17,7 @@ from backend.views import (
     add_to_cart, remove_from_cart, get_cart_items, add_to_cart_with_date,
     add_to_wishlist, remove_from_wishlist, get_wishlist_items,
     validate_cart, move_to_wishlist, clear_cart, cart_summary, bulk_update_cart,
-    apply_coupon, get_cart_items_enhanced,
+    apply_coupon, best_coupon, get_cart_items_enhanced,
     get_wishlist_items_enhanced, add_to_wishlist_enhanced,
     remove_from_wishlist_enhanced, move_wishlist_to_cart, share_wishlist,
     undo_wishlist_removal, clear_wishlist,
@@ -51,21 +51,24 @@ from backend.views import (
     vendor_create_product, vendor_update_product, vendor_delete_product,
     vendor_create_product_option, vendor_update_product_option,
     vendor_delete_product_option, vendor_upload_product_image, vendor_delete_product_image,
+    vendor_catalog_imports, vendor_catalog_import_detail, vendor_order_events, vendor_order_event_stream,
+    vendor_export, service_vendor_export_bookings,
     vendor_get_categories, vendor_bulk_update_stock,
     vendor_orders, vendor_order_detail, vendor_accept_order, vendor_reject_order, vendor_logout, vendor_save_device_token, set_default_address,
-    get_serviceable_locations, update_cart_item_quantity, get_service_wishlist, add_service_to_wishlist,
+    get_serviceable_locations, get_nearby, update_cart_item_quantity, get_service_wishlist, add_service_to_wishlist,
     remove_service_from_wishlist, check_service_in_wishlist, change_password, guest_login, get_home_page_item_products,
     vendor_trial_bookings, vendor_trial_decide,
 
     # Referral & Wallet
-    referral_info, referral_history, wallet_transactions, referral_share
+    referral_info, referral_history, wallet_transactions, referral_share, cron_referral_rewards
     ,
     # Trial-at-home
     get_trial_settings, create_trial_booking, list_my_trial_bookings, trial_booking_detail,
     mark_trial_booking_paid,
 
     # Analytics
-    analytics_screen_start, analytics_screen_end, analytics_location_ping
+    analytics_screen_start, analytics_screen_end, analytics_location_ping, analytics_batch,
+    cron_analytics_rollups, cron_session_funnels, cron_location_pings
 
 )
 
@@ -85,6 +88,10 @@ urlpatterns = [
     path('analytics/screen/start/', analytics_screen_start, name='analytics_screen_start'),
     path('analytics/screen/end/', analytics_screen_end, name='analytics_screen_end'),
     path('analytics/location/ping/', analytics_location_ping, name='analytics_location_ping'),
+    path('analytics/batch/', analytics_batch, name='analytics_batch'),
+    path('cron/analytics-rollups/', cron_analytics_rollups, name='cron_analytics_rollups'),
+    path('cron/session-funnels/', cron_session_funnels, name='cron_session_funnels'),
+    path('cron/location-pings/', cron_location_pings, name='cron_location_pings'),
     path('guest-login/', guest_login, name='guest_login'),
 
     # =============================================================================
@@ -128,6 +135,7 @@ urlpatterns = [
     path('cart/', get_cart_items, name='get_cart_items'),
     path('cart/enhanced/', get_cart_items_enhanced, name='get_cart_items_enhanced'),
     path('cart/apply-coupon/', apply_coupon, name='apply_coupon'),
+    path('cart/best-coupon/', best_coupon, name='best_coupon'),
     path('cart/bulk-update/', bulk_update_cart, name='bulk_update_cart'),
     path('cart/summary/', cart_summary, name='cart_summary'),
     path('cart/clear/', clear_cart, name='clear_cart'),
@@ -177,6 +185,7 @@ urlpatterns = [
     path('referral/history/', referral_history, name='referral_history'),
     path('wallet/transactions/', wallet_transactions, name='wallet_transactions'),
     path('referral/share/', referral_share, name='referral_share'),
+    path('cron/referral-rewards/', cron_referral_rewards, name='cron_referral_rewards'),
 
     # =============================================================================
     # TRIAL AT HOME (Trial Booking + Upsell Discount)
@@ -248,15 +257,21 @@ urlpatterns = [
          name='vendor_delete_product_option'),
     path('vendor/images/upload/', vendor_upload_product_image, name='vendor_upload_product_image'),
     path('vendor/images/<int:image_id>/delete/', vendor_delete_product_image, name='vendor_delete_product_image'),
+    path('vendor/catalog/imports/', vendor_catalog_imports, name='vendor_catalog_imports'),
+    path('vendor/catalog/imports/<uuid:job_id>/', vendor_catalog_import_detail, name='vendor_catalog_import_detail'),
     path('vendor/categories/', vendor_get_categories, name='vendor_get_categories'),
     path('vendor/trial/bookings/', vendor_trial_bookings, name='vendor_trial_bookings'),
     path('vendor/trial/bookings/<uuid:trial_id>/decide/', vendor_trial_decide, name='vendor_trial_decide'),
     path('vendor/stock/bulk-update/', vendor_bulk_update_stock, name='vendor_bulk_update_stock'),
     path('vendor/orders/', vendor_orders, name='vendor_orders'),
+    path('vendor/orders/events/', vendor_order_events, name='vendor_order_events'),
+    path('vendor/orders/events/stream/', vendor_order_event_stream, name='vendor_order_event_stream'),
+    path('vendor/exports/<str:dataset>/', vendor_export, name='vendor_export'),
     path('vendor/orders/<uuid:order_id>/', vendor_order_detail, name='vendor_order_detail'),
     path('vendor/orders/<uuid:order_id>/accept/', vendor_accept_order, name='vendor_accept_order'),
     path('vendor/orders/<uuid:order_id>/reject/', vendor_reject_order, name='vendor_reject_order'),
     path('serviceable-locations/', get_serviceable_locations, name='get_serviceable_locations'),
+    path('nearby/', get_nearby, name='get_nearby'),
 
     # =============================================================================
     # SERVICE VENDOR ENDPOINTS (Services mode)
@@ -270,6 +285,7 @@ urlpatterns = [
     path('service-vendor/services/create/', service_vendor_create_service, name='service_vendor_create_service'),
     path('service-vendor/services/<uuid:service_id>/update/', service_vendor_update_service, name='service_vendor_update_service'),
     path('service-vendor/services/<uuid:service_id>/delete/', service_vendor_delete_service, name='service_vendor_delete_service'),
+    path('service-vendor/exports/service-bookings/', service_vendor_export_bookings, name='service_vendor_export_bookings'),
     path('service-vendor/bookings/', service_vendor_bookings, name='service_vendor_bookings'),
     path('service-vendor/bookings/<uuid:booking_id>/confirm/', service_vendor_confirm_booking, name='service_vendor_confirm_booking'),
     path('service-vendor/bookings/<uuid:booking_id>/cancel/', service_vendor_cancel_booking, name='service_vendor_cancel_booking'),
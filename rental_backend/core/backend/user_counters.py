@@ -0,0 +1,98 @@
+"""
+Denormalized per-user counters read by home/profile/login responses and
+UserSerializer instead of counting rows on every request:
+    User.cart_count            CartItem rows of the user
+    User.wishlist_count        rows in User.wishlist
+    User.unread_notifications  Notification rows with seen=False
+
+backend/signals.py adjusts them in the same transaction as the write, with
+F() expressions, from CartItem creates/deletes, m2m_changed (wishlist add,
+remove, clear, from either side), ProductOption deletes (cascaded M2M rows send
+no m2m_changed) and Notification saves/deletes. Queryset updates, raw SQL and
+bulk_create bypass signals; `python manage.py repair_user_counters` recounts.
+"""
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+CART = 'cart_count'
+WISHLIST = 'wishlist_count'
+UNREAD_NOTIFICATIONS = 'unread_notifications'
+
+# User M2M field name -> counter
+M2M_COUNTERS = {'wishlist': WISHLIST}
+
+
+def adjust(user_ids, field, delta, instance=None):
+    """
+    Add delta to one counter of these users (never below zero). `instance`, a
+    User whose counter should reflect the write, is refreshed from the row.
+    """
+    from backend.models import User
+
+    user_ids = [pk for pk in user_ids if pk is not None]
+    if not user_ids or not delta:
+        return
+    User.objects.filter(pk__in=user_ids).update(**{field: Greatest(F(field) + delta, 0)})
+    if instance is not None and instance.pk in user_ids:
+        instance.refresh_from_db(fields=[field])
+
+
+def reset(user_ids, field, instance=None):
+    from backend.models import User
+
+    User.objects.filter(pk__in=[pk for pk in user_ids if pk is not None]).update(**{field: 0})
+    if instance is not None:
+        setattr(instance, field, 0)
+
+
+# =============================================================================
+# REPAIR
+# =============================================================================
+
+def _expected_counts(user_ids=None):
+    """{user_id: {counter: value}} recomputed from the source tables (absent users have none)."""
+    from backend.models import CartItem, Notification, User
+
+    sources = {
+        CART: (CartItem.objects.all(), 'user_id'),
+        WISHLIST: (User.wishlist.through.objects.all(), 'user_id'),
+        UNREAD_NOTIFICATIONS: (Notification.objects.filter(seen=False), 'user_id'),
+    }
+    expected = {}
+    for field, (queryset, user_field) in sources.items():
+        if user_ids is not None:
+            queryset = queryset.filter(**{f'{user_field}__in': user_ids})
+        for user_id, count in queryset.values(user_field).annotate(n=Count('pk')).values_list(user_field, 'n'):
+            expected.setdefault(user_id, {})[field] = count
+    return expected
+
+
+def repair(user_ids=None, dry_run=False, batch_size=1000):
+    """Recount every counter (of these users). Returns the number of users that were (or would be) fixed."""
+    from backend.models import User
+
+    fields = [CART, WISHLIST, UNREAD_NOTIFICATIONS]
+    expected = _expected_counts(user_ids)
+    users = User.objects.only('pk', *fields)
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+
+    fixed, batch = 0, []
+    for user in users.iterator(chunk_size=batch_size):
+        counts = expected.get(user.pk, {})
+        changed = False
+        for field in fields:
+            if getattr(user, field) != counts.get(field, 0):
+                setattr(user, field, counts.get(field, 0))
+                changed = True
+        if not changed:
+            continue
+        fixed += 1
+        batch.append(user)
+        if len(batch) >= batch_size:
+            if not dry_run:
+                User.objects.bulk_update(batch, fields)
+            batch = []
+    if batch and not dry_run:
+        User.objects.bulk_update(batch, fields)
+    return fixed
@@ -207,26 +207,14 @@ class IsAuthenticatedServiceVendor(BasePermission):
 
 def get_pincode_from_coordinates(latitude, longitude):
     """
-    Get pincode from latitude/longitude using geocoding
-    You can use geopy library for this
+    Get pincode from latitude/longitude (nearest pincode centroid, offline;
+    see backend/pincode_geocoder.py). Returns None when nothing is close.
     """
-    try:
-        from geopy.geocoders import Nominatim
-
-        geolocator = Nominatim(user_agent="rental_app")
-        location = geolocator.reverse(f"{latitude}, {longitude}", language='en')
-
-        if location and location.raw.get('address'):
-            address = location.raw['address']
-            pincode = address.get('postcode', '')
-
-            # Clean pincode (remove spaces, take first 6 digits)
-            pincode = ''.join(filter(str.isdigit, pincode))[:6]
+    from backend.pincode_geocoder import reverse_geocode
 
-            return pincode if len(pincode) == 6 else None
-
-        return None
-    except Exception as e:
+    try:
+        return reverse_geocode(latitude, longitude)
+    except (TypeError, ValueError) as e:
         print(f"Error getting pincode from coordinates: {e}")
         return None
 
@@ -263,102 +251,24 @@ def validate_coupon_and_calculate_discount(
     - product_option_ids: list of ProductOption UUIDs in cart (for product eligibility)
     - product_ids: list of Product UUIDs in cart (alternative; we derive from product_option if needed)
     - service_ids: list of Service UUIDs in cart (for service eligibility)
+
+    Coupons come from the in-memory eligibility index (backend/coupon_index.py).
     """
-    from decimal import Decimal
-    from backend.models import Coupon, Order, ProductOption
-
-    product_option_ids = product_option_ids or []
-    product_ids = list(product_ids) if product_ids else []
-    service_ids = service_ids or []
-
-    # Resolve product IDs from product_option_ids if needed
-    if product_option_ids and not product_ids:
-        product_ids = list(
-            ProductOption.objects.filter(id__in=product_option_ids)
-            .values_list('product_id', flat=True)
-            .distinct()
-        )
+    from backend import coupon_index
 
     coupon_code = (coupon_code or '').strip().upper()
     if not coupon_code:
-        return False, 'Coupon code is required', 0, int(cart_total), None
+        return False, coupon_index.MSG_REQUIRED, 0, int(cart_total), None
 
-    try:
-        coupon = Coupon.objects.prefetch_related(
-            'applicable_products', 'applicable_categories', 'applicable_services'
-        ).get(code=coupon_code)
-    except Coupon.DoesNotExist:
-        return False, 'Invalid or expired coupon code', 0, int(cart_total), None
-
-    if not coupon.is_active:
-        return False, 'Invalid or expired coupon code', 0, int(cart_total), None
-
-    now = timezone.now()
-    if now < coupon.valid_from:
-        return False, 'This coupon is not yet valid', 0, int(cart_total), None
-    if now > coupon.valid_until:
-        return False, 'Invalid or expired coupon code', 0, int(cart_total), None
-
-    if coupon.usage_limit > 0 and coupon.used_count >= coupon.usage_limit:
-        return False, 'This coupon has reached its usage limit', 0, int(cart_total), None
-
-    if coupon.first_order_only:
-        if Order.objects.filter(user=user).exists():
-            return False, 'This coupon is valid for first order only', 0, int(cart_total), None
-
-    cart_total_decimal = Decimal(str(cart_total))
-    if cart_total_decimal < coupon.minimum_order_amount:
-        return (
-            False,
-            f'Minimum order value of ₹{coupon.minimum_order_amount} required for this coupon',
-            0,
-            int(cart_total),
-            None,
-        )
+    coupon = coupon_index.find(coupon_code)
+    if coupon is None:
+        return False, coupon_index.MSG_INVALID, 0, int(cart_total), None
 
-    # Service booking: only check applicable_services (ignore product/category for this request)
-    if service_ids:
-        if coupon.applicable_services.exists():
-            # Normalize to strings for comparison (DB returns UUIDs, request sends strings)
-            allowed_service_ids = {str(sid).strip().lower() for sid in coupon.applicable_services.values_list('id', flat=True)}
-            request_service_ids = {str(sid).strip().lower() for sid in service_ids}
-            if not (request_service_ids & allowed_service_ids):
-                return False, 'This coupon is not applicable to this service', 0, int(cart_total), None
-        # Service request passed (or coupon has no service restriction). Skip product/category checks.
-    else:
-        # Product/cart order: check applicable_products and applicable_categories
-        if coupon.applicable_products.exists():
-            if not product_ids:
-                return False, 'This coupon is not applicable to your cart items', 0, int(cart_total), None
-            allowed_product_ids = set(coupon.applicable_products.values_list('id', flat=True))
-            if not (set(product_ids) & allowed_product_ids):
-                return False, 'This coupon is not applicable to your cart items', 0, int(cart_total), None
-
-        if coupon.applicable_categories.exists():
-            if not product_ids:
-                return False, 'This coupon is not applicable to your cart items', 0, int(cart_total), None
-            from backend.models import Product
-            cart_category_ids = set(
-                Product.objects.filter(id__in=product_ids).values_list('category_id', flat=True)
-            )
-            allowed_cat_ids = set(coupon.applicable_categories.values_list('id', flat=True))
-            if not (cart_category_ids & allowed_cat_ids):
-                return False, 'This coupon is not applicable to your cart items', 0, int(cart_total), None
-
-    # Calculate discount
-    if coupon.discount_type == Coupon.DISCOUNT_PERCENTAGE:
-        discount = (cart_total_decimal * coupon.discount_value) / Decimal('100')
-    else:
-        discount = coupon.discount_value
-
-    if coupon.maximum_discount_amount is not None and coupon.maximum_discount_amount > 0:
-        discount = min(discount, coupon.maximum_discount_amount)
-
-    discount = int(discount)
-    discount = min(discount, int(cart_total))
-    final_total = max(0, int(cart_total) - discount)
-
-    return True, 'Coupon applied successfully', discount, final_total, coupon
+    context = coupon_index.CartContext(user, cart_total, product_option_ids, product_ids, service_ids)
+    success, message, discount = coupon_index.evaluate(coupon, context)
+    if not success:
+        return False, message, 0, int(cart_total), None
+    return True, message, discount, max(0, int(cart_total) - discount), coupon.as_model()
 
 
 def get_available_categories_for_pincode(pincode):
@@ -485,52 +395,10 @@ def get_available_service_categories_for_pincode(pincode):
 
 def get_coordinates_from_location(pincode, area_name, city=None, state=None):
     """
-    Get latitude and longitude from pincode and area name using geocoding
+    Get latitude and longitude from pincode and area name (offline pincode
+    centroids; see backend/pincode_geocoder.py)
     Returns: (latitude, longitude) or (None, None) if not found
     """
-    try:
-        from geopy.geocoders import Nominatim
-        from geopy.exc import GeocoderTimedOut, GeocoderServiceError
-
-        geolocator = Nominatim(user_agent="rental_app")
-
-        # Build search query with available information
-        search_parts = []
-        if area_name:
-            search_parts.append(area_name)
-        if city:
-            search_parts.append(city)
-        if state:
-            search_parts.append(state)
-        if pincode:
-            search_parts.append(pincode)
-        search_parts.append("India")
-
-        search_query = ", ".join(search_parts)
-
-        print(f"Searching coordinates for: {search_query}")
-
-        # Try geocoding with full query
-        location = geolocator.geocode(search_query, timeout=10)
-
-        if location:
-            print(f"Found coordinates: {location.latitude}, {location.longitude}")
-            return round(location.latitude, 6), round(location.longitude, 6)
-
-        # If full query fails, try with just pincode
-        if pincode:
-            print(f" Trying with pincode only: {pincode}")
-            location = geolocator.geocode(f"{pincode}, India", timeout=10)
-            if location:
-                print(f"Found coordinates: {location.latitude}, {location.longitude}")
-                return round(location.latitude, 6), round(location.longitude, 6)
-
-        print(" Could not find coordinates")
-        return None, None
-
-    except (GeocoderTimedOut, GeocoderServiceError) as e:
-        print(f"Geocoding service error: {e}")
-        return None, None
-    except Exception as e:
-        print(f" Error getting coordinates: {e}")
-        return None, None
\ No newline at end of file
+    from backend.pincode_geocoder import geocode
+
+    return geocode(pincode=pincode, area_name=area_name, city=city, state=state)
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""
+Per-vendor event feed (new orders, cancellations, trial bookings).
+
+Writers call publish_* (from backend/signals.py). Events are inserted after the
+surrounding transaction commits, one per (vendor, kind, order/trial). Readers
+follow VendorEvent.id as a cursor through the async views in views.py, either as
+a long-poll or as a Server-Sent Events stream. Waiting costs one indexed
+(vendor, id) query per poll interval, not the full vendor order listing, and
+under ASGI an idle connection does not hold a worker thread.
+
+An event is only handed out once it is VENDOR_EVENT_SETTLE_SECONDS old. Ids are
+allocated at insert time, so a slightly slower concurrent insert could commit a
+lower id after a reader has already moved its cursor past it; the settle
+delay covers that window.
+"""
+import datetime
+import logging
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+KIND_ORDER_CREATED = 'order.created'
+KIND_ORDER_CANCELLED = 'order.cancelled'
+KIND_TRIAL_CREATED = 'trial.created'
+KIND_TRIAL_CANCELLED = 'trial.cancelled'
+
+MAX_EVENTS_PER_READ = 100
+
+_local = threading.local()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# =============================================================================
+# PUBLISH (coalesced until commit)
+# =============================================================================
+
+def _flush_pending():
+    from backend.models import VendorEvent
+
+    pending = getattr(_local, 'pending', None)
+    if not pending:
+        return
+    _local.pending = {}
+    events = [
+        VendorEvent(vendor_id=vendor_id, kind=kind, order_id=order_id, trial_id=trial_id, data=data)
+        for (vendor_id, kind, order_id, trial_id), data in pending.items()
+    ]
+    try:
+        # The partial unique constraints drop repeats (e.g. one event per order, not per item)
+        VendorEvent.objects.bulk_create(events, ignore_conflicts=True)
+    except Exception:
+        logger.exception('Publishing %s vendor event(s) failed', len(events))
+
+
+def _publish(vendor_id, kind, order_id=None, trial_id=None, data=None):
+    if not vendor_id:
+        return
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        pending = _local.pending = {}
+    pending.setdefault((vendor_id, kind, order_id, trial_id), data or {})
+    transaction.on_commit(_flush_pending)
+
+
+def _order_data(order):
+    return {
+        'order_id': str(order.id),
+        'tx_status': order.tx_status,
+        'vendor_status': order.vendor_status,
+        'amount': order.tx_amount,
+    }
+
+
+def _trial_data(trial):
+    return {
+        'trial_id': str(trial.id),
+        'trial_date': trial.trial_date.isoformat() if trial.trial_date else None,
+        'time_slot': trial.time_slot,
+        'area': trial.area,
+        'status': trial.status,
+    }
+
+
+def publish_order_created(vendor_id, order):
+    _publish(vendor_id, KIND_ORDER_CREATED, order_id=order.id, data=_order_data(order))
+
+
+def publish_order_cancelled(vendor_ids, order):
+    for vendor_id in set(vendor_ids):
+        _publish(vendor_id, KIND_ORDER_CANCELLED, order_id=order.id, data=_order_data(order))
+
+
+def publish_trial_created(trial):
+    _publish(trial.vendor_id, KIND_TRIAL_CREATED, trial_id=trial.id, data=_trial_data(trial))
+
+
+def publish_trial_cancelled(trial):
+    _publish(trial.vendor_id, KIND_TRIAL_CANCELLED, trial_id=trial.id, data=_trial_data(trial))
+
+
+# =============================================================================
+# READ
+# =============================================================================
+
+def latest_cursor(vendor_id):
+    """Cursor to start from when a client connects without one (only future events)."""
+    from backend.models import VendorEvent
+    return VendorEvent.objects.filter(vendor_id=vendor_id).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def read_events(vendor_id, cursor, limit=MAX_EVENTS_PER_READ):
+    """Settled events after `cursor`, oldest first, as API dicts."""
+    from backend.models import VendorEvent
+
+    settled = timezone.now() - datetime.timedelta(seconds=_setting('VENDOR_EVENT_SETTLE_SECONDS', 1))
+    events = (
+        VendorEvent.objects
+        .filter(vendor_id=vendor_id, id__gt=cursor, created_at__lte=settled)
+        .order_by('id')[:limit]
+    )
+    return [event_data(e) for e in events]
+
+
+def event_data(event):
+    return {
+        'id': event.id,
+        'type': event.kind,
+        'order_id': str(event.order_id) if event.order_id else None,
+        'trial_id': str(event.trial_id) if event.trial_id else None,
+        'data': event.data,
+        'created_at': event.created_at.isoformat(),
+    }
+
+
+def purge_events(retain_days=None):
+    """Delete events older than VENDOR_EVENT_RETENTION_DAYS. Returns rows deleted."""
+    from backend.models import VendorEvent
+
+    if retain_days is None:
+        retain_days = _setting('VENDOR_EVENT_RETENTION_DAYS', 7)
+    cutoff = timezone.now() - datetime.timedelta(days=retain_days)
+    deleted, _ = VendorEvent.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
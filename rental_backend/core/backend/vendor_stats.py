@@ -0,0 +1,312 @@
+"""
+Counter cache for the vendor and service vendor dashboards.
+
+VendorStats / ServiceVendorStats rows are maintained incrementally: the
+signals in backend/signals.py turn each write into a delta of what the row
+contributes (an option's stock, an order's pending/accepted/revenue share, a
+booking's counts) and queue it with add_*(). Deltas are summed until the
+surrounding transaction commits and then applied as one F() UPDATE per stats
+row, so a checkout never aggregates a vendor's history. Orders per local day
+(VendorOrderDay) give the sliding 30-day "recent orders" on read.
+
+Full aggregates run only in refresh_* : when a vendor's row is first read and
+from `python manage.py rebuild_vendor_stats`, which also repairs drift from
+writes that bypass signals without calling add_* (raw SQL, queryset.update).
+"""
+import datetime
+import logging
+import threading
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+RECENT_ORDERS_DAYS = 30
+LOW_STOCK_THRESHOLD = 10
+
+_local = threading.local()
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min), timezone.get_current_timezone())
+
+
+# =============================================================================
+# CONTRIBUTIONS (what one row adds to its vendor's counters)
+# =============================================================================
+
+def option_counts(quantity):
+    quantity = quantity or 0
+    return {
+        'total_options': 1,
+        'total_stock': quantity,
+        'low_stock_items': 1 if 0 < quantity < LOW_STOCK_THRESHOLD else 0,
+    }
+
+
+def order_counts(vendor_status, tx_status, tx_amount):
+    return {
+        'pending_orders': 1 if vendor_status == 'PENDING' else 0,
+        'accepted_orders': 1 if vendor_status == 'ACCEPTED' else 0,
+        'total_revenue': (tx_amount or 0) if tx_status == 'SUCCESS' else 0,
+    }
+
+
+def booking_counts(status, payment_status, total_amount):
+    return {
+        'total_bookings': 1,
+        'pending_bookings': 1 if status == 'PENDING' else 0,
+        'confirmed_bookings': 1 if status == 'CONFIRMED' else 0,
+        'total_revenue': (total_amount or 0) if payment_status == 'PAID' else 0,
+    }
+
+
+def diff(new, old, sign=1):
+    """new - old, key by key (either may be None); sign=-1 gives old - new."""
+    keys = set(new or ()) | set(old or ())
+    return {k: sign * ((new or {}).get(k, 0) - (old or {}).get(k, 0)) for k in keys}
+
+
+def scale(counts, factor):
+    return {k: v * factor for k, v in counts.items()}
+
+
+def combine(*counts):
+    """Key-by-key sum of several contributions."""
+    total = {}
+    for row in counts:
+        for k, v in row.items():
+            total[k] = total.get(k, 0) + v
+    return total
+
+
+# =============================================================================
+# DELTAS (summed until commit)
+# =============================================================================
+
+def _pending():
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        pending = _local.pending = {'vendor': {}, 'service_vendor': {}, 'days': {}, 'left': set()}
+    return pending
+
+
+def _add(kind, key, counts):
+    if not key:
+        return
+    row = _pending()[kind].setdefault(key, {})
+    for field, delta in counts.items():
+        if delta:
+            row[field] = row.get(field, 0) + delta
+    # Runs immediately outside a transaction; otherwise after the outermost commit.
+    # Every call registers; the first callback to run drains everything.
+    transaction.on_commit(_flush_pending)
+
+
+def add_vendor(vendor_id, counts):
+    """Queue counter deltas ({field: delta}) for a VendorStats row."""
+    _add('vendor', vendor_id, counts)
+
+
+def add_service_vendor(service_vendor_id, counts):
+    """Queue counter deltas for a ServiceVendorStats row."""
+    _add('service_vendor', service_vendor_id, counts)
+
+
+def add_order(vendor_id, order_created_at, counts, sign=1):
+    """An order starts (sign=1) or stops (sign=-1) counting for a vendor."""
+    if not vendor_id:
+        return
+    add_vendor(vendor_id, scale(counts, sign))
+    day = timezone.localdate(order_created_at) if order_created_at else timezone.localdate()
+    _add('days', (vendor_id, day), {'orders': sign})
+
+
+def mark_order_left(order_id, vendor_id, sign):
+    """
+    Track (order, vendor) pairs whose membership ended in this transaction.
+    Returns False for a second "left" of the same pair (sign=-1), which must
+    not be counted again.
+    """
+    left = _pending()['left']
+    key = (order_id, vendor_id)
+    if sign > 0:
+        left.discard(key)
+        return True
+    if key in left:
+        return False
+    left.add(key)
+    return True
+
+
+def _apply(model, pk_field, key, counts):
+    values = {
+        field: F(field) + delta if delta > 0 else Greatest(F(field) + delta, 0)
+        for field, delta in counts.items() if delta
+    }
+    if values:
+        # No row yet: it is built from the source tables on first read
+        model.objects.filter(**{pk_field: key}).update(**values)
+
+
+def _apply_day(vendor_id, day, delta):
+    from backend.models import VendorOrderDay, VendorStats
+
+    if not delta:
+        return
+    if VendorOrderDay.objects.filter(vendor_id=vendor_id, day=day).update(orders=Greatest(F('orders') + delta, 0)):
+        if delta < 0:
+            VendorOrderDay.objects.filter(vendor_id=vendor_id, day=day, orders=0).delete()
+        return
+    if delta > 0 and VendorStats.objects.filter(vendor_id=vendor_id).exists():
+        VendorOrderDay.objects.get_or_create(vendor_id=vendor_id, day=day, defaults={'orders': 0})
+        VendorOrderDay.objects.filter(vendor_id=vendor_id, day=day).update(orders=F('orders') + delta)
+
+
+def _flush_pending():
+    from backend.models import ServiceVendorStats, VendorStats
+
+    pending = getattr(_local, 'pending', None)
+    if not pending:
+        return
+    _local.pending = None
+    for kind, model, pk_field in (
+        ('vendor', VendorStats, 'vendor_id'),
+        ('service_vendor', ServiceVendorStats, 'service_vendor_id'),
+    ):
+        for key, counts in pending[kind].items():
+            try:
+                _apply(model, pk_field, key, counts)
+            except Exception:
+                logger.exception('Vendor stats update failed (%s, %s)', kind, key)
+    for (vendor_id, day), counts in pending['days'].items():
+        try:
+            _apply_day(vendor_id, day, counts.get('orders', 0))
+        except Exception:
+            logger.exception('Vendor order day update failed (%s, %s)', vendor_id, day)
+
+
+# =============================================================================
+# FULL REFRESH (first read, rebuild_vendor_stats)
+# =============================================================================
+
+def refresh_vendor_products(vendor_id):
+    """Recompute product/option/stock counters for one vendor."""
+    from backend.models import Product, ProductOption, VendorStats
+
+    options = ProductOption.objects.filter(product__vendor_id=vendor_id).aggregate(
+        total_options=Count('id'),
+        total_stock=Sum('quantity'),
+        low_stock_items=Count('id', filter=Q(quantity__lt=LOW_STOCK_THRESHOLD, quantity__gt=0)),
+    )
+    VendorStats.objects.update_or_create(
+        vendor_id=vendor_id,
+        defaults={
+            'total_products': Product.objects.filter(vendor_id=vendor_id).count(),
+            'total_options': options['total_options'] or 0,
+            'total_stock': options['total_stock'] or 0,
+            'low_stock_items': options['low_stock_items'] or 0,
+            'products_refreshed_at': timezone.now(),
+        },
+    )
+
+
+def refresh_vendor_orders(vendor_id):
+    """Recompute order counters and recent order days for one vendor (orders with at least one of its items)."""
+    from backend.models import Order, OrderedProduct, VendorOrderDay, VendorStats
+
+    now = timezone.now()
+    orders = Order.objects.filter(id__in=OrderedProduct.objects.filter(vendor_id=vendor_id).values('order_id'))
+    stats = orders.aggregate(
+        pending_orders=Count('id', filter=Q(vendor_status='PENDING')),
+        accepted_orders=Count('id', filter=Q(vendor_status='ACCEPTED')),
+        total_revenue=Sum('tx_amount', filter=Q(tx_status='SUCCESS')),
+    )
+    first_day = timezone.localdate(now) - datetime.timedelta(days=RECENT_ORDERS_DAYS - 1)
+    days = (
+        orders.filter(created_at__gte=_day_start(first_day))
+        .annotate(day=TruncDate('created_at')).values('day').annotate(n=Count('id'))
+    )
+    with transaction.atomic():
+        VendorStats.objects.update_or_create(
+            vendor_id=vendor_id,
+            defaults={
+                'pending_orders': stats['pending_orders'] or 0,
+                'accepted_orders': stats['accepted_orders'] or 0,
+                'total_revenue': stats['total_revenue'] or 0,
+                'orders_refreshed_at': now,
+            },
+        )
+        VendorOrderDay.objects.filter(vendor_id=vendor_id).delete()
+        VendorOrderDay.objects.bulk_create([
+            VendorOrderDay(vendor_id=vendor_id, day=row['day'], orders=row['n']) for row in days
+        ])
+
+
+def refresh_service_vendor(service_vendor_id):
+    """Recompute service/booking counters for one service vendor."""
+    from backend.models import Service, ServiceBooking, ServiceVendorStats
+
+    stats = ServiceBooking.objects.filter(service_option__service__service_vendor_id=service_vendor_id).aggregate(
+        total_bookings=Count('id'),
+        pending_bookings=Count('id', filter=Q(status='PENDING')),
+        confirmed_bookings=Count('id', filter=Q(status='CONFIRMED')),
+        total_revenue=Sum('total_amount', filter=Q(payment_status='PAID')),
+    )
+    ServiceVendorStats.objects.update_or_create(
+        service_vendor_id=service_vendor_id,
+        defaults={
+            'total_services': Service.objects.filter(service_vendor_id=service_vendor_id).count(),
+            'total_bookings': stats['total_bookings'] or 0,
+            'pending_bookings': stats['pending_bookings'] or 0,
+            'confirmed_bookings': stats['confirmed_bookings'] or 0,
+            'total_revenue': stats['total_revenue'] or 0,
+            'refreshed_at': timezone.now(),
+        },
+    )
+
+
+def refresh_vendor(vendor_id):
+    refresh_vendor_products(vendor_id)
+    refresh_vendor_orders(vendor_id)
+
+
+# =============================================================================
+# READ
+# =============================================================================
+
+def recent_orders(vendor_id):
+    """Orders in the last RECENT_ORDERS_DAYS local days, today included (summed from VendorOrderDay)."""
+    from backend.models import VendorOrderDay
+
+    first_day = timezone.localdate() - datetime.timedelta(days=RECENT_ORDERS_DAYS - 1)
+    return VendorOrderDay.objects.filter(vendor_id=vendor_id, day__gte=first_day).aggregate(n=Sum('orders'))['n'] or 0
+
+
+def get_vendor_stats(vendor):
+    """
+    VendorStats row for the dashboard (built on first use), with
+    recent_orders set from the vendor's order days.
+    """
+    from backend.models import VendorStats
+
+    stats = VendorStats.objects.filter(vendor_id=vendor.id).first()
+    if stats is None or stats.products_refreshed_at is None or stats.orders_refreshed_at is None:
+        refresh_vendor(vendor.id)
+        stats = VendorStats.objects.get(vendor_id=vendor.id)
+    stats.recent_orders = recent_orders(vendor.id)
+    return stats
+
+
+def get_service_vendor_stats(service_vendor):
+    """ServiceVendorStats row for the dashboard (built on first use)."""
+    from backend.models import ServiceVendorStats
+
+    stats = ServiceVendorStats.objects.filter(service_vendor_id=service_vendor.id).first()
+    if stats is None:
+        refresh_service_vendor(service_vendor.id)
+        stats = ServiceVendorStats.objects.get(service_vendor_id=service_vendor.id)
+    return stats
@@ -1,4 +1,6 @@
+import asyncio
 import base64
+import time as time_module
 import uuid
 from datetime import datetime, date, time, timedelta
 import hashlib
@@ -6,6 +8,7 @@ import hmac
 import json
 import logging
 import math
+import os
 from calendar import monthrange, calendar
 from random import randint
 
@@ -17,13 +20,15 @@ import requests
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from django.db import transaction
 from django.contrib.auth.hashers import make_password, check_password
-from django.db.models import Q, Case, When, IntegerField, Value, F, Count, Avg, Sum, Exists, OuterRef
-from django.http import HttpResponse, JsonResponse
+from django.db.models import Q, Case, When, IntegerField, Value, F, Count, Avg, Sum, Exists, OuterRef, Prefetch
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.template.loader import get_template
 from google.auth import jwt
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes, parser_classes, authentication_classes
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.generics import get_object_or_404
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.parsers import MultiPartParser, FormParser
@@ -49,6 +54,8 @@ from backend.serializers import UserSerializer, CategorySerializer, SlideSeriali
 
 from backend.utils import send_otp, token_response, send_password_reset_email, IsAuthenticatedUser, \
     new_token, IsAuthenticatedVendor, IsAuthenticatedServiceVendor
+from backend import vendor_events
+from backend.image_variants import variant_urls
 from core import settings
 from core.settings import TEMPLATES_BASE_URL
 from rest_framework import status as http_status
@@ -88,6 +95,25 @@ def _notify_user_trial_decision(user, title, body, data=None):
 # =============================================================================
 # ANALYTICS: SCREEN VIEW EVENTS (Customer app)
 # =============================================================================
+# All analytics writes go through backend.analytics_buffer.record_events, which
+# buffers them for a background bulk insert (or writes directly when disabled).
+
+# Max events accepted in one analytics batch request
+ANALYTICS_BATCH_MAX_EVENTS = 200
+
+
+def _analytics_request_user_id(request):
+    """Return the customer User id for this request, or None for guests."""
+    user = getattr(request, 'user', None)
+    return user.id if isinstance(user, User) else None
+
+
+def _analytics_defaults(request):
+    return {
+        key: str(request.data.get(key) or '').strip()
+        for key in ('device_id', 'session_id', 'platform', 'app_version')
+    }
+
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -104,35 +130,20 @@ def analytics_screen_start(request):
       - If user token present, links to user.
       - If guest, user=null but device_id can be set for uniqueness.
     Returns:
-      - event_id
+      - event_id (generated here; the row itself may be written a few seconds later)
     """
-    from backend.models import ScreenViewEvent
-    screen = (request.data.get('screen') or '').strip()
-    if not screen:
-        return Response({'success': False, 'message': 'screen is required'}, status=400)
-
-    device_id = (request.data.get('device_id') or '').strip()
-    session_id = (request.data.get('session_id') or '').strip()
-    platform = (request.data.get('platform') or '').strip()
-    app_version = (request.data.get('app_version') or '').strip()
+    from backend.analytics_buffer import parse_event, record_events, KIND_SCREEN_START
 
-    user = None
-    try:
-        # If request has authenticated user, attach it
-        if getattr(request, 'user', None) and getattr(request.user, 'is_authenticated', False):
-            user = request.user
-    except Exception:
-        user = None
-
-    ev = ScreenViewEvent.objects.create(
-        user=user if getattr(user, 'id', None) else None,
-        device_id=device_id,
-        session_id=session_id,
-        screen=screen[:150],
-        platform=platform[:20],
-        app_version=app_version[:40],
+    record, error = parse_event(
+        {'type': KIND_SCREEN_START, 'screen': request.data.get('screen')},
+        defaults=_analytics_defaults(request),
+        user_id=_analytics_request_user_id(request),
     )
-    return Response({'success': True, 'event_id': str(ev.id)})
+    if error:
+        return Response({'success': False, 'message': error}, status=400)
+
+    record_events([record])
+    return Response({'success': True, 'event_id': record['event_id']})
 
 
 @api_view(['POST'])
@@ -143,40 +154,30 @@ def analytics_screen_end(request):
     Body:
       - event_id: uuid (required)
       - duration_seconds: int (optional; if not provided, computed via now-started_at)
+    The response carries the stored duration; it is null only when the start
+    is still buffered by another worker (the row gets now-started_at on flush).
     """
-    from backend.models import ScreenViewEvent
-    event_id = (request.data.get('event_id') or '').strip()
-    if not event_id:
-        return Response({'success': False, 'message': 'event_id is required'}, status=400)
-
-    try:
-        ev = ScreenViewEvent.objects.get(id=event_id)
-    except ScreenViewEvent.DoesNotExist:
-        return Response({'success': False, 'message': 'event not found'}, status=404)
-
-    if ev.ended_at:
-        return Response({'success': True, 'message': 'already ended', 'duration_seconds': ev.duration_seconds})
+    from backend.analytics_buffer import (
+        parse_event, record_events, screen_started_at, KIND_SCREEN_END,
+    )
 
-    dur = request.data.get('duration_seconds', None)
-    try:
-        if dur is not None:
-            dur_int = int(dur)
-            if dur_int < 0:
-                dur_int = 0
-        else:
-            dur_int = int((timezone.now() - ev.started_at).total_seconds())
-            if dur_int < 0:
-                dur_int = 0
-    except (ValueError, TypeError):
-        dur_int = int((timezone.now() - ev.started_at).total_seconds())
-        if dur_int < 0:
-            dur_int = 0
+    record, error = parse_event({
+        'type': KIND_SCREEN_END,
+        'event_id': request.data.get('event_id'),
+        'duration_seconds': request.data.get('duration_seconds'),
+    })
+    if error:
+        return Response({'success': False, 'message': error}, status=400)
 
-    ev.ended_at = timezone.now()
-    ev.duration_seconds = dur_int
-    ev.save(update_fields=['ended_at', 'duration_seconds'])
+    if record['duration_seconds'] is None:
+        started_at = screen_started_at(record['event_id'])
+        if started_at is not None:
+            record['duration_seconds'] = max(0, int((timezone.now() - started_at).total_seconds()))
 
-    return Response({'success': True, 'duration_seconds': ev.duration_seconds})
+    if record_events([record]):
+        # Only possible when buffering is disabled (direct write could not find the row)
+        return Response({'success': False, 'message': 'event not found'}, status=404)
+    return Response({'success': True, 'duration_seconds': record['duration_seconds']})
 
 
 @api_view(['POST'])
@@ -192,47 +193,81 @@ def analytics_location_ping(request):
       - platform: string (optional)
       - app_version: string (optional)
     """
-    from backend.models import CustomerLocationPing
+    from backend.analytics_buffer import parse_event, record_events, KIND_LOCATION_PING
 
-    device_id = (request.data.get('device_id') or '').strip()
-    if not device_id:
-        return Response({'success': False, 'message': 'device_id is required'}, status=400)
+    record, error = parse_event(
+        {
+            'type': KIND_LOCATION_PING,
+            'latitude': request.data.get('latitude'),
+            'longitude': request.data.get('longitude'),
+            'accuracy_m': request.data.get('accuracy_m'),
+        },
+        defaults=_analytics_defaults(request),
+        user_id=_analytics_request_user_id(request),
+    )
+    if error:
+        return Response({'success': False, 'message': error}, status=400)
 
-    lat = request.data.get('latitude')
-    lng = request.data.get('longitude')
-    try:
-        lat = float(lat)
-        lng = float(lng)
-    except (TypeError, ValueError):
-        return Response({'success': False, 'message': 'latitude/longitude must be numbers'}, status=400)
+    record_events([record])
+    return Response({'success': True})
 
-    acc = request.data.get('accuracy_m', 0) or 0
-    try:
-        acc = float(acc)
-    except (TypeError, ValueError):
-        acc = 0.0
 
-    platform = (request.data.get('platform') or '').strip()
-    app_version = (request.data.get('app_version') or '').strip()
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def analytics_batch(request):
+    """
+    Ingest several analytics events in one request.
+    Body:
+      - device_id, session_id, platform, app_version: defaults for every event (optional)
+      - events: list (required, max ANALYTICS_BATCH_MAX_EVENTS) of
+          {"type": "screen_start", "screen": "...", "event_id": uuid (optional, client-generated)}
+          {"type": "screen_end", "event_id": uuid, "duration_seconds": int (optional)}
+          {"type": "location_ping", "latitude": n, "longitude": n, "accuracy_m": n (optional)}
+        Each event may override device_id / session_id / platform / app_version.
+    A screen_end may reference a screen_start from the same batch (send a client event_id).
+    Rows are written with bulk_create / bulk_update in one transaction (via the
+    analytics buffer when enabled).
+    Returns:
+      - results: one {"index", "success", "event_id"?, "message"?} per input event
+    """
+    from backend.analytics_buffer import parse_event, record_events
 
-    user = None
-    try:
-        if getattr(request, 'user', None) and getattr(request.user, 'is_authenticated', False):
-            user = request.user
-    except Exception:
-        user = None
-
-    CustomerLocationPing.objects.create(
-        user=user if getattr(user, 'id', None) else None,
-        device_id=device_id,
-        latitude=lat,
-        longitude=lng,
-        accuracy_m=acc,
-        platform=platform[:20],
-        app_version=app_version[:40],
-    )
+    events = request.data.get('events')
+    if not isinstance(events, list) or not events:
+        return Response({'success': False, 'message': 'events must be a non-empty list'}, status=400)
+    if len(events) > ANALYTICS_BATCH_MAX_EVENTS:
+        return Response({
+            'success': False,
+            'message': f'At most {ANALYTICS_BATCH_MAX_EVENTS} events per batch',
+        }, status=400)
 
-    return Response({'success': True})
+    defaults = _analytics_defaults(request)
+    user_id = _analytics_request_user_id(request)
+
+    results = []
+    records = []
+    for index, ev in enumerate(events):
+        record, error = parse_event(ev, defaults=defaults, user_id=user_id)
+        if error:
+            results.append({'index': index, 'success': False, 'message': error})
+            continue
+        records.append(record)
+        result = {'index': index, 'success': True}
+        if record.get('event_id'):
+            result['event_id'] = record['event_id']
+        results.append(result)
+
+    unmatched = {r['event_id'] for r in record_events(records)}
+    for result in results:
+        if result.get('event_id') in unmatched:
+            result.update(success=False, message='event not found')
+
+    return Response({
+        'success': True,
+        'accepted': sum(1 for r in results if r['success']),
+        'rejected': sum(1 for r in results if not r['success']),
+        'results': results,
+    })
 
 
 # Authentication APIs (existing code kept intact)
@@ -752,6 +787,7 @@ def home_banners(request):
                 'id': b.id,
                 'title': b.title or '',
                 'image_url': image_url,
+                **variant_urls(b.image, b.image_variants, request),
                 'redirect_type': b.redirect_type,
                 'redirect_value': b.redirect_value or '',
             })
@@ -1137,8 +1173,8 @@ def home_screen_data(request):
         products_data.append(product_data)
 
     # Get cart and wishlist counts
-    cart_count = user.cart.count() if is_authenticated else 0
-    wishlist_count = user.wishlist.count() if is_authenticated else 0
+    cart_count = user.cart_count if is_authenticated else 0
+    wishlist_count = user.wishlist_count if is_authenticated else 0
 
     print(f"\n{'=' * 60}")
     print(f"📦 FINAL RESPONSE")
@@ -1209,6 +1245,8 @@ def get_wishlist_items_enhanced(request):
         })
 
     try:
+        cart_option_ids = set(CartItem.objects.filter(user=user).values_list('product_option_id', flat=True))
+
         # ✅ Get wishlist items
         wishlist_items = user.wishlist.select_related(
             'product__category'
@@ -1235,18 +1273,9 @@ def get_wishlist_items_enhanced(request):
                     except Exception as e:
                         print(f"    ⚠️ Image URL error: {e}")
 
-                # Calculate ratings
-                total_ratings = (
-                        item.product.star_5 + item.product.star_4 +
-                        item.product.star_3 + item.product.star_2 + item.product.star_1
-                )
-                average_rating = 0
-                if total_ratings > 0:
-                    average_rating = round(
-                        ((item.product.star_5 * 5) + (item.product.star_4 * 4) +
-                         (item.product.star_3 * 3) + (item.product.star_2 * 2) +
-                         (item.product.star_1 * 1)) / total_ratings, 1
-                    )
+                # Ratings (stored by backend.ratings)
+                total_ratings = item.product.rating_count
+                average_rating = float(item.product.rating_average) if total_ratings else 0
 
                 # Calculate discount
                 discount_percentage = 0
@@ -1304,7 +1333,7 @@ def get_wishlist_items_enhanced(request):
                     'rent_for_1_day': rent_for_1_day,
                     'offer_price_per_day': offer_price_per_day,
                     'label': rental_label,
-                    'in_cart': user.cart.filter(id=item.id).exists(),
+                    'in_cart': item.id in cart_option_ids,
                 }
 
                 wishlist_data.append(item_data)
@@ -1616,9 +1645,8 @@ def search_products(request):
     elif sort_by == 'newest':
         products = products.order_by('-created_at')
     elif sort_by == 'popularity':
-        products = products.annotate(
-            total_ratings=F('star_5') + F('star_4') + F('star_3') + F('star_2') + F('star_1')
-        ).order_by('-total_ratings')
+        # Stored count kept by backend.ratings (indexed)
+        products = products.order_by('-rating_count')
     elif sort_by == 'discount':
         products = products.annotate(
             discount_percent=Case(
@@ -1708,35 +1736,6 @@ def search_products(request):
 
 
 # Cart and Wishlist APIs
-@api_view(['POST'])
-@permission_classes([IsAuthenticatedUser])
-def add_to_cart(request):
-    user = request.user
-    product_option_id = request.data.get('product_option_id')
-    quantity = request.data.get('quantity', 1)
-
-    if not product_option_id:
-        return Response({'error': 'Product option ID is required'}, status=400)
-
-    try:
-        product_option = ProductOption.objects.get(id=product_option_id)
-    except ProductOption.DoesNotExist:
-        return Response({'error': 'Product option not found'}, status=404)
-
-    if user.cart.filter(id=product_option_id).exists():
-        return Response({'message': 'Product already in cart'}, status=200)
-
-    if product_option.quantity < quantity:
-        return Response({'error': 'Insufficient stock'}, status=400)
-
-    user.cart.add(product_option)
-
-    return Response({
-        'message': 'Added to cart successfully',
-        'cart_count': user.cart.count()
-    })
-
-
 # Replace the existing remove_from_cart function with this updated version
 
 @api_view(['POST'])
@@ -1756,7 +1755,7 @@ def add_to_wishlist(request):
         return Response({
             'success': False,
             'message': 'Product option ID is required',
-            'wishlist_count': user.wishlist.count()
+            'wishlist_count': user.wishlist_count
         }, status=400)
 
     try:
@@ -1767,7 +1766,7 @@ def add_to_wishlist(request):
         return Response({
             'success': False,
             'message': 'Product option not found',
-            'wishlist_count': user.wishlist.count()
+            'wishlist_count': user.wishlist_count
         }, status=404)
 
     # Check if already in wishlist
@@ -1776,7 +1775,7 @@ def add_to_wishlist(request):
         return Response({
             'success': True,
             'message': 'Product already in wishlist',
-            'wishlist_count': user.wishlist.count()
+            'wishlist_count': user.wishlist_count
         }, status=200)
 
     # Add to wishlist
@@ -1784,7 +1783,7 @@ def add_to_wishlist(request):
     print(f"   ✅ Added to wishlist")
 
     # Verify it was added
-    new_count = user.wishlist.count()
+    new_count = user.wishlist_count
     print(f"   📊 New wishlist count: {new_count}")
 
     return Response({
@@ -1807,14 +1806,14 @@ def remove_from_wishlist(request, product_option_id):
         return Response({
             'success': False,
             'message': 'Product option not found',
-            'wishlist_count': user.wishlist.count()  # ✅ ADD: Always return count
+            'wishlist_count': user.wishlist_count  # ✅ ADD: Always return count
         }, status=404)
 
     if not user.wishlist.filter(id=product_option_id).exists():
         return Response({
             'success': False,
             'message': 'Product not in wishlist',
-            'wishlist_count': user.wishlist.count()  # ✅ ADD: Always return count
+            'wishlist_count': user.wishlist_count  # ✅ ADD: Always return count
         }, status=400)
 
     user.wishlist.remove(product_option)
@@ -1822,51 +1821,7 @@ def remove_from_wishlist(request, product_option_id):
     return Response({
         'success': True,
         'message': 'Removed from wishlist successfully',
-        'wishlist_count': user.wishlist.count()
-    })
-
-
-@api_view(['GET'])
-@permission_classes([IsAuthenticatedUser])
-def get_cart_items(request):
-    user = request.user
-    cart_items = user.cart.select_related('product').prefetch_related('images_set').all()
-
-    cart_data = []
-    for item in cart_items:
-        first_image = item.images_set.first()
-        image_url = None
-        if first_image and request:
-            image_url = request.build_absolute_uri(first_image.image.url)
-        elif first_image:
-            image_url = first_image.image.url
-
-        item_data = {
-            'id': str(item.id),
-            'title': f"({item.option}) {item.product.title}" if item.option else item.product.title,
-            'image': image_url,
-            'price': item.product.price,
-            'offer_price': item.product.offer_price,
-            'quantity': item.quantity,
-            'cod': item.product.cod,
-            'delivery_charge': item.product.delivery_charge,
-        }
-        cart_data.append(item_data)
-
-    total_amount = sum(item['price'] for item in cart_data)
-    offer_amount = sum(item['offer_price'] for item in cart_data if item['offer_price'] > 0)
-    delivery_charges = sum(item['delivery_charge'] for item in cart_data)
-
-    final_amount = offer_amount if offer_amount > 0 else total_amount
-    final_amount += delivery_charges
-
-    return Response({
-        'cart_items': cart_data,
-        'total_amount': total_amount,
-        'offer_amount': offer_amount,
-        'delivery_charges': delivery_charges,
-        'final_amount': final_amount,
-        'total_items': len(cart_data)
+        'wishlist_count': user.wishlist_count
     })
 
 
@@ -1993,9 +1948,8 @@ def search_products(request):
     elif sort_by == 'newest':
         products = products.order_by('-created_at')
     elif sort_by == 'popularity':
-        products = products.annotate(
-            total_ratings=F('star_5') + F('star_4') + F('star_3') + F('star_2') + F('star_1')
-        ).order_by('-total_ratings')
+        # Stored count kept by backend.ratings (indexed)
+        products = products.order_by('-rating_count')
     elif sort_by == 'discount':
         products = products.annotate(
             discount_percent=Case(
@@ -2168,9 +2122,8 @@ def category_products(request, category_id):
     elif sort_by == 'newest':
         products = products.order_by('-created_at')
     elif sort_by == 'popularity':
-        products = products.annotate(
-            total_ratings=F('star_5') + F('star_4') + F('star_3') + F('star_2') + F('star_1')
-        ).order_by('-total_ratings')
+        # Stored count kept by backend.ratings (indexed)
+        products = products.order_by('-rating_count')
     elif sort_by == 'discount':
         products = products.annotate(
             discount_percent=Case(
@@ -2183,17 +2136,8 @@ def category_products(request, category_id):
             )
         ).order_by('-discount_percent')
     elif sort_by == 'rating':
-        products = products.annotate(
-            total_ratings=F('star_5') + F('star_4') + F('star_3') + F('star_2') + F('star_1'),
-            avg_rating=Case(
-                When(
-                    total_ratings__gt=0,
-                    then=(F('star_5') * 5 + F('star_4') * 4 + F('star_3') * 3 + F('star_2') * 2 + F('star_1') * 1) / F(
-                        'total_ratings')
-                ),
-                default=0
-            )
-        ).order_by('-avg_rating')
+        # Stored average kept by backend.ratings (indexed)
+        products = products.order_by('-rating_average', '-rating_count')
     else:
         products = products.order_by('position', '-created_at')
 
@@ -2451,17 +2395,8 @@ def page_item_products(request):
                 )
             ).order_by('-discount_percent')
         elif sort_by == 'rating':
-            products = products.annotate(
-                total_ratings=F('star_5') + F('star_4') + F('star_3') + F('star_2') + F('star_1'),
-                avg_rating=Case(
-                    When(
-                        total_ratings__gt=0,
-                        then=(F('star_5') * 5 + F('star_4') * 4 + F('star_3') * 3 + F('star_2') * 2 + F(
-                            'star_1') * 1) / F('total_ratings')
-                    ),
-                    default=0
-                )
-            ).order_by('-avg_rating')
+            # Stored average kept by backend.ratings (indexed)
+            products = products.order_by('-rating_average', '-rating_count')
         else:
             products = products.order_by('position', '-created_at')
 
@@ -2644,17 +2579,8 @@ def page_item_products(request):
                 )
             ).order_by('-discount_percent')
         elif sort_by == 'rating':
-            products = products.annotate(
-                total_ratings=F('star_5') + F('star_4') + F('star_3') + F('star_2') + F('star_1'),
-                avg_rating=Case(
-                    When(
-                        total_ratings__gt=0,
-                        then=(F('star_5') * 5 + F('star_4') * 4 + F('star_3') * 3 + F('star_2') * 2 + F(
-                            'star_1') * 1) / F('total_ratings')
-                    ),
-                    default=0
-                )
-            ).order_by('-avg_rating')
+            # Stored average kept by backend.ratings (indexed)
+            products = products.order_by('-rating_average', '-rating_count')
         else:
             products = products.order_by('position', '-created_at')
 
@@ -2759,19 +2685,26 @@ def add_to_cart(request):
         return Response({'error': 'Product option not found'}, status=404)
 
     # Check if product is already in cart
-    if user.cart.filter(id=product_option_id).exists():
+    if CartItem.objects.filter(user=user, product_option=product_option).exists():
         return Response({'message': 'Product already in cart'}, status=200)
 
     # Check stock availability
     if product_option.quantity < quantity:
         return Response({'error': 'Insufficient stock'}, status=400)
 
-    # Add to cart
-    user.cart.add(product_option)
+    # Add to cart (a one-day rental, as add_to_cart_with_date defaults to)
+    CartItem.objects.create(
+        user=user,
+        product_option=product_option,
+        quantity=quantity,
+        rental_type='rent',
+        rental_duration='1_day',
+        rental_price=product_option.get_rental_price('1_day'),
+    )
 
     return Response({
         'message': 'Added to cart successfully',
-        'cart_count': user.cart.count()
+        'cart_count': user.cart_count
     })
 
 
@@ -2793,13 +2726,8 @@ def remove_from_cart(request, item_id):  # Ã¢Å“â€¦ Changed parameter na
         if cart_item:
             print(f"Ã¢Å“â€¦ Found as CartItem: {cart_item}")
             # Delete the CartItem
-            product_option = cart_item.product_option
             cart_item.delete()
 
-            # Also remove from the old ManyToMany cart if it exists
-            if user.cart.filter(id=product_option.id).exists():
-                user.cart.remove(product_option)
-
             return Response({
                 'success': True,
                 'message': 'Removed from cart successfully',
@@ -2819,11 +2747,7 @@ def remove_from_cart(request, item_id):  # Ã¢Å“â€¦ Changed parameter na
 
             print(f"Ã°Å¸â€”â€˜Ã¯Â¸Â Deleted {deleted_count} CartItems")
 
-            # Also remove from old ManyToMany cart
-            if user.cart.filter(id=item_id).exists():
-                user.cart.remove(product_option)
-
-            if deleted_count > 0 or user.cart.filter(id=item_id).exists():
+            if deleted_count > 0:
                 return Response({
                     'success': True,
                     'message': 'Removed from cart successfully',
@@ -2878,7 +2802,7 @@ def add_to_wishlist(request):
 
     return Response({
         'message': 'Added to wishlist successfully',
-        'wishlist_count': user.wishlist.count()
+        'wishlist_count': user.wishlist_count
     })
 
 
@@ -2902,7 +2826,7 @@ def remove_from_wishlist(request, product_option_id):
 
     return Response({
         'message': 'Removed from wishlist successfully',
-        'wishlist_count': user.wishlist.count()
+        'wishlist_count': user.wishlist_count
     })
 
 
@@ -2912,46 +2836,18 @@ def get_cart_items(request):
     """
     Get user's cart items with enhanced product data
     """
-    user = request.user
-    cart_items = user.cart.select_related('product').prefetch_related('images_set').all()
+    from backend.cart import cart_payload, get_cart
 
-    cart_data = []
-    for item in cart_items:
-        # Get first image
-        first_image = item.images_set.first()
-        image_url = None
-        if first_image and request:
-            image_url = request.build_absolute_uri(first_image.image.url)
-        elif first_image:
-            image_url = first_image.image.url
-
-        item_data = {
-            'id': str(item.id),
-            'title': f"({item.option}) {item.product.title}" if item.option else item.product.title,
-            'image': image_url,
-            'price': item.product.price,
-            'offer_price': item.product.offer_price,
-            'quantity': item.quantity,
-            'cod': item.product.cod,
-            'delivery_charge': item.product.delivery_charge,
-        }
-        cart_data.append(item_data)
-
-    # Calculate totals
-    total_amount = sum(item['price'] for item in cart_data)
-    offer_amount = sum(item['offer_price'] for item in cart_data if item['offer_price'] > 0)
-    delivery_charges = sum(item['delivery_charge'] for item in cart_data)
-
-    final_amount = offer_amount if offer_amount > 0 else total_amount
-    final_amount += delivery_charges
+    cart_data, summary = cart_payload(get_cart(request.user), request)
 
     return Response({
         'cart_items': cart_data,
-        'total_amount': total_amount,
-        'offer_amount': offer_amount,
-        'delivery_charges': delivery_charges,
-        'final_amount': final_amount,
-        'total_items': len(cart_data)
+        'total_amount': summary['total_amount'],
+        'offer_amount': summary['offer_amount'],
+        'delivery_charges': summary['delivery_charges'],
+        'final_amount': summary['final_amount'],
+        'total_items': summary['total_items'],
+        'summary': summary,
     })
 
 
@@ -3152,6 +3048,7 @@ def product_details(request, product_id):
         return Response({'error': 'Product not found'}, status=404)
 
     user = request.user
+    cart_option_ids = set(CartItem.objects.filter(user=user).values_list('product_option_id', flat=True))
 
     # Get all product options with their images
     options_data = []
@@ -3173,25 +3070,14 @@ def product_details(request, product_id):
             'in_stock': option.quantity > 0,
             'images': option_images,
             # Check if this option is in user's cart or wishlist
-            'in_cart': user.cart.filter(id=option.id).exists(),
+            'in_cart': option.id in cart_option_ids,
             'in_wishlist': user.wishlist.filter(id=option.id).exists(),
         }
         options_data.append(option_data)
 
-    # Calculate ratings and reviews summary
-    total_ratings = product.star_5 + product.star_4 + product.star_3 + product.star_2 + product.star_1
-
-    if total_ratings > 0:
-        average_rating = (
-                                 (product.star_5 * 5) +
-                                 (product.star_4 * 4) +
-                                 (product.star_3 * 3) +
-                                 (product.star_2 * 2) +
-                                 (product.star_1 * 1)
-                         ) / total_ratings
-        average_rating = round(average_rating, 1)
-    else:
-        average_rating = 0
+    # Ratings summary (stored by backend.ratings)
+    total_ratings = product.rating_count
+    average_rating = float(product.rating_average) if total_ratings else 0
 
     # Calculate discount percentage
     discount_percentage = 0
@@ -3291,6 +3177,36 @@ def product_details(request, product_id):
     })
 
 
+def _coupon_cart_args(request):
+    """
+    (cart_total, product_option_ids, product_ids, service_ids) from a coupon
+    request body; without cart_total, the user's priced cart is used.
+    """
+    data = request.data
+    cart_total = data.get('cart_total')
+
+    if cart_total is None:
+        # Fallback: the priced cart's item total
+        from backend.cart import get_cart, option_ids
+
+        cart = get_cart(request.user)
+        cart_total = cart['summary']['offer_amount']
+        product_option_ids = sorted(option_ids(cart))
+    else:
+        cart_total = int(cart_total)
+        product_option_ids = data.get('products') or []
+        if product_option_ids and isinstance(product_option_ids[0], str):
+            product_option_ids = [pid.strip() for pid in product_option_ids if pid]
+
+    product_ids = data.get('product_ids') or []
+    if product_ids and isinstance(product_ids[0], str):
+        product_ids = [pid.strip() for pid in product_ids if pid]
+    service_ids = data.get('services') or []
+    if service_ids and isinstance(service_ids[0], str):
+        service_ids = [sid.strip() for sid in service_ids if sid]
+    return cart_total, product_option_ids, product_ids, service_ids
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticatedUser])
 def apply_coupon(request):
@@ -3311,32 +3227,8 @@ def apply_coupon(request):
     from backend.utils import validate_coupon_and_calculate_discount
 
     user = request.user
-    data = request.data
-    coupon_code = data.get('coupon_code', '').strip()
-    cart_total = data.get('cart_total')
-
-    if cart_total is None:
-        # Fallback: compute cart total from user's CartItem
-        cart_items = CartItem.objects.filter(user=user).select_related(
-            'product_option', 'product_option__product'
-        )
-        cart_total = 0
-        product_option_ids = []
-        for item in cart_items:
-            cart_total += (item.rental_price or 0) * item.quantity
-            product_option_ids.append(str(item.product_option_id))
-    else:
-        cart_total = int(cart_total)
-        product_option_ids = data.get('products') or []
-        if product_option_ids and isinstance(product_option_ids[0], str):
-            product_option_ids = [pid.strip() for pid in product_option_ids if pid]
-
-    product_ids = data.get('product_ids') or []
-    if product_ids and isinstance(product_ids[0], str):
-        product_ids = [pid.strip() for pid in product_ids if pid]
-    service_ids = data.get('services') or []
-    if service_ids and isinstance(service_ids[0], str):
-        service_ids = [sid.strip() for sid in service_ids if sid]
+    coupon_code = request.data.get('coupon_code', '').strip()
+    cart_total, product_option_ids, product_ids, service_ids = _coupon_cart_args(request)
 
     success, message, discount_amount, final_total, coupon_obj = validate_coupon_and_calculate_discount(
         coupon_code=coupon_code,
@@ -3361,12 +3253,56 @@ def apply_coupon(request):
     }, status=400)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticatedUser])
+def best_coupon(request):
+    """
+    Best coupon for a cart: every active coupon is checked in one pass.
+
+    POST /api/cart/best-coupon/
+    Request: same body as apply-coupon, without coupon_code (empty body = the user's cart)
+    Success: { "success": true, "coupon_code": "FIRST50", "discount": 200, "final_total": 1300,
+               "coupons": [{"code", "description", "discount", "final_total"}, ...] }  # best first
+    None:    { "success": false, "message": "No coupon applies to this cart", "coupons": [] }
+    """
+    from backend.coupon_index import CartContext, applicable_coupons
+
+    cart_total, product_option_ids, product_ids, service_ids = _coupon_cart_args(request)
+    context = CartContext(request.user, cart_total, product_option_ids, product_ids, service_ids)
+    coupons = [
+        {
+            'code': coupon.code,
+            'description': coupon.description,
+            'discount': discount,
+            'final_total': max(0, int(cart_total) - discount),
+        }
+        for discount, coupon in applicable_coupons(context)
+    ]
+    if not coupons:
+        return Response({
+            'success': False,
+            'message': 'No coupon applies to this cart',
+            'coupons': [],
+        })
+    best = coupons[0]
+    return Response({
+        'success': True,
+        'message': f"{best['code']} saves ₹{best['discount']}",
+        'coupon_code': best['code'],
+        'discount': best['discount'],
+        'final_total': best['final_total'],
+        'coupons': coupons,
+    })
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticatedUser])
 def bulk_update_cart(request):
     """
     Update multiple cart items at once
     """
+    from backend.cart import cart_payload, get_cart, invalidate
+
     user = request.user
     updates = request.data.get('updates', [])
 
@@ -3383,13 +3319,14 @@ def bulk_update_cart(request):
                     continue
 
                 try:
-                    product_option = ProductOption.objects.get(id=product_option_id)
+                    product_option = ProductOption.objects.select_related('product').get(id=product_option_id)
                 except ProductOption.DoesNotExist:
                     continue
 
+                cart_items = CartItem.objects.filter(user=user, product_option=product_option)
                 if quantity <= 0:
                     # Remove item from cart
-                    user.cart.remove(product_option)
+                    cart_items.delete()
                 else:
                     # Check stock availability
                     if product_option.quantity < quantity:
@@ -3397,13 +3334,30 @@ def bulk_update_cart(request):
                             'error': f'Insufficient stock for {product_option.product.title}. Only {product_option.quantity} available.'
                         }, status=400)
 
-                    # Add/update item in cart (since Django ManyToMany doesn't support quantity directly,
-                    # you might need to create a separate CartItem model for quantities)
-                    if not user.cart.filter(id=product_option_id).exists():
-                        user.cart.add(product_option)
+                    # Set the quantity on the option's cart lines, or add it as a one-day rental
+                    if not cart_items.update(quantity=quantity):
+                        CartItem.objects.create(
+                            user=user,
+                            product_option=product_option,
+                            quantity=quantity,
+                            rental_type='rent',
+                            rental_duration='1_day',
+                            rental_price=product_option.get_rental_price('1_day'),
+                        )
+            # Quantity changes above are queryset updates, which send no signals
+            invalidate([user.pk])
 
         # Return updated cart data
-        return get_cart_items(request)
+        cart_data, summary = cart_payload(get_cart(user), request)
+        return Response({
+            'cart_items': cart_data,
+            'total_amount': summary['total_amount'],
+            'offer_amount': summary['offer_amount'],
+            'delivery_charges': summary['delivery_charges'],
+            'final_amount': summary['final_amount'],
+            'total_items': summary['total_items'],
+            'summary': summary,
+        })
 
     except Exception as e:
         return Response({'error': str(e)}, status=500)
@@ -3415,41 +3369,18 @@ def cart_summary(request):
     """
     Get cart summary with item count and total value
     """
-    user = request.user
-    cart_items = user.cart.select_related('product').all()
-
-    if not cart_items:
-        return Response({
-            'total_items': 0,
-            'total_amount': 0,
-            'cart_count': 0
-        })
-
-    total_amount = 0
-    offer_amount = 0
+    from backend.cart import get_cart
 
-    for item in cart_items:
-        if item.product.offer_price > 0:
-            offer_amount += item.product.offer_price
-        else:
-            total_amount += item.product.price
-
-    final_amount = offer_amount if offer_amount > 0 else total_amount
-
-    return Response({
-        'total_items': len(cart_items),
-        'total_amount': total_amount,
-        'offer_amount': offer_amount,
-        'final_amount': final_amount,
-        'cart_count': len(cart_items)
-    })
+    summary = dict(get_cart(request.user)['summary'])
+    summary['cart_count'] = summary['total_items']
+    return Response(summary)
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticatedUser])
 def clear_cart(request):
     """
-    âœ… FIXED: Clear all items from user's cart (both CartItem and ManyToMany)
+    âœ… FIXED: Clear all items from user's cart
     """
     user = request.user
 
@@ -3458,9 +3389,6 @@ def clear_cart(request):
         cart_items_count = CartItem.objects.filter(user=user).count()
         CartItem.objects.filter(user=user).delete()
 
-        # Also clear the old ManyToMany cart (for backward compatibility)
-        user.cart.clear()
-
         print(f"âœ… Cleared {cart_items_count} items from cart for user {user.email}")
 
         return Response({
@@ -3478,7 +3406,7 @@ def clear_cart(request):
         return Response({
             'success': False,
             'message': f'Failed to clear cart: {str(e)}',
-            'cart_count': user.cart.count()
+            'cart_count': user.cart_count
         }, status=500)
 
 @api_view(['POST'])
@@ -3537,7 +3465,7 @@ def move_to_wishlist(request):
                 'success': True,
                 'message': 'Item already in wishlist',
                 'cart_count': CartItem.objects.filter(user=user).count(),
-                'wishlist_count': user.wishlist.count(),
+                'wishlist_count': user.wishlist_count,
                 'already_in_wishlist': True
             })
 
@@ -3548,7 +3476,7 @@ def move_to_wishlist(request):
 
         # Get updated counts
         cart_count = CartItem.objects.filter(user=user).count()
-        wishlist_count = user.wishlist.count()
+        wishlist_count = user.wishlist_count
 
         print(f"ðŸ“Š Updated counts - Cart: {cart_count}, Wishlist: {wishlist_count}")
 
@@ -3576,8 +3504,9 @@ def validate_cart(request):
     """
     Validate cart items for stock availability and price changes
     """
-    user = request.user
-    cart_items = user.cart.select_related('product').all()
+    from backend.cart import get_cart
+
+    cart_items = get_cart(request.user)['items']
 
     if not cart_items:
         return Response({
@@ -3590,13 +3519,20 @@ def validate_cart(request):
 
     for item in cart_items:
         # Check if product is still available
-        if item.quantity <= 0:
+        if not item['in_stock']:
             issues.append({
-                'product_option_id': str(item.id),
-                'product_title': item.product.title,
+                'product_option_id': item['product_option_id'],
+                'product_title': item['title'],
                 'issue': 'out_of_stock',
                 'message': 'This item is now out of stock'
             })
+        elif item['quantity'] > item['stock_quantity']:
+            issues.append({
+                'product_option_id': item['product_option_id'],
+                'product_title': item['title'],
+                'issue': 'insufficient_stock',
+                'message': f"Only {item['stock_quantity']} available"
+            })
 
         # Check if price has changed (you can implement price tracking if needed)
         # This would require storing original price when added to cart
@@ -3615,6 +3551,8 @@ def get_cart_items_enhanced(request):
     """
     ✅ FIXED: Get enhanced cart items with complete null safety for rental pricing
     """
+    from backend.cart import cart_payload, get_cart
+
     user = request.user
 
     print(f"\n{'=' * 60}")
@@ -3622,207 +3560,15 @@ def get_cart_items_enhanced(request):
     print(f"{'=' * 60}")
 
     try:
-        # Get CartItem entries with related data
-        cart_items_db = CartItem.objects.select_related(
-            'product_option__product__category'
-        ).prefetch_related(
-            'product_option__images_set'
-        ).filter(user=user).order_by('-created_at')
-
-        print(f"📦 Found {cart_items_db.count()} cart items")
-
-        cart_data = []
-        total_amount = 0
-        offer_amount = 0
-        total_savings = 0
-        delivery_charges = 0
-        total_security_amount = 0
-
-        for idx, cart_item in enumerate(cart_items_db, 1):
-            print(f"\n  Processing item {idx}/{cart_items_db.count()}:")
-
-            product_option = cart_item.product_option
-            product = product_option.product
-
-            print(f"    Product: {product.title}")
-            print(f"    Option: {product_option.option}")
-            print(f"    Rental Type: {cart_item.rental_type}")
-            print(f"    Duration: {cart_item.rental_duration}")
-
-            # Get first image with null safety
-            first_image = product_option.images_set.first()
-            image_url = None
-            if first_image and first_image.image:
-                try:
-                    image_url = request.build_absolute_uri(first_image.image.url)
-                    print(f"    ✅ Image URL: {image_url[:50]}...")
-                except Exception as e:
-                    print(f"    ⚠️ Image URL error: {e}")
-
-            # ✅ Calculate prices with complete null safety
-            original_price = int(product.price) if product.price else 0
-
-            # ✅ CRITICAL: Calculate rental_price with multiple fallbacks
-            rental_price = 0
-
-            try:
-                # Priority 1: Use stored cart_item rental_price
-                if cart_item.rental_price and cart_item.rental_price > 0:
-                    rental_price = int(cart_item.rental_price)
-                    print(f"    ✅ Using stored rental price: ₹{rental_price}")
-
-                # Priority 2: Calculate from product option
-                elif cart_item.rental_type == 'rent' and cart_item.rental_duration:
-                    calculated_price = product_option.get_rental_price(cart_item.rental_duration)
-                    if calculated_price and calculated_price > 0:
-                        rental_price = int(calculated_price)
-                        print(f"    💡 Calculated rental price: ₹{rental_price}")
-
-                # Priority 3: Use buy pricing
-                elif cart_item.rental_type == 'buy':
-                    buy_offer = product_option.get_buy_offer_price()
-                    buy_price = product_option.get_buy_price()
-
-                    if buy_offer and buy_offer > 0:
-                        rental_price = int(buy_offer)
-                        print(f"    💰 Using buy offer price: ₹{rental_price}")
-                    elif buy_price and buy_price > 0:
-                        rental_price = int(buy_price)
-                        print(f"    💰 Using buy price: ₹{rental_price}")
-
-                # Priority 4: Use product offer_price
-                if rental_price == 0 and product.offer_price and product.offer_price > 0:
-                    rental_price = int(product.offer_price)
-                    print(f"    💡 Using product offer price: ₹{rental_price}")
-
-                # Priority 5: Final fallback to original price
-                if rental_price == 0:
-                    rental_price = original_price
-                    print(f"    ⚠️ Using original price as fallback: ₹{rental_price}")
-
-            except Exception as e:
-                print(f"    ❌ Rental price calculation error: {e}")
-                # ✅ Ultimate fallback
-                rental_price = original_price
-                print(f"    🔄 Fallback to original price: ₹{rental_price}")
-
-            # ✅ Ensure rental_price is never zero or null
-            if not rental_price or rental_price <= 0:
-                rental_price = original_price
-                print(f"    ⚠️ Rental price was invalid, using: ₹{rental_price}")
-
-            # Calculate savings
-            savings_per_item = original_price - rental_price if rental_price < original_price else 0
-            print(f"    💵 Savings per item: ₹{savings_per_item}")
-
-            # Calculate rental end date with null safety
-            rental_end_date = None
-            if cart_item.rental_type == 'rent' and cart_item.selected_date:
-                try:
-                    from datetime import datetime, timedelta
-                    start_date = datetime.strptime(str(cart_item.selected_date), '%Y-%m-%d')
-                    duration_days = {
-                        '1_day': 1, '2_days': 2, '3_days': 3,
-                        '7_days': 7, '14_days': 14, '30_days': 30
-                    }
-                    days = duration_days.get(cart_item.rental_duration, 1)
-                    end_date = start_date + timedelta(days=days - 1)
-                    rental_end_date = end_date.strftime('%Y-%m-%d')
-                    print(f"    📅 Rental period: {cart_item.selected_date} to {rental_end_date}")
-                except Exception as e:
-                    print(f"    ⚠️ Date calculation error: {e}")
-
-            # Add to totals
-            item_quantity = int(cart_item.quantity) if cart_item.quantity else 1
-            total_amount += original_price * item_quantity
-            offer_amount += rental_price * item_quantity
-            total_savings += savings_per_item * item_quantity
-
-            # Delivery charges
-            item_delivery = int(product.delivery_charge) if product.delivery_charge else 0
-            delivery_charges += item_delivery
-
-            # Security amount (per product, × quantity)
-            item_security = int(getattr(product, 'security_amount', 0) or 0)
-            total_security_amount += item_security * item_quantity
-
-            print(f"    🔢 Quantity: {item_quantity}")
-            print(f"    💰 Item total: ₹{rental_price * item_quantity}")
-
-            # ✅ Build item data with guaranteed non-null values
-            item_data = {
-                'id': str(cart_item.id),
-                'product_option_id': str(product_option.id),
-                'title': f"({product_option.option}) {product.title}" if product_option.option else product.title,
-                'image': image_url,
-                'price': original_price,
-                'offer_price': int(
-                    product.offer_price) if product.offer_price and product.offer_price > 0 else original_price,
-                'quantity': item_quantity,
-                'cod': bool(product.cod),
-                'delivery_charge': item_delivery,
-                'savings': savings_per_item,
-                'product_id': str(product.id),
-                'in_stock': product_option.quantity > 0,
-                'stock_quantity': int(product_option.quantity) if product_option.quantity else 0,
-
-                # ✅ Check wishlist status
-                'in_wishlist': user.wishlist.filter(id=product_option.id).exists(),
-
-                # ✅ Rental information with complete null safety
-                'selected_date': cart_item.selected_date.strftime('%Y-%m-%d') if cart_item.selected_date else None,
-                'rental_type': str(cart_item.rental_type) if cart_item.rental_type else 'buy',
-                'rental_duration': str(cart_item.rental_duration) if cart_item.rental_duration else '',
-                'rental_price': rental_price,  # ✅ Guaranteed to be valid int
-                'rental_end_date': rental_end_date,
-                'security_amount': item_security,
-                'security_total': item_security * item_quantity,
-            }
+        cart_data, summary = cart_payload(get_cart(user), request)
 
-            cart_data.append(item_data)
-            print(f"    ✅ Item added to cart response")
-
-        # Calculate final amounts (include security deposit in total payable)
-        final_amount = offer_amount + delivery_charges + total_security_amount
-
-        # ✅ Free delivery logic
-        free_delivery_threshold = 500
-        free_delivery_eligible = offer_amount >= free_delivery_threshold
-        amount_for_free_delivery = max(0, free_delivery_threshold - offer_amount)
-
-        if free_delivery_eligible:
-            delivery_charges = 0
-            final_amount = offer_amount + total_security_amount
-            print(f"\n🎉 FREE DELIVERY UNLOCKED!")
-        else:
-            print(f"\n💰 Add ₹{amount_for_free_delivery} more for free delivery")
-
-        print(f"\n{'=' * 60}")
-        print(f"📊 CART SUMMARY")
-        print(f"{'=' * 60}")
-        print(f"Items: {len(cart_data)}")
-        print(f"Total Amount: ₹{total_amount}")
-        print(f"Offer Amount: ₹{offer_amount}")
-        print(f"Savings: ₹{total_savings}")
-        print(f"Delivery: ₹{delivery_charges}")
-        print(f"Final: ₹{final_amount}")
-        print(f"{'=' * 60}\n")
+        print(f"📦 Found {len(cart_data)} cart items")
+        print(f"Final: ₹{summary['final_amount']}")
 
         return Response({
             'success': True,
             'cart_items': cart_data,
-            'summary': {
-                'total_amount': int(total_amount),
-                'offer_amount': int(offer_amount),
-                'total_savings': int(total_savings),
-                'delivery_charges': int(delivery_charges),
-                'security_amount': int(total_security_amount),
-                'final_amount': int(final_amount),
-                'total_items': len(cart_data),
-                'free_delivery_threshold': free_delivery_threshold,
-                'free_delivery_eligible': free_delivery_eligible,
-                'amount_for_free_delivery': int(amount_for_free_delivery)
-            },
+            'summary': summary,
             'recommendations': {
                 'similar_products': [],
                 'frequently_bought_together': []
@@ -4159,42 +3905,14 @@ def update_order_rating(request, ordered_product_id):
     # Update rating and review
     from django.utils import timezone
 
-    old_rating = ordered_product.rating
     ordered_product.rating = rating
     ordered_product.review_text = review  # ✅ Save review text
     ordered_product.rated_at = timezone.now()  # ✅ Save timestamp
     ordered_product.save()
 
-    # Update product ratings
+    # The product's rating histogram is updated by a signal (backend/ratings.py)
     product = ordered_product.product_option.product
 
-    # Remove old rating if exists
-    if old_rating > 0:
-        if old_rating == 5:
-            product.star_5 = max(0, product.star_5 - 1)
-        elif old_rating == 4:
-            product.star_4 = max(0, product.star_4 - 1)
-        elif old_rating == 3:
-            product.star_3 = max(0, product.star_3 - 1)
-        elif old_rating == 2:
-            product.star_2 = max(0, product.star_2 - 1)
-        elif old_rating == 1:
-            product.star_1 = max(0, product.star_1 - 1)
-
-    # Add new rating
-    if rating == 5:
-        product.star_5 += 1
-    elif rating == 4:
-        product.star_4 += 1
-    elif rating == 3:
-        product.star_3 += 1
-    elif rating == 2:
-        product.star_2 += 1
-    elif rating == 1:
-        product.star_1 += 1
-
-    product.save()
-
     return Response({
         'message': 'Rating updated successfully',
         'rating': rating,
@@ -4652,8 +4370,8 @@ def home_screen_data(request):
         products_data.append(product_data)
 
     # Get counts
-    cart_count = user.cart.count() if is_authenticated else 0
-    wishlist_count = user.wishlist.count() if is_authenticated else 0
+    cart_count = user.cart_count if is_authenticated else 0
+    wishlist_count = user.wishlist_count if is_authenticated else 0
 
     # Male/Female home tile images (from admin: Home Male/Female tile images)
     from backend.models import HomeGenderTileImage
@@ -4850,9 +4568,9 @@ def get_profile(request):
             'district': user.district or '',
             'state': user.state or '',
             'created_at': user.created_at.isoformat() if user.created_at else None,
-            'wishlist_count': user.wishlist.count(),
-            'cart_count': user.cart.count(),
-            'notifications': user.notifications_set.filter(seen=False).count(),
+            'wishlist_count': user.wishlist_count,
+            'cart_count': user.cart_count,
+            'notifications': user.unread_notifications,
         }
 
         return Response({
@@ -5241,9 +4959,10 @@ def _get_product_reviews(product, page=1, page_size=5):
         product_option__product=product,
         rating__isnull=False,
         rating__gt=0
-    ).select_related('order__user').order_by('-created_at')
+    ).select_related('order__user', 'product_option').order_by('-created_at')
 
-    # Pagination
+    # Pagination; pages come from the queryset's own COUNT, the displayed total
+    # from the product's stored rating_count (backend/ratings.py)
     paginator = Paginator(reviews_queryset, page_size)
 
     try:
@@ -5284,7 +5003,7 @@ def _get_product_reviews(product, page=1, page_size=5):
 
     return {
         'reviews': reviews,
-        'total_reviews': paginator.count,
+        'total_reviews': product.rating_count,
         'current_page': page_obj.number,
         'total_pages': paginator.num_pages,
         'has_next': page_obj.has_next(),
@@ -5567,7 +5286,7 @@ def create_order(request):
 
             # Clear cart if from_cart is True
             if data.get('from_cart', True):
-                user.cart.clear()
+                CartItem.objects.filter(user=user).delete()
 
             # Prepare response
             order_data = {
@@ -5663,9 +5382,9 @@ def edit_profile(request):
             'district': user.district or '',
             'state': user.state or '',
             'created_at': user.created_at.isoformat() if user.created_at else None,
-            'wishlist_count': user.wishlist.count(),
-            'cart_count': user.cart.count(),
-            'notifications': user.notifications_set.filter(seen=False).count(),
+            'wishlist_count': user.wishlist_count,
+            'cart_count': user.cart_count,
+            'notifications': user.unread_notifications,
         }
 
         return Response({
@@ -5720,7 +5439,7 @@ def add_to_wishlist_enhanced(request):
     return Response({
         'success': True,
         'message': 'Item added to wishlist successfully',
-        'wishlist_count': user.wishlist.count()
+        'wishlist_count': user.wishlist_count
     })
 
 
@@ -5757,7 +5476,7 @@ def remove_from_wishlist_enhanced(request, product_option_id):
     return Response({
         'success': True,
         'message': 'Item removed from wishlist',
-        'wishlist_count': user.wishlist.count(),
+        'wishlist_count': user.wishlist_count,
         'removed_item': removed_item
     })
 
@@ -5779,11 +5498,20 @@ def move_wishlist_to_cart(request):
 
     moved_items = []
     already_in_cart = []
+    in_cart = set(CartItem.objects.filter(user=user).values_list('product_option_id', flat=True))
 
     with transaction.atomic():
         for item in wishlist_items:
-            if not user.cart.filter(id=item.id).exists():
-                user.cart.add(item)
+            if item.id not in in_cart:
+                # Moved as a one-day rental, as add_to_cart_with_date defaults to
+                CartItem.objects.create(
+                    user=user,
+                    product_option=item,
+                    quantity=1,
+                    rental_type='rent',
+                    rental_duration='1_day',
+                    rental_price=item.get_rental_price('1_day'),
+                )
                 user.wishlist.remove(item)
                 moved_items.append(str(item))
             else:
@@ -5795,8 +5523,8 @@ def move_wishlist_to_cart(request):
         'message': f'{len(moved_items)} items moved to cart successfully',
         'moved_items_count': len(moved_items),
         'already_in_cart_count': len(already_in_cart),
-        'cart_count': user.cart.count(),
-        'wishlist_count': user.wishlist.count()
+        'cart_count': user.cart_count,
+        'wishlist_count': user.wishlist_count
     })
 
 
@@ -5873,7 +5601,7 @@ def undo_wishlist_removal(request):
     return Response({
         'success': True,
         'message': 'Item restored to wishlist',
-        'wishlist_count': user.wishlist.count()
+        'wishlist_count': user.wishlist_count
     })
 
 
@@ -5884,7 +5612,7 @@ def clear_wishlist(request):
     Clear all items from wishlist
     """
     user = request.user
-    items_count = user.wishlist.count()
+    items_count = user.wishlist_count
 
     if items_count == 0:
         return Response({
@@ -5972,13 +5700,9 @@ def create_service_booking(request):
         }, status=400)
 
     # Artist-specific: block booking if date is blocked or admin-booked
+    from backend import artist_calendar
     service = service_option.service
-    artist_date = ArtistAvailability.objects.filter(
-        artist=service,
-        date=booking_date,
-        status__in=[ArtistAvailability.STATUS_BLOCKED, ArtistAvailability.STATUS_BOOKED],
-    ).first()
-    if artist_date:
+    if artist_calendar.day_unavailable(service.id, booking_date):
         return Response({
             'success': False,
             'message': 'Date already unavailable'
@@ -5993,15 +5717,9 @@ def create_service_booking(request):
             'message': 'Invalid time format. Use HH:MM:SS'
         }, status=400)
 
-    # Check if the slot is already booked
-    existing_booking = ServiceBooking.objects.filter(
-        service_option=service_option,
-        booking_date=booking_date,
-        booking_time=booking_time,
-        status__in=['PENDING', 'CONFIRMED', 'IN_PROGRESS']
-    ).exists()
-
-    if existing_booking:
+    # Check the artist is free for the whole duration (any of their options)
+    duration_minutes = artist_calendar.parse_duration_minutes(service_option.duration)
+    if not artist_calendar.is_free(artist_calendar.day_busy(service.id, booking_date), booking_time, duration_minutes):
         return Response({
             'success': False,
             'message': 'This time slot is already booked'
@@ -6025,62 +5743,48 @@ def create_service_booking(request):
             }, status=400)
         total_amount = final_total
 
+    from backend import coupon_usage, wallet
     try:
-        # Create the booking
-        booking = ServiceBooking.objects.create(
-            user=user,
-            service_option=service_option,
-            booking_date=booking_date,
-            booking_time=booking_time,
-            duration=service_option.duration if hasattr(service_option, 'duration') else '1 hour',
-            customer_name=customer_name,
-            customer_phone=customer_phone,
-            customer_address=customer_address,
-            total_amount=total_amount,
-            notes=notes,
-            status='PENDING',
-            payment_status='PENDING'
-        )
-
-        # Record coupon usage and increment used_count (so limit counts both orders and service bookings)
-        if coupon_obj:
-            from backend.models import CouponUsage
-            CouponUsage.objects.create(
-                user=user,
-                coupon=coupon_obj,
-                order=None,
-                service_booking=booking,
-            )
-            coupon_obj.used_count += 1
-            coupon_obj.save(update_fields=['used_count', 'updated_at'])
-
-        # Apply referral wallet (after coupon)
-        settings_obj = ReferralSettings.get_active()
-        max_wallet_percent = settings_obj.max_wallet_usage_percent if settings_obj else 20
-        requested_wallet_amount = int(request.data.get('wallet_amount') or 0)
-        wallet_balance = int(user.referral_wallet_balance or 0)
-        max_wallet_from_percent = int(total_amount * max_wallet_percent / 100) if max_wallet_percent > 0 else 0
-        wallet_to_use = max(0, min(wallet_balance, requested_wallet_amount, max_wallet_from_percent, int(total_amount)))
-
-        if wallet_to_use > 0:
-            # Deduct from user wallet
-            new_balance = wallet_balance - wallet_to_use
-            user.referral_wallet_balance = new_balance
-            user.save(update_fields=['referral_wallet_balance'])
-
-            # Update booking amount
-            booking.total_amount = int(total_amount) - wallet_to_use
-            booking.save(update_fields=['total_amount'])
-
-            # Ledger entry
-            WalletTransaction.objects.create(
+        with transaction.atomic():
+            # Create the booking
+            booking = ServiceBooking.objects.create(
                 user=user,
-                amount=wallet_to_use,
-                type=WalletTransaction.TYPE_DEBIT,
-                description="Used in service booking",
-                service_booking=booking,
+                service_option=service_option,
+                booking_date=booking_date,
+                booking_time=booking_time,
+                duration=service_option.duration if hasattr(service_option, 'duration') else '1 hour',
+                customer_name=customer_name,
+                customer_phone=customer_phone,
+                customer_address=customer_address,
+                total_amount=total_amount,
+                notes=notes,
+                status='PENDING',
+                payment_status='PENDING'
             )
 
+            # Claim the coupon (limit counts both orders and service bookings); no booking if it ran out
+            if coupon_obj:
+                coupon_usage.redeem(coupon_obj, user, service_booking=booking)
+
+            # Apply referral wallet (after coupon)
+            settings_obj = ReferralSettings.get_active()
+            max_wallet_percent = settings_obj.max_wallet_usage_percent if settings_obj else 20
+            requested_wallet_amount = int(request.data.get('wallet_amount') or 0)
+            wallet_balance = int(user.referral_wallet_balance or 0)
+            max_wallet_from_percent = int(total_amount * max_wallet_percent / 100) if max_wallet_percent > 0 else 0
+            wallet_to_use = max(0, min(wallet_balance, requested_wallet_amount, max_wallet_from_percent, int(total_amount)))
+
+            if wallet_to_use > 0:
+                # Ledger entry + balance; no booking if the balance was spent meanwhile
+                wallet.debit(
+                    user, wallet_to_use, "Used in service booking", wallet.booking_debit_key(booking),
+                    service_booking=booking,
+                )
+
+                # Update booking amount
+                booking.total_amount = int(total_amount) - wallet_to_use
+                booking.save(update_fields=['total_amount'])
+
         # Serialize the created booking
         booking_data = {
             'id': str(booking.id),
@@ -6111,6 +5815,11 @@ def create_service_booking(request):
             'booking': booking_data
         }, status=201)
 
+    except (coupon_usage.CouponUnavailable, wallet.InsufficientBalance) as e:
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=400)
     except Exception as e:
         print(f"Error creating booking: {e}")
         return Response({
@@ -6197,46 +5906,15 @@ def get_service_availability(request, service_id):
             'message': 'Invalid month'
         }, status=400)
 
-    # Get all bookings for this service (artist) in the specified month
-    service_options = service.options_set.all()
-    bookings = ServiceBooking.objects.filter(
-        service_option__in=service_options,
-        booking_date__year=year,
-        booking_date__month=month,
-        status__in=['PENDING', 'CONFIRMED', 'IN_PROGRESS']
-    )
-    booked_dates = list(bookings.values_list('booking_date__day', flat=True).distinct())
-
-    # Artist-specific availability: blocked and admin-booked dates for THIS artist only
-    artist_avail = ArtistAvailability.objects.filter(
-        artist=service,
-        date__year=year,
-        date__month=month,
-    )
-    blocked_dates = list(artist_avail.filter(status=ArtistAvailability.STATUS_BLOCKED).values_list('date__day', flat=True).distinct())
-    artist_booked_dates = list(artist_avail.filter(status=ArtistAvailability.STATUS_BOOKED).values_list('date__day', flat=True).distinct())
-
-    # Combined: customer bookings (red) + admin "booked" (red); blocked (grey) returned separately
-    all_unavailable = set(booked_dates) | set(artist_booked_dates) | set(blocked_dates)
-
-    total_days = monthrange(year, month)[1]
-    today = timezone.now().date()
-
-    available_dates = []
-    for day in range(1, total_days + 1):
-        from datetime import datetime as dt
-        check_date = dt(year, month, day).date()
-        if check_date >= today and day not in all_unavailable:
-            available_dates.append(day)
+    # Day bitmaps for THIS artist: booked (red: customer + admin booked), blocked (grey)
+    from backend import artist_calendar
+    days = artist_calendar.month_availability(service.id, year, month, timezone.now().date())
 
     return Response({
         'success': True,
         'year': year,
         'month': month,
-        'booked_dates': list(set(booked_dates) | set(artist_booked_dates)),  # red: customer + admin booked
-        'blocked_dates': blocked_dates,  # grey: admin blocked
-        'available_dates': available_dates,
-        'total_days': total_days
+        **days,
     })
 
 
@@ -6247,10 +5925,12 @@ def get_available_time_slots(request, service_id):
     Get available time slots for a specific date
 
     URL: /api/services/<service_id>/time-slots/
-    Query Params: date (YYYY-MM-DD)
+    Query Params: date (YYYY-MM-DD), service_option (optional; slots fit its duration)
     """
+    from django.core.exceptions import ValidationError
     from django.utils import timezone
     from datetime import datetime as dt
+    from backend import artist_calendar
 
     date_str = request.GET.get('date')
 
@@ -6282,12 +5962,7 @@ def get_available_time_slots(request, service_id):
         }, status=400)
 
     # Artist-specific: if date is blocked or admin-booked, no slots
-    artist_date = ArtistAvailability.objects.filter(
-        artist=service,
-        date=date_obj,
-        status__in=[ArtistAvailability.STATUS_BLOCKED, ArtistAvailability.STATUS_BOOKED],
-    ).first()
-    if artist_date:
+    if artist_calendar.day_unavailable(service.id, date_obj):
         return Response({
             'success': False,
             'message': 'Date already unavailable',
@@ -6296,30 +5971,26 @@ def get_available_time_slots(request, service_id):
             'booked_slots': [],
         }, status=200)
 
-    # Get existing bookings for this date
-    service_options = service.options_set.all()
-    booked_times = ServiceBooking.objects.filter(
-        service_option__in=service_options,
-        booking_date=date_obj,
-        status__in=['PENDING', 'CONFIRMED', 'IN_PROGRESS']
-    ).values_list('booking_time', flat=True)
-
-    # Generate available time slots (9 AM to 6 PM)
-    all_slots = [
-        f"{hour:02d}:00:00" for hour in range(9, 19)
-    ]
+    # Booking length: the chosen option's duration, else one hour
+    duration_minutes = artist_calendar.DEFAULT_DURATION_MINUTES
+    service_option_id = request.GET.get('service_option')
+    if service_option_id:
+        try:
+            duration = ServiceOption.objects.filter(id=service_option_id, service=service).values_list('duration', flat=True).first()
+        except (ValueError, ValidationError):
+            duration = None
+        if duration:
+            duration_minutes = artist_calendar.parse_duration_minutes(duration)
 
-    # Filter out booked slots
-    available_slots = [
-        slot for slot in all_slots
-        if slot not in [str(bt) for bt in booked_times]
-    ]
+    # Hourly start times (9 AM to 6 PM) that fit before any overlapping booking
+    busy = artist_calendar.day_busy(service.id, date_obj)
+    available_slots, booked_slots = artist_calendar.offered_slots(busy, duration_minutes)
 
     return Response({
         'success': True,
         'date': date_str,
         'available_slots': available_slots,
-        'booked_slots': [str(bt) for bt in booked_times]
+        'booked_slots': booked_slots
     })
 
 
@@ -6443,14 +6114,23 @@ def reschedule_booking(request, booking_id):
             'message': 'New date must be in the future'
         }, status=400)
 
-    # Check if new date is available
-    conflicting_booking = ServiceBooking.objects.filter(
-        service_option=booking.service_option,
-        booking_date=new_date_obj,
-        status__in=['PENDING', 'CONFIRMED', 'IN_PROGRESS']
-    ).exclude(id=booking_id).exists()
+    # Parse new time
+    try:
+        new_time_obj = dt.strptime(new_time, '%H:%M:%S').time()
+    except ValueError:
+        return Response({
+            'success': False,
+            'message': 'Invalid time format. Use HH:MM:SS'
+        }, status=400)
 
-    if conflicting_booking:
+    # Check the artist is free at the new date and time (ignoring this booking)
+    from backend import artist_calendar
+    artist_id = booking.service_option.service_id
+    busy = artist_calendar.day_busy(artist_id, new_date_obj, exclude_booking_id=booking.id)
+    if (
+        artist_calendar.day_unavailable(artist_id, new_date_obj)
+        or not artist_calendar.is_free(busy, new_time_obj, artist_calendar.parse_duration_minutes(booking.duration))
+    ):
         return Response({
             'success': False,
             'message': 'Selected date is not available'
@@ -6459,7 +6139,7 @@ def reschedule_booking(request, booking_id):
     # Update booking
     old_date = booking.booking_date
     booking.booking_date = new_date_obj
-    booking.booking_time = new_time
+    booking.booking_time = new_time_obj
     booking.notes = f"{booking.notes}\nRescheduled from {old_date} to {new_date_obj}"
     booking.save()
 
@@ -6547,9 +6227,8 @@ def rate_service_booking(request):
         booking.rated_at = timezone.now()
         booking.save()
 
-        # âœ… UPDATE: Aggregate service rating
+        # The service's rating and histogram are updated by a signal (backend/ratings.py)
         service = booking.service_option.service
-        _update_service_rating(service)
 
         action = "updated" if is_update else "saved"
         print(f"âœ… Rating {action}: {rating_int} stars for {service.title}")
@@ -6582,28 +6261,6 @@ def rate_service_booking(request):
         }, status=500)
 
 
-def _update_service_rating(service):
-    """
-    âœ… NEW: Update service's aggregate rating based on all user ratings
-    """
-    from django.db.models import Avg, Count
-
-    # Get all rated bookings for this service
-    ratings_data = ServiceBooking.objects.filter(
-        service_option__service=service,
-        rating__isnull=False
-    ).aggregate(
-        avg_rating=Avg('rating'),
-        total_reviews=Count('rating')
-    )
-
-    # Update service rating
-    service.rating = round(ratings_data['avg_rating'] or 0, 1)
-    service.total_reviews = ratings_data['total_reviews'] or 0
-    service.save(update_fields=['rating', 'total_reviews'])
-
-    print(f"ðŸ“Š Service rating updated: {service.rating} ({service.total_reviews} reviews)")
-
 @api_view(['POST'])
 def forgot_password(request):
     phone = request.data.get('phone')
@@ -7818,10 +7475,8 @@ def vendor_delete_product_image(request, image_id):
         }, status=404)
 
     try:
-        # Delete the image file from storage
-        if product_image.image:
-            product_image.image.delete()
-
+        # The file is shared by identical uploads; it is removed with its last
+        # reference (backend/media_blobs.py)
         product_image.delete()
 
         return Response({
@@ -7836,6 +7491,118 @@ def vendor_delete_product_image(request, image_id):
         }, status=500)
 
 
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticatedVendor])
+@authentication_classes([VendorTokenAuthentication])
+@parser_classes([MultiPartParser, FormParser])
+def vendor_catalog_imports(request):
+    """
+    Bulk catalog import (see backend/catalog_import.py for manifest columns)
+    GET  /api/vendor/catalog/imports/   -> last 20 import jobs
+    POST /api/vendor/catalog/imports/   Form Data:
+        - manifest: .csv or .jsonl file, one row per product option
+        - images: optional .zip with the image paths referenced in the manifest
+    Returns 202 with the job; poll GET /api/vendor/catalog/imports/<job_id>/
+    """
+    from backend.catalog_import import job_status, start_job
+    from backend.models import CatalogImportJob
+
+    vendor = request.user
+
+    if request.method == 'GET':
+        jobs = CatalogImportJob.objects.filter(vendor=vendor).order_by('-created_at')[:20]
+        return Response({
+            'success': True,
+            'imports': [job_status(job) for job in jobs]
+        })
+
+    manifest = request.FILES.get('manifest')
+    images = request.FILES.get('images')
+    if not manifest:
+        return Response({
+            'success': False,
+            'message': 'Manifest file is required'
+        }, status=400)
+
+    if os.path.splitext(manifest.name)[1].lower() not in ('.csv', '.jsonl', '.ndjson'):
+        return Response({
+            'success': False,
+            'message': 'Manifest must be a .csv or .jsonl file'
+        }, status=400)
+
+    if images and os.path.splitext(images.name)[1].lower() != '.zip':
+        return Response({
+            'success': False,
+            'message': 'Images must be uploaded as a .zip file'
+        }, status=400)
+
+    max_bytes = settings.CATALOG_IMPORT_MAX_UPLOAD_MB * 1024 * 1024
+    if manifest.size > max_bytes or (images and images.size > max_bytes):
+        return Response({
+            'success': False,
+            'message': f'File too large (max {settings.CATALOG_IMPORT_MAX_UPLOAD_MB}MB)'
+        }, status=400)
+
+    try:
+        job = CatalogImportJob.objects.create(vendor=vendor, manifest=manifest, images_zip=images)
+        start_job(job.id)
+        return Response({
+            'success': True,
+            'message': 'Import started',
+            'import': job_status(job)
+        }, status=202)
+
+    except Exception as e:
+        return Response({
+            'success': False,
+            'message': f'Failed to start import: {str(e)}'
+        }, status=500)
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticatedVendor])
+@authentication_classes([VendorTokenAuthentication])
+def vendor_catalog_import_detail(request, job_id):
+    """
+    GET  /api/vendor/catalog/imports/<job_id>/  -> job progress and row errors
+    POST /api/vendor/catalog/imports/<job_id>/  -> resume a failed or stalled job
+    """
+    from backend.catalog_import import job_status, start_job
+    from backend.models import CatalogImportJob
+
+    try:
+        job = CatalogImportJob.objects.get(id=job_id, vendor=request.user)
+    except CatalogImportJob.DoesNotExist:
+        return Response({
+            'success': False,
+            'message': 'Import not found'
+        }, status=404)
+
+    if request.method == 'POST':
+        if job.status == CatalogImportJob.STATUS_COMPLETED:
+            return Response({
+                'success': False,
+                'message': 'Import already completed'
+            }, status=400)
+        if job.status == CatalogImportJob.STATUS_RUNNING and not _catalog_import_is_stale(job):
+            return Response({
+                'success': False,
+                'message': 'Import is still running'
+            }, status=400)
+        start_job(job.id)
+        job.refresh_from_db()
+
+    return Response({
+        'success': True,
+        'import': job_status(job)
+    })
+
+
+def _catalog_import_is_stale(job):
+    stale_after = timedelta(minutes=settings.CATALOG_IMPORT_STALE_MINUTES)
+    return not job.heartbeat_at or job.heartbeat_at < timezone.now() - stale_after
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticatedVendor])
 @authentication_classes([VendorTokenAuthentication])
@@ -7883,6 +7650,9 @@ def vendor_get_categories(request):
     })
 
 
+VENDOR_BULK_STOCK_MAX_LINES = 1000
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticatedVendor])
 @authentication_classes([VendorTokenAuthentication])
@@ -7895,43 +7665,105 @@ def vendor_bulk_update_stock(request):
             {"option_id": "uuid", "quantity": 50}
         ]
     }
+    Options are loaded in one query scoped to the vendor and written with one
+    bulk_update. Returns a result per line; if an option appears twice the last line wins.
     """
+    vendor = request.user
     updates = request.data.get('updates', [])
 
-    if not updates:
+    if not updates or not isinstance(updates, list):
         return Response({
             'success': False,
             'message': 'No updates provided'
         }, status=400)
 
-    updated_count = 0
-    errors = []
+    if len(updates) > VENDOR_BULK_STOCK_MAX_LINES:
+        return Response({
+            'success': False,
+            'message': f'Too many updates (max {VENDOR_BULK_STOCK_MAX_LINES} per request)'
+        }, status=400)
+
+    # Validate lines before touching the database
+    results = []
+    wanted = {}
+    for update in updates:
+        update = update if isinstance(update, dict) else {}
+        option_id = update.get('option_id')
+        quantity = update.get('quantity')
+        result = {'option_id': option_id, 'success': False}
+        results.append(result)
+
+        if not option_id or quantity is None:
+            result['message'] = 'Missing option_id or quantity in update'
+            continue
+        try:
+            option_uuid = uuid.UUID(str(option_id))
+        except (ValueError, TypeError, AttributeError):
+            result['message'] = f'Product option {option_id} not found'
+            continue
+        try:
+            quantity = int(quantity)
+        except (ValueError, TypeError):
+            result['message'] = f'Invalid quantity for option {option_id}'
+            continue
+        if quantity < 0:
+            result['message'] = f'Invalid quantity for option {option_id}'
+            continue
+        if option_uuid in wanted:
+            earlier = wanted[option_uuid][0]
+            earlier.pop('quantity', None)
+            earlier['message'] = 'Superseded by a later update for this option'
+        result['quantity'] = quantity
+        wanted[option_uuid] = (result, quantity)
 
     try:
         with transaction.atomic():
-            for update in updates:
-                option_id = update.get('option_id')
-                quantity = update.get('quantity')
-
-                if not option_id or quantity is None:
-                    errors.append(f'Missing option_id or quantity in update')
+            options = {
+                o.id: o for o in ProductOption.objects.select_for_update()
+                .filter(id__in=list(wanted), product__vendor=vendor)
+                .only('id', 'quantity')
+            }
+            changed = {}
+            for option_uuid, (result, quantity) in wanted.items():
+                option = options.get(option_uuid)
+                if option is None:
+                    result['message'] = f'Product option {result["option_id"]} not found'
+                    result.pop('quantity', None)
                     continue
+                result['previous_quantity'] = option.quantity
+                if option.quantity != quantity:
+                    option.quantity = quantity
+                    changed[option_uuid] = option
+
+            if changed:
+                # bulk_update skips ProductOption.save() (debug prints + refresh_from_db per row)
+                ProductOption.objects.bulk_update(changed.values(), ['quantity'], batch_size=500)
+                # ...and the post_save signal that marks carts holding these options stale
+                from backend.cart import invalidate_for_options
+                invalidate_for_options([option.pk for option in changed.values()])
+                # ...and the signal that moves the vendor's stock counters
+                from backend import vendor_stats
+                vendor_stats.add_vendor(vendor.id, vendor_stats.combine(*(
+                    vendor_stats.diff(
+                        vendor_stats.option_counts(option.quantity),
+                        vendor_stats.option_counts(wanted[option_uuid][0]['previous_quantity']),
+                    )
+                    for option_uuid, option in changed.items()
+                )))
 
-                try:
-                    product_option = ProductOption.objects.get(id=option_id)
-                    product_option.quantity = int(quantity)
-                    product_option.save()
-                    updated_count += 1
-                except ProductOption.DoesNotExist:
-                    errors.append(f'Product option {option_id} not found')
-                except (ValueError, TypeError):
-                    errors.append(f'Invalid quantity for option {option_id}')
+        for result in results:
+            if 'quantity' in result:
+                result['success'] = True
+        updated_count = sum(1 for r in results if r['success'])
+        errors = [r['message'] for r in results if not r['success']]
 
         return Response({
             'success': True,
             'message': f'Successfully updated {updated_count} product options',
             'updated_count': updated_count,
-            'errors': errors if errors else None
+            'changed_count': len(changed),
+            'errors': errors if errors else None,
+            'results': results,
         })
 
     except Exception as e:
@@ -7977,6 +7809,10 @@ def product_details_with_dates(request, product_id):
     except Product.DoesNotExist:
         return Response({'error': 'Product not found'}, status=404)
 
+    cart_option_ids = set(
+        CartItem.objects.filter(user=user).values_list('product_option_id', flat=True)
+    ) if is_authenticated else set()
+
     # ✅ Get all product options with their individual pricing
     options_data = []
     for option in product.options_set.all():
@@ -7996,7 +7832,7 @@ def product_details_with_dates(request, product_id):
             'in_stock': option.quantity > 0,
             'images': option_images,
             # ✅ Only check cart/wishlist if authenticated
-            'in_cart': user.cart.filter(id=option.id).exists() if is_authenticated else False,
+            'in_cart': option.id in cart_option_ids,
             'in_wishlist': user.wishlist.filter(id=option.id).exists() if is_authenticated else False,
             # ✅ Availability fields
             'rent_available': option.is_rent_available,
@@ -8010,16 +7846,9 @@ def product_details_with_dates(request, product_id):
         }
         options_data.append(option_data)
 
-    # Calculate ratings
-    total_ratings = product.star_5 + product.star_4 + product.star_3 + product.star_2 + product.star_1
-    if total_ratings > 0:
-        average_rating = (
-                                 (product.star_5 * 5) + (product.star_4 * 4) + (product.star_3 * 3) +
-                                 (product.star_2 * 2) + (product.star_1 * 1)
-                         ) / total_ratings
-        average_rating = round(average_rating, 1)
-    else:
-        average_rating = 0
+    # Ratings (stored by backend.ratings)
+    total_ratings = product.rating_count
+    average_rating = float(product.rating_average) if total_ratings else 0
 
     # ✅ NEW: Get reviews with pagination
     reviews_page = int(request.GET.get('reviews_page', 1))
@@ -8612,10 +8441,6 @@ def add_to_cart_with_date(request):
             )
             created = True
 
-        # Also add to the old ManyToMany cart for compatibility
-        if not user.cart.filter(id=product_option.id).exists():
-            user.cart.add(product_option)
-
         print(f"âœ… Cart item created successfully: ID={cart_item.id}")
 
         return Response({
@@ -9100,32 +8925,18 @@ def create_order_with_bookings(request):
             wallet_to_use = max(0, min(wallet_balance, requested_wallet_amount, max_wallet_from_percent, int(total_amount)))
 
             if wallet_to_use > 0:
-                # Deduct from user wallet
-                new_balance = wallet_balance - wallet_to_use
-                user.referral_wallet_balance = new_balance
-                user.save(update_fields=['referral_wallet_balance'])
+                # Ledger entry + balance; no order if the balance was spent meanwhile
+                from backend import wallet
+                try:
+                    wallet.debit(user, wallet_to_use, "Used in order", wallet.order_debit_key(order), order=order)
+                except wallet.InsufficientBalance as e:
+                    transaction.set_rollback(True)
+                    return Response({'success': False, 'message': str(e)}, status=400)
 
                 # Update order amount
                 order.tx_amount = int(total_amount) - wallet_to_use
                 order.save(update_fields=['tx_amount'])
 
-                # Ledger entry
-                WalletTransaction.objects.create(
-                    user=user,
-                    amount=wallet_to_use,
-                    type=WalletTransaction.TYPE_DEBIT,
-                    description="Used in order",
-                    order=order,
-                )
-
-            # Record coupon usage and increment used_count
-            if coupon_obj:
-                from backend.models import CouponUsage
-                CouponUsage.objects.create(user=user, coupon=coupon_obj, order=order)
-                coupon_obj.used_count += 1
-                coupon_obj.save(update_fields=['used_count', 'updated_at'])
-                print(f"🎟️ Coupon usage recorded: {coupon_obj.code} (used {coupon_obj.used_count} times)")
-
             # ✅ UPGRADED: Create OrderedProduct entries AND decrease stock ONLY for purchases
             ordered_products = []
             for item in items_to_order:
@@ -9179,10 +8990,19 @@ def create_order_with_bookings(request):
 
             # Clear cart
             if data.get('from_cart', True):
-                user.cart.clear()
                 CartItem.objects.filter(user=user).delete()
                 print(f"🗑️ Cart cleared")
 
+            # Claim the coupon last: its counter row stays locked until the order commits
+            if coupon_obj:
+                from backend import coupon_usage
+                try:
+                    coupon_usage.redeem(coupon_obj, user, order=order)
+                except coupon_usage.CouponUnavailable as e:
+                    transaction.set_rollback(True)
+                    return Response({'success': False, 'message': str(e)}, status=400)
+                print(f"🎟️ Coupon usage recorded: {coupon_obj.code}")
+
             # Send notification
             try:
                 Notification.objects.create(
@@ -9784,6 +9604,124 @@ def referral_share(request):
         'share_message': share_message,
     })
 
+
+def _cron_denied(request):
+    """Error response unless the request carries the Vercel cron secret, else None."""
+    secret = settings.CRON_SECRET
+    if not secret:
+        return Response({'success': False, 'message': 'CRON_SECRET is not configured'}, status=503)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {secret}'):
+        return Response({'success': False, 'message': 'Unauthorized'}, status=401)
+    return None
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@authentication_classes([])
+def cron_referral_rewards(request):
+    """
+    Scheduled referral run (backend/referral_rewards.py), called by the Vercel
+    cron in vercel.json; same work as `python manage.py process_referral_rewards`.
+    GET /api/cron/referral-rewards/
+    Headers: Authorization: Bearer <CRON_SECRET>
+    """
+    from backend import referral_rewards
+
+    denied = _cron_denied(request)
+    if denied:
+        return denied
+
+    completed, credited = referral_rewards.process()
+    return Response({
+        'success': True,
+        'message': f'{completed} referral(s) completed, {len(credited)} credited',
+        'completed': completed,
+        'credited': len(credited),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@authentication_classes([])
+def cron_analytics_rollups(request):
+    """
+    Scheduled dashboard rollups (backend/analytics_rollups.py), called by the
+    Vercel cron in vercel.json; same work as `python manage.py build_analytics_rollups`.
+    GET /api/cron/analytics-rollups/
+    Headers: Authorization: Bearer <CRON_SECRET>
+    """
+    from backend.analytics_rollups import build_order_rollups, build_screen_rollups
+
+    denied = _cron_denied(request)
+    if denied:
+        return denied
+
+    screen_days = build_screen_rollups()
+    order_days = build_order_rollups()
+    return Response({
+        'success': True,
+        'message': f'{screen_days} screen day(s), {order_days} order day(s) rebuilt',
+        'screen_days': screen_days,
+        'order_days': order_days,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@authentication_classes([])
+def cron_session_funnels(request):
+    """
+    Scheduled funnel update (backend/analytics_funnels.py), called by the Vercel
+    cron in vercel.json; same work as `python manage.py build_session_funnels`.
+    GET /api/cron/session-funnels/
+    Headers: Authorization: Bearer <CRON_SECRET>
+    """
+    from backend.analytics_funnels import build_session_funnels
+
+    denied = _cron_denied(request)
+    if denied:
+        return denied
+
+    sessions, events = build_session_funnels()
+    return Response({
+        'success': True,
+        'message': f'{sessions} session(s) updated',
+        'sessions': sessions,
+        'events': events,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@authentication_classes([])
+def cron_location_pings(request):
+    """
+    Scheduled location ping rollup and retention (backend/analytics_rollups.py),
+    called by the Vercel cron in vercel.json; same work as
+    `python manage.py rollup_location_pings`.
+    GET /api/cron/location-pings/
+    Headers: Authorization: Bearer <CRON_SECRET>
+    """
+    from backend.analytics_rollups import (
+        backfill_ping_grid_cells, build_location_rollups, ping_retention_cutoff, purge_location_pings,
+    )
+
+    denied = _cron_denied(request)
+    if denied:
+        return denied
+
+    filled = backfill_ping_grid_cells()
+    days = build_location_rollups()
+    deleted = purge_location_pings(ping_retention_cutoff())
+    return Response({
+        'success': True,
+        'message': f'{days} day(s) rebuilt, {deleted} raw ping(s) deleted',
+        'grid_cells_filled': filled,
+        'days': days,
+        'deleted': deleted,
+    })
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticatedUser])
 def get_order_confirmation_status(request, order_id):
@@ -10502,6 +10440,52 @@ def vendor_categories(request):
 
 
 
+def _vendor_orders_queryset(vendor):
+    """Orders with at least one item of this vendor (indexed OrderedProduct.vendor lookup, no DISTINCT)."""
+    return Order.objects.filter(
+        id__in=OrderedProduct.objects.filter(vendor=vendor).values('order_id')
+    )
+
+
+def _vendor_items_prefetch(vendor):
+    """Prefetch only this vendor's items of each order into order.vendor_items."""
+    return Prefetch(
+        'orders_set',
+        queryset=OrderedProduct.objects.filter(vendor=vendor)
+        .select_related('product_option__product')
+        .prefetch_related(Prefetch('product_option__images_set', queryset=ProductImage.objects.order_by('pk'))),
+        to_attr='vendor_items',
+    )
+
+
+def _vendor_order_item_data(request, item):
+    images = item.product_option.images_set.all()
+    first_image = images[0] if images else None
+    image_url = None
+    if first_image and first_image.image:
+        try:
+            image_url = request.build_absolute_uri(first_image.image.url)
+        except:
+            pass
+
+    return {
+        'id': str(item.id),
+        'product_title': item.product_option.product.title,
+        'product_option_name': item.product_option.option or 'Default',
+        'product_image': image_url,
+        'quantity': item.quantity,
+        'product_price': item.product_price,
+        'tx_price': item.tx_price,
+        'delivery_price': item.delivery_price,
+        'status': item.status,
+        'created_at': item.created_at.isoformat(),
+        'rental_type': item.rental_type,
+        'rental_duration': item.rental_duration,
+        'rental_start_date': item.rental_start_date.strftime('%Y-%m-%d') if item.rental_start_date else None,
+        'rental_end_date': item.rental_end_date.strftime('%Y-%m-%d') if item.rental_end_date else None,
+    }
+
+
 @api_view(['GET'])
 @authentication_classes([VendorTokenAuthentication])
 @permission_classes([IsAuthenticatedVendor])
@@ -10513,15 +10497,9 @@ def vendor_orders(request):
     vendor = request.user  # This is the Vendor instance from authentication
 
     try:
-        # Get vendor's products
-        vendor_product_ids = Product.objects.filter(vendor=vendor).values_list('id', flat=True)
-
-        # Get orders containing vendor's products
-        orders_queryset = Order.objects.filter(
-            orders_set__product_option__product_id__in=vendor_product_ids
-        ).distinct().select_related('user').prefetch_related(
-            'orders_set__product_option__product',
-            'orders_set__product_option__images_set'
+        # Orders containing vendor's products (OrderedProduct.vendor)
+        orders_queryset = _vendor_orders_queryset(vendor).select_related('user').prefetch_related(
+            _vendor_items_prefetch(vendor)
         ).order_by('-created_at')
 
         # Apply status filter
@@ -10553,38 +10531,8 @@ def vendor_orders(request):
         # Serialize orders
         orders_data = []
         for order in orders:
-            # Get only vendor's products from this order
-            vendor_items = order.orders_set.filter(
-                product_option__product_id__in=vendor_product_ids
-            )
-
-            # Serialize items
-            items_data = []
-            for item in vendor_items:
-                first_image = item.product_option.images_set.first()
-                image_url = None
-                if first_image and first_image.image:
-                    try:
-                        image_url = request.build_absolute_uri(first_image.image.url)
-                    except:
-                        pass
-
-                items_data.append({
-                    'id': str(item.id),
-                    'product_title': item.product_option.product.title,
-                    'product_option_name': item.product_option.option or 'Default',
-                    'product_image': image_url,
-                    'quantity': item.quantity,
-                    'product_price': item.product_price,
-                    'tx_price': item.tx_price,
-                    'delivery_price': item.delivery_price,
-                    'status': item.status,
-                    'created_at': item.created_at.isoformat(),
-                    'rental_type': item.rental_type,
-                    'rental_duration': item.rental_duration,
-                    'rental_start_date': item.rental_start_date.strftime('%Y-%m-%d') if item.rental_start_date else None,
-                    'rental_end_date': item.rental_end_date.strftime('%Y-%m-%d') if item.rental_end_date else None,
-                })
+            # Only vendor's products from this order (prefetched)
+            items_data = [_vendor_order_item_data(request, item) for item in order.vendor_items]
 
             orders_data.append({
                 'id': str(order.id),
@@ -10639,58 +10587,19 @@ def vendor_order_detail(request, order_id):
     vendor = request.user
 
     try:
-        # Get vendor's products
-        vendor_product_ids = Product.objects.filter(vendor=vendor).values_list('id', flat=True)
-
-        # Get the order
+        # Get the order with only vendor's items
         order = Order.objects.select_related('user').prefetch_related(
-            'orders_set__product_option__product',
-            'orders_set__product_option__images_set'
+            _vendor_items_prefetch(vendor)
         ).get(id=order_id)
 
         # Verify vendor has access to this order
-        order_has_vendor_products = order.orders_set.filter(
-            product_option__product_id__in=vendor_product_ids
-        ).exists()
-
-        if not order_has_vendor_products:
+        if not order.vendor_items:
             return Response({
                 'success': False,
                 'message': 'Order not found or access denied'
             }, status=404)
 
-        # Get only vendor's products from this order
-        vendor_items = order.orders_set.filter(
-            product_option__product_id__in=vendor_product_ids
-        )
-
-        # Serialize items
-        items_data = []
-        for item in vendor_items:
-            first_image = item.product_option.images_set.first()
-            image_url = None
-            if first_image and first_image.image:
-                try:
-                    image_url = request.build_absolute_uri(first_image.image.url)
-                except:
-                    pass
-
-            items_data.append({
-                'id': str(item.id),
-                'product_title': item.product_option.product.title,
-                'product_option_name': item.product_option.option or 'Default',
-                'product_image': image_url,
-                'quantity': item.quantity,
-                'product_price': item.product_price,
-                'tx_price': item.tx_price,
-                'delivery_price': item.delivery_price,
-                'status': item.status,
-                'created_at': item.created_at.isoformat(),
-                'rental_type': item.rental_type,
-                'rental_duration': item.rental_duration,
-                'rental_start_date': item.rental_start_date.strftime('%Y-%m-%d') if item.rental_start_date else None,
-                'rental_end_date': item.rental_end_date.strftime('%Y-%m-%d') if item.rental_end_date else None,
-            })
+        items_data = [_vendor_order_item_data(request, item) for item in order.vendor_items]
 
         order_data = {
             'id': str(order.id),
@@ -10748,18 +10657,12 @@ def vendor_accept_order(request, order_id):
     notes = request.data.get('notes', '')
 
     try:
-        # Get vendor's products
-        vendor_product_ids = Product.objects.filter(vendor=vendor).values_list('id', flat=True)
-
         # Get the order
         order = Order.objects.get(id=order_id)
 
         # Verify vendor has access
-        order_has_vendor_products = order.orders_set.filter(
-            product_option__product_id__in=vendor_product_ids
-        ).exists()
-
-        if not order_has_vendor_products:
+        vendor_items = order.orders_set.filter(vendor=vendor)
+        if not vendor_items.exists():
             return Response({
                 'success': False,
                 'message': 'Order not found or access denied'
@@ -10780,16 +10683,13 @@ def vendor_accept_order(request, order_id):
         order.save()
 
         # Update ordered products status
-        vendor_items = order.orders_set.filter(
-            product_option__product_id__in=vendor_product_ids
-        )
         vendor_items.update(status='ORDERED')
 
         # Update product bookings to CONFIRMED
         from backend.models import ProductBooking
         ProductBooking.objects.filter(
             order=order,
-            product_id__in=vendor_product_ids,
+            product__vendor=vendor,
             status='PENDING'
         ).update(status='CONFIRMED')
 
@@ -10854,18 +10754,12 @@ def vendor_reject_order(request, order_id):
         }, status=400)
 
     try:
-        # Get vendor's products
-        vendor_product_ids = Product.objects.filter(vendor=vendor).values_list('id', flat=True)
-
         # Get the order
         order = Order.objects.get(id=order_id)
 
         # Verify vendor has access
-        order_has_vendor_products = order.orders_set.filter(
-            product_option__product_id__in=vendor_product_ids
-        ).exists()
-
-        if not order_has_vendor_products:
+        vendor_items = order.orders_set.filter(vendor=vendor).select_related('product_option')
+        if not vendor_items.exists():
             return Response({
                 'success': False,
                 'message': 'Order not found or access denied'
@@ -10885,10 +10779,6 @@ def vendor_reject_order(request, order_id):
         order.save()
 
         # Restore stock for rejected items
-        vendor_items = order.orders_set.filter(
-            product_option__product_id__in=vendor_product_ids
-        )
-
         for item in vendor_items:
             item.product_option.quantity += item.quantity
             item.product_option.save()
@@ -10899,7 +10789,7 @@ def vendor_reject_order(request, order_id):
         from backend.models import ProductBooking
         ProductBooking.objects.filter(
             order=order,
-            product_id__in=vendor_product_ids,
+            product__vendor=vendor,
             status='PENDING'
         ).update(status='CANCELLED')
 
@@ -10945,6 +10835,212 @@ def vendor_reject_order(request, order_id):
         }, status=500)
 
 
+# ---------------------------------------------------------------------------
+# Vendor live order feed (backend/vendor_events.py)
+# Plain async views: under ASGI (core/asgi.py) a waiting vendor holds no worker
+# thread. The deploy runs WSGI (core/wsgi.py), where every wait occupies a sync
+# worker, so there the long-poll is capped at VENDOR_EVENT_WSGI_MAX_WAIT_SECONDS
+# and the SSE stream is a sync generator that yields each event as it is read
+# and closes after VENDOR_EVENT_WSGI_STREAM_SECONDS (clients reconnect).
+# DRF's @api_view is sync-only, so auth and responses are done by hand.
+# ---------------------------------------------------------------------------
+
+def _served_by_asgi(request):
+    from django.core.handlers.asgi import ASGIRequest
+    return isinstance(request, ASGIRequest)
+
+
+async def _authenticate_vendor_async(request):
+    """(vendor, None) or (None, 401 JsonResponse)."""
+    try:
+        vendor, _ = await sync_to_async(VendorTokenAuthentication().authenticate)(request)
+    except AuthenticationFailed as e:
+        return None, JsonResponse({'success': False, 'message': str(e.detail)}, status=401)
+    if vendor is None:
+        return None, JsonResponse({'success': False, 'message': 'Authentication required'}, status=401)
+    return vendor, None
+
+
+def _vendor_event_cursor(request):
+    """Cursor from ?since= or the SSE Last-Event-ID header; None if absent, False if invalid."""
+    raw = request.GET.get('since') or request.headers.get('Last-Event-ID')
+    if raw in (None, ''):
+        return None
+    try:
+        return max(0, int(raw))
+    except (TypeError, ValueError):
+        return False
+
+
+async def vendor_order_events(request):
+    """
+    Long-poll for new orders, cancellations and trial bookings
+    GET /api/vendor/orders/events/?since=<cursor>&wait=<seconds>
+    Headers: Authorization: Token <vendor_token>
+
+    Without `since` returns the current cursor immediately (no events).
+    Otherwise waits up to `wait` seconds (default 25; at most
+    VENDOR_EVENT_WSGI_MAX_WAIT_SECONDS when served by WSGI) for events after the cursor.
+    Response: {success, events: [{id, type, order_id, trial_id, data, created_at}], cursor}
+    Pass the returned cursor as `since` on the next call.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'message': 'Method not allowed'}, status=405)
+    vendor, error = await _authenticate_vendor_async(request)
+    if error:
+        return error
+
+    cursor = _vendor_event_cursor(request)
+    if cursor is False:
+        return JsonResponse({'success': False, 'message': 'since must be an integer'}, status=400)
+    if cursor is None:
+        cursor = await sync_to_async(vendor_events.latest_cursor)(vendor.id)
+        return JsonResponse({'success': True, 'events': [], 'cursor': cursor})
+
+    try:
+        wait = float(request.GET.get('wait', 25))
+    except (TypeError, ValueError):
+        wait = 25
+    max_wait = settings.VENDOR_EVENT_MAX_WAIT_SECONDS
+    if not _served_by_asgi(request):
+        max_wait = min(max_wait, settings.VENDOR_EVENT_WSGI_MAX_WAIT_SECONDS)
+    wait = min(max(wait, 0), max_wait)
+    poll = settings.VENDOR_EVENT_POLL_SECONDS
+    deadline = time_module.monotonic() + wait
+
+    while True:
+        events = await sync_to_async(vendor_events.read_events)(vendor.id, cursor)
+        remaining = deadline - time_module.monotonic()
+        if events or remaining <= 0:
+            break
+        await asyncio.sleep(min(poll, remaining))
+
+    if events:
+        cursor = events[-1]['id']
+    return JsonResponse({'success': True, 'events': events, 'cursor': cursor})
+
+
+async def vendor_order_event_stream(request):
+    """
+    Server-Sent Events stream of the same events
+    GET /api/vendor/orders/events/stream/?since=<cursor>
+    Headers: Authorization: Token <vendor_token> (reconnects may send Last-Event-ID)
+
+    Each event: "id: <cursor>", "event: <type>", "data: <event JSON>".
+    The stream closes after VENDOR_EVENT_STREAM_SECONDS (VENDOR_EVENT_WSGI_STREAM_SECONDS
+    when served by WSGI); clients reconnect with the last id.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'message': 'Method not allowed'}, status=405)
+    vendor, error = await _authenticate_vendor_async(request)
+    if error:
+        return error
+
+    cursor = _vendor_event_cursor(request)
+    if cursor is False:
+        return JsonResponse({'success': False, 'message': 'since must be an integer'}, status=400)
+    if cursor is None:
+        cursor = await sync_to_async(vendor_events.latest_cursor)(vendor.id)
+
+    poll = settings.VENDOR_EVENT_POLL_SECONDS
+    keepalive = settings.VENDOR_EVENT_KEEPALIVE_SECONDS
+
+    def frames(events, cursor, last_sent):
+        """(SSE frames, cursor, last_sent) for one read of the event table."""
+        chunks = []
+        for event in events:
+            cursor = event['id']
+            chunks.append(f"id: {cursor}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n")
+        now = time_module.monotonic()
+        if events:
+            last_sent = now
+        elif now - last_sent >= keepalive:
+            last_sent = now
+            chunks.append(': keepalive\n\n')
+        return chunks, cursor, last_sent
+
+    async def stream(cursor):
+        end = time_module.monotonic() + settings.VENDOR_EVENT_STREAM_SECONDS
+        last_sent = time_module.monotonic()
+        yield f'retry: {int(poll * 1000)}\nid: {cursor}\n\n'
+        while time_module.monotonic() < end:
+            events = await sync_to_async(vendor_events.read_events)(vendor.id, cursor)
+            chunks, cursor, last_sent = frames(events, cursor, last_sent)
+            for chunk in chunks:
+                yield chunk
+            await asyncio.sleep(poll)
+
+    def sync_stream(cursor):
+        # WSGI servers send each chunk of a sync iterator as soon as it is
+        # yielded; an async generator would be drained to the end first.
+        from django.db import close_old_connections
+
+        end = time_module.monotonic() + settings.VENDOR_EVENT_WSGI_STREAM_SECONDS
+        last_sent = time_module.monotonic()
+        yield f'retry: {int(poll * 1000)}\nid: {cursor}\n\n'
+        try:
+            while time_module.monotonic() < end:
+                events = vendor_events.read_events(vendor.id, cursor)
+                chunks, cursor, last_sent = frames(events, cursor, last_sent)
+                yield from chunks
+                time_module.sleep(max(0, min(poll, end - time_module.monotonic())))
+        finally:
+            close_old_connections()
+
+    body = stream(cursor) if _served_by_asgi(request) else sync_stream(cursor)
+    response = StreamingHttpResponse(body, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _streaming_export(request, dataset, vendor_id):
+    """Validate ?file_format, ?date_from, ?date_to and stream one export dataset for a vendor."""
+    from backend import exports
+
+    file_format = (request.query_params.get('file_format') or exports.FORMAT_CSV).lower()
+    if file_format not in exports.FORMATS:
+        return Response({
+            'success': False,
+            'message': f'file_format must be one of: {", ".join(exports.FORMATS)}'
+        }, status=400)
+    try:
+        date_from = exports.parse_date(request.query_params.get('date_from'))
+        date_to = exports.parse_date(request.query_params.get('date_to'))
+    except ValueError:
+        return Response({
+            'success': False,
+            'message': 'Invalid date format. Use YYYY-MM-DD'
+        }, status=400)
+    if date_from and date_to and date_from > date_to:
+        return Response({
+            'success': False,
+            'message': 'date_from must not be after date_to'
+        }, status=400)
+
+    queryset = exports.filtered_queryset(dataset, date_from=date_from, date_to=date_to, vendor_id=vendor_id)
+    return exports.export_response(dataset, queryset, file_format)
+
+
+VENDOR_EXPORT_DATASETS = ('orders', 'ordered-products', 'product-bookings')
+
+
+@api_view(['GET'])
+@authentication_classes([VendorTokenAuthentication])
+@permission_classes([IsAuthenticatedVendor])
+def vendor_export(request, dataset):
+    """
+    Stream the vendor's orders, ordered products or product bookings as CSV/XLSX.
+    Query params: file_format (csv|xlsx), date_from, date_to (YYYY-MM-DD).
+    """
+    if dataset not in VENDOR_EXPORT_DATASETS:
+        return Response({
+            'success': False,
+            'message': f'Unknown export. Use one of: {", ".join(VENDOR_EXPORT_DATASETS)}'
+        }, status=404)
+    return _streaming_export(request, dataset, request.user.id)
+
+
 # Update the vendor_dashboard function to include pending and accepted orders
 @api_view(['GET'])
 @authentication_classes([VendorTokenAuthentication])
@@ -10952,55 +11048,13 @@ def vendor_reject_order(request, order_id):
 def vendor_dashboard(request):
     """
     Get vendor dashboard statistics - Updated with order counts
+    (one VendorStats row, see backend/vendor_stats.py)
     """
     vendor = request.user
 
     try:
-        # Get all products for this vendor
-        products = Product.objects.filter(vendor=vendor)
-
-        # Calculate statistics
-        total_products = products.count()
-        total_options = ProductOption.objects.filter(product__in=products).count()
-        total_stock = ProductOption.objects.filter(product__in=products).aggregate(
-            total=Sum('quantity')
-        )['total'] or 0
-
-        # Get low stock items (less than 10)
-        low_stock_items = ProductOption.objects.filter(
-            product__in=products,
-            quantity__lt=10,
-            quantity__gt=0
-        ).count()
-
-        # Get vendor's product IDs
-        vendor_product_ids = products.values_list('id', flat=True)
-
-        # Get recent orders (last 30 days)
-        from django.utils import timezone
-        thirty_days_ago = timezone.now() - timezone.timedelta(days=30)
-        recent_orders = Order.objects.filter(
-            orders_set__product_option__product_id__in=vendor_product_ids,
-            created_at__gte=thirty_days_ago
-        ).distinct().count()
-
-        # Get pending orders (NEW)
-        pending_orders = Order.objects.filter(
-            orders_set__product_option__product_id__in=vendor_product_ids,
-            vendor_status='PENDING'
-        ).distinct().count()
-
-        # Get accepted orders (NEW)
-        accepted_orders = Order.objects.filter(
-            orders_set__product_option__product_id__in=vendor_product_ids,
-            vendor_status='ACCEPTED'
-        ).distinct().count()
-
-        # Calculate total revenue (successful orders)
-        total_revenue = Order.objects.filter(
-            orders_set__product_option__product_id__in=vendor_product_ids,
-            tx_status='SUCCESS'
-        ).distinct().aggregate(total=Sum('tx_amount'))['total'] or 0
+        from backend.vendor_stats import get_vendor_stats
+        stats = get_vendor_stats(vendor)
 
         return Response({
             'success': True,
@@ -11010,14 +11064,14 @@ def vendor_dashboard(request):
                     'name': vendor.name,
                     'email': vendor.email,
                 },
-                'total_products': total_products,
-                'total_options': total_options,
-                'total_stock': total_stock,
-                'low_stock_items': low_stock_items,
-                'recent_orders': recent_orders,
-                'pending_orders': pending_orders,
-                'accepted_orders': accepted_orders,
-                'total_revenue': int(total_revenue)
+                'total_products': stats.total_products,
+                'total_options': stats.total_options,
+                'total_stock': stats.total_stock,
+                'low_stock_items': stats.low_stock_items,
+                'recent_orders': stats.recent_orders,
+                'pending_orders': stats.pending_orders,
+                'accepted_orders': stats.accepted_orders,
+                'total_revenue': int(stats.total_revenue)
             }
         })
     except Exception as e:
@@ -11218,6 +11272,8 @@ def service_vendor_signup(request):
     otp = request.data.get('otp')
     fcmtoken = (request.data.get('fcmtoken') or request.data.get('fcm_token') or '').strip()
     subcategory_ids = request.data.get('service_subcategory_ids') or request.data.get('service_subcategories') or []
+    latitude = request.data.get('latitude')
+    longitude = request.data.get('longitude')
 
     if not all([name, phone, otp]):
         return Response({'success': False, 'message': 'name, phone and otp are required'}, status=400)
@@ -11242,8 +11298,22 @@ def service_vendor_signup(request):
         updates['area'] = area
     if pincode and vendor.pincode != pincode:
         updates['pincode'] = pincode
+    # Optional GPS fix of the vendor's base location (used by /api/nearby/)
+    if latitude not in (None, '') and longitude not in (None, ''):
+        from decimal import Decimal, InvalidOperation
+        try:
+            lat_value = Decimal(str(latitude)).quantize(Decimal('0.000001'))
+            lng_value = Decimal(str(longitude)).quantize(Decimal('0.000001'))
+        except (InvalidOperation, ValueError):
+            return Response({'success': False, 'message': 'Invalid latitude/longitude'}, status=400)
+        if not (-90 <= lat_value <= 90 and -180 <= lng_value <= 180):
+            return Response({'success': False, 'message': 'Invalid latitude/longitude'}, status=400)
+        if (vendor.latitude, vendor.longitude) != (lat_value, lng_value):
+            updates['latitude'], updates['longitude'] = lat_value, lng_value
     if updates:
+        from backend import geo_index
         ServiceVendor.objects.filter(pk=vendor.pk).update(**updates)
+        geo_index.invalidate(geo_index.INDEX_SERVICES)
         vendor.refresh_from_db()
 
     # Attach allowed subcategories
@@ -11267,6 +11337,8 @@ def service_vendor_signup(request):
             'phone': vendor.phone,
             'area': vendor.area,
             'pincode': vendor.pincode,
+            'latitude': float(vendor.latitude) if vendor.latitude is not None else None,
+            'longitude': float(vendor.longitude) if vendor.longitude is not None else None,
             'service_subcategories': list(vendor.service_subcategories.values('id', 'name')),
         }
     })
@@ -11389,21 +11461,25 @@ def service_vendor_delete_service(request, service_id):
 @api_view(['GET'])
 @authentication_classes([ServiceVendorTokenAuthentication])
 @permission_classes([IsAuthenticatedServiceVendor])
-def service_vendor_dashboard(request):
+def service_vendor_export_bookings(request):
     """
-    Basic dashboard stats for service vendors.
+    Stream the service vendor's bookings as CSV/XLSX.
+    Query params: file_format (csv|xlsx), date_from, date_to (YYYY-MM-DD).
     """
-    vendor = request.user
+    return _streaming_export(request, 'service-bookings', request.user.id)
 
-    services_qs = Service.objects.filter(service_vendor=vendor)
-    bookings_qs = ServiceBooking.objects.filter(service_option__service__service_vendor=vendor)
 
-    total_services = services_qs.count()
-    total_bookings = bookings_qs.count()
-    pending_bookings = bookings_qs.filter(status='PENDING').count()
-    confirmed_bookings = bookings_qs.filter(status='CONFIRMED').count()
+@api_view(['GET'])
+@authentication_classes([ServiceVendorTokenAuthentication])
+@permission_classes([IsAuthenticatedServiceVendor])
+def service_vendor_dashboard(request):
+    """
+    Basic dashboard stats for service vendors (one ServiceVendorStats row).
+    """
+    from backend.vendor_stats import get_service_vendor_stats
 
-    total_revenue = bookings_qs.filter(payment_status='PAID').aggregate(total=Sum('total_amount'))['total'] or 0
+    vendor = request.user
+    stats = get_service_vendor_stats(vendor)
 
     return Response({
         'success': True,
@@ -11415,11 +11491,11 @@ def service_vendor_dashboard(request):
                 'area': vendor.area,
                 'pincode': vendor.pincode,
             },
-            'total_services': total_services,
-            'total_bookings': total_bookings,
-            'pending_bookings': pending_bookings,
-            'confirmed_bookings': confirmed_bookings,
-            'total_revenue': int(total_revenue),
+            'total_services': stats.total_services,
+            'total_bookings': stats.total_bookings,
+            'pending_bookings': stats.pending_bookings,
+            'confirmed_bookings': stats.confirmed_bookings,
+            'total_revenue': int(stats.total_revenue),
         }
     })
 
@@ -11549,6 +11625,70 @@ def get_serviceable_locations(request):
         }, status=500)
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_nearby(request):
+    """
+    Serviceable locations and artists (services) nearest to a GPS fix.
+    GET /api/nearby/?lat=..&lng=..
+
+    Query Params:
+        - lat, lng: required
+        - type: locations | services | all (default: all)
+        - k: number of results per type (default 5 when no radius is given)
+        - radius_km: only results within this distance (with k: the k nearest inside it)
+    """
+    from backend import geo_index
+    from backend.service_listing import services_for_page
+
+    try:
+        lat = float(request.GET.get('lat'))
+        lng = float(request.GET.get('lng'))
+    except (TypeError, ValueError):
+        return Response({'success': False, 'message': 'lat and lng are required'}, status=400)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return Response({'success': False, 'message': 'Invalid coordinates'}, status=400)
+
+    result_type = request.GET.get('type', 'all')
+    if result_type not in ('locations', 'services', 'all'):
+        return Response({'success': False, 'message': 'type must be locations, services or all'}, status=400)
+
+    max_results = getattr(settings, 'NEARBY_MAX_RESULTS', 50)
+    try:
+        k = request.GET.get('k')
+        k = min(max(int(k), 1), max_results) if k else None
+        radius_km = request.GET.get('radius_km')
+        radius_km = min(float(radius_km), getattr(settings, 'NEARBY_MAX_RADIUS_KM', 100.0)) if radius_km else None
+    except (TypeError, ValueError):
+        return Response({'success': False, 'message': 'Invalid k or radius_km'}, status=400)
+    if k is None and radius_km is None:
+        k = 5
+    radius_m = radius_km * 1000 if radius_km is not None else None
+
+    response = {'success': True, 'latitude': lat, 'longitude': lng}
+
+    if result_type in ('locations', 'all'):
+        locations = geo_index.nearby_locations(lat, lng, k=k, radius_m=radius_m)[:max_results]
+        response['locations'] = [
+            {**{key: value for key, value in location.items() if key != 'distance_m'},
+             'distance_km': round(location['distance_m'] / 1000, 2)}
+            for location in locations
+        ]
+
+    if result_type in ('services', 'all'):
+        found = geo_index.nearby_services(lat, lng, k=k, radius_m=radius_m)[:max_results]
+        services = services_for_page([service_id for _, service_id, _ in found])
+        services_data = ServiceSerializer(services, many=True, context={'request': request}).data
+        placement = {str(service_id): (distance, payload) for distance, service_id, payload in found}
+        for item in services_data:
+            distance, payload = placement[str(item['id'])]
+            item['distance_km'] = round(distance / 1000, 2)
+            item['located_by'] = payload['located_by']
+        response['services'] = services_data
+
+    return Response(response)
+
+
 # views.py - Update these endpoints to allow guest access
 
 # ✅ FIXED: Service Categories - Allow guests
@@ -11695,58 +11835,37 @@ def get_all_services(request):
         print(f'   - Pincode: {pincode}')
         print(f'   - Guest Mode: {not is_authenticated}')
 
-        # Base queryset - only available services
-        services = Service.objects.select_related('category', 'subcategory').prefetch_related(
-            'options_set__images_set'
-        ).filter(availability=True)
+        # Filter and sort on the indexed listing read model (backend/service_listing.py);
+        # only the services of the requested page are loaded with their options/images
+        from backend.service_listing import listing_queryset, services_for_page
 
+        category_filter = subcategory_filter = None
         # Apply subcategory filter (takes precedence when set)
         if subcategory_id:
             try:
-                subcategory_id_int = int(subcategory_id)
-                services = services.filter(subcategory_id=subcategory_id_int)
-                print(f'   ✅ Filtered by subcategory: {subcategory_id_int}')
+                subcategory_filter = int(subcategory_id)
+                print(f'   ✅ Filtered by subcategory: {subcategory_filter}')
             except (ValueError, TypeError):
                 print(f'   ⚠️ Invalid subcategory ID: {subcategory_id}')
-                pass
         # Apply category filter (services in this category, including via subcategories)
         elif category_id:
             try:
-                category_id_int = int(category_id)
-                from django.db.models import Q
-                services = services.filter(Q(category_id=category_id_int) | Q(subcategory__category_id=category_id_int))
-                print(f'   ✅ Filtered by category: {category_id_int}')
+                category_filter = int(category_id)
+                print(f'   ✅ Filtered by category: {category_filter}')
             except (ValueError, TypeError):
                 print(f'   ⚠️ Invalid category ID: {category_id}')
-                pass
-
-        # Apply pincode filter (if you have location-based services)
-        if pincode:
-            # Optional: Filter services available in this pincode
-            # You can add this logic based on your ServiceableLocation model
-            pass
 
-        # Apply sorting
-        if sort_by == 'price_low_high':
-            services = services.order_by('base_price')
-            print(f'   ✅ Sorted by: Price Low to High')
-        elif sort_by == 'price_high_low':
-            services = services.order_by('-base_price')
-            print(f'   ✅ Sorted by: Price High to Low')
-        elif sort_by == 'rating':
-            services = services.order_by('-rating', '-total_reviews')
-            print(f'   ✅ Sorted by: Rating')
-        elif sort_by == 'experience':
-            # Assuming you have experience_years field
-            services = services.order_by('-experience_years')
-            print(f'   ✅ Sorted by: Experience')
-        else:
-            # Default: Most recent first
-            services = services.order_by('-created_at')
-            print(f'   ✅ Sorted by: Most Recent')
+        # Pincode filter: services offered in this serviceable location
+        listings = listing_queryset(
+            category_id=category_filter,
+            subcategory_id=subcategory_filter,
+            pincode=(pincode or '').strip() or None,
+            sort_by=sort_by,
+        )
+        print(f'   ✅ Sorted by: {sort_by}')
 
         # Pagination
-        paginator = Paginator(services, 20)  # 20 services per page
+        paginator = Paginator(listings.values_list('service_id', flat=True), 20)  # 20 services per page
 
         try:
             page_obj = paginator.page(page)
@@ -11760,7 +11879,7 @@ def get_all_services(request):
 
         # Serialize services
         services_data = ServiceSerializer(
-            page_obj,
+            services_for_page(list(page_obj)),
             many=True,
             context={'request': request}
         ).data
@@ -12023,6 +12142,8 @@ def update_cart_item_quantity(request, item_id):
     PUT/PATCH /api/cart/update/<item_id>/
     Body: {"quantity": 3}
     """
+    from backend.cart import cart_payload, get_cart
+
     user = request.user
     new_quantity = request.data.get('quantity')
 
@@ -12065,95 +12186,13 @@ def update_cart_item_quantity(request, item_id):
         print(f"âœ… Cart item {item_id} quantity updated to {new_quantity}")
 
         # Build updated cart response
-        cart_items = CartItem.objects.select_related(
-            'product_option__product'
-        ).prefetch_related(
-            'product_option__images_set'
-        ).filter(user=user).order_by('-created_at')
-
-        cart_data = []
-        total_amount = 0
-        offer_amount = 0
-        total_savings = 0
-        delivery_charges = 0
-
-        for item in cart_items:
-            product = item.product_option.product
-            first_image = item.product_option.images_set.first()
-            image_url = None
-            if first_image and first_image.image:
-                try:
-                    image_url = request.build_absolute_uri(first_image.image.url)
-                except:
-                    pass
-
-            original_price = product.price
-            rental_price = item.rental_price
-            savings_per_item = original_price - rental_price if rental_price < original_price else 0
-
-            total_amount += original_price * item.quantity
-            offer_amount += rental_price * item.quantity
-            total_savings += savings_per_item * item.quantity
-            delivery_charges += product.delivery_charge
-
-            # Calculate rental end date
-            rental_end_date = None
-            if item.rental_type == 'rent' and item.selected_date:
-                try:
-                    from datetime import datetime, timedelta
-                    start_date = datetime.strptime(str(item.selected_date), '%Y-%m-%d')
-                    duration_days = {
-                        '1_day': 1, '2_days': 2, '3_days': 3,
-                        '7_days': 7, '14_days': 14, '30_days': 30
-                    }
-                    days = duration_days.get(item.rental_duration, 1)
-                    end_date = start_date + timedelta(days=days - 1)
-                    rental_end_date = end_date.strftime('%Y-%m-%d')
-                except:
-                    pass
-
-            cart_data.append({
-                'id': str(item.id),
-                'product_option_id': str(item.product_option.id),
-                'title': f"({item.product_option.option}) {product.title}" if item.product_option.option else product.title,
-                'image': image_url,
-                'price': original_price,
-                'offer_price': product.offer_price if product.offer_price > 0 else original_price,
-                'quantity': item.quantity,
-                'cod': product.cod,
-                'delivery_charge': product.delivery_charge,
-                'savings': savings_per_item,
-                'product_id': str(product.id),
-                'in_stock': item.product_option.quantity > 0,
-                'stock_quantity': item.product_option.quantity,
-                'selected_date': item.selected_date.strftime('%Y-%m-%d') if item.selected_date else None,
-                'rental_type': item.rental_type,
-                'rental_duration': item.rental_duration,
-                'rental_price': rental_price,
-                'rental_end_date': rental_end_date,
-            })
-
-        final_amount = offer_amount + delivery_charges
-        free_delivery_threshold = 500
-        if offer_amount >= free_delivery_threshold:
-            delivery_charges = 0
-            final_amount = offer_amount
+        cart_data, summary = cart_payload(get_cart(user), request)
 
         return Response({
             'success': True,
             'message': 'Quantity updated successfully',
             'cart_items': cart_data,
-            'summary': {
-                'total_amount': total_amount,
-                'offer_amount': offer_amount,
-                'total_savings': total_savings,
-                'delivery_charges': delivery_charges,
-                'final_amount': final_amount,
-                'total_items': len(cart_data),
-                'free_delivery_threshold': free_delivery_threshold,
-                'free_delivery_eligible': offer_amount >= free_delivery_threshold,
-                'amount_for_free_delivery': max(0, free_delivery_threshold - offer_amount)
-            },
+            'summary': summary,
             'recommendations': {
                 'similar_products': [],
                 'frequently_bought_together': []
@@ -12482,8 +12521,8 @@ def guest_login(request):
                 'fullname': guest_user.fullname,
                 'is_guest': True,
                 'notifications': 0,
-                'wishlist_count': guest_user.wishlist.count(),
-                'cart_count': guest_user.cart.count(),
+                'wishlist_count': guest_user.wishlist_count,
+                'cart_count': guest_user.cart_count,
             },
             'message': '🎭 Browsing as guest. Sign up to save your data!',
         }, status=200)
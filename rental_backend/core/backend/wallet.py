@@ -0,0 +1,290 @@
+"""
+Referral wallet: an append-only ledger (WalletTransaction) plus the cached
+balance on User.referral_wallet_balance.
+
+Every credit or debit is posted through post(), or credit_referrals() for a
+batch of referral rewards, with an idempotency key unique per business event:
+    referral_key(referral)          reward for one referral
+    order_debit_key(order)          wallet spent on one order
+    booking_debit_key(booking)      wallet spent on one service booking
+The ledger row is inserted first; if the key already exists the event was
+posted before and nothing changes. The balance is then moved with an F()
+update in the same transaction (a debit only WHERE balance >= amount), so
+concurrent credits and debits never overwrite each other and the balance
+cannot go negative.
+
+Support corrects a balance by posting an adjustment entry (User admin →
+"Adjust wallet"), never by editing the cached balance.
+
+`python manage.py reconcile_wallets` compares every balance with the ledger in
+one grouped query. The first time a user's balance differs it is taken as the
+truth (balances predate the ledger, or were edited by hand) and an opening
+entry for the difference is posted; after that, drift means a write bypassed
+post() and the balance is reset to its ledger sum. It also keys entries
+posted before idempotency keys existed.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+MSG_INSUFFICIENT = 'Your wallet balance has changed, please try again'
+
+
+class InsufficientBalance(Exception):
+    """A debit found less than its amount in the wallet; the message is shown to the user."""
+
+
+def referral_key(referral):
+    return f'referral:{referral.pk}:reward'
+
+
+def order_debit_key(order):
+    return f'order:{order.pk}:debit'
+
+
+def booking_debit_key(booking):
+    return f'service_booking:{booking.pk}:debit'
+
+
+def opening_key(user_id):
+    return f'user:{user_id}:opening'
+
+
+def adjustment_key(token):
+    """token: one per adjustment form, so a resubmitted form posts nothing."""
+    return f'adjustment:{token}'
+
+
+# =============================================================================
+# POSTING
+# =============================================================================
+
+def post(user, tx_type, amount, description, key, **links):
+    """
+    Post one ledger entry and move the user's balance. Returns
+    (transaction, created); created is False when `key` was already posted.
+    links: order / service_booking / referral the entry belongs to.
+    Raises InsufficientBalance, with nothing posted, for an uncovered debit.
+    """
+    from backend.models import User, WalletTransaction
+
+    amount = Decimal(str(amount))
+    if amount <= 0:
+        raise ValueError('Wallet amounts must be positive')
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                entry = WalletTransaction.objects.create(
+                    user=user, type=tx_type, amount=amount, description=description[:255], idempotency_key=key,
+                    **links,
+                )
+        except IntegrityError:
+            existing = WalletTransaction.objects.filter(idempotency_key=key).first()
+            if existing is None:
+                raise
+            return existing, False
+
+        users = User.objects.filter(pk=user.pk)
+        if tx_type == WalletTransaction.TYPE_DEBIT:
+            moved = users.filter(referral_wallet_balance__gte=amount).update(
+                referral_wallet_balance=F('referral_wallet_balance') - amount,
+            )
+            if not moved:
+                raise InsufficientBalance(MSG_INSUFFICIENT)
+        else:
+            users.update(referral_wallet_balance=F('referral_wallet_balance') + amount)
+    user.refresh_from_db(fields=['referral_wallet_balance'])
+    return entry, True
+
+
+def credit(user, amount, description, key, **links):
+    from backend.models import WalletTransaction
+    return post(user, WalletTransaction.TYPE_CREDIT, amount, description, key, **links)
+
+
+def debit(user, amount, description, key, **links):
+    from backend.models import WalletTransaction
+    return post(user, WalletTransaction.TYPE_DEBIT, amount, description, key, **links)
+
+
+def credit_referrals(referrals):
+    """
+    Credit the rewards of many referrals with one ledger insert and one balance
+    UPDATE. Referrals whose reward is already in the ledger are skipped.
+    Returns the referrals credited now. Call inside a transaction that holds
+    the referral rows; a reward posted meanwhile by another run makes the
+    insert fail (IntegrityError) rather than pay twice.
+    """
+    from backend.models import User, WalletTransaction
+
+    by_key = {referral_key(referral): referral for referral in referrals if referral.reward_amount > 0}
+    posted = set(WalletTransaction.objects.filter(idempotency_key__in=by_key).values_list('idempotency_key', flat=True))
+    credited = [referral for key, referral in by_key.items() if key not in posted]
+    if not credited:
+        return []
+
+    with transaction.atomic():
+        WalletTransaction.objects.bulk_create([
+            WalletTransaction(
+                user_id=referral.referrer_id,
+                type=WalletTransaction.TYPE_CREDIT,
+                amount=referral.reward_amount,
+                description=f"Referral reward for {referral.referred_user.email}"[:255],
+                idempotency_key=referral_key(referral),
+                referral=referral,
+            )
+            for referral in credited
+        ])
+        totals = {}
+        for referral in credited:
+            totals[referral.referrer_id] = totals.get(referral.referrer_id, 0) + referral.reward_amount
+        User.objects.filter(pk__in=totals).update(referral_wallet_balance=F('referral_wallet_balance') + Case(
+            *[When(pk=user_id, then=Value(total)) for user_id, total in totals.items()],
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ))
+    return credited
+
+
+# =============================================================================
+# RECONCILIATION
+# =============================================================================
+
+def backfill_keys():
+    """
+    Give ledger entries posted before idempotency keys their key, so the events
+    they record can't be posted again: the first referral reward credit per
+    rewarded referral (matched by referrer, amount and description) and the
+    first debit per order / service booking. Returns the number of entries keyed.
+    """
+    from backend.models import Referral, WalletTransaction
+
+    unkeyed = WalletTransaction.objects.filter(idempotency_key__isnull=True)
+    keyed = 0
+    with transaction.atomic():
+        for referral in Referral.objects.filter(status=Referral.STATUS_REWARDED).select_related('referred_user'):
+            if WalletTransaction.objects.filter(idempotency_key=referral_key(referral)).exists():
+                continue
+            entry = unkeyed.filter(
+                user_id=referral.referrer_id,
+                type=WalletTransaction.TYPE_CREDIT,
+                amount=referral.reward_amount,
+                description=f"Referral reward for {referral.referred_user.email}",
+            ).order_by('created_at', 'pk').first()
+            if entry is not None:
+                keyed += unkeyed.filter(pk=entry.pk).update(idempotency_key=referral_key(referral), referral=referral)
+
+        debits = unkeyed.filter(type=WalletTransaction.TYPE_DEBIT).order_by('created_at', 'pk')
+        for link, make_key in (('order', order_debit_key), ('service_booking', booking_debit_key)):
+            seen = set()
+            for entry in debits.filter(**{f'{link}__isnull': False}).select_related(link):
+                target = getattr(entry, link)
+                key = make_key(target)
+                if target.pk in seen or WalletTransaction.objects.filter(idempotency_key=key).exists():
+                    continue
+                seen.add(target.pk)
+                keyed += unkeyed.filter(pk=entry.pk).update(idempotency_key=key)
+    return keyed
+
+
+def ledger_balances(user_ids=None):
+    """{user_id: credits - debits} from the ledger (users without entries are absent)."""
+    from backend.models import WalletTransaction
+
+    entries = WalletTransaction.objects.all()
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+    rows = entries.values('user_id').annotate(
+        credits=Sum('amount', filter=Q(type=WalletTransaction.TYPE_CREDIT)),
+        debits=Sum('amount', filter=Q(type=WalletTransaction.TYPE_DEBIT)),
+    ).values_list('user_id', 'credits', 'debits')
+    return {user_id: (credits or 0) - (debits or 0) for user_id, credits, debits in rows}
+
+
+def _ledger_sum():
+    """Subquery: credits - debits of the outer User row."""
+    from backend.models import WalletTransaction
+
+    signed = Case(
+        When(type=WalletTransaction.TYPE_DEBIT, then=-F('amount')),
+        default=F('amount'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    total = WalletTransaction.objects.filter(user_id=OuterRef('pk')).order_by().values('user_id').annotate(
+        total=Sum(signed),
+    ).values('total')
+    return Coalesce(Subquery(total), Value(Decimal('0')), output_field=DecimalField(max_digits=10, decimal_places=2))
+
+
+def _fix_batch(user_ids):
+    """Open or reset the balances of these users, each under its row lock. Returns the rows changed."""
+    from backend.models import User, WalletTransaction
+
+    fixed = []
+    with transaction.atomic():
+        cached = dict(
+            User.objects.select_for_update().filter(pk__in=user_ids).order_by('pk')
+            .values_list('pk', 'referral_wallet_balance')
+        )
+        # Read again under the locks: post() moves a balance after its entry is in
+        expected = ledger_balances(list(cached))
+        opened = set(WalletTransaction.objects.filter(
+            idempotency_key__in=[opening_key(user_id) for user_id in cached],
+        ).values_list('user_id', flat=True))
+
+        openings, reset = [], []
+        for user_id, balance in cached.items():
+            ledger = expected.get(user_id, 0)
+            if balance == ledger:
+                continue
+            fixed.append((user_id, balance, ledger, user_id not in opened))
+            if user_id in opened:
+                reset.append(user_id)
+                continue
+            openings.append(WalletTransaction(
+                user_id=user_id,
+                type=WalletTransaction.TYPE_CREDIT if balance > ledger else WalletTransaction.TYPE_DEBIT,
+                amount=abs(balance - ledger),
+                description='Opening balance',
+                idempotency_key=opening_key(user_id),
+            ))
+        WalletTransaction.objects.bulk_create(openings)
+        if reset:
+            User.objects.filter(pk__in=reset).update(referral_wallet_balance=_ledger_sum())
+    return fixed
+
+
+def reconcile(user_ids=None, dry_run=False, batch_size=1000):
+    """
+    Bring every balance (of these users) in line with the ledger: a user's
+    first difference is posted as an opening entry (the balance stays), a
+    later one resets the balance to the ledger sum. Returns
+    [(user_id, cached balance, ledger balance, opened)] of users that were
+    (or would be) fixed; opened is True when an opening entry was (or would
+    be) posted.
+    """
+    from backend.models import User, WalletTransaction
+
+    expected = ledger_balances(user_ids)
+    users = User.objects.only('pk', 'referral_wallet_balance')
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    drifting = [
+        (user.pk, user.referral_wallet_balance, expected.get(user.pk, 0))
+        for user in users.iterator(chunk_size=batch_size)
+        if user.referral_wallet_balance != expected.get(user.pk, 0)
+    ]
+
+    if dry_run:
+        opened = set(WalletTransaction.objects.filter(
+            idempotency_key__in=[opening_key(user_id) for user_id, _, _ in drifting],
+        ).values_list('user_id', flat=True))
+        return [(user_id, cached, ledger, user_id not in opened) for user_id, cached, ledger in drifting]
+
+    fixed = []
+    ids = [user_id for user_id, _, _ in drifting]
+    for start in range(0, len(ids), batch_size):
+        fixed.extend(_fix_batch(ids[start:start + batch_size]))
+    return fixed
@@ -3,6 +3,14 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The vendor live order feed (/api/vendor/orders/events/ and .../stream/) is
+made of async views that wait for events. The default deploy serves WSGI
+(core/wsgi.py), where those views keep waits short so they do not tie up
+sync workers; serving this entry point instead (e.g. gunicorn
+core.asgi:application -k uvicorn.workers.UvicornWorker) lets idle
+connections wait the full VENDOR_EVENT_MAX_WAIT_SECONDS /
+VENDOR_EVENT_STREAM_SECONDS without occupying a worker.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
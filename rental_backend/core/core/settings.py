@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/5.1/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
+import json
 import os
 from pathlib import Path
 import requests
@@ -261,6 +262,54 @@ REFERRAL_SIGNUP_BASE_URL = os.environ.get(
     "https://play.google.com/store/apps/details?id=com.chaitanya.rentalcothes",  # Your Android app – replace with your website signup URL if you prefer
 )
 
+# -----------------------------------------------------------------------------
+# Analytics write-behind buffer (see backend/analytics_buffer.py)
+# -----------------------------------------------------------------------------
+# Screen events and location pings are appended to a local segment log and
+# bulk-inserted by a background thread. Durability: memory | flush | fsync.
+# Unflushed segments are replayed on start-up or with:
+#   python manage.py flush_analytics_buffer
+ANALYTICS_BUFFER_ENABLED = os.environ.get('ANALYTICS_BUFFER_ENABLED', 'True').lower() in ('1', 'true', 'yes')
+ANALYTICS_BUFFER_DIR = os.environ.get('ANALYTICS_BUFFER_DIR', os.path.join(BASE_DIR, 'analytics_buffer'))
+ANALYTICS_BUFFER_DURABILITY = os.environ.get('ANALYTICS_BUFFER_DURABILITY', 'flush')
+ANALYTICS_BUFFER_FLUSH_SIZE = int(os.environ.get('ANALYTICS_BUFFER_FLUSH_SIZE', '500'))
+ANALYTICS_BUFFER_FLUSH_SECONDS = float(os.environ.get('ANALYTICS_BUFFER_FLUSH_SECONDS', '5'))
+
+# -----------------------------------------------------------------------------
+# Customer location pings (downsampling + retention)
+# -----------------------------------------------------------------------------
+# A ping is stored only if the device moved at least LOCATION_PING_MIN_DISTANCE_M
+# or LOCATION_PING_MIN_INTERVAL_MINUTES passed since its last stored ping (0 disables).
+# Raw pings older than LOCATION_PING_RETENTION_DAYS are deleted by
+#   python manage.py rollup_location_pings
+# after being folded into LocationCellDailyCount (used by the admin heatmap).
+LOCATION_PING_MIN_DISTANCE_M = float(os.environ.get('LOCATION_PING_MIN_DISTANCE_M', '200'))
+LOCATION_PING_MIN_INTERVAL_MINUTES = float(os.environ.get('LOCATION_PING_MIN_INTERVAL_MINUTES', '10'))
+LOCATION_PING_RETENTION_DAYS = int(os.environ.get('LOCATION_PING_RETENTION_DAYS', '30'))
+
+# -----------------------------------------------------------------------------
+# Session funnels (see backend/analytics_funnels.py)
+# -----------------------------------------------------------------------------
+# Funnel name -> ordered screen names (as sent to /analytics/screen/start/).
+# Override with a JSON object in ANALYTICS_FUNNELS. After changing a funnel run:
+#   python manage.py build_session_funnels --full
+ANALYTICS_FUNNELS = json.loads(os.environ.get('ANALYTICS_FUNNELS') or json.dumps({
+    'purchase': ['home', 'product_detail', 'cart', 'checkout', 'order_success'],
+    'service_booking': ['home', 'service_detail', 'service_booking', 'order_success'],
+}))
+# Sessions are tracked (and can absorb late events) for this many days
+ANALYTICS_FUNNEL_STATE_DAYS = int(os.environ.get('ANALYTICS_FUNNEL_STATE_DAYS', '7'))
+
+# -----------------------------------------------------------------------------
+# Bulk catalog import (see backend/catalog_import.py)
+# -----------------------------------------------------------------------------
+# Jobs start in a background thread; unfinished or failed jobs are resumed with:
+#   python manage.py run_catalog_imports
+CATALOG_IMPORT_BATCH_SIZE = int(os.environ.get('CATALOG_IMPORT_BATCH_SIZE', '200'))
+CATALOG_IMPORT_IMAGE_WORKERS = int(os.environ.get('CATALOG_IMPORT_IMAGE_WORKERS', '4'))
+CATALOG_IMPORT_STALE_MINUTES = int(os.environ.get('CATALOG_IMPORT_STALE_MINUTES', '5'))
+CATALOG_IMPORT_MAX_UPLOAD_MB = int(os.environ.get('CATALOG_IMPORT_MAX_UPLOAD_MB', '500'))
+
 
 
 
@@ -316,3 +365,80 @@ else:
 
 
 
+
+# -----------------------------------------------------------------------------
+# Image variants: thumb / medium / full WebP copies (see backend/image_variants.py)
+# -----------------------------------------------------------------------------
+# Rendered in a process pool after upload; existing media:
+#   python manage.py build_image_variants
+IMAGE_VARIANTS_ENABLED = os.environ.get('IMAGE_VARIANTS_ENABLED', 'True').lower() in ('1', 'true', 'yes')
+IMAGE_VARIANT_WORKERS = int(os.environ.get('IMAGE_VARIANT_WORKERS', '2'))
+IMAGE_VARIANT_QUALITY = int(os.environ.get('IMAGE_VARIANT_QUALITY', '80'))
+
+# -----------------------------------------------------------------------------
+# Content-addressed image uploads (see backend/media_blobs.py)
+# -----------------------------------------------------------------------------
+# A blob re-uploaded within this window survives losing its last reference
+# (its new row may not have committed yet); sweep leftovers with:
+#   python manage.py gc_media_blobs
+MEDIA_BLOB_GRACE_MINUTES = int(os.environ.get('MEDIA_BLOB_GRACE_MINUTES', '10'))
+
+# -----------------------------------------------------------------------------
+# Vendor live order feed (see backend/vendor_events.py)
+# -----------------------------------------------------------------------------
+# Served by async views. Under ASGI (core/asgi.py) waiting clients hold no
+# worker; under WSGI (the default deploy) each one holds a sync worker, so the
+# long-poll and the SSE stream use the shorter WSGI limits. Purge old events with:
+#   python manage.py purge_vendor_events
+VENDOR_EVENT_POLL_SECONDS = float(os.environ.get('VENDOR_EVENT_POLL_SECONDS', '2'))
+VENDOR_EVENT_SETTLE_SECONDS = float(os.environ.get('VENDOR_EVENT_SETTLE_SECONDS', '1'))
+VENDOR_EVENT_MAX_WAIT_SECONDS = float(os.environ.get('VENDOR_EVENT_MAX_WAIT_SECONDS', '55'))
+VENDOR_EVENT_KEEPALIVE_SECONDS = float(os.environ.get('VENDOR_EVENT_KEEPALIVE_SECONDS', '15'))
+VENDOR_EVENT_STREAM_SECONDS = int(os.environ.get('VENDOR_EVENT_STREAM_SECONDS', '300'))
+VENDOR_EVENT_WSGI_MAX_WAIT_SECONDS = float(os.environ.get('VENDOR_EVENT_WSGI_MAX_WAIT_SECONDS', '5'))
+VENDOR_EVENT_WSGI_STREAM_SECONDS = int(os.environ.get('VENDOR_EVENT_WSGI_STREAM_SECONDS', '25'))
+VENDOR_EVENT_RETENTION_DAYS = int(os.environ.get('VENDOR_EVENT_RETENTION_DAYS', '7'))
+
+# -----------------------------------------------------------------------------
+# Streaming CSV / XLSX exports (see backend/exports.py)
+# -----------------------------------------------------------------------------
+# Rows fetched per round trip from the server-side cursor
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '2000'))
+
+# -----------------------------------------------------------------------------
+# Nearby search (see backend/geo_index.py)
+# -----------------------------------------------------------------------------
+# In-process KD-tree indexes; changes from other processes are picked up after
+# at most this many seconds
+GEO_INDEX_CHECK_SECONDS = int(os.environ.get('GEO_INDEX_CHECK_SECONDS', '60'))
+NEARBY_MAX_RESULTS = int(os.environ.get('NEARBY_MAX_RESULTS', '50'))
+NEARBY_MAX_RADIUS_KM = float(os.environ.get('NEARBY_MAX_RADIUS_KM', '100'))
+
+# -----------------------------------------------------------------------------
+# Offline pincode geocoder (see backend/pincode_geocoder.py)
+# -----------------------------------------------------------------------------
+# Load / update the dataset and backfill ServiceableLocation coordinates:
+#   python manage.py load_pincode_geodata <pincode_directory.csv> --backfill
+# Reverse lookups farther than this from every pincode centroid return None
+PINCODE_GEOCODER_MAX_KM = float(os.environ.get('PINCODE_GEOCODER_MAX_KM', '30'))
+
+# -----------------------------------------------------------------------------
+# Priced cart (see backend/cart.py)
+# -----------------------------------------------------------------------------
+# Cached per user in the default cache; every cart change moves the user to a
+# new key, so this only bounds how long unused entries are kept
+CART_CACHE_SECONDS = int(os.environ.get('CART_CACHE_SECONDS', '300'))
+CART_FREE_DELIVERY_THRESHOLD = int(os.environ.get('CART_FREE_DELIVERY_THRESHOLD', '500'))
+
+# -----------------------------------------------------------------------------
+# Coupon eligibility index (see backend/coupon_index.py)
+# -----------------------------------------------------------------------------
+# Coupon edits made by other processes are picked up after at most this many seconds
+COUPON_INDEX_CHECK_SECONDS = int(os.environ.get('COUPON_INDEX_CHECK_SECONDS', '60'))
+
+# -----------------------------------------------------------------------------
+# Scheduled jobs (crons in vercel.json)
+# -----------------------------------------------------------------------------
+# Vercel sends it as "Authorization: Bearer <CRON_SECRET>"; /api/cron/*
+# endpoints refuse every call while it is unset
+CRON_SECRET = os.environ.get('CRON_SECRET', '')